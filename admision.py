@@ -0,0 +1,201 @@
+# admision.py
+"""
+Control de admisión para las rutas costosas.
+
+Cada clase de ruta tiene un máximo de peticiones en curso por worker y una
+cola de espera acotada:
+
+    importaciones  cargas de archivos, conciliación y cartas en lote
+                   (pandas/openpyxl, pools de procesos)
+    reportes       /reporte-facturas: con vuelo_unico las peticiones
+                   iguales comparten un cálculo, así que admite una cola larga
+    io             descargas grandes en streaming (NDJSON, /glosas-view) y PDF
+    auth           login (/token, /login): bcrypt es CPU pura
+
+Una petición que encuentra la clase llena espera su turno en la cola (FIFO)
+hasta ADMISION_<CLASE>_ESPERA_S segundos; si la cola también está llena, o
+se agota la espera, se responde al momento con 503 (429 en auth) y
+Retry-After, sin tocar la base. El resto de rutas (el CRUD interactivo) no
+pasa por aquí: una ráfaga de reportes no le quita workers.
+
+Los contadores (en curso, en cola, admitidas, rechazadas) salen en /metrics
+y en /api/admision.
+"""
+
+import asyncio
+import json
+import math
+import os
+import re
+from collections import deque
+from typing import Deque, Dict, List, Optional, Pattern, Tuple
+
+from serializacion import MEDIA_NDJSON
+
+
+class Clase:
+    """Cupos de una clase de rutas. Solo se usa desde el event loop del worker."""
+
+    def __init__(self, nombre: str, limite: int, cola: int, espera_s: float, estado: int):
+        self.nombre = nombre
+        self.limite = limite
+        self.cola = cola
+        self.espera_s = espera_s
+        self.estado = estado
+        self.en_curso = 0
+        self.admitidas = 0
+        self.rechazadas = 0
+        self.vencidas = 0  # rechazadas por agotar la espera en cola
+        self._esperando: Deque[asyncio.Future] = deque()
+
+    @property
+    def en_cola(self) -> int:
+        return len(self._esperando)
+
+    async def entrar(self) -> bool:
+        """True si la petición puede seguir (y debe llamar a salir() al terminar)."""
+        if self.en_curso < self.limite and not self._esperando:
+            self.en_curso += 1
+            self.admitidas += 1
+            return True
+        if len(self._esperando) >= self.cola:
+            self.rechazadas += 1
+            return False
+
+        turno = asyncio.get_running_loop().create_future()
+        self._esperando.append(turno)
+        try:
+            await asyncio.wait_for(turno, self.espera_s)
+        except asyncio.TimeoutError:
+            self.rechazadas += 1
+            self.vencidas += 1
+            return False
+        except BaseException:
+            # Cliente desconectado: si el turno ya le había llegado, se cede.
+            if turno.done() and not turno.cancelled():
+                self.salir()
+            raise
+        finally:
+            if turno in self._esperando:
+                self._esperando.remove(turno)
+        self.admitidas += 1
+        return True
+
+    def salir(self) -> None:
+        """Libera el cupo: pasa directamente al primero de la cola que siga esperando."""
+        while self._esperando:
+            turno = self._esperando.popleft()
+            if not turno.done():
+                turno.set_result(True)
+                return
+        self.en_curso -= 1
+
+    def reintentar_en(self) -> int:
+        """Segundos sugeridos en Retry-After."""
+        return max(1, math.ceil(self.espera_s))
+
+    def contadores(self) -> Dict[str, int]:
+        return {
+            "en_curso": self.en_curso,
+            "en_cola": self.en_cola,
+            "admitidas": self.admitidas,
+            "rechazadas": self.rechazadas,
+            "vencidas": self.vencidas,
+        }
+
+
+def _clase(nombre: str, limite: int, cola: int, espera_s: float, estado: int) -> Clase:
+    prefijo = f"ADMISION_{nombre.upper()}_"
+    return Clase(
+        nombre,
+        limite=int(os.getenv(prefijo + "LIMITE", limite)),
+        cola=int(os.getenv(prefijo + "COLA", cola)),
+        espera_s=float(os.getenv(prefijo + "ESPERA_S", espera_s)),
+        estado=estado,
+    )
+
+
+CLASES: Dict[str, Clase] = {
+    c.nombre: c for c in (
+        _clase("importaciones", limite=1, cola=2, espera_s=30, estado=503),
+        _clase("reportes", limite=2, cola=32, espera_s=30, estado=503),
+        _clase("io", limite=4, cola=8, espera_s=10, estado=503),
+        _clase("auth", limite=4, cola=16, espera_s=5, estado=429),
+    )
+}
+
+# (método, ruta) -> clase. Las rutas van sin prefijo de montaje.
+REGLAS: List[Tuple[str, Pattern, str]] = [
+    ("GET", re.compile(r"^/reporte-facturas$"), "reportes"),
+    ("POST", re.compile(r"^/importar-(facturas|glosas)$"), "importaciones"),
+    ("POST", re.compile(r"^/facturas/importar-dian$"), "importaciones"),
+    ("POST", re.compile(r"^/conciliacion/eps$"), "importaciones"),
+    ("POST", re.compile(r"^/respuestas-glosa/cartas$"), "importaciones"),
+    ("GET", re.compile(r"^/glosas-view$"), "io"),
+    ("GET", re.compile(r"^/respuestas-glosa/\d+/carta$"), "io"),
+    ("POST", re.compile(r"^/(token|login)$"), "auth"),
+]
+
+
+def clase_de(metodo: str, ruta: str, consulta: bytes = b"", accept: bytes = b"") -> Optional[Clase]:
+    for metodo_regla, patron, nombre in REGLAS:
+        if metodo == metodo_regla and patron.match(ruta):
+            return CLASES[nombre]
+    # Listados completos en NDJSON (ver serializacion.pide_ndjson).
+    if metodo == "GET" and (b"formato=ndjson" in consulta or MEDIA_NDJSON.encode() in accept):
+        return CLASES["io"]
+    return None
+
+
+def contadores() -> Dict[str, int]:
+    """Para metricas.registrar_coleccion: aditivos entre workers."""
+    return {f"{nombre}_{k}": v for nombre, clase in CLASES.items() for k, v in clase.contadores().items()}
+
+
+def estado() -> Dict[str, dict]:
+    return {
+        nombre: {**clase.contadores(), "limite": clase.limite, "cola_maxima": clase.cola}
+        for nombre, clase in CLASES.items()
+    }
+
+
+class AdmisionMiddleware:
+    """ASGI puro: el cupo se mantiene hasta enviar el último byte (también en streaming)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        cabeceras = dict(scope.get("headers") or [])
+        clase = clase_de(scope["method"], scope["path"], scope.get("query_string", b""), cabeceras.get(b"accept", b""))
+        if clase is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not await clase.entrar():
+            await self._rechazar(clase, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            clase.salir()
+
+    @staticmethod
+    async def _rechazar(clase: Clase, send) -> None:
+        cuerpo = json.dumps({
+            "detail": "Servidor ocupado con otras peticiones de este tipo; intente de nuevo en unos segundos.",
+            "clase": clase.nombre,
+        }).encode()
+        await send({
+            "type": "http.response.start",
+            "status": clase.estado,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(cuerpo)).encode()),
+                (b"retry-after", str(clase.reintentar_en()).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": cuerpo})
@@ -0,0 +1,99 @@
+# alcance.py
+"""
+Alcance de datos por institución (aislamiento entre inquilinos).
+
+Cada usuario de una IPS o EPS pertenece a una institución
+(usuario.id_institucion). Su alcance se resuelve una vez por petición
+(auth.get_alcance) y se aplica como un WHERE más en las consultas de
+listados, detalles y reportes, de modo que la base solo devuelve su parte:
+
+    roles IPS  -> factura.id_institucion_emisora  = su institución
+    roles EPS  -> factura.id_institucion_receptora = su institución
+    ADMIN      -> sin restricción
+
+Las tablas hijas se restringen por su factura (glosa -> factura,
+respuesta -> glosa -> factura, ...), siempre con subconsultas sobre claves
+indexadas. Un usuario de IPS/EPS sin institución asignada no ve nada.
+"""
+
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import false, or_, select
+
+import models
+
+ROLES_IPS = frozenset({"FACTURADOR_IPS", "AUDITOR_IPS", "GERENTE_IPS"})
+ROLES_EPS = frozenset({"AUDITOR_EPS", "USUARIO_EPS"})
+
+
+@dataclass(frozen=True)
+class Alcance:
+    id_institucion: Optional[int] = None
+    # Columna de factura que debe coincidir: "id_institucion_emisora" o
+    # "id_institucion_receptora". None con restringido=True: no ve nada.
+    columna: Optional[str] = None
+    restringido: bool = False
+
+    def clausula(self, tabla):
+        """WHERE para las filas de `tabla` (Table o modelo) dentro del alcance; None si no hay restricción."""
+        if not self.restringido:
+            return None
+        if self.columna is None or self.id_institucion is None:
+            return false()
+        tabla = getattr(tabla, "__table__", tabla)
+        nombre = tabla.name
+        if nombre in ("factura", "factura_archivo", "cubo_glosas", "cubo_facturas"):
+            return tabla.c[self.columna] == self.id_institucion
+        if nombre in ("glosa", "alerta_vencimiento"):
+            return tabla.c.id_factura.in_(self._ids_factura(models.Factura))
+        if nombre == "glosa_archivo":
+            return tabla.c.id_factura.in_(self._ids_factura(models.FacturaArchivo))
+        if nombre in ("respuestas_glosa", "glosa_evento"):
+            return tabla.c.id_glosa.in_(self._ids_glosa(models.Glosa, models.Factura))
+        if nombre == "respuestas_glosa_archivo":
+            return tabla.c.id_glosa.in_(self._ids_glosa(models.GlosaArchivo, models.FacturaArchivo))
+        if nombre in ("adjuntos", "adjuntos_archivo"):
+            glosa, factura, respuesta = (
+                (models.Glosa, models.Factura, models.RespuestaGlosa) if nombre == "adjuntos"
+                else (models.GlosaArchivo, models.FacturaArchivo, models.RespuestaGlosaArchivo)
+            )
+            ids_glosa = self._ids_glosa(glosa, factura)
+            ids_respuesta = select(respuesta.id_respuesta_glosa).where(respuesta.id_glosa.in_(ids_glosa))
+            return or_(tabla.c.id_glosa.in_(ids_glosa), tabla.c.id_respuesta_glosa.in_(ids_respuesta))
+        raise ValueError(f"La tabla {nombre} no tiene alcance por institución")
+
+    def restringir(self, stmt, tabla):
+        """Añade la cláusula de `tabla` a un SELECT (o Query)."""
+        clausula = self.clausula(tabla)
+        return stmt if clausula is None else stmt.where(clausula)
+
+    def admite_factura(self, id_institucion_emisora, id_institucion_receptora):
+        """Si una factura con esas instituciones cae dentro del alcance (escalares o Series de pandas)."""
+        if not self.restringido:
+            return True
+        if self.columna is None or self.id_institucion is None:
+            return False
+        propia = id_institucion_emisora if self.columna == "id_institucion_emisora" else id_institucion_receptora
+        return propia == self.id_institucion
+
+    def _ids_factura(self, factura):
+        return select(factura.id_factura).where(getattr(factura, self.columna) == self.id_institucion)
+
+    def _ids_glosa(self, glosa, factura):
+        return select(glosa.id_glosa).where(glosa.id_factura.in_(self._ids_factura(factura)))
+
+
+TOTAL = Alcance()
+NINGUNO = Alcance(restringido=True)
+
+
+def resolver(usuario) -> Alcance:
+    """Alcance de un usuario según su rol e institución."""
+    if usuario.rol in ROLES_IPS:
+        return Alcance(usuario.id_institucion, "id_institucion_emisora", restringido=True)
+    if usuario.rol in ROLES_EPS:
+        return Alcance(usuario.id_institucion, "id_institucion_receptora", restringido=True)
+    if usuario.rol == "ADMIN":
+        return TOTAL
+    return NINGUNO  # rol desconocido: nada
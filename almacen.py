@@ -0,0 +1,191 @@
+# almacen.py
+"""
+Almacén clave/valor compartido entre workers.
+
+Todo estado en memoria del que dependa la corrección de la app con varios
+workers (versiones de tabla de la caché HTTP, métricas agregadas, candados
+de tareas programadas...) pasa por aquí, para que escalar a N procesos siga
+siendo correcto.
+
+    ALMACEN_COMPARTIDO_URL=memoria://                  un solo proceso (por defecto)
+    ALMACEN_COMPARTIDO_URL=sqlite:///ruta/almacen.db   workers del mismo host
+
+Se puede añadir otra implementación (p. ej. Redis) heredando de Almacen.
+"""
+
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+
+class Almacen(ABC):
+    """Interfaz mínima. Los valores son texto; `incr` trata el valor como entero."""
+
+    compartido = False
+
+    @abstractmethod
+    def get(self, clave: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def get_many(self, claves: Iterable[str]) -> Dict[str, str]:
+        return {c: v for c in claves if (v := self.get(c)) is not None}
+
+    @abstractmethod
+    def set(self, clave: str, valor: str, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def agregar(self, clave: str, valor: str, ttl: Optional[float] = None) -> bool:
+        """Guarda solo si la clave no existe (o expiró). Devuelve si se guardó."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def incr(self, clave: str, delta: int = 1) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, clave: str) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def con_prefijo(self, prefijo: str) -> Dict[str, str]:
+        raise NotImplementedError
+
+
+class AlmacenMemoria(Almacen):
+    """Diccionario del proceso. Correcto solo con un worker."""
+
+    def __init__(self):
+        self._datos: Dict[str, tuple] = {}
+        self._candado = threading.Lock()
+
+    def _vigente(self, clave: str) -> Optional[str]:
+        par = self._datos.get(clave)
+        if par is None:
+            return None
+        valor, expira = par
+        if expira is not None and expira <= time.time():
+            del self._datos[clave]
+            return None
+        return valor
+
+    def get(self, clave):
+        with self._candado:
+            return self._vigente(clave)
+
+    def set(self, clave, valor, ttl=None):
+        with self._candado:
+            self._datos[clave] = (valor, time.time() + ttl if ttl else None)
+
+    def agregar(self, clave, valor, ttl=None):
+        with self._candado:
+            if self._vigente(clave) is not None:
+                return False
+            self._datos[clave] = (valor, time.time() + ttl if ttl else None)
+            return True
+
+    def incr(self, clave, delta=1):
+        with self._candado:
+            nuevo = int(self._vigente(clave) or 0) + delta
+            self._datos[clave] = (str(nuevo), None)
+            return nuevo
+
+    def delete(self, clave):
+        with self._candado:
+            self._datos.pop(clave, None)
+
+    def con_prefijo(self, prefijo):
+        with self._candado:
+            return {c: v for c in list(self._datos) if c.startswith(prefijo) and (v := self._vigente(c)) is not None}
+
+
+class AlmacenSQLite(Almacen):
+    """Archivo SQLite en modo WAL: lo comparten todos los workers del host."""
+
+    compartido = True
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self._local = threading.local()
+        conn = self._conexion()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS almacen ("
+            " clave TEXT PRIMARY KEY, valor TEXT NOT NULL, expira REAL)"
+        )
+
+    def _conexion(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        # Tras un fork (gunicorn --preload) no se reutiliza la conexión del proceso padre.
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.ruta, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, clave):
+        fila = self._conexion().execute(
+            "SELECT valor FROM almacen WHERE clave = ? AND (expira IS NULL OR expira > ?)", (clave, time.time())
+        ).fetchone()
+        return fila[0] if fila else None
+
+    def get_many(self, claves):
+        claves = list(claves)
+        if not claves:
+            return {}
+        marcas = ",".join("?" * len(claves))
+        filas = self._conexion().execute(
+            f"SELECT clave, valor FROM almacen WHERE clave IN ({marcas}) AND (expira IS NULL OR expira > ?)",
+            (*claves, time.time()),
+        )
+        return dict(filas.fetchall())
+
+    def set(self, clave, valor, ttl=None):
+        self._conexion().execute(
+            "INSERT INTO almacen (clave, valor, expira) VALUES (?, ?, ?)"
+            " ON CONFLICT(clave) DO UPDATE SET valor = excluded.valor, expira = excluded.expira",
+            (clave, valor, time.time() + ttl if ttl else None),
+        )
+
+    def agregar(self, clave, valor, ttl=None):
+        ahora = time.time()
+        cursor = self._conexion().execute(
+            "INSERT INTO almacen (clave, valor, expira) VALUES (?, ?, ?)"
+            " ON CONFLICT(clave) DO UPDATE SET valor = excluded.valor, expira = excluded.expira"
+            " WHERE almacen.expira IS NOT NULL AND almacen.expira <= ?",
+            (clave, valor, ahora + ttl if ttl else None, ahora),
+        )
+        return cursor.rowcount == 1
+
+    def incr(self, clave, delta=1):
+        fila = self._conexion().execute(
+            "INSERT INTO almacen (clave, valor, expira) VALUES (?, ?, NULL)"
+            " ON CONFLICT(clave) DO UPDATE SET valor = CAST(almacen.valor AS INTEGER) + ?"
+            " RETURNING valor",
+            (clave, str(delta), delta),
+        ).fetchone()
+        return int(fila[0])
+
+    def delete(self, clave):
+        self._conexion().execute("DELETE FROM almacen WHERE clave = ?", (clave,))
+
+    def con_prefijo(self, prefijo):
+        filas = self._conexion().execute(
+            "SELECT clave, valor FROM almacen WHERE clave >= ? AND clave < ? AND (expira IS NULL OR expira > ?)",
+            (prefijo, prefijo + "￿", time.time()),
+        )
+        return dict(filas.fetchall())
+
+
+def crear_almacen(url: str) -> Almacen:
+    if url.startswith("sqlite:///"):
+        return AlmacenSQLite(url[len("sqlite:///"):])
+    if url in ("memoria://", ""):
+        return AlmacenMemoria()
+    raise ValueError(f"ALMACEN_COMPARTIDO_URL no soportada: {url}")
+
+
+almacen = crear_almacen(os.getenv("ALMACEN_COMPARTIDO_URL", "memoria://"))
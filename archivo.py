@@ -0,0 +1,149 @@
+# archivo.py
+"""
+Archivo de árboles de Factura cerrados.
+
+Una factura se archiva cuando todas sus glosas están en un estado final y
+son anteriores a la fecha de corte (por defecto, el 1 de enero del año en
+curso). Su árbol completo (factura, glosas, respuestas y adjuntos) se copia
+a las tablas *_archivo y se borra de las tablas calientes en la misma
+transacción, por lotes de facturas.
+
+En PostgreSQL glosa_archivo está particionada por año de fecha_glosa; las
+particiones que falten se crean antes de copiar cada lote.
+
+Los datos archivados se siguen consultando por la API con
+?incluir_archivo=true en los listados y detalles de glosas y facturas.
+
+Uso:
+    python archivo.py [--antes-de 2025-01-01] [--lote 500] [--simular]
+"""
+
+import argparse
+import logging
+from datetime import date
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import delete, exists, func, insert, or_, select, text
+from sqlalchemy.orm import Session
+
+import estados_glosa
+import models
+
+logger = logging.getLogger(__name__)
+
+ESTADOS_CERRADOS = estados_glosa.ESTADOS_CERRADOS
+
+# Tabla caliente -> tabla de archivo, en orden de copia (padres primero).
+TABLAS_ARCHIVO = (
+    (models.Factura, models.FacturaArchivo),
+    (models.Glosa, models.GlosaArchivo),
+    (models.RespuestaGlosa, models.RespuestaGlosaArchivo),
+    (models.Adjunto, models.AdjuntoArchivo),
+)
+
+
+def facturas_archivables(db: Session, antes_de: date, limite: Optional[int] = None) -> List[int]:
+    """Ids de facturas con glosas, todas cerradas y con fecha_glosa < antes_de."""
+    abierta = (
+        select(models.Glosa.id_glosa)
+        .where(
+            models.Glosa.id_factura == models.Factura.id_factura,
+            or_(models.Glosa.estado_glosa.not_in(ESTADOS_CERRADOS), models.Glosa.fecha_glosa >= antes_de),
+        )
+    )
+    con_glosas = select(models.Glosa.id_glosa).where(models.Glosa.id_factura == models.Factura.id_factura)
+    stmt = (
+        select(models.Factura.id_factura)
+        .where(exists(con_glosas), ~exists(abierta))
+        .order_by(models.Factura.id_factura)
+        .limit(limite)
+    )
+    return list(db.execute(stmt).scalars())
+
+
+def asegurar_particiones(db: Session, anios: Iterable[int]) -> None:
+    """Crea (en PostgreSQL) las particiones anuales de glosa_archivo que falten."""
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    for anio in sorted(set(anios)):
+        db.execute(text(
+            f"CREATE TABLE IF NOT EXISTS glosa_archivo_{anio:04d} PARTITION OF glosa_archivo "
+            f"FOR VALUES FROM ('{anio:04d}-01-01') TO ('{anio + 1:04d}-01-01')"
+        ))
+
+
+def _filtro_arbol(modelo, ids_factura: List[int], ids_glosa):
+    """Filas de `modelo` que pertenecen a las facturas indicadas."""
+    if modelo is models.Factura:
+        return models.Factura.id_factura.in_(ids_factura)
+    if modelo is models.Glosa:
+        return models.Glosa.id_factura.in_(ids_factura)
+    if modelo is models.RespuestaGlosa:
+        return models.RespuestaGlosa.id_glosa.in_(ids_glosa)
+    respuestas = select(models.RespuestaGlosa.id_respuesta_glosa).where(models.RespuestaGlosa.id_glosa.in_(ids_glosa))
+    return or_(models.Adjunto.id_glosa.in_(ids_glosa), models.Adjunto.id_respuesta_glosa.in_(respuestas))
+
+
+def archivar_lote(db: Session, ids_factura: List[int]) -> Dict[str, int]:
+    """Mueve el árbol de las facturas indicadas a las tablas de archivo (sin commit)."""
+    anios = db.execute(
+        select(func.distinct(models.Glosa.fecha_glosa)).where(models.Glosa.id_factura.in_(ids_factura))
+    ).scalars()
+    asegurar_particiones(db, (f.year for f in anios))
+
+    ids_glosa = select(models.Glosa.id_glosa).where(models.Glosa.id_factura.in_(ids_factura))
+    movidas: Dict[str, int] = {}
+    for modelo, archivo in TABLAS_ARCHIVO:
+        columnas = [c.name for c in modelo.__table__.columns]
+        origen = select(*[modelo.__table__.c[c] for c in columnas]).where(_filtro_arbol(modelo, ids_factura, ids_glosa))
+        movidas[archivo.__tablename__] = db.execute(insert(archivo).from_select(columnas, origen)).rowcount
+
+    # Hijos primero al borrar, por las FK.
+    for modelo, _ in reversed(TABLAS_ARCHIVO):
+        db.execute(
+            delete(modelo).where(_filtro_arbol(modelo, ids_factura, ids_glosa)).execution_options(synchronize_session=False)
+        )
+    return movidas
+
+
+def archivar(db: Session, antes_de: Optional[date] = None, lote: int = 500, simular: bool = False) -> Dict[str, int]:
+    """Archiva por lotes todas las facturas archivables; devuelve filas movidas por tabla."""
+    antes_de = antes_de or date(date.today().year, 1, 1)
+    totales: Dict[str, int] = {archivo.__tablename__: 0 for _, archivo in TABLAS_ARCHIVO}
+    while True:
+        ids = facturas_archivables(db, antes_de, limite=lote)
+        if not ids:
+            break
+        try:
+            movidas = archivar_lote(db, ids)
+            if simular:
+                db.rollback()
+            else:
+                db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        for tabla, n in movidas.items():
+            totales[tabla] += n
+        logger.info("Archivadas %d facturas (%s)", len(ids), movidas)
+        if simular:
+            break
+    return totales
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--antes-de", type=date.fromisoformat, default=None)
+    parser.add_argument("--lote", type=int, default=500)
+    parser.add_argument("--simular", action="store_true", help="mueve un lote y lo revierte")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        for tabla, n in archivar(db, antes_de=args.antes_de, lote=args.lote, simular=args.simular).items():
+            print(f"{tabla:>26}: {n:>10,}")
+    finally:
+        db.close()
@@ -0,0 +1,129 @@
+# auditoria.py
+"""
+Bitácora de auditoría de glosas (tabla glosa_evento, solo inserciones).
+
+- Cambios por el ORM (crear, PUT, formulario, borrar): un listener
+  after_flush calcula el diff de cada Glosa con el historial de atributos y
+  lo inserta con un único executemany en la misma transacción. Si la
+  transacción se revierte, el evento también.
+- Operaciones masivas que no pasan por el flush (transiciones,
+  conciliación): llaman a registrar() con todas sus filas de una vez.
+
+El diff es compacto: {"campo": [antes, despues]}, solo con los campos que
+cambiaron. El usuario sale de session.info["id_usuario"], que fija la
+dependencia de autenticación en la sesión de la petición.
+"""
+
+import logging
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Any, Iterable, List, Optional
+
+from sqlalchemy import event, inspect, insert, text
+from sqlalchemy.orm import Session
+
+import models
+
+logger = logging.getLogger(__name__)
+
+# Campos que cambian en toda actualización o se derivan de otros (la huella,
+# ver duplicados.py) y no aportan al historial.
+CAMPOS_IGNORADOS = {"fecha_ultima_actualizacion", "huella"}
+
+
+def _valor(valor: Any) -> Any:
+    """Valor serializable a JSON, sin perder precisión en decimales."""
+    if isinstance(valor, Decimal):
+        return str(valor)
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    return valor
+
+
+def evento(id_glosa: int, tipo: str, cambios: dict, id_usuario: Optional[int] = None, fecha: Optional[datetime] = None) -> dict:
+    return {
+        "id_glosa": id_glosa,
+        "tipo": tipo,
+        "cambios": {campo: [_valor(a), _valor(d)] for campo, (a, d) in cambios.items()},
+        "id_usuario": id_usuario,
+        "fecha_evento": fecha or datetime.now(timezone.utc),
+    }
+
+
+def registrar(db: Session, eventos: List[dict]) -> None:
+    """Inserta los eventos con un solo executemany (sin commit)."""
+    if eventos:
+        db.connection().execute(insert(models.GlosaEvento.__table__), eventos)
+
+
+def _diff(glosa: models.Glosa) -> dict:
+    estado = inspect(glosa)
+    cambios = {}
+    for atributo in estado.mapper.column_attrs:
+        if atributo.key in CAMPOS_IGNORADOS:
+            continue
+        historial = estado.attrs[atributo.key].history
+        if historial.has_changes():
+            antes = historial.deleted[0] if historial.deleted else None
+            despues = historial.added[0] if historial.added else None
+            if antes != despues:
+                cambios[atributo.key] = (antes, despues)
+    return cambios
+
+
+def _foto(glosa: models.Glosa, antes: bool) -> dict:
+    valores = {}
+    for atributo in inspect(glosa).mapper.column_attrs:
+        valor = getattr(glosa, atributo.key)
+        if valor is not None and atributo.key not in CAMPOS_IGNORADOS:
+            valores[atributo.key] = (valor, None) if antes else (None, valor)
+    return valores
+
+
+@event.listens_for(Session, "after_flush")
+def _auditar_flush(session, flush_context):
+    # En after_flush new/dirty/deleted y el historial aún reflejan lo que se
+    # acaba de escribir, y los ids nuevos ya están asignados.
+    id_usuario = session.info.get("id_usuario")
+    ahora = datetime.now(timezone.utc)
+    eventos = []
+    for obj in session.new:
+        if isinstance(obj, models.Glosa):
+            eventos.append(evento(obj.id_glosa, "creacion", _foto(obj, antes=False), id_usuario, ahora))
+    for obj in session.dirty:
+        if isinstance(obj, models.Glosa) and session.is_modified(obj):
+            cambios = _diff(obj)
+            if cambios:
+                eventos.append(evento(obj.id_glosa, "actualizacion", cambios, id_usuario, ahora))
+    for obj in session.deleted:
+        if isinstance(obj, models.Glosa):
+            eventos.append(evento(obj.id_glosa, "eliminacion", _foto(obj, antes=True), id_usuario, ahora))
+    registrar(session, eventos)
+
+
+# ====================================================================
+# Particiones mensuales (PostgreSQL)
+# ====================================================================
+
+def _meses(desde: date, meses: int) -> Iterable[date]:
+    anio, mes = desde.year, desde.month
+    for _ in range(meses):
+        yield date(anio, mes, 1)
+        anio, mes = (anio + 1, 1) if mes == 12 else (anio, mes + 1)
+
+
+def asegurar_particiones(conn, desde: Optional[date] = None, meses: int = 13) -> None:
+    """
+    Crea las particiones mensuales de glosa_evento desde el mes de `desde`.
+    Conviene crearlas por adelantado (init_db.py, y a diario
+    vencimientos.tarea_diaria): una vez la partición DEFAULT tiene filas de
+    un mes, ya no se puede crear la de ese mes.
+    """
+    if conn.dialect.name != "postgresql":
+        return
+    for inicio in _meses(desde or date.today(), meses):
+        fin = (inicio + timedelta(days=32)).replace(day=1)
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS glosa_evento_{inicio:%Y_%m} PARTITION OF glosa_evento "
+            f"FOR VALUES FROM ('{inicio.isoformat()}') TO ('{fin.isoformat()}')"
+        ))
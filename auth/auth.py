@@ -4,14 +4,17 @@ from datetime import datetime, timedelta, timezone
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from dotenv import load_dotenv
 import os
+from urllib.parse import quote
 
 from sqlalchemy.orm import Session
 # Importar get_db_session desde database para usarlo en las dependencias
-from database import get_db_session # <-- ¡CAMBIO CRUCIAL AQUÍ!
+from database import get_db_session, get_db_lectura # <-- ¡CAMBIO CRUCIAL AQUÍ!
+import alcance
+from alcance import Alcance
 import crud # Necesitaremos crud para buscar usuarios
 import schemas # Asegúrate de que schemas esté importado
 
@@ -66,8 +69,8 @@ def decode_access_token(token: str):
 # ====================================================================
 
 # Dependencia para obtener el usuario actual a partir del token JWT
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db_session)) -> schemas.UsuarioResponse:
-    """Obtiene el usuario autenticado a partir del token JWT."""
+def _usuario_del_token(token: str, db: Session):
+    """Usuario activo del token JWT; 401/400 si no es válido."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="No se pudieron validar las credenciales",
@@ -92,9 +95,85 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Usuario inactivo"
         )
-        
     return user
 
+# Las vistas HTML (/dashboard, /glosas-view, formularios) no pueden enviar
+# Authorization: el inicio de sesión de /login deja el mismo JWT en una cookie
+# HttpOnly y SameSite=Lax (un formulario de otro sitio no la envía en un POST).
+COOKIE_SESION = "access_token"
+oauth2_opcional = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
+
+def token_de_peticion(request: Request, token: Optional[str] = Depends(oauth2_opcional)) -> Optional[str]:
+    """JWT de la cabecera Authorization o, si no viene, de la cookie de sesión."""
+    return token or request.cookies.get(COOKIE_SESION) or None
+
+def _no_autenticado() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="No autenticado",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+def get_current_user(token: Optional[str] = Depends(token_de_peticion), db: Session = Depends(get_db_session)) -> schemas.UsuarioResponse:
+    """Obtiene el usuario autenticado a partir del token JWT."""
+    if token is None:
+        raise _no_autenticado()
+    user = _usuario_del_token(token, db)
+    # La sesión de la petición (compartida entre dependencias) sabe quién la
+    # usa: la bitácora de auditoría lo toma de aquí.
+    db.info["id_usuario"] = user.id_usuario
+    return user
+
+# Alcance de datos por institución (alcance.py). Se resuelve una vez por
+# petición con la misma sesión de lectura que usa la ruta. Sin token (ni
+# cookie de sesión):
+#   get_alcance             lecturas de la API: no ve ninguna fila (401 con
+#                           ALCANCE_OBLIGATORIO=true)
+#   get_alcance_escritura   escrituras: 401
+#   get_alcance_vista       páginas HTML: redirige a /login
+# ALCANCE_ANONIMO=total devuelve el comportamiento anterior (sin token se ve
+# y se modifica todo), solo para instalaciones de una sede sin inicio de sesión.
+ALCANCE_OBLIGATORIO = os.getenv("ALCANCE_OBLIGATORIO", "false").lower() == "true"
+ALCANCE_ANONIMO = os.getenv("ALCANCE_ANONIMO", "ninguno").lower()
+
+def _anonimo_total() -> bool:
+    return ALCANCE_ANONIMO == "total" and not ALCANCE_OBLIGATORIO
+
+def get_alcance(token: Optional[str] = Depends(token_de_peticion), db: Session = Depends(get_db_lectura)) -> Alcance:
+    """Alcance de datos del usuario que hace la petición."""
+    if token is None:
+        if ALCANCE_OBLIGATORIO:
+            raise _no_autenticado()
+        return alcance.TOTAL if _anonimo_total() else alcance.NINGUNO
+    return alcance.resolver(_usuario_del_token(token, db))
+
+def get_alcance_escritura(token: Optional[str] = Depends(token_de_peticion), db: Session = Depends(get_db_lectura)) -> Alcance:
+    """Como get_alcance, pero una escritura sin token responde 401."""
+    if token is None:
+        if _anonimo_total():
+            return alcance.TOTAL
+        raise _no_autenticado()
+    return alcance.resolver(_usuario_del_token(token, db))
+
+def get_alcance_vista(
+    request: Request, token: Optional[str] = Depends(token_de_peticion), db: Session = Depends(get_db_lectura),
+) -> Alcance:
+    """
+    Como get_alcance, pero una página HTML sin sesión (o con la sesión
+    vencida) redirige a /login, que vuelve a la página al iniciar sesión.
+    """
+    if token is None and _anonimo_total():
+        return alcance.TOTAL
+    if token is not None:
+        try:
+            return alcance.resolver(_usuario_del_token(token, db))
+        except HTTPException:
+            pass
+    raise HTTPException(
+        status_code=status.HTTP_303_SEE_OTHER,
+        detail="Inicie sesión",
+        headers={"Location": f"/login?siguiente={quote(request.url.path)}"},
+    )
 
 # Dependencias de autorización por rol
 def get_current_active_user(current_user: schemas.UsuarioResponse = Depends(get_current_user)) -> schemas.UsuarioResponse:
@@ -0,0 +1,98 @@
+# benchmarks/bench_archivo.py
+"""
+Ganancia en la ruta caliente al archivar las facturas cerradas.
+
+Mide las consultas del dashboard y del listado de glosas antes y después de
+correr archivo.archivar() sobre los mismos datos sintéticos.
+
+El generador reparte los estados al azar; para reproducir una base real,
+donde lo antiguo ya está cerrado, primero se marcan como "Conciliada" las
+glosas anteriores a --antes-de.
+
+Uso:
+    python benchmarks/bench_archivo.py [--escala 100000] [--antes-de 2025-07-01] [--repeticiones 5]
+
+Si DATABASE_URL no está definida se usa un archivo SQLite temporal.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="bench_archivo_"), "bench.db"))
+
+from sqlalchemy import func, select, update
+
+from database import Base, SessionLocal, engine
+import archivo
+import crud
+import models
+import schemas
+from generador import FECHA_BASE, generar
+
+
+def consultas_calientes(db) -> None:
+    """Lo que hace el dashboard más la primera página de /glosas/."""
+    limite = FECHA_BASE + timedelta(days=5)
+    db.execute(select(func.count()).select_from(models.Glosa)).scalar_one()
+    db.execute(select(func.count()).select_from(models.Factura)).scalar_one()
+    db.execute(
+        select(models.Glosa.id_glosa).where(
+            models.Glosa.fecha_vencimiento_respuesta <= limite,
+            models.Glosa.estado_glosa != "Respondida",
+        )
+    ).all()
+    crud.get_filas(db, models.Glosa, schemas.Glosa, skip=0, limit=100)
+
+
+def medir(repeticiones: int) -> float:
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        db = SessionLocal()
+        try:
+            inicio = time.perf_counter()
+            consultas_calientes(db)
+            mejor = min(mejor, time.perf_counter() - inicio)
+        finally:
+            db.close()
+    return mejor
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escala", type=int, default=100_000)
+    parser.add_argument("--antes-de", type=date.fromisoformat, default=date(2025, 7, 1))
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if db.query(models.Glosa).count() == 0:
+            generar(db, escala=args.escala)
+        db.execute(
+            update(models.Glosa)
+            .where(models.Glosa.fecha_glosa < args.antes_de)
+            .values(estado_glosa="Conciliada")
+        )
+        db.commit()
+        antes = medir(args.repeticiones)
+        movidas = archivo.archivar(db, antes_de=args.antes_de, lote=2_000)
+        calientes = db.query(models.Glosa).count()
+    finally:
+        db.close()
+    despues = medir(args.repeticiones)
+
+    print(f"glosas archivadas: {movidas['glosa_archivo']:,}  (quedan {calientes:,} en la tabla caliente)")
+    print(f"   antes: {antes * 1000:8.1f} ms")
+    print(f" después: {despues * 1000:8.1f} ms")
+    print(f"aceleración: {antes / despues:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
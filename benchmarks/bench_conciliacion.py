@@ -0,0 +1,96 @@
+# benchmarks/bench_conciliacion.py
+"""
+Conciliación de un archivo EPS grande: cruce + aplicación.
+
+Arma un archivo EPS sintético con una línea por glosa abierta (un 5 % con
+la suma descuadrada y otro 2 % de facturas inexistentes) y mide cada fase
+de conciliacion.conciliar().
+
+Uso:
+    python benchmarks/bench_conciliacion.py [--lineas 200000]
+
+Si DATABASE_URL no está definida se usa un archivo SQLite temporal.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="bench_conciliacion_"), "bench.db"))
+
+import numpy as np
+import pandas as pd
+
+from database import Base, SessionLocal, engine
+import conciliacion
+import models
+from generador import generar
+
+
+def archivo_eps(abiertas: pd.DataFrame, lineas: int, semilla: int = 7) -> pd.DataFrame:
+    azar = np.random.default_rng(semilla)
+    base = abiertas.sample(n=min(lineas, len(abiertas)), random_state=semilla)
+    glosado = base["valor_glosado"].astype(float).to_numpy()
+    aceptado = np.round(glosado * azar.random(len(base)), 2)
+    no_aceptado = np.round(glosado - aceptado, 2)
+    descuadre = azar.random(len(base)) < 0.05
+    no_aceptado[descuadre] += 1
+    numeros = base["numero_factura"].to_numpy(dtype=object)
+    inexistentes = azar.random(len(base)) < 0.02
+    numeros[inexistentes] = "NO-EXISTE"
+    return pd.DataFrame({
+        "numero_factura": numeros,
+        "codigo_motivo": base["codigo_motivo"].to_numpy(),
+        "valor_aceptado": [f"{v:.2f}" for v in aceptado],
+        "valor_no_aceptado": [f"{v:.2f}" for v in no_aceptado],
+    })
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lineas", type=int, default=200_000)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if db.query(models.Glosa).count() == 0:
+            # Con los estados del generador ~60 % de las glosas quedan abiertas.
+            generar(db, escala=int(args.lineas / 0.55))
+        usuario = db.query(models.Usuario.id_usuario).first()[0]
+
+        inicio = time.perf_counter()
+        abiertas = conciliacion.glosas_abiertas(db)
+        t_lectura = time.perf_counter() - inicio
+        eps = archivo_eps(abiertas, args.lineas)
+
+        inicio = time.perf_counter()
+        cruce = conciliacion.cruzar(eps, abiertas)
+        t_cruce = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        aplicadas = conciliacion.aplicar(db, cruce, usuario)
+        db.commit()
+        t_aplicar = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        diferencias = conciliacion.reporte_diferencias(cruce)
+        t_reporte = time.perf_counter() - inicio
+    finally:
+        db.close()
+
+    print(f"líneas EPS: {len(eps):,}   glosas abiertas: {len(abiertas):,}")
+    print(cruce["resultado"].value_counts().to_string())
+    print(f"lectura glosas: {t_lectura:6.2f} s")
+    print(f"         cruce: {t_cruce:6.2f} s")
+    print(f"  aplicar ({aplicadas:,}): {t_aplicar:6.2f} s")
+    print(f"       reporte: {t_reporte:6.2f} s  ({len(diferencias):,} diferencias)")
+    print(f"         total: {t_lectura + t_cruce + t_aplicar + t_reporte:6.2f} s")
+
+
+if __name__ == "__main__":
+    main()
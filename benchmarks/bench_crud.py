@@ -0,0 +1,115 @@
+# benchmarks/bench_crud.py
+"""
+Microbenchmarks de las funciones de crud y de las rutas de importación y reporte.
+
+    python -m pytest benchmarks/bench_crud.py --benchmark-json=benchmarks/resultados/<commit>.json
+
+(Se pasa el archivo explícitamente: no sigue el patrón test_*.py, así que
+`pytest` a secas no lo recoge.)
+"""
+
+import io
+import random
+from datetime import date
+from decimal import Decimal
+
+import pandas as pd
+import pytest
+
+import crud
+import models
+import schemas
+
+pytest.importorskip("pytest_benchmark")
+
+
+@pytest.fixture
+def ids_glosa(datos):
+    azar = random.Random(datos["semilla"])
+    return [azar.randint(1, datos["glosas"]) for _ in range(1000)]
+
+
+def test_get_glosa_por_id(benchmark, db, ids_glosa):
+    ids = iter(ids_glosa * 1000)
+    benchmark(lambda: crud.get_glosa(db, next(ids)))
+
+
+def test_get_glosas_orm(benchmark, db):
+    benchmark(crud.get_glosas, db, 0, 100)
+
+
+def test_get_filas_glosas(benchmark, db):
+    benchmark(crud.get_filas, db, models.Glosa, schemas.Glosa, 0, 100)
+
+
+def test_get_facturas_orm(benchmark, db):
+    benchmark(crud.get_facturas, db, 0, 100)
+
+
+def test_create_glosa(benchmark, db):
+    creadas = []
+    # Un valor distinto por ronda: la misma glosa repetida choca con ux_glosa_huella.
+    centavos = iter(range(1_234_567, 10**9))
+
+    def crear():
+        creadas.append(crud.create_glosa(db, schemas.GlosaCreate(
+            id_factura=1, id_motivo_glosa=1, fecha_glosa=date(2025, 7, 1),
+            valor_glosado=Decimal(next(centavos)).scaleb(-2),
+        )).id_glosa)
+
+    benchmark.pedantic(crear, rounds=100, iterations=1)
+    db.query(models.Glosa).filter(models.Glosa.id_glosa.in_(creadas)).delete(synchronize_session=False)
+    db.commit()
+
+
+def test_update_glosa(benchmark, db, ids_glosa):
+    ids = iter(ids_glosa * 10)
+    benchmark.pedantic(
+        lambda: crud.update_glosa(db, next(ids), schemas.GlosaUpdate(observaciones_glosa="Actualizada en benchmark")),
+        rounds=200, iterations=1,
+    )
+
+
+def test_http_listado_glosas(benchmark, client, datos):
+    # skip cambiante: se mide la consulta, no la caché HTTP.
+    desplazamientos = iter(range(0, 10**9, 100))
+    benchmark(lambda: client.get(f"/glosas/?skip={next(desplazamientos) % datos['glosas']}&limit=100"))
+
+
+def test_http_dashboard(benchmark, client):
+    benchmark(client.get, "/dashboard")
+
+
+def test_http_reporte_facturas(benchmark, client):
+    respuesta = benchmark.pedantic(client.get, args=("/reporte-facturas",), rounds=5, iterations=1)
+    assert respuesta.status_code == 200
+
+
+def test_http_importar_facturas(benchmark, client, db):
+    lotes = iter(range(10**6))
+    emisora, receptora = (
+        db.query(models.Institucion.nit).filter_by(tipo_institucion=tipo).order_by(models.Institucion.id_institucion).first()[0]
+        for tipo in ("IPS", "EPS")
+    )
+
+    def archivo():
+        lote = next(lotes)
+        df = pd.DataFrame({
+            "numero_factura": [f"IMP-{lote}-{i}" for i in range(1000)],
+            "nit_emisora": [emisora] * 1000,
+            "nit_receptora": [receptora] * 1000,
+            "fecha_emision": ["2025-06-01"] * 1000,
+            "fecha_radicado": ["2025-06-05"] * 1000,
+            "nombre_eps": ["EPS Sintética"] * 1000,
+            "valor_total": [150000.0 + i for i in range(1000)],
+        })
+        contenido = io.BytesIO()
+        df.to_excel(contenido, index=False)
+        return (), {"files": {"file": ("facturas.xlsx", contenido.getvalue())}}
+
+    respuesta = benchmark.pedantic(
+        lambda files: client.post("/importar-facturas", files=files), setup=archivo, rounds=5, iterations=1,
+    )
+    assert respuesta.status_code == 200
+    cuerpo = respuesta.json()
+    assert "error" not in cuerpo and cuerpo["cargadas"] == 1000, cuerpo
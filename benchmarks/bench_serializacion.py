@@ -0,0 +1,86 @@
+# benchmarks/bench_serializacion.py
+"""
+Microbenchmark: costo por fila de GET /glosas/ antes y después de la ruta rápida.
+
+  antes:   ORM -> validación Pydantic (List[schemas.Glosa]) -> json.dumps
+  después: select de columnas -> dicts -> orjson (serializacion.RespuestaORJSON)
+
+Uso:
+    python benchmarks/bench_serializacion.py [--filas 10000] [--repeticiones 5]
+
+Si DATABASE_URL no está definida se usa una base SQLite en memoria.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from pydantic import TypeAdapter
+
+from database import Base, SessionLocal, engine
+import crud
+import models
+import schemas
+from serializacion import RespuestaORJSON
+from generador import generar
+
+
+def antes(db, filas: int) -> bytes:
+    adaptador = TypeAdapter(List[schemas.Glosa])
+    glosas = crud.get_glosas(db, skip=0, limit=filas)
+    validadas = adaptador.validate_python(glosas, from_attributes=True)
+    contenido = adaptador.dump_python(validadas, mode="json")
+    return json.dumps(contenido, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def despues(db, filas: int) -> bytes:
+    glosas = crud.get_filas(db, models.Glosa, schemas.Glosa, skip=0, limit=filas)
+    return RespuestaORJSON(glosas).body
+
+
+def medir(funcion, filas: int, repeticiones: int) -> float:
+    """Mejor tiempo (s) de `repeticiones` corridas, cada una con sesión nueva."""
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        db = SessionLocal()
+        try:
+            inicio = time.perf_counter()
+            funcion(db, filas)
+            mejor = min(mejor, time.perf_counter() - inicio)
+        finally:
+            db.close()
+    return mejor
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, default=10_000)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if db.query(models.Glosa).count() < args.filas:
+            generar(db, escala=args.filas)
+        assert json.loads(antes(db, args.filas)) == json.loads(despues(db, args.filas))
+    finally:
+        db.close()
+
+    resultados = {}
+    for nombre, funcion in (("antes", antes), ("despues", despues)):
+        segundos = medir(funcion, args.filas, args.repeticiones)
+        resultados[nombre] = segundos
+        print(f"{nombre:>8}: {segundos * 1000:8.1f} ms total  {segundos / args.filas * 1e6:6.2f} µs/fila")
+    print(f"aceleración: {resultados['antes'] / resultados['despues']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
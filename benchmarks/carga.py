@@ -0,0 +1,155 @@
+# benchmarks/carga.py
+"""
+Perfil de carga en proceso (sin servidor) para los routers principales.
+
+Varios hilos recorren PERFIL durante `--duracion` segundos contra la app vía
+TestClient y se guardan latencias p50/p95/p99 y peticiones por segundo por
+ruta en un JSON comparable entre commits (benchmarks/comparar.py).
+
+    python benchmarks/carga.py --usuarios 8 --duracion 30 [--escala 10000]
+
+Para carga real contra un servidor levantado, el mismo perfil está en
+benchmarks/locustfile.py.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Tuple
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(DIRECTORIO, ".."))
+sys.path.insert(0, DIRECTORIO)
+
+# (peso, nombre, método, ruta(azar, glosas) -> str)
+PERFIL: List[Tuple[int, str, str, Callable[[random.Random, int], str]]] = [
+    (30, "GET /glosas/", "GET", lambda a, n: f"/glosas/?skip={a.randrange(0, max(n - 100, 1))}&limit=100"),
+    (25, "GET /glosas/{id}", "GET", lambda a, n: f"/glosas/{a.randint(1, n)}"),
+    (10, "GET /facturas/", "GET", lambda a, n: "/facturas/"),
+    (10, "GET /motivos-glosa/", "GET", lambda a, n: "/motivos-glosa/"),
+    (5, "GET /instituciones/", "GET", lambda a, n: "/instituciones/"),
+    (10, "GET /respuestas-glosa/", "GET", lambda a, n: "/respuestas-glosa/"),
+    (5, "GET /dashboard", "GET", lambda a, n: "/dashboard"),
+    (4, "GET /glosas-view", "GET", lambda a, n: "/glosas-view"),
+    (1, "GET /reporte-facturas", "GET", lambda a, n: "/reporte-facturas"),
+]
+
+USUARIO_BENCH = "bench{semilla}_1@glosas.test"
+CLAVE_BENCH = "bench1234"
+
+
+def _percentil(valores: List[float], p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def ejecutar(cliente, glosas: int, usuarios: int, duracion: float, semilla: int, cabeceras: Dict[str, str]) -> dict:
+    pesos = [p[0] for p in PERFIL]
+    latencias: Dict[str, List[float]] = defaultdict(list)
+    errores: Dict[str, int] = defaultdict(int)
+    candado = threading.Lock()
+    fin = time.perf_counter() + duracion
+
+    def usuario(indice: int) -> None:
+        azar = random.Random(semilla * 1000 + indice)
+        propias: Dict[str, List[float]] = defaultdict(list)
+        fallidas: Dict[str, int] = defaultdict(int)
+        while time.perf_counter() < fin:
+            _, nombre, metodo, ruta = azar.choices(PERFIL, weights=pesos)[0]
+            inicio = time.perf_counter()
+            respuesta = cliente.request(metodo, ruta(azar, glosas), headers=cabeceras)
+            propias[nombre].append(time.perf_counter() - inicio)
+            if respuesta.status_code >= 500:
+                fallidas[nombre] += 1
+        with candado:
+            for nombre, valores in propias.items():
+                latencias[nombre].extend(valores)
+            for nombre, n in fallidas.items():
+                errores[nombre] += n
+
+    hilos = [threading.Thread(target=usuario, args=(i,)) for i in range(usuarios)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    return {
+        nombre: {
+            "peticiones": len(valores),
+            "errores": errores.get(nombre, 0),
+            "rps": round(len(valores) / duracion, 2),
+            "p50_ms": round(_percentil(valores, 50) * 1000, 2),
+            "p95_ms": round(_percentil(valores, 95) * 1000, 2),
+            "p99_ms": round(_percentil(valores, 99) * 1000, 2),
+        }
+        for nombre, valores in sorted(latencias.items())
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--usuarios", type=int, default=8)
+    parser.add_argument("--duracion", type=float, default=30)
+    parser.add_argument("--escala", type=int, default=10_000)
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--url", help="base de datos (por defecto BENCH_DATABASE_URL o un SQLite temporal)")
+    parser.add_argument("--salida", help="archivo JSON (por defecto benchmarks/resultados/carga-<commit>.json)")
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.url or os.getenv(
+        "BENCH_DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="glosas_carga_"), "carga.db")
+    )
+    from fastapi.testclient import TestClient
+    from sqlalchemy import func, select
+    from conftest import commit_actual
+    from database import Base, SessionLocal, engine
+    from generador import generar
+    import models
+    import main as aplicacion
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        glosas = db.execute(select(func.count()).select_from(models.Glosa)).scalar_one()
+        if glosas == 0:
+            glosas = generar(db, escala=args.escala, semilla=args.semilla)["glosa"]
+    finally:
+        db.close()
+
+    # Los 500 se cuentan como errores del perfil en lugar de abortar el hilo.
+    with TestClient(aplicacion.app, raise_server_exceptions=False) as cliente:
+        cabeceras = {}
+        token = cliente.post("/token", data={"username": USUARIO_BENCH.format(semilla=args.semilla), "password": CLAVE_BENCH})
+        if token.status_code == 200:
+            cabeceras["Authorization"] = f"Bearer {token.json()['access_token']}"
+        rutas = ejecutar(cliente, glosas, args.usuarios, args.duracion, args.semilla, cabeceras)
+
+    resultado = {
+        "tipo": "carga",
+        "commit": commit_actual(),
+        "backend": engine.dialect.name,
+        "glosas": glosas,
+        "usuarios": args.usuarios,
+        "duracion_s": args.duracion,
+        "rutas": rutas,
+    }
+    salida = args.salida or os.path.join(DIRECTORIO, "resultados", f"carga-{resultado['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as archivo:
+        json.dump(resultado, archivo, indent=2, ensure_ascii=False)
+
+    for nombre, r in rutas.items():
+        print(f"{nombre:<26} {r['peticiones']:>7} req  {r['rps']:>8.1f} rps  p50 {r['p50_ms']:>7.1f} ms  p95 {r['p95_ms']:>7.1f} ms  errores {r['errores']}")
+    print(f"-> {salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+# benchmarks/comparar.py
+"""
+Compara dos corridas guardadas en JSON (pytest-benchmark o benchmarks/carga.py).
+
+    python benchmarks/comparar.py base.json nuevo.json [--umbral 10]
+
+Sale con código 1 si alguna medición empeora más del umbral (en %): sirve
+como verificación de regresiones entre commits.
+"""
+
+import argparse
+import json
+import sys
+from typing import Dict
+
+
+def _metricas(ruta: str) -> Dict[str, float]:
+    with open(ruta, encoding="utf-8") as archivo:
+        datos = json.load(archivo)
+    if "benchmarks" in datos:  # pytest-benchmark: media en segundos
+        return {b["name"]: b["stats"]["mean"] * 1000 for b in datos["benchmarks"]}
+    if datos.get("tipo") == "carga":  # carga.py: p95 en milisegundos
+        return {nombre: r["p95_ms"] for nombre, r in datos["rutas"].items()}
+    raise SystemExit(f"{ruta}: formato no reconocido")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("nuevo")
+    parser.add_argument("--umbral", type=float, default=10.0, help="empeoramiento máximo tolerado (%%)")
+    args = parser.parse_args()
+
+    base, nuevo = _metricas(args.base), _metricas(args.nuevo)
+    regresiones = 0
+    print(f"{'medición':<40} {'base ms':>10} {'nuevo ms':>10} {'cambio':>9}")
+    for nombre in sorted(set(base) | set(nuevo)):
+        if nombre not in base or nombre not in nuevo:
+            print(f"{nombre:<40} {base.get(nombre, float('nan')):>10.3f} {nuevo.get(nombre, float('nan')):>10.3f}   (solo en una)")
+            continue
+        cambio = (nuevo[nombre] - base[nombre]) / base[nombre] * 100 if base[nombre] else 0.0
+        marca = "  <-- regresión" if cambio > args.umbral else ""
+        regresiones += bool(marca)
+        print(f"{nombre:<40} {base[nombre]:>10.3f} {nuevo[nombre]:>10.3f} {cambio:>+8.1f}%{marca}")
+    sys.exit(1 if regresiones else 0)
+
+
+if __name__ == "__main__":
+    main()
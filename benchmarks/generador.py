@@ -0,0 +1,243 @@
+# benchmarks/generador.py
+"""
+Generador de datos sintéticos, reproducible por semilla.
+
+La escala es el número de glosas; el resto se deriva de ella:
+
+    instituciones  max(20, escala // 2000)   (mitad IPS, mitad EPS)
+    motivos        60
+    usuarios       20
+    facturas       escala // 3
+    glosas         escala
+    respuestas     ~60 % de las glosas
+    adjuntos       ~30 % de las glosas
+
+Las filas se insertan por lotes con INSERT ... VALUES múltiples, así que la
+memoria no crece con la escala (10k a 10M glosas). Los ids se asignan a partir
+del máximo existente, de modo que se puede anexar a una base con datos.
+
+Uso:
+    python benchmarks/generador.py --escala 100000 [--semilla 42] [--url sqlite:///bench.db]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Dict, Iterator, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# Fecha fija: los mismos datos para la misma semilla, sin importar cuándo se generen.
+FECHA_BASE = date(2025, 12, 31)
+ESTADOS = ("Pendiente", "En revisión", "Respondida", "Aceptada", "Rechazada")
+TIPOS_RESPUESTA = ("Reclamacion", "Aceptacion Parcial", "Aceptacion Total")
+PREFIJOS_MOTIVO = ("FA", "TA", "SO", "AU", "CO", "PE")
+# bcrypt de "bench1234": evita pagar el hash en cada corrida.
+HASH_CLAVE = "$2b$12$R6gJU/lIpYUrfJxEpNWeh.1nZK89YDeY2Sy7wOtG.1SGkwlDNFE5K"
+
+
+def _max_id(db, columna) -> int:
+    from sqlalchemy import func, select
+    return db.execute(select(func.coalesce(func.max(columna), 0))).scalar_one()
+
+
+def _insertar_por_lotes(db, modelo, filas: Iterator[dict], lote: int) -> int:
+    from sqlalchemy import insert
+    total = 0
+    bloque: List[dict] = []
+    for fila in filas:
+        bloque.append(fila)
+        if len(bloque) >= lote:
+            db.execute(insert(modelo), bloque)
+            total += len(bloque)
+            bloque = []
+    if bloque:
+        db.execute(insert(modelo), bloque)
+        total += len(bloque)
+    db.commit()
+    return total
+
+
+def generar(db, escala: int = 10_000, semilla: int = 42, lote: int = 5_000) -> Dict[str, int]:
+    """Puebla la base con datos sintéticos; devuelve cuántas filas se crearon por tabla."""
+    from sqlalchemy import select
+    import models
+
+    azar = random.Random(semilla)
+    creadas: Dict[str, int] = {}
+
+    base_inst = _max_id(db, models.Institucion.id_institucion)
+    n_instituciones = max(20, escala // 2000)
+    ips = [base_inst + i + 1 for i in range(0, n_instituciones, 2)]
+    eps = [base_inst + i + 1 for i in range(1, n_instituciones, 2)]
+    creadas["institucion"] = _insertar_por_lotes(db, models.Institucion, (
+        {
+            "id_institucion": base_inst + i + 1,
+            "nit": f"{semilla % 100:02d}{base_inst + i + 1:08d}",
+            "razon_social": f"{'IPS' if i % 2 == 0 else 'EPS'} Sintética {base_inst + i + 1}",
+            "tipo_institucion": "IPS" if i % 2 == 0 else "EPS",
+            "activo": True,
+        }
+        for i in range(n_instituciones)
+    ), lote)
+
+    base_motivo = _max_id(db, models.MotivoGlosa.id_motivo_glosa)
+    motivos = [base_motivo + i + 1 for i in range(60)]
+    creadas["motivo_glosa"] = _insertar_por_lotes(db, models.MotivoGlosa, (
+        {
+            "id_motivo_glosa": id_motivo,
+            "codigo_motivo": f"{PREFIJOS_MOTIVO[i % len(PREFIJOS_MOTIVO)]}{id_motivo:04d}",
+            "descripcion_motivo": f"Motivo sintético {id_motivo}",
+            "aplica_a": "Facturacion",
+        }
+        for i, id_motivo in enumerate(motivos)
+    ), lote)
+
+    base_usuario = _max_id(db, models.Usuario.id_usuario)
+    usuarios = [base_usuario + i + 1 for i in range(20)]
+    creadas["usuario"] = _insertar_por_lotes(db, models.Usuario, (
+        {
+            "id_usuario": id_usuario,
+            "nombre_completo": f"Usuario Sintético {id_usuario}",
+            "email": f"bench{semilla}_{id_usuario}@glosas.test",
+            "password_hash": HASH_CLAVE,
+            "rol": "AUDITOR_IPS",
+            "fecha_creacion": datetime(2025, 1, 1),
+            "activo": True,
+        }
+        for id_usuario in usuarios
+    ), lote)
+
+    base_factura = _max_id(db, models.Factura.id_factura)
+    n_facturas = max(1, escala // 3)
+
+    def emision(id_factura: int) -> date:
+        # Derivada del id para no guardar millones de fechas en memoria.
+        return FECHA_BASE - timedelta(days=(id_factura * 7919) % 731)
+
+    def facturas():
+        for i in range(n_facturas):
+            id_factura = base_factura + i + 1
+            receptora = azar.choice(eps)
+            yield {
+                "id_factura": id_factura,
+                "numero_factura": f"FE{semilla}-{id_factura:09d}",
+                "id_institucion_emisora": azar.choice(ips),
+                "id_institucion_receptora": receptora,
+                "fecha_emision": emision(id_factura),
+                "fecha_radicado": emision(id_factura) + timedelta(days=azar.randint(1, 20)),
+                "nombre_eps": f"EPS Sintética {receptora}",
+                "valor_total_factura": Decimal(azar.randint(100_000_00, 50_000_000_00)).scaleb(-2),
+                "estado_factura": "Radicada",
+            }
+
+    creadas["factura"] = _insertar_por_lotes(db, models.Factura, facturas(), lote)
+
+    base_glosa = _max_id(db, models.Glosa.id_glosa)
+
+    def glosas():
+        for i in range(escala):
+            id_glosa = base_glosa + i + 1
+            id_factura = base_factura + azar.randint(1, n_facturas)
+            fecha_glosa = emision(id_factura) + timedelta(days=azar.randint(5, 60))
+            yield {
+                "id_glosa": id_glosa,
+                "id_factura": id_factura,
+                "id_motivo_glosa": azar.choice(motivos),
+                "fecha_registro_glosa": datetime.combine(fecha_glosa, datetime.min.time()),
+                "fecha_glosa": fecha_glosa,
+                "valor_glosado": Decimal(azar.randint(1_000_00, 5_000_000_00)).scaleb(-2),
+                "estado_glosa": azar.choice(ESTADOS),
+                "fecha_ultima_actualizacion": datetime.combine(fecha_glosa, datetime.min.time()),
+                "observaciones_glosa": None if azar.random() < 0.5 else f"Observación sintética {id_glosa}",
+                "usuario_responsable": azar.choice(usuarios),
+                "fecha_vencimiento_respuesta": fecha_glosa + timedelta(days=21),
+            }
+
+    creadas["glosa"] = _insertar_por_lotes(db, models.Glosa, glosas(), lote)
+
+    base_respuesta = _max_id(db, models.RespuestaGlosa.id_respuesta_glosa)
+
+    def respuestas():
+        # 3 de cada 4 glosas ya gestionadas (~60 % del total) tienen respuesta.
+        gestionadas = db.execute(
+            select(models.Glosa.id_glosa)
+            .where(models.Glosa.id_glosa > base_glosa, models.Glosa.estado_glosa != "Pendiente")
+            .order_by(models.Glosa.id_glosa)
+            .execution_options(yield_per=lote)
+        ).scalars()
+        n = 0
+        for id_glosa in gestionadas:
+            if azar.random() >= 0.75:
+                continue
+            n += 1
+            aceptado = Decimal(azar.randint(0, 1_000_000_00)).scaleb(-2)
+            yield {
+                "id_respuesta_glosa": base_respuesta + n,
+                "id_glosa": id_glosa,
+                "fecha_respuesta": FECHA_BASE - timedelta(days=azar.randint(0, 365)),
+                "usuario_que_responde": azar.choice(usuarios),
+                "tipo_respuesta": azar.choice(TIPOS_RESPUESTA),
+                "valor_aceptado": aceptado,
+                "valor_no_aceptado": Decimal(azar.randint(0, 1_000_000_00)).scaleb(-2),
+                "argumento_respuesta": "Argumento sintético de respuesta",
+                "estado_posterior_glosa": "Respondida",
+                "fecha_creacion": datetime(2025, 6, 1),
+                "fecha_ultima_actualizacion": datetime(2025, 6, 1),
+            }
+
+    creadas["respuestas_glosa"] = _insertar_por_lotes(db, models.RespuestaGlosa, respuestas(), lote)
+
+    base_adjunto = _max_id(db, models.Adjunto.id_adjunto)
+
+    def adjuntos():
+        n = 0
+        for id_glosa in range(base_glosa + 1, base_glosa + escala + 1):
+            if azar.random() < 0.3:
+                n += 1
+                yield {
+                    "id_adjunto": base_adjunto + n,
+                    "id_glosa": id_glosa,
+                    "nombre_archivo": f"soporte_{id_glosa}.pdf",
+                    "tipo_mime": "application/pdf",
+                    "ruta_almacenamiento": f"/adjuntos/{id_glosa}/soporte.pdf",
+                    "tipo_documento": "PDF",
+                    "usuario_que_sube": azar.choice(usuarios),
+                    "fecha_subida": datetime(2025, 6, 1),
+                }
+
+    creadas["adjuntos"] = _insertar_por_lotes(db, models.Adjunto, adjuntos(), lote)
+    return creadas
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escala", type=int, default=10_000, help="número de glosas")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--lote", type=int, default=5_000)
+    parser.add_argument("--url", help="URL de base de datos (por defecto DATABASE_URL)")
+    args = parser.parse_args()
+
+    if args.url:
+        os.environ["DATABASE_URL"] = args.url
+    from database import Base, SessionLocal, engine
+    import models  # noqa: F401  (registra las tablas)
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        inicio = time.perf_counter()
+        creadas = generar(db, escala=args.escala, semilla=args.semilla, lote=args.lote)
+    finally:
+        db.close()
+    for tabla, n in creadas.items():
+        print(f"{tabla:>18}: {n:>10,}")
+    print(f"{time.perf_counter() - inicio:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
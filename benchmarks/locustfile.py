@@ -0,0 +1,42 @@
+# benchmarks/locustfile.py
+"""
+El perfil de benchmarks/carga.py para Locust, contra un servidor levantado:
+
+    locust -f benchmarks/locustfile.py --host http://127.0.0.1:8000 \
+        --headless -u 50 -r 10 -t 2m --json > benchmarks/resultados/locust-<commit>.json
+
+BENCH_GLOSAS indica cuántas glosas hay (para elegir ids válidos) y
+BENCH_SEMILLA con qué semilla se generó el usuario de prueba.
+"""
+
+import os
+import random
+import sys
+
+from locust import HttpUser, between, task
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from carga import CLAVE_BENCH, PERFIL, USUARIO_BENCH  # noqa: E402
+
+GLOSAS = int(os.getenv("BENCH_GLOSAS", 10_000))
+SEMILLA = int(os.getenv("BENCH_SEMILLA", 42))
+
+
+def _tarea(nombre, metodo, ruta):
+    def tarea(usuario):
+        usuario.client.request(metodo, ruta(usuario.azar, GLOSAS), name=nombre, headers=usuario.cabeceras)
+    return tarea
+
+
+class UsuarioGlosas(HttpUser):
+    wait_time = between(0.1, 1.0)
+    tasks = {_tarea(nombre, metodo, ruta): peso for peso, nombre, metodo, ruta in PERFIL}
+
+    def on_start(self):
+        self.azar = random.Random()
+        self.cabeceras = {}
+        respuesta = self.client.post(
+            "/token", data={"username": USUARIO_BENCH.format(semilla=SEMILLA), "password": CLAVE_BENCH}, name="POST /token"
+        )
+        if respuesta.status_code == 200:
+            self.cabeceras["Authorization"] = f"Bearer {respuesta.json()['access_token']}"
@@ -0,0 +1,348 @@
+# cache_http.py
+"""
+Caché HTTP para los listados que los clientes descargan una y otra vez.
+
+- Cada tabla tiene un número de versión, guardado en el almacén compartido
+  entre workers, que sube al confirmar (commit) una transacción que la
+  modificó. El ETag débil de una respuesta se deriva de la ruta, los
+  parámetros, el usuario y las versiones de las tablas de las que depende,
+  así que un If-None-Match se responde con 304 sin tocar la base.
+- Los cuerpos ya generados se guardan en una LRU acotada (entradas y bytes),
+  junto con sus versiones comprimidas (gzip, y brotli si está instalado).
+- Las rutas de RUTAS_SOLO_ETAG se transmiten en streaming: llevan ETag y
+  responden 304, pero su cuerpo no se junta en memoria ni se guarda; se
+  comprimen con gzip bloque a bloque (Z_SYNC_FLUSH tras cada bloque, para
+  que el navegador pinte lo que ya llegó).
+"""
+
+import gzip
+import hashlib
+import os
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+
+from almacen import almacen
+from database import LECTURA_PROPIA_S, contexto_peticion
+from serializacion import pide_ndjson
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional
+    brotli = None
+
+
+# ====================================================================
+# Versiones de tabla
+# ====================================================================
+
+# Las versiones viven en el almacén compartido para que todos los workers
+# emitan los mismos ETags. La "época" distingue un almacén recién creado
+# (p. ej. uno en memoria tras reiniciar) de otro con contadores anteriores.
+_PREFIJO = "cache_http:version:"
+_PREFIJO_INSTANTE = "cache_http:invalidada:"
+almacen.agregar(_PREFIJO + "_epoca", uuid.uuid4().hex[:8])
+
+
+def invalidar(*tablas: str) -> None:
+    """Sube la versión de las tablas indicadas (invalida sus ETags)."""
+    ahora = str(time.time())
+    for tabla in tablas:
+        almacen.incr(_PREFIJO + tabla)
+        almacen.set(_PREFIJO_INSTANTE + tabla, ahora)
+
+
+def invalidada_hace_poco(tablas: Iterable[str], segundos: float) -> bool:
+    """Si alguna de las tablas cambió en los últimos `segundos`."""
+    instantes = almacen.get_many([_PREFIJO_INSTANTE + tabla for tabla in tablas])
+    return any(float(v) > time.time() - segundos for v in instantes.values())
+
+
+def replica_atrasada(tablas: Iterable[str]) -> bool:
+    """
+    La petición en curso leyó de la réplica justo después de una escritura en
+    `tablas`: lo leído puede ir por detrás de la versión actual y no debe
+    quedar asociado a ella.
+    """
+    contexto = contexto_peticion.get()
+    return contexto is not None and contexto.leyo_replica and invalidada_hace_poco(tablas, LECTURA_PROPIA_S)
+
+
+def version_tablas(tablas: Iterable[str]) -> str:
+    claves = [_PREFIJO + "_epoca"] + [_PREFIJO + tabla for tabla in tablas]
+    versiones = almacen.get_many(claves)
+    return ".".join(versiones.get(clave, "0") for clave in claves)
+
+
+def _marcar(session: Session, tablas: Iterable[str]) -> None:
+    session.info.setdefault("tablas_modificadas", set()).update(tablas)
+
+
+@event.listens_for(Session, "after_flush")
+def _tablas_del_flush(session, flush_context):
+    tablas = {
+        obj.__table__.name
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+        if hasattr(obj, "__table__")
+    }
+    _marcar(session, tablas)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _tablas_de_sentencias(orm_execute_state):
+    # INSERT/UPDATE/DELETE masivos no pasan por el flush.
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        tabla = getattr(orm_execute_state.statement, "table", None)
+        if tabla is not None:
+            _marcar(orm_execute_state.session, [tabla.name])
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidar_al_confirmar(session):
+    tablas = session.info.pop("tablas_modificadas", None)
+    if tablas:
+        invalidar(*tablas)
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_al_revertir(session):
+    session.info.pop("tablas_modificadas", None)
+
+
+# ====================================================================
+# LRU de respuestas
+# ====================================================================
+
+class _Entrada:
+    __slots__ = ("cuerpo", "tipo", "comprimidos")
+
+    def __init__(self, cuerpo: bytes, tipo: str):
+        self.cuerpo = cuerpo
+        self.tipo = tipo
+        self.comprimidos: Dict[str, bytes] = {}
+
+    @property
+    def tamano(self) -> int:
+        return len(self.cuerpo) + sum(len(c) for c in self.comprimidos.values())
+
+
+class CacheRespuestas:
+    """LRU acotada por número de entradas y por bytes, con contadores de aciertos."""
+
+    def __init__(self, max_entradas: int = 256, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self._entradas: "OrderedDict[str, _Entrada]" = OrderedDict()
+        self._bytes = 0
+        self._candado = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.no_modificados = 0
+        self.desalojos = 0
+
+    def obtener(self, clave: str) -> Optional[_Entrada]:
+        with self._candado:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return entrada
+
+    def guardar(self, clave: str, entrada: _Entrada) -> None:
+        with self._candado:
+            anterior = self._entradas.pop(clave, None)
+            if anterior is not None:
+                self._bytes -= anterior.tamano
+            self._entradas[clave] = entrada
+            self._bytes += entrada.tamano
+            self._recortar()
+
+    def comprimir(self, clave: str, entrada: _Entrada, codificacion: str) -> bytes:
+        """Devuelve (y memoriza) el cuerpo comprimido con `codificacion`."""
+        comprimido = entrada.comprimidos.get(codificacion)
+        if comprimido is None:
+            if codificacion == "br":
+                comprimido = brotli.compress(entrada.cuerpo, quality=5)
+            else:
+                comprimido = gzip.compress(entrada.cuerpo, compresslevel=6)
+            with self._candado:
+                entrada.comprimidos[codificacion] = comprimido
+                if self._entradas.get(clave) is entrada:
+                    self._bytes += len(comprimido)
+                    self._recortar()
+        return comprimido
+
+    def _recortar(self) -> None:
+        while self._entradas and (len(self._entradas) > self.max_entradas or self._bytes > self.max_bytes):
+            _, desalojada = self._entradas.popitem(last=False)
+            self._bytes -= desalojada.tamano
+            self.desalojos += 1
+
+    def limpiar(self) -> None:
+        with self._candado:
+            self._entradas.clear()
+            self._bytes = 0
+
+    def contadores(self) -> dict:
+        """Valores aditivos: se pueden sumar entre workers."""
+        return {
+            "entradas": len(self._entradas),
+            "bytes": self._bytes,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "no_modificados": self.no_modificados,
+            "desalojos": self.desalojos,
+        }
+
+    def estadisticas(self) -> dict:
+        consultas = self.aciertos + self.fallos
+        return {
+            **self.contadores(),
+            "tasa_aciertos": round(self.aciertos / consultas, 4) if consultas else 0.0,
+        }
+
+
+cache = CacheRespuestas(
+    max_entradas=int(os.getenv("CACHE_HTTP_MAX_ENTRADAS", 256)),
+    max_bytes=int(os.getenv("CACHE_HTTP_MAX_MB", 64)) * 1024 * 1024,
+)
+
+
+# ====================================================================
+# Middleware
+# ====================================================================
+
+# Ruta -> (tablas de las que depende, si el contenido cambia con la fecha del día)
+RUTAS_CACHEABLES: Dict[str, Tuple[Tuple[str, ...], bool]] = {
+    # Con ?include= los listados embeben filas de otras tablas (crud.RELACIONES),
+    # y el alcance de las glosas se resuelve por su factura: también cuentan.
+    "/facturas/": (("factura", "factura_archivo", "institucion"), False),
+    "/motivos-glosa/": (("motivo_glosa",), False),
+    "/instituciones/": (("institucion",), False),
+    "/glosas/": (("glosa", "glosa_archivo", "factura", "factura_archivo", "motivo_glosa"), False),
+    "/glosas-view": (("glosa", "factura", "motivo_glosa"), True),  # el semáforo depende de hoy
+    "/glosas-view/filas": (("glosa", "factura", "motivo_glosa"), True),
+    "/analytics/cubo": (("cubo_glosas", "cubo_facturas"), False),
+}
+# Rutas de RUTAS_CACHEABLES cuyo cuerpo se transmite (sin LRU; gzip en streaming).
+RUTAS_SOLO_ETAG = frozenset({"/glosas-view"})
+
+TIPOS_COMPRIMIBLES = ("application/json", "text/html", "text/plain", "text/csv")
+TAMANO_MINIMO_COMPRESION = 1024
+
+
+def _codificacion_aceptada(request: Request) -> Optional[str]:
+    aceptadas = request.headers.get("accept-encoding", "")
+    if brotli is not None and "br" in aceptadas:
+        return "br"
+    if "gzip" in aceptadas:
+        return "gzip"
+    return None
+
+
+def _etag(request: Request, tablas: Tuple[str, ...], por_dia: bool) -> str:
+    partes = [
+        request.url.path,
+        request.url.query,
+        # Quién pide: el token de la API o la cookie de sesión de las vistas HTML.
+        request.headers.get("authorization", ""),
+        request.headers.get("cookie", ""),
+        version_tablas(tablas),
+        date.today().isoformat() if por_dia else "",
+    ]
+    resumen = hashlib.sha1("\x1f".join(partes).encode("utf-8")).hexdigest()[:20]
+    return f'W/"{resumen}"'
+
+
+async def _gzip_en_streaming(partes):
+    """Comprime un cuerpo en streaming; cada bloque sale completo (Z_SYNC_FLUSH)."""
+    compresor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # contenedor gzip
+    async for parte in partes:
+        if isinstance(parte, str):
+            parte = parte.encode("utf-8")
+        comprimido = compresor.compress(parte) + compresor.flush(zlib.Z_SYNC_FLUSH)
+        if comprimido:
+            yield comprimido
+    yield compresor.flush()
+
+
+class CacheHTTPMiddleware(BaseHTTPMiddleware):
+    """ETag + GET condicional + LRU de cuerpos + compresión para RUTAS_CACHEABLES."""
+
+    def __init__(self, app, cache: CacheRespuestas = cache, rutas=RUTAS_CACHEABLES, solo_etag=RUTAS_SOLO_ETAG):
+        super().__init__(app)
+        self.cache = cache
+        self.rutas = rutas
+        self.solo_etag = solo_etag
+
+    async def dispatch(self, request: Request, call_next):
+        ruta = self.rutas.get(request.url.path)
+        if request.method != "GET" or ruta is None or pide_ndjson(request):
+            # NDJSON es un listado completo en streaming: ni se guarda ni se comprime aquí.
+            return await call_next(request)
+
+        etag = _etag(request, *ruta)
+        cabeceras = {
+            "ETag": etag,
+            "Cache-Control": "private, no-cache",
+            "Vary": "Accept-Encoding, Authorization, Cookie",
+        }
+
+        if etag in request.headers.get("if-none-match", ""):
+            self.cache.no_modificados += 1
+            return Response(status_code=304, headers=cabeceras)
+
+        if request.url.path in self.solo_etag:
+            respuesta = await call_next(request)
+            if respuesta.status_code != 200:
+                return respuesta
+            if replica_atrasada(ruta[0]):
+                cabeceras = {"Vary": cabeceras["Vary"]}
+            tipo = respuesta.headers.get("content-type", "")
+            if (
+                "gzip" in request.headers.get("accept-encoding", "")
+                and tipo.startswith(TIPOS_COMPRIMIBLES)
+                and "content-encoding" not in respuesta.headers
+            ):
+                cabeceras["Content-Encoding"] = "gzip"
+                return StreamingResponse(
+                    _gzip_en_streaming(respuesta.body_iterator),
+                    headers={**cabeceras, "Content-Type": tipo},
+                    background=respuesta.background,
+                )
+            respuesta.headers.update(cabeceras)
+            return respuesta
+
+        entrada = self.cache.obtener(etag)
+        if entrada is None:
+            respuesta = await call_next(request)
+            if respuesta.status_code != 200 or replica_atrasada(ruta[0]):
+                return respuesta
+            cuerpo = b"".join([parte async for parte in respuesta.body_iterator])
+            entrada = _Entrada(cuerpo, respuesta.headers.get("content-type", "application/json"))
+            self.cache.guardar(etag, entrada)
+
+        cuerpo = entrada.cuerpo
+        codificacion = _codificacion_aceptada(request)
+        if (
+            codificacion
+            and len(cuerpo) >= TAMANO_MINIMO_COMPRESION
+            and entrada.tipo.startswith(TIPOS_COMPRIMIBLES)
+        ):
+            cuerpo = self.cache.comprimir(etag, entrada, codificacion)
+            cabeceras["Content-Encoding"] = codificacion
+
+        return Response(content=cuerpo, headers=cabeceras, media_type=entrada.tipo)
+
@@ -0,0 +1,118 @@
+# carta_pdf.py
+"""
+Plantillas de cartas y su renderizado a PDF.
+
+Las plantillas (templates/cartas/*.txt) son texto Jinja2: cada línea es un
+párrafo, las que empiezan por "## " salen en negrita y las vacías separan.
+Se compilan una vez por proceso (entorno Jinja sin recarga) y el PDF lo
+arma fpdf2, que es Python puro.
+
+Solo depende de Jinja2 y fpdf2: lo importan los procesos del pool de
+cartas.py sin cargar SQLAlchemy ni la configuración de la base.
+"""
+
+import os
+from datetime import date
+from decimal import Decimal
+from typing import Optional
+
+PLANTILLAS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates", "cartas")
+
+MESES = (
+    "enero", "febrero", "marzo", "abril", "mayo", "junio",
+    "julio", "agosto", "septiembre", "octubre", "noviembre", "diciembre",
+)
+
+
+class RendererNoDisponible(RuntimeError):
+    pass
+
+
+def _pesos(valor) -> str:
+    """1234567.8 -> "$ 1.234.567,80"."""
+    texto = f"{Decimal(str(valor)):,.2f}"
+    return "$ " + texto.replace(",", "_").replace(".", ",").replace("_", ".")
+
+
+def _fecha_larga(fecha: Optional[date]) -> str:
+    if fecha is None:
+        return ""
+    return f"{fecha.day} de {MESES[fecha.month - 1]} de {fecha.year}"
+
+
+_entorno = None
+
+
+def entorno():
+    """Entorno Jinja del proceso: cada plantilla se compila la primera vez y queda en memoria."""
+    global _entorno
+    if _entorno is None:
+        from jinja2 import Environment, FileSystemLoader, StrictUndefined
+
+        _entorno = Environment(
+            loader=FileSystemLoader(PLANTILLAS_DIR),
+            auto_reload=False,
+            undefined=StrictUndefined,
+            keep_trailing_newline=True,
+        )
+        _entorno.filters.update(pesos=_pesos, fecha_larga=_fecha_larga)
+    return _entorno
+
+
+def disponible() -> bool:
+    try:
+        import fpdf  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def texto(plantilla: str, datos: dict) -> str:
+    return entorno().get_template(plantilla).render(**datos)
+
+
+def pdf(contenido: str, titulo: str = "") -> bytes:
+    """Texto de una plantilla ya renderizada -> PDF tamaño carta."""
+    try:
+        from fpdf import FPDF
+    except ImportError:
+        raise RendererNoDisponible("Para generar cartas en PDF instale fpdf2 (pip install fpdf2)")
+
+    doc = FPDF(format="Letter")
+    doc.set_margins(25, 25, 25)
+    doc.set_auto_page_break(True, margin=25)
+    doc.set_title(titulo)
+    doc.add_page()
+    for linea in contenido.splitlines():
+        # Las fuentes base del PDF son Latin-1: lo que no cabe se reemplaza.
+        linea = linea.encode("latin-1", "replace").decode("latin-1")
+        if not linea.strip():
+            doc.ln(4)
+            continue
+        negrita = linea.startswith("## ")
+        doc.set_font("Helvetica", "B" if negrita else "", 11)
+        doc.multi_cell(0, 6, linea[3:] if negrita else linea, new_x="LMARGIN", new_y="NEXT")
+    return bytes(doc.output())
+
+
+def precargar(plantilla: str) -> None:
+    """Inicializador de los procesos del pool: compila la plantilla antes de la primera carta."""
+    entorno().get_template(plantilla)
+
+
+def generar(tarea: tuple) -> dict:
+    """
+    Tarea del pool: (plantilla, datos, ruta). Escribe el PDF en `ruta`
+    (tmp + rename) y devuelve {"id_respuesta_glosa", "ruta", "bytes"}.
+    Nunca lanza: un error de una carta vuelve en "error" y no detiene el lote.
+    """
+    plantilla, datos, ruta = tarea
+    try:
+        contenido = pdf(texto(plantilla, datos), titulo=f"Respuesta glosa {datos['id_glosa']}")
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        with open(ruta + ".tmp", "wb") as f:
+            f.write(contenido)
+        os.replace(ruta + ".tmp", ruta)
+        return {"id_respuesta_glosa": datos["id_respuesta_glosa"], "ruta": ruta, "bytes": len(contenido)}
+    except Exception as e:  # plantilla, fpdf o disco: se informa por carta
+        return {"id_respuesta_glosa": datos["id_respuesta_glosa"], "error": str(e)}
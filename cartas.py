@@ -0,0 +1,183 @@
+# cartas.py
+"""
+Cartas de respuesta a glosas en PDF, en lote.
+
+1. Una sola consulta trae, para cada respuesta del lote, los datos de la
+   carta (glosa, factura, IPS, EPS, motivo y quien firma) como dicts planos.
+2. Las cartas se renderizan en un pool de procesos (carta_pdf.generar): cada
+   proceso compila la plantilla una vez al arrancar y escribe sus PDF en
+   CARTAS_DIR/<id_factura>/. Los lotes pequeños se hacen en este proceso.
+3. Cada carta queda como adjunto de su respuesta (tipo "Carta de
+   respuesta"); si la respuesta ya tenía carta, se actualiza ese adjunto.
+
+Uso:
+    python cartas.py --factura 123 | --eps "Nueva EPS" [--desde 2025-01-01] [--hasta ...] --usuario 1 [--procesos 4]
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timezone
+from functools import partial
+from typing import List, Optional
+
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.orm import Session, aliased
+
+import carta_pdf
+import models
+from alcance import Alcance, TOTAL
+
+logger = logging.getLogger(__name__)
+
+CARTAS_DIR = os.getenv("CARTAS_DIR", "cartas")
+PLANTILLA = "respuesta_glosa.txt"
+TIPO_DOCUMENTO = "Carta de respuesta"
+# Cartas por tarea enviada al pool; con menos que esto no vale la pena arrancarlo.
+CARTAS_POR_TAREA = 32
+
+
+def datos_cartas(
+    db: Session, ids: Optional[List[int]] = None, id_factura: Optional[int] = None,
+    nombre_eps: Optional[str] = None, desde: Optional[date] = None, hasta: Optional[date] = None,
+    alcance: Alcance = TOTAL,
+) -> List[dict]:
+    """Variables de la plantilla de cada respuesta que cumple los filtros, en orden de id."""
+    r, g, f, m, u = models.RespuestaGlosa, models.Glosa, models.Factura, models.MotivoGlosa, models.Usuario
+    ips, eps = aliased(models.Institucion), aliased(models.Institucion)
+    stmt = (
+        select(
+            r.id_respuesta_glosa, r.fecha_respuesta, r.tipo_respuesta, r.valor_aceptado, r.valor_no_aceptado,
+            r.argumento_respuesta, g.id_glosa, g.fecha_glosa, g.valor_glosado, f.id_factura, f.numero_factura,
+            f.fecha_emision, m.codigo_motivo, m.descripcion_motivo, u.nombre_completo.label("firmante"),
+            ips.razon_social.label("ips_razon_social"), ips.nit.label("ips_nit"),
+            eps.razon_social.label("eps_razon_social"), eps.nit.label("eps_nit"),
+        )
+        .join(g, g.id_glosa == r.id_glosa)
+        .join(f, f.id_factura == g.id_factura)
+        .join(m, m.id_motivo_glosa == g.id_motivo_glosa)
+        .join(u, u.id_usuario == r.usuario_que_responde)
+        .join(ips, ips.id_institucion == f.id_institucion_emisora)
+        .join(eps, eps.id_institucion == f.id_institucion_receptora)
+        .order_by(r.id_respuesta_glosa)
+    )
+    if ids is not None:
+        stmt = stmt.where(r.id_respuesta_glosa.in_(ids))
+    if id_factura is not None:
+        stmt = stmt.where(f.id_factura == id_factura)
+    if nombre_eps is not None:
+        stmt = stmt.where(f.nombre_eps == nombre_eps)
+    if desde is not None:
+        stmt = stmt.where(r.fecha_respuesta >= desde)
+    if hasta is not None:
+        stmt = stmt.where(r.fecha_respuesta <= hasta)
+    stmt = alcance.restringir(stmt, f)
+
+    cartas = []
+    for fila in db.execute(stmt).mappings():
+        datos = {k: v for k, v in fila.items() if not k.startswith(("ips_", "eps_"))}
+        datos["ips"] = {"razon_social": fila["ips_razon_social"], "nit": fila["ips_nit"]}
+        datos["eps"] = {"razon_social": fila["eps_razon_social"], "nit": fila["eps_nit"]}
+        cartas.append(datos)
+    return cartas
+
+
+def _ruta(directorio: str, datos: dict) -> str:
+    return os.path.join(directorio, str(datos["id_factura"]), f"respuesta_glosa_{datos['id_respuesta_glosa']}.pdf")
+
+
+def renderizar(cartas: List[dict], directorio: Optional[str] = None, procesos: Optional[int] = None) -> List[dict]:
+    """PDF de cada carta en disco; devuelve el resultado de carta_pdf.generar por carta."""
+    if not carta_pdf.disponible():
+        raise carta_pdf.RendererNoDisponible("Para generar cartas en PDF instale fpdf2 (pip install fpdf2)")
+    directorio = directorio or CARTAS_DIR
+    tareas = [(PLANTILLA, datos, _ruta(directorio, datos)) for datos in cartas]
+    procesos = procesos or os.cpu_count() or 1
+    if procesos == 1 or len(tareas) <= CARTAS_POR_TAREA:
+        return list(map(carta_pdf.generar, tareas))
+    with ProcessPoolExecutor(
+        max_workers=procesos, mp_context=multiprocessing.get_context("spawn"),
+        initializer=partial(carta_pdf.precargar, PLANTILLA),
+    ) as pool:
+        return list(pool.map(carta_pdf.generar, tareas, chunksize=CARTAS_POR_TAREA))
+
+
+def registrar(db: Session, generadas: List[dict], id_usuario: int) -> None:
+    """Adjunto "Carta de respuesta" de cada PDF generado (sin commit); reusa el que ya exista."""
+    if not generadas:
+        return
+    a = models.Adjunto
+    previos = dict(db.execute(
+        select(a.id_respuesta_glosa, a.id_adjunto).where(
+            a.tipo_documento == TIPO_DOCUMENTO,
+            a.id_respuesta_glosa.in_([c["id_respuesta_glosa"] for c in generadas]),
+        )
+    ).all())
+    ahora = datetime.now(timezone.utc)
+    nuevos, existentes = [], []
+    for c in generadas:
+        valores = {
+            "nombre_archivo": os.path.basename(c["ruta"]), "ruta_almacenamiento": c["ruta"],
+            "usuario_que_sube": id_usuario, "fecha_subida": ahora,
+        }
+        if c["id_respuesta_glosa"] in previos:
+            existentes.append({"b_id": previos[c["id_respuesta_glosa"]], **valores})
+        else:
+            nuevos.append({
+                "id_respuesta_glosa": c["id_respuesta_glosa"], "tipo_documento": TIPO_DOCUMENTO,
+                "tipo_mime": "application/pdf", **valores,
+            })
+    if nuevos:
+        db.execute(a.__table__.insert(), nuevos)
+    if existentes:
+        db.execute(
+            update(a.__table__).where(a.__table__.c.id_adjunto == bindparam("b_id"))
+            .values({k: bindparam(k) for k in ("nombre_archivo", "ruta_almacenamiento", "usuario_que_sube", "fecha_subida")}),
+            existentes,
+        )
+
+
+def generar_lote(
+    db: Session, id_usuario: int, directorio: Optional[str] = None, procesos: Optional[int] = None, **filtros,
+) -> dict:
+    """Cartas de las respuestas que cumplen `filtros` (ver datos_cartas), registradas como adjuntos (sin commit)."""
+    cartas = datos_cartas(db, **filtros)
+    resultados = renderizar(cartas, directorio, procesos)
+    generadas = [c for c in resultados if "error" not in c]
+    registrar(db, generadas, id_usuario)
+    return {
+        "respuestas": len(cartas),
+        "generadas": len(generadas),
+        "errores": [c for c in resultados if "error" in c],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--factura", type=int, default=None)
+    parser.add_argument("--eps", default=None)
+    parser.add_argument("--desde", type=date.fromisoformat, default=None)
+    parser.add_argument("--hasta", type=date.fromisoformat, default=None)
+    parser.add_argument("--usuario", type=int, required=True, help="id del usuario que queda como quien sube las cartas")
+    parser.add_argument("--procesos", type=int, default=None)
+    args = parser.parse_args()
+    if args.factura is None and args.eps is None:
+        parser.error("indique --factura o --eps")
+
+    logging.basicConfig(level=logging.INFO)
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        resumen = generar_lote(
+            db, args.usuario, procesos=args.procesos,
+            id_factura=args.factura, nombre_eps=args.eps, desde=args.desde, hasta=args.hasta,
+        )
+        db.commit()
+        print(f"Respuestas: {resumen['respuestas']:,}  cartas: {resumen['generadas']:,}  con error: {len(resumen['errores']):,}")
+        for e in resumen["errores"][:50]:
+            print(f"  respuesta {e['id_respuesta_glosa']}: {e['error']}")
+    finally:
+        db.close()
@@ -0,0 +1,321 @@
+# conciliacion.py
+"""
+Conciliación de los archivos de respuesta de las EPS.
+
+Cada línea del archivo de la EPS trae su decisión sobre una glosa:
+
+    numero_factura, codigo_motivo, valor_aceptado, valor_no_aceptado
+    [, valor_glosado] [, observacion]
+
+Todo el cruce se hace sobre columnas (pandas/NumPy), no fila a fila:
+
+1. Las glosas abiertas se leen con un único SELECT de columnas.
+2. El cruce son dos merge (hash join): primero por numero_factura +
+   codigo_motivo + monto, y lo que sobre por numero_factura + codigo_motivo.
+   Un ordinal dentro de cada clave hace que varias glosas con la misma
+   factura y motivo se emparejen una a una.
+3. Los valores se comparan en centavos enteros (int64), nunca en float:
+   el texto se lee directamente a centavos, DECIMAL(18,2) cabe en int64 y la
+   suma aceptado + no aceptado cuadra exactamente. Un valor que no es un
+   monto (texto, negativo, más de dos decimales distintos de cero,
+   1.234,56) deja la línea como valor_invalido y nunca se aplica.
+4. Las líneas que cuadran se aplican con un INSERT executemany de
+   respuestas, un UPDATE executemany de estados y un INSERT executemany de
+   eventos de auditoría, en una transacción. Antes se bloquean sus glosas
+   (SELECT ... FOR UPDATE) y se vuelve a comprobar que sigan abiertas: las
+   que cambiaron de estado desde el cruce quedan como estado_cambiado.
+
+El resultado incluye un reporte de diferencias por línea.
+"""
+
+import logging
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import Dict
+
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.orm import Session
+
+import auditoria
+import cubos
+import estados_glosa
+import models
+import validaciones
+import vencimientos
+from alcance import Alcance, TOTAL
+
+logger = logging.getLogger(__name__)
+
+ESTADO_CONCILIADA = estados_glosa.CONCILIADA
+# Solo se cruzan glosas que la máquina de estados deja conciliar.
+ESTADOS_ABIERTOS = estados_glosa.origenes(ESTADO_CONCILIADA)
+
+COLUMNAS_OBLIGATORIAS = ("numero_factura", "codigo_motivo", "valor_aceptado", "valor_no_aceptado")
+
+# Resultados posibles por línea del reporte.
+CONCILIADA = "conciliada"
+SOLO_EN_ARCHIVO = "sin_glosa_abierta"
+SIN_RESPUESTA = "sin_respuesta_eps"
+VALOR_GLOSADO_DISTINTO = "valor_glosado_distinto"
+SUMA_NO_CUADRA = "suma_no_cuadra"
+VALOR_INVALIDO = "valor_invalido"
+ESTADO_CAMBIADO = "estado_cambiado"
+
+# Monto en texto: "+" opcional, hasta 16 enteros (DECIMAL(18,2)) y decimales;
+# las comas de miles se quitan antes (validaciones.PATRON_MILES). Un monto
+# negativo no es una decisión válida: no coincide y queda como inválido.
+_PATRON_MONTO = r"\+?(?P<enteros>[0-9]{1,16})(?:\.(?P<decimales>[0-9]*))?"
+
+# Ids por SELECT ... FOR UPDATE al aplicar.
+LOTE_BLOQUEO = 1000
+
+
+class ArchivoInvalido(ValueError):
+    pass
+
+
+def _centavos(serie, vacio: int = 0):
+    """
+    Serie de texto o Decimal -> (centavos int64, inválido bool), sin pasar por
+    float. Las celdas vacías valen `vacio`; las que no son un monto, 0 y se
+    marcan como inválidas.
+    """
+    import numpy as np
+    import pandas as pd
+
+    texto = serie.astype(object).where(serie.notna(), "").astype(str).str.strip()
+    miles = texto.str.fullmatch(validaciones.PATRON_MILES)
+    texto = texto.where(~miles, texto.str.replace(",", "", regex=False))
+    partes = texto.str.extract(f"^{_PATRON_MONTO}$")
+    decimales = partes["decimales"].fillna("")
+    # Más allá de los centavos solo se admiten ceros (1000.500, no 1000.505).
+    valido = partes["enteros"].notna() & decimales.str.slice(2).str.fullmatch("0*")
+    vacia = texto.eq("")
+
+    enteros = partes["enteros"].where(valido, "0").astype("int64").to_numpy()
+    fraccion = decimales.str.slice(0, 2).str.pad(2, side="right", fillchar="0").where(valido, "0").astype("int64").to_numpy()
+    centavos = enteros * 100 + fraccion
+    return np.where(vacia, vacio, centavos).astype("int64"), (~valido & ~vacia).to_numpy(dtype=bool)
+
+
+def leer_archivo_eps(contenido, nombre: str):
+    """CSV o Excel de la EPS -> DataFrame normalizado."""
+    import pandas as pd
+
+    if nombre.lower().endswith(".csv"):
+        df = pd.read_csv(contenido, dtype=str, keep_default_na=False)
+    else:
+        df = pd.read_excel(contenido, dtype=str)
+    df.columns = df.columns.str.strip().str.lower()
+    faltantes = [c for c in COLUMNAS_OBLIGATORIAS if c not in df.columns]
+    if faltantes:
+        raise ArchivoInvalido(f"Faltan columnas en el archivo: {', '.join(faltantes)}")
+    return df
+
+
+def glosas_abiertas(db: Session, alcance: Alcance = TOTAL):
+    """Glosas abiertas (dentro de `alcance`) con su clave de cruce, como DataFrame."""
+    import pandas as pd
+
+    stmt = (
+        select(
+            models.Glosa.id_glosa,
+            models.Factura.numero_factura,
+            models.MotivoGlosa.codigo_motivo,
+            models.Glosa.valor_glosado,
+            models.Glosa.estado_glosa,
+        )
+        .join(models.Factura, models.Factura.id_factura == models.Glosa.id_factura)
+        .join(models.MotivoGlosa, models.MotivoGlosa.id_motivo_glosa == models.Glosa.id_motivo_glosa)
+        .where(models.Glosa.estado_glosa.in_(ESTADOS_ABIERTOS))
+    )
+    stmt = alcance.restringir(stmt, models.Glosa)
+    return pd.DataFrame(
+        db.execute(stmt).all(),
+        columns=["id_glosa", "numero_factura", "codigo_motivo", "valor_glosado", "estado_glosa"],
+    )
+
+
+def cruzar(eps, nuestras):
+    """Empareja líneas de la EPS con glosas abiertas y clasifica cada par."""
+    import numpy as np
+    import pandas as pd
+
+    eps = eps.copy()
+    eps["numero_factura"] = eps["numero_factura"].astype(str).str.strip()
+    eps["codigo_motivo"] = eps["codigo_motivo"].astype(str).str.strip().str.upper()
+    eps["linea"] = np.arange(2, len(eps) + 2)  # fila en la hoja, con encabezado
+    eps["aceptado_c"], invalido = _centavos(eps["valor_aceptado"])
+    eps["no_aceptado_c"], invalido_no_aceptado = _centavos(eps["valor_no_aceptado"])
+    invalido = invalido | invalido_no_aceptado
+    if "valor_glosado" in eps.columns:
+        eps = eps.rename(columns={"valor_glosado": "valor_glosado_eps"})
+        eps["glosado_eps_c"], invalido_glosado = _centavos(eps["valor_glosado_eps"], vacio=-1)
+        invalido = invalido | invalido_glosado
+    else:
+        eps["glosado_eps_c"] = -1
+    eps["valor_invalido"] = invalido
+
+    nuestras = nuestras.copy()
+    nuestras["codigo_motivo"] = nuestras["codigo_motivo"].str.upper()
+    nuestras["glosado_c"] = _centavos(nuestras["valor_glosado"])[0]
+
+    clave = ["numero_factura", "codigo_motivo"]
+    # 1) Pares exactos: misma clave y mismo monto glosado (el de la EPS, o la
+    #    suma de su decisión si no lo envía).
+    #    Una línea con montos inválidos no se empareja por monto.
+    eps["monto_c"] = np.where(eps["glosado_eps_c"] >= 0, eps["glosado_eps_c"], eps["aceptado_c"] + eps["no_aceptado_c"])
+    eps.loc[eps["valor_invalido"], "monto_c"] = -1
+    nuestras["monto_c"] = nuestras["glosado_c"]
+    eps["_ordinal"] = eps.groupby(clave + ["monto_c"]).cumcount()
+    nuestras["_ordinal"] = nuestras.sort_values("id_glosa").groupby(clave + ["monto_c"]).cumcount()
+    exactos = eps.merge(nuestras, on=clave + ["monto_c", "_ordinal"], how="inner")
+
+    # 2) El resto se empareja por clave y orden (línea del archivo / id de glosa).
+    eps = eps[~eps["linea"].isin(exactos["linea"])].drop(columns="monto_c")
+    nuestras = nuestras[~nuestras["id_glosa"].isin(exactos["id_glosa"])].drop(columns="monto_c")
+    eps["_ordinal"] = eps.groupby(clave).cumcount()
+    nuestras["_ordinal"] = nuestras.sort_values("id_glosa").groupby(clave).cumcount()
+    resto = eps.merge(nuestras, on=clave + ["_ordinal"], how="outer", indicator=True)
+
+    exactos["_merge"] = "both"
+    cruce = pd.concat([exactos.drop(columns="monto_c"), resto], ignore_index=True)
+    cruce["_merge"] = cruce["_merge"].astype(str)
+
+    solo_eps = (cruce["_merge"] == "left_only").to_numpy()
+    solo_nuestra = (cruce["_merge"] == "right_only").to_numpy()
+    invalido = cruce["valor_invalido"].fillna(False).to_numpy(dtype=bool)
+    glosado = cruce["glosado_c"].fillna(0).to_numpy(dtype="int64")
+    glosado_eps = cruce["glosado_eps_c"].fillna(-1).to_numpy(dtype="int64")
+    suma = cruce["aceptado_c"].fillna(0).to_numpy(dtype="int64") + cruce["no_aceptado_c"].fillna(0).to_numpy(dtype="int64")
+
+    cruce["resultado"] = np.select(
+        [invalido, solo_eps, solo_nuestra, (glosado_eps >= 0) & (glosado_eps != glosado), suma != glosado],
+        [VALOR_INVALIDO, SOLO_EN_ARCHIVO, SIN_RESPUESTA, VALOR_GLOSADO_DISTINTO, SUMA_NO_CUADRA],
+        default=CONCILIADA,
+    )
+    cruce["diferencia"] = np.where(solo_eps | solo_nuestra | invalido, 0, suma - glosado) / 100
+    return cruce.drop(columns=["_merge", "_ordinal"])
+
+
+def _tipo_respuesta(aceptado, glosado):
+    import numpy as np
+
+    return np.select(
+        [aceptado == glosado, aceptado == 0],
+        ["Aceptacion Total", "Reclamacion"],
+        default="Aceptacion Parcial",
+    )
+
+
+def _bloquear_abiertas(db: Session, ids) -> Dict[int, str]:
+    """Estado de las glosas de `ids` que siguen abiertas, bloqueadas hasta el commit."""
+    glosa = models.Glosa.__table__
+    abiertas = {}
+    for i in range(0, len(ids), LOTE_BLOQUEO):
+        abiertas.update(db.execute(
+            select(glosa.c.id_glosa, glosa.c.estado_glosa)
+            .where(glosa.c.id_glosa.in_(ids[i:i + LOTE_BLOQUEO]), glosa.c.estado_glosa.in_(ESTADOS_ABIERTOS))
+            .with_for_update()
+        ).all())
+    return abiertas
+
+
+def aplicar(db: Session, cruce, id_usuario: int) -> int:
+    """
+    Crea las respuestas y concilia las glosas de las líneas que cuadran (sin
+    commit). Cualquier otro resultado, incluido valor_invalido, no se aplica.
+    Las glosas que ya no están abiertas (otra petición las cambió después del
+    cruce) no se tocan: su línea pasa a estado_cambiado en `cruce`.
+    """
+    candidatas = cruce["resultado"] == CONCILIADA
+    if not candidatas.any():
+        return 0
+    abiertas = _bloquear_abiertas(db, cruce.loc[candidatas, "id_glosa"].astype("int64").tolist())
+    cambiadas = candidatas & ~cruce["id_glosa"].isin(list(abiertas))
+    cruce.loc[cambiadas, "resultado"] = ESTADO_CAMBIADO
+    cruce.loc[cambiadas, "diferencia"] = 0.0
+    conciliadas = cruce[candidatas & ~cambiadas]
+    if conciliadas.empty:
+        return 0
+
+    ahora = datetime.now(timezone.utc)
+    hoy = date.today()
+    aceptado = conciliadas["aceptado_c"].to_numpy(dtype="int64")
+    no_aceptado = conciliadas["no_aceptado_c"].to_numpy(dtype="int64")
+    tipos = _tipo_respuesta(aceptado, conciliadas["glosado_c"].to_numpy(dtype="int64"))
+    observaciones = (
+        conciliadas["observacion"].fillna("").astype(str).tolist()
+        if "observacion" in conciliadas.columns
+        else [""] * len(conciliadas)
+    )
+    ids = conciliadas["id_glosa"].astype("int64").tolist()
+
+    respuestas = [
+        {
+            "id_glosa": id_glosa,
+            "fecha_respuesta": hoy,
+            "usuario_que_responde": id_usuario,
+            "tipo_respuesta": tipo,
+            "valor_aceptado": Decimal(int(a)).scaleb(-2),
+            "valor_no_aceptado": Decimal(int(n)).scaleb(-2),
+            "argumento_respuesta": observacion or "Conciliación de archivo EPS",
+            "estado_posterior_glosa": ESTADO_CONCILIADA,
+            "fecha_creacion": ahora,
+            "fecha_ultima_actualizacion": ahora,
+        }
+        for id_glosa, tipo, a, n, observacion in zip(ids, tipos.tolist(), aceptado, no_aceptado, observaciones)
+    ]
+    db.execute(insert(models.RespuestaGlosa.__table__), respuestas)
+    glosa = models.Glosa.__table__
+    db.execute(
+        update(glosa)
+        .where(glosa.c.id_glosa == bindparam("b_id"), glosa.c.estado_glosa.in_(ESTADOS_ABIERTOS))
+        .values(estado_glosa=ESTADO_CONCILIADA, fecha_ultima_actualizacion=ahora),
+        [{"b_id": id_glosa} for id_glosa in ids],
+    )
+    vencimientos.marcar(db, ids)
+    cubos.marcar(db, glosas=ids)
+    auditoria.registrar(db, [
+        auditoria.evento(
+            id_glosa, "conciliacion",
+            {"estado_glosa": (abiertas[id_glosa], ESTADO_CONCILIADA), "valor_aceptado": (None, r["valor_aceptado"])},
+            id_usuario, ahora,
+        )
+        for id_glosa, r in zip(ids, respuestas)
+    ])
+    return len(ids)
+
+
+def conciliar(db: Session, eps, id_usuario: int, aplicar_cambios: bool = True, alcance: Alcance = TOTAL) -> Dict:
+    """
+    Cruza el archivo de la EPS con las glosas abiertas y, si se pide, aplica lo
+    conciliado. Las glosas fuera de `alcance` no se cruzan: sus líneas quedan
+    como sin_glosa_abierta. "omitidas" son las glosas que cuadraban pero
+    cambiaron de estado antes de aplicar (estado_cambiado).
+    """
+    cruce = cruzar(eps, glosas_abiertas(db, alcance))
+    aplicadas = 0
+    if aplicar_cambios:
+        try:
+            aplicadas = aplicar(db, cruce, id_usuario)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+    resumen = cruce["resultado"].value_counts().to_dict()
+    omitidas = cruce.loc[cruce["resultado"] == ESTADO_CAMBIADO, "id_glosa"].astype("int64").tolist()
+    logger.info("Conciliación EPS: %s (aplicadas %d)", resumen, aplicadas)
+    return {"resumen": resumen, "aplicadas": aplicadas, "omitidas": omitidas, "cruce": cruce}
+
+
+def reporte_diferencias(cruce, solo_diferencias: bool = True):
+    """Reporte por línea: clave, glosa, valores y resultado."""
+    columnas = [
+        "linea", "numero_factura", "codigo_motivo", "id_glosa",
+        "valor_glosado", "valor_glosado_eps", "valor_aceptado", "valor_no_aceptado", "diferencia", "resultado",
+    ]
+    reporte = cruce.reindex(columns=columnas)
+    if solo_diferencias:
+        reporte = reporte[reporte["resultado"] != CONCILIADA]
+    return reporte.sort_values(["resultado", "linea"], na_position="last")
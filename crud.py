@@ -1,13 +1,23 @@
 # crud.py
 
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import any_, bindparam, func, select, union_all, update
+from sqlalchemy.dialects.postgresql import ARRAY
 import models
 import schemas # <--- ¡ASEGÚRATE DE QUE ESTA LÍNEA ESTÉ AQUÍ!
+import serializacion
+from database import abrir_sesion_lectura
+import estados_glosa
+import auditoria
+import vencimientos
+import dias_habiles
+import duplicados  # registra el cálculo de la huella al insertar glosas
+from alcance import Alcance, TOTAL
 from datetime import datetime, date, timezone
-from typing import List, Optional, TypeVar, Type, Any
+from typing import Iterator, List, Optional, TypeVar, Type, Any
 from decimal import Decimal
 from sqlalchemy.exc import IntegrityError
+import logging
 
 # Importar funciones de hashing desde auth.auth
 # Asegúrate de que esta ruta de importación sea correcta.
@@ -15,6 +25,8 @@ from sqlalchemy.exc import IntegrityError
 # entonces 'from auth.auth import' es la forma correcta.
 from auth.auth import get_password_hash, verify_password
 
+logger = logging.getLogger(__name__)
+
 # ====================================================================
 # Funciones CRUD para Usuario
 # ====================================================================
@@ -37,6 +49,7 @@ def create_user(db: Session, user: schemas.UsuarioCreate):
         password_hash=password_to_store, # Almacena la contraseña hasheada
         rol=user.rol,
         telefono=user.telefono,
+        id_institucion=user.id_institucion,
         fecha_creacion=datetime.now(),
         activo=True # Los nuevos usuarios están activos por defecto
     )
@@ -149,8 +162,12 @@ def delete_motivo_glosa(db: Session, motivo_glosa_id: int):
 # Funciones CRUD para Factura
 # ====================================================================
 
-def get_factura(db: Session, factura_id: int):
-    return db.query(models.Factura).filter(models.Factura.id_factura == factura_id).first()
+def get_factura(db: Session, factura_id: int, alcance: Alcance = TOTAL):
+    return alcance.restringir(db.query(models.Factura), models.Factura).filter(models.Factura.id_factura == factura_id).first()
+
+def get_factura_archivada(db: Session, factura_id: int, alcance: Alcance = TOTAL):
+    consulta = alcance.restringir(db.query(models.FacturaArchivo), models.FacturaArchivo)
+    return consulta.filter(models.FacturaArchivo.id_factura == factura_id).first()
 
 def get_factura_by_numero(db: Session, numero_factura: str):
     return db.query(models.Factura).filter(models.Factura.numero_factura == numero_factura).first()
@@ -165,8 +182,8 @@ def create_factura(db: Session, factura: schemas.FacturaCreate):
     db.refresh(db_factura)
     return db_factura
 
-def update_factura(db: Session, factura_id: int, factura_update: schemas.FacturaUpdate):
-    db_factura = db.query(models.Factura).filter(models.Factura.id_factura == factura_id).first()
+def update_factura(db: Session, factura_id: int, factura_update: schemas.FacturaUpdate, alcance: Alcance = TOTAL):
+    db_factura = get_factura(db, factura_id, alcance)
     if db_factura:
         update_data = factura_update.model_dump(exclude_unset=True)
         for key, value in update_data.items():
@@ -175,8 +192,8 @@ def update_factura(db: Session, factura_id: int, factura_update: schemas.Factura
         db.refresh(db_factura)
     return db_factura
 
-def delete_factura(db: Session, factura_id: int):
-    db_factura = db.query(models.Factura).filter(models.Factura.id_factura == factura_id).first()
+def delete_factura(db: Session, factura_id: int, alcance: Alcance = TOTAL):
+    db_factura = get_factura(db, factura_id, alcance)
     if db_factura:
         db.delete(db_factura)
         db.commit()
@@ -186,8 +203,12 @@ def delete_factura(db: Session, factura_id: int):
 # Funciones CRUD para Glosa
 # ====================================================================
 
-def get_glosa(db: Session, glosa_id: int):
-    return db.query(models.Glosa).filter(models.Glosa.id_glosa == glosa_id).first()
+def get_glosa(db: Session, glosa_id: int, alcance: Alcance = TOTAL):
+    return alcance.restringir(db.query(models.Glosa), models.Glosa).filter(models.Glosa.id_glosa == glosa_id).first()
+
+def get_glosa_archivada(db: Session, glosa_id: int, alcance: Alcance = TOTAL):
+    consulta = alcance.restringir(db.query(models.GlosaArchivo), models.GlosaArchivo)
+    return consulta.filter(models.GlosaArchivo.id_glosa == glosa_id).first()
 
 def get_glosas(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.Glosa).offset(skip).limit(limit).all()
@@ -200,6 +221,9 @@ def create_glosa(db: Session, glosa: schemas.GlosaCreate):
         del glosa_data["fecha_ultima_actualizacion"]
     if glosa_data.get("usuario_responsable") == 0:
         glosa_data["usuario_responsable"] = None
+    if not glosa_data.get("fecha_vencimiento_respuesta"):
+        # Término legal en días hábiles desde la fecha de la glosa.
+        glosa_data["fecha_vencimiento_respuesta"] = dias_habiles.vencimiento(db, glosa_data["fecha_glosa"])
     db_glosa = models.Glosa(**glosa_data)
 
     try:
@@ -209,20 +233,26 @@ def create_glosa(db: Session, glosa: schemas.GlosaCreate):
         return db_glosa
     except IntegrityError as e:
         db.rollback() # Revierte la transacción en caso de error de integridad
-        print(f"Error de integridad al crear glosa: {e.orig}")
+        logger.warning("Error de integridad al crear glosa: %s", e.orig)
         raise e # Re-lanza la excepción si quieres ver el traceback completo para depuración
     except Exception as e:
         db.rollback() # Revierte cualquier otra excepción inesperada
-        print(f"Error inesperado al crear glosa: {e}")
+        logger.exception("Error inesperado al crear glosa")
         raise e
 
-def update_glosa(db: Session, glosa_id: int, glosa_update: schemas.GlosaUpdate) -> Optional[models.Glosa]:
+def update_glosa(db: Session, glosa_id: int, glosa_update: schemas.GlosaUpdate, alcance: Alcance = TOTAL) -> Optional[models.Glosa]:
     """
-    Actualiza una glosa existente en la base de datos.
+    Actualiza una glosa existente en la base de datos (None si no existe o
+    está fuera del alcance).
     """
-    db_glosa = db.query(models.Glosa).filter(models.Glosa.id_glosa == glosa_id).first()
+    db_glosa = get_glosa(db, glosa_id, alcance)
     if db_glosa:
         update_data = glosa_update.model_dump(exclude_unset=True) # exclude_unset=True para actualizar solo los campos provistos
+        if "estado_glosa" in update_data:
+            # Lanza estados_glosa.TransicionInvalida si el cambio no está permitido.
+            estados_glosa.validar_transicion(db_glosa.estado_glosa, update_data["estado_glosa"])
+        if update_data.get("fecha_glosa") and "fecha_vencimiento_respuesta" not in update_data:
+            update_data["fecha_vencimiento_respuesta"] = dias_habiles.vencimiento(db, update_data["fecha_glosa"])
         for key, value in update_data.items():
             setattr(db_glosa, key, value)
         db_glosa.fecha_ultima_actualizacion = datetime.now(timezone.utc) # Actualizar el timestamp
@@ -231,37 +261,101 @@ def update_glosa(db: Session, glosa_id: int, glosa_update: schemas.GlosaUpdate)
         db.refresh(db_glosa)
     return db_glosa
 
-def delete_glosa(db: Session, glosa_id: int):
-    db_glosa = db.query(models.Glosa).filter(models.Glosa.id_glosa == glosa_id).first()
+def delete_glosa(db: Session, glosa_id: int, alcance: Alcance = TOTAL):
+    db_glosa = get_glosa(db, glosa_id, alcance)
     if db_glosa:
         db.delete(db_glosa)
         db.commit()
     return db_glosa
-    
 
-def update_glosa(db: Session, glosa_id: int, glosa_update: schemas.GlosaUpdate):
-    db_glosa = db.query(models.Glosa).filter(models.Glosa.id_glosa == glosa_id).first()
-    if db_glosa:
-        update_data = glosa_update.model_dump(exclude_unset=True)
-        for key, value in update_data.items():
-            setattr(db_glosa, key, value)
-        db.commit()
-        db.refresh(db_glosa)
-    return db_glosa
+def get_historial_glosa(db: Session, glosa_id: int, alcance: Alcance = TOTAL) -> List[dict]:
+    evento = models.GlosaEvento
+    stmt = (
+        select(evento.id_evento, evento.id_glosa, evento.fecha_evento, evento.id_usuario, evento.tipo, evento.cambios)
+        .where(evento.id_glosa == glosa_id)
+        .order_by(evento.fecha_evento, evento.id_evento)
+    )
+    stmt = alcance.restringir(stmt, evento)
+    return [dict(fila) for fila in db.execute(stmt).mappings()]
 
-def delete_glosa(db: Session, glosa_id: int):
-    db_glosa = db.query(models.Glosa).filter(models.Glosa.id_glosa == glosa_id).first()
-    if db_glosa:
-        db.delete(db_glosa)
+# Lote máximo de ids por sentencia fuera de PostgreSQL (límite de parámetros de SQLite).
+LOTE_TRANSICIONES = 5000
+
+def transicionar_glosas(db: Session, ids: List[int], destino: str, alcance: Alcance = TOTAL) -> dict:
+    """
+    Lleva a `destino` todas las glosas de `ids` cuyo estado actual lo permita:
+    SELECT ... FOR UPDATE del estado previo y UPDATE ... WHERE id = ANY(:ids)
+    AND estado IN (:origenes) RETURNING (IN por lotes en otros motores).
+    Devuelve los ids actualizados y, para los omitidos, el motivo. El cambio queda en la bitácora (auditoria.py).
+    Las glosas fuera de `alcance` se omiten como si no existieran.
+    """
+    origenes = estados_glosa.origenes(destino)
+    ids = list(dict.fromkeys(ids))
+    glosa = models.Glosa.__table__
+    ahora = datetime.now(timezone.utc)
+    dialecto = db.get_bind().dialect
+
+    if dialecto.name == "postgresql":
+        # Un solo parámetro array: el plan no cambia con el número de ids.
+        lotes = [ids]
+        filtro_ids = lambda columna, lote: columna == any_(bindparam("ids", lote, type_=ARRAY(columna.type)))
+    else:
+        lotes = [ids[i:i + LOTE_TRANSICIONES] for i in range(0, len(ids), LOTE_TRANSICIONES)]
+        filtro_ids = lambda columna, lote: columna.in_(lote)
+
+    cambios = {}  # id_glosa -> estado anterior
+    try:
+        for lote in lotes:
+            # Estado previo de las elegibles, bloqueadas hasta el commit: es el
+            # "antes" de la bitácora y nadie lo cambia entre el SELECT y el UPDATE.
+            elegibles = dict(db.execute(alcance.restringir(
+                select(glosa.c.id_glosa, glosa.c.estado_glosa)
+                .where(filtro_ids(glosa.c.id_glosa, lote), glosa.c.estado_glosa.in_(origenes)),
+                glosa,
+            ).with_for_update()).all())
+            if not elegibles:
+                continue
+            stmt = (
+                update(glosa)
+                .where(filtro_ids(glosa.c.id_glosa, list(elegibles)), glosa.c.estado_glosa.in_(origenes))
+                .values(estado_glosa=destino, fecha_ultima_actualizacion=ahora)
+            )
+            if dialecto.update_returning:
+                actualizadas = db.execute(stmt.returning(glosa.c.id_glosa)).scalars().all()
+            else:
+                db.execute(stmt)
+                actualizadas = list(elegibles)
+            cambios.update((i, elegibles[i]) for i in actualizadas)
+        vencimientos.marcar(db, cambios)
+        auditoria.registrar(db, [
+            auditoria.evento(id_glosa, "transicion", {"estado_glosa": (anterior, destino)}, db.info.get("id_usuario"), ahora)
+            for id_glosa, anterior in cambios.items()
+        ])
         db.commit()
-    return db_glosa
+    except Exception:
+        db.rollback()
+        raise
+
+    restantes = [i for i in ids if i not in cambios]
+    actuales = {}
+    for i in range(0, len(restantes), LOTE_TRANSICIONES):
+        actuales.update(db.execute(alcance.restringir(
+            select(glosa.c.id_glosa, glosa.c.estado_glosa).where(glosa.c.id_glosa.in_(restantes[i:i + LOTE_TRANSICIONES])),
+            glosa,
+        )).all())
+    omitidas = [
+        {"id_glosa": i, "estado_actual": actuales.get(i), "motivo": "no_existe" if i not in actuales else "transicion_no_permitida"}
+        for i in restantes
+    ]
+    return {"estado": destino, "actualizadas": sorted(cambios), "omitidas": omitidas}
+
 
 # ====================================================================
 # Funciones CRUD para RespuestaGlosa
 # ====================================================================
 
-def get_respuesta_glosa(db: Session, respuesta_id: int):
-    return db.query(models.RespuestaGlosa).filter(models.RespuestaGlosa.id_respuesta_glosa == respuesta_id).first()
+def get_respuesta_glosa(db: Session, respuesta_id: int, alcance: Alcance = TOTAL):
+    return alcance.restringir(db.query(models.RespuestaGlosa), models.RespuestaGlosa).filter(models.RespuestaGlosa.id_respuesta_glosa == respuesta_id).first()
 
 def get_respuestas_glosa(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.RespuestaGlosa).offset(skip).limit(limit).all()
@@ -273,8 +367,8 @@ def create_respuesta_glosa(db: Session, respuesta_glosa: schemas.RespuestaGlosaC
     db.refresh(db_respuesta_glosa)
     return db_respuesta_glosa
 
-def update_respuesta_glosa(db: Session, respuesta_id: int, respuesta_update: schemas.RespuestaGlosaUpdate):
-    db_respuesta = db.query(models.RespuestaGlosa).filter(models.RespuestaGlosa.id_respuesta_glosa == respuesta_id).first()
+def update_respuesta_glosa(db: Session, respuesta_id: int, respuesta_update: schemas.RespuestaGlosaUpdate, alcance: Alcance = TOTAL):
+    db_respuesta = get_respuesta_glosa(db, respuesta_id, alcance)
     if db_respuesta:
         update_data = respuesta_update.model_dump(exclude_unset=True)
         for key, value in update_data.items():
@@ -283,8 +377,8 @@ def update_respuesta_glosa(db: Session, respuesta_id: int, respuesta_update: sch
         db.refresh(db_respuesta)
     return db_respuesta
 
-def delete_respuesta_glosa(db: Session, respuesta_id: int):
-    db_respuesta = db.query(models.RespuestaGlosa).filter(models.RespuestaGlosa.id_respuesta_glosa == respuesta_id).first()
+def delete_respuesta_glosa(db: Session, respuesta_id: int, alcance: Alcance = TOTAL):
+    db_respuesta = get_respuesta_glosa(db, respuesta_id, alcance)
     if db_respuesta:
         db.delete(db_respuesta)
         db.commit()
@@ -294,8 +388,8 @@ def delete_respuesta_glosa(db: Session, respuesta_id: int):
 # Funciones CRUD para Adjunto
 # ====================================================================
 
-def get_adjunto(db: Session, adjunto_id: int):
-    return db.query(models.Adjunto).filter(models.Adjunto.id_adjunto == adjunto_id).first()
+def get_adjunto(db: Session, adjunto_id: int, alcance: Alcance = TOTAL):
+    return alcance.restringir(db.query(models.Adjunto), models.Adjunto).filter(models.Adjunto.id_adjunto == adjunto_id).first()
 
 def get_adjuntos(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.Adjunto).offset(skip).limit(limit).all()
@@ -307,8 +401,8 @@ def create_adjunto(db: Session, adjunto: schemas.AdjuntoCreate):
     db.refresh(db_adjunto)
     return db_adjunto
 
-def update_adjunto(db: Session, adjunto_id: int, adjunto_update: schemas.AdjuntoUpdate):
-    db_adjunto = db.query(models.Adjunto).filter(models.Adjunto.id_adjunto == adjunto_id).first()
+def update_adjunto(db: Session, adjunto_id: int, adjunto_update: schemas.AdjuntoUpdate, alcance: Alcance = TOTAL):
+    db_adjunto = get_adjunto(db, adjunto_id, alcance)
     if db_adjunto:
         update_data = adjunto_update.model_dump(exclude_unset=True)
         for key, value in update_data.items():
@@ -317,9 +411,152 @@ def update_adjunto(db: Session, adjunto_id: int, adjunto_update: schemas.Adjunto
         db.refresh(db_adjunto)
     return db_adjunto
 
-def delete_adjunto(db: Session, adjunto_id: int):
-    db_adjunto = db.query(models.Adjunto).filter(models.Adjunto.id_adjunto == adjunto_id).first()
+def delete_adjunto(db: Session, adjunto_id: int, alcance: Alcance = TOTAL):
+    db_adjunto = get_adjunto(db, adjunto_id, alcance)
     if db_adjunto:
         db.delete(db_adjunto)
         db.commit()
-    return db_adjunto
\ No newline at end of file
+    return db_adjunto
+
+# ====================================================================
+# Listados rápidos (sin objetos ORM ni revalidación Pydantic)
+# ====================================================================
+
+def _factura_de(origen):
+    factura = models.FacturaArchivo if origen is models.GlosaArchivo else models.Factura
+    return factura, origen.id_factura == factura.id_factura
+
+def _motivo_de(origen):
+    return models.MotivoGlosa, origen.id_motivo_glosa == models.MotivoGlosa.id_motivo_glosa
+
+_EMISORA = aliased(models.Institucion, name="emisora")
+_RECEPTORA = aliased(models.Institucion, name="receptora")
+
+# Relaciones que se pueden embeber con ?include= en los listados:
+# modelo -> {nombre: (esquema, origen -> (destino, condición del LEFT JOIN))}.
+# `origen` es el modelo o su tabla de archivo.
+RELACIONES = {
+    models.Glosa: {
+        "factura": (schemas.FacturaResponse, _factura_de),
+        "motivo": (schemas.MotivoGlosaResponse, _motivo_de),
+    },
+    models.Factura: {
+        "emisora": (schemas.InstitucionResponse, lambda o: (_EMISORA, o.id_institucion_emisora == _EMISORA.id_institucion)),
+        "receptora": (schemas.InstitucionResponse, lambda o: (_RECEPTORA, o.id_institucion_receptora == _RECEPTORA.id_institucion)),
+    },
+}
+
+def proyeccion(modelo, esquema, fields: Optional[str], include: Optional[str]):
+    """?fields= / ?include= validados para `modelo` (serializacion.CampoDesconocido si no)."""
+    relaciones = {nombre: esquema_rel for nombre, (esquema_rel, _) in RELACIONES.get(modelo, {}).items()}
+    clave = modelo.__table__.primary_key.columns.values()[0].name
+    return serializacion.proyeccion(esquema, relaciones, fields, include, clave)
+
+def _consulta_filas(modelo, esquema, archivo, alcance: Alcance, campos: Optional[tuple], incluir: Optional[dict]):
+    """SELECT de get_filas / iterar_filas. Devuelve (stmt, segmentos, columna de la clave primaria)."""
+    incluir = incluir or {}
+    segmentos = []
+
+    def consulta(origen):
+        columnas, claves, conversores = serializacion.columnas_para(origen, esquema, campos)
+        partes = [(None, claves, conversores)]
+        stmt = select(*columnas).select_from(origen)
+        for nombre, campos_rel in incluir.items():
+            esquema_rel, destino_de = RELACIONES[modelo][nombre]
+            destino, condicion = destino_de(origen)
+            columnas_rel, claves_rel, conversores_rel = serializacion.columnas_para(
+                destino, esquema_rel, campos_rel, prefijo=f"{nombre}__"
+            )
+            stmt = stmt.add_columns(*columnas_rel).outerjoin(destino, condicion)
+            partes.append((nombre, claves_rel, conversores_rel))
+        segmentos[:] = partes
+        return alcance.restringir(stmt, origen)
+
+    clave_primaria = modelo.__table__.primary_key.columns.values()[0]
+    if archivo is None:
+        return consulta(modelo), segmentos, clave_primaria
+    union = union_all(consulta(modelo), consulta(archivo)).subquery()
+    return select(*union.c), segmentos, union.c[clave_primaria.name]
+
+def _a_dicts(filas, segmentos) -> List[dict]:
+    if len(segmentos) == 1:
+        return serializacion.filas_a_dicts(filas, segmentos[0][1], segmentos[0][2])
+    return serializacion.filas_anidadas(filas, segmentos)
+
+def get_filas(
+    db: Session, modelo, esquema, skip: int = 0, limit: int = 100, archivo=None, alcance: Alcance = TOTAL,
+    campos: Optional[tuple] = None, incluir: Optional[dict] = None,
+) -> List[dict]:
+    """
+    Lista registros de `modelo` como diccionarios con exactamente los campos
+    de `esquema`, seleccionando solo esas columnas. Pensado para responder
+    con serializacion.RespuestaORJSON.
+
+    Con `archivo` (p. ej. models.GlosaArchivo) se listan también las filas
+    archivadas, ordenadas por clave primaria. `alcance` restringe las filas a
+    la institución del usuario (alcance.py), en el mismo SELECT.
+
+    `campos` limita las columnas propias e `incluir` ({relación: campos o
+    None}, ver RELACIONES) añade las de cada relación con un LEFT JOIN en el
+    mismo SELECT; salen anidadas bajo el nombre de la relación.
+    """
+    stmt, segmentos, clave = _consulta_filas(modelo, esquema, archivo, alcance, campos, incluir)
+    if archivo is not None:
+        stmt = stmt.order_by(clave)
+    return _a_dicts(db.execute(stmt.offset(skip).limit(limit)), segmentos)
+
+# Filas por vuelta del cursor en iterar_filas.
+LOTE_STREAM = 1000
+
+def iterar_filas(
+    modelo, esquema, archivo=None, alcance: Alcance = TOTAL, campos: Optional[tuple] = None,
+    incluir: Optional[dict] = None, desde_id: Optional[int] = None, lote: Optional[int] = None,
+) -> Iterator[List[dict]]:
+    """
+    Como get_filas, pero recorre todas las filas (ordenadas por clave
+    primaria, las de clave > `desde_id` si se indica) con un cursor del
+    servidor (yield_per) y entrega un lote de diccionarios por vuelta: la
+    memoria no crece con el tamaño del listado.
+
+    Abre su propia sesión de lectura al empezar a iterar y la cierra al
+    terminar: se consume desde una StreamingResponse, cuando la sesión de
+    la petición ya se cerró.
+    """
+    stmt, segmentos, clave = _consulta_filas(modelo, esquema, archivo, alcance, campos, incluir)
+    if desde_id is not None:
+        stmt = stmt.where(clave > desde_id)
+    stmt = stmt.order_by(clave).execution_options(yield_per=lote or LOTE_STREAM)
+    db = abrir_sesion_lectura()
+    try:
+        for particion in db.execute(stmt).partitions():
+            yield _a_dicts(particion, segmentos)
+    finally:
+        db.close()
+
+# ====================================================================
+# Escrituras masivas
+# ====================================================================
+
+def upsert(db: Session, modelo, filas: List[dict], claves: List[str], actualizar: Optional[List[str]] = None, donde=None) -> None:
+    """
+    INSERT ... ON CONFLICT (claves) en un solo executemany (sin commit).
+    Con `actualizar`, las filas existentes toman esas columnas de la fila
+    nueva (DO UPDATE), solo si cumplen `donde` cuando se indica; si no, se
+    dejan como están (DO NOTHING). `claves` debe tener un índice único.
+    PostgreSQL y SQLite.
+    """
+    if not filas:
+        return
+    dialecto = db.get_bind().dialect.name
+    if dialecto == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialecto == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"upsert no soportado en {dialecto}")
+    stmt = insert(modelo.__table__)
+    if actualizar:
+        stmt = stmt.on_conflict_do_update(index_elements=claves, set_={c: stmt.excluded[c] for c in actualizar}, where=donde)
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=claves)
+    db.execute(stmt, filas)
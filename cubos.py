@@ -0,0 +1,385 @@
+# cubos.py
+"""
+Cubos de análisis: agregados de glosas y facturas por EPS × motivo × mes.
+
+    cubo_glosas   (periodo, nombre_eps, codigo_motivo, IPS, EPS)
+                  -> glosas, valor_glosado, glosas_respondidas,
+                     valor_aceptado, valor_no_aceptado
+    cubo_facturas (periodo, nombre_eps, IPS, EPS)
+                  -> facturas, valor_facturado
+
+periodo es AAAAMM (de fecha_glosa o fecha_emision). Los valores aceptado y
+no aceptado son los de la última respuesta de cada glosa. Se agregan las
+tablas calientes y las de archivo, así archivar no cambia los cubos.
+
+Mantenimiento incremental por mes: el flush del ORM anota los meses
+tocados (y las glosas/facturas cuyo mes se resuelve después); las
+operaciones masivas los anotan con marcar(). Al confirmar pasan a una cola
+del proceso y el hilo de este módulo recalcula esos meses completos, con un
+DELETE y un INSERT ... SELECT agrupado por cubo, fuera de la petición.
+Recalcular un mes solo lee las filas de ese mes (índices por fecha).
+
+/analytics/cubo consulta solo los cubos: la respuesta no depende del
+tamaño del histórico.
+
+Uso:
+    python cubos.py            # reconstrucción completa
+"""
+
+import logging
+import os
+import threading
+from datetime import date
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import Integer, cast, delete, event, extract, func, insert, inspect, literal, select, union_all
+from sqlalchemy.orm import Session
+
+import models
+from alcance import Alcance, TOTAL
+from dialectos import suma_dinero
+
+logger = logging.getLogger(__name__)
+
+SIN_EPS = "(sin EPS)"
+CUBOS_INTERVALO_S = float(os.getenv("CUBOS_INTERVALO_S", "10"))
+LOTE_IDS = 5000
+
+# Dimensión de la API -> columna de los cubos.
+DIMENSIONES = {
+    "periodo": "periodo",
+    "eps": "nombre_eps",
+    "motivo": "codigo_motivo",
+    "ips": "id_institucion_emisora",
+}
+
+_COLUMNAS_GLOSAS = [
+    "periodo", "nombre_eps", "codigo_motivo", "id_institucion_emisora", "id_institucion_receptora",
+    "glosas", "valor_glosado", "glosas_respondidas", "valor_aceptado", "valor_no_aceptado",
+]
+_COLUMNAS_FACTURAS = [
+    "periodo", "nombre_eps", "id_institucion_emisora", "id_institucion_receptora", "facturas", "valor_facturado",
+]
+
+
+class DimensionDesconocida(ValueError):
+    pass
+
+
+def periodo_de(fecha: date) -> int:
+    return fecha.year * 100 + fecha.month
+
+
+def _rango(periodo: int):
+    anio, mes = divmod(periodo, 100)
+    return date(anio, mes, 1), date(anio + mes // 12, mes % 12 + 1, 1)
+
+
+def _periodo(columna):
+    return cast(extract("year", columna) * 100 + extract("month", columna), Integer)
+
+
+# ====================================================================
+# Agregación
+# ====================================================================
+
+def _filas_glosas(glosa, factura, respuesta, periodo: Optional[int]):
+    en_periodo = [] if periodo is None else [glosa.fecha_glosa >= _rango(periodo)[0], glosa.fecha_glosa < _rango(periodo)[1]]
+    ultima = (
+        select(respuesta.id_glosa, func.max(respuesta.id_respuesta_glosa).label("id_respuesta"))
+        .where(respuesta.id_glosa.in_(select(glosa.id_glosa).where(*en_periodo)))
+        .group_by(respuesta.id_glosa)
+        .subquery()
+    )
+    return (
+        select(
+            _periodo(glosa.fecha_glosa).label("periodo"),
+            func.coalesce(factura.nombre_eps, SIN_EPS).label("nombre_eps"),
+            models.MotivoGlosa.codigo_motivo.label("codigo_motivo"),
+            factura.id_institucion_emisora.label("id_institucion_emisora"),
+            factura.id_institucion_receptora.label("id_institucion_receptora"),
+            glosa.valor_glosado.label("valor_glosado"),
+            ultima.c.id_respuesta,
+            respuesta.valor_aceptado.label("valor_aceptado"),
+            respuesta.valor_no_aceptado.label("valor_no_aceptado"),
+        )
+        .join(factura, factura.id_factura == glosa.id_factura)
+        .join(models.MotivoGlosa, models.MotivoGlosa.id_motivo_glosa == glosa.id_motivo_glosa)
+        .outerjoin(ultima, ultima.c.id_glosa == glosa.id_glosa)
+        .outerjoin(respuesta, respuesta.id_respuesta_glosa == ultima.c.id_respuesta)
+        .where(*en_periodo)
+    )
+
+
+def _agregado_glosas(periodo: Optional[int]):
+    filas = union_all(
+        _filas_glosas(models.Glosa, models.Factura, models.RespuestaGlosa, periodo),
+        _filas_glosas(models.GlosaArchivo, models.FacturaArchivo, models.RespuestaGlosaArchivo, periodo),
+    ).subquery()
+    claves = [filas.c[c] for c in _COLUMNAS_GLOSAS[:5]]
+    return select(
+        *claves,
+        func.count(),
+        suma_dinero(filas.c.valor_glosado),
+        func.count(filas.c.id_respuesta),
+        func.coalesce(suma_dinero(filas.c.valor_aceptado), 0),
+        func.coalesce(suma_dinero(filas.c.valor_no_aceptado), 0),
+    ).group_by(*claves)
+
+
+def _agregado_facturas(periodo: Optional[int]):
+    partes = []
+    for factura in (models.Factura, models.FacturaArchivo):
+        stmt = select(
+            _periodo(factura.fecha_emision).label("periodo"),
+            func.coalesce(factura.nombre_eps, SIN_EPS).label("nombre_eps"),
+            factura.id_institucion_emisora.label("id_institucion_emisora"),
+            factura.id_institucion_receptora.label("id_institucion_receptora"),
+            factura.valor_total_factura.label("valor_total_factura"),
+        )
+        if periodo is not None:
+            inicio, fin = _rango(periodo)
+            stmt = stmt.where(factura.fecha_emision >= inicio, factura.fecha_emision < fin)
+        partes.append(stmt)
+    filas = union_all(*partes).subquery()
+    claves = [filas.c[c] for c in _COLUMNAS_FACTURAS[:4]]
+    return select(*claves, func.count(), suma_dinero(filas.c.valor_total_factura)).group_by(*claves)
+
+
+def recalcular_periodos(db: Session, periodos: Iterable[int]) -> int:
+    """Reescribe los meses indicados de ambos cubos (sin commit). Devuelve cuántos meses."""
+    periodos = sorted(set(periodos))
+    for periodo in periodos:
+        db.execute(delete(models.CuboGlosas).where(models.CuboGlosas.periodo == periodo))
+        db.execute(delete(models.CuboFacturas).where(models.CuboFacturas.periodo == periodo))
+        db.execute(insert(models.CuboGlosas).from_select(_COLUMNAS_GLOSAS, _agregado_glosas(periodo)))
+        db.execute(insert(models.CuboFacturas).from_select(_COLUMNAS_FACTURAS, _agregado_facturas(periodo)))
+    return len(periodos)
+
+
+def reconstruir(db: Session) -> Dict[str, int]:
+    """Reconstrucción completa: una sentencia por cubo (sin commit). Devuelve filas por cubo."""
+    db.execute(delete(models.CuboGlosas))
+    db.execute(delete(models.CuboFacturas))
+    return {
+        "cubo_glosas": db.execute(insert(models.CuboGlosas).from_select(_COLUMNAS_GLOSAS, _agregado_glosas(None))).rowcount,
+        "cubo_facturas": db.execute(insert(models.CuboFacturas).from_select(_COLUMNAS_FACTURAS, _agregado_facturas(None))).rowcount,
+    }
+
+
+# ====================================================================
+# Meses tocados (recálculo incremental)
+# ====================================================================
+
+_pendientes: Dict[str, Set[int]] = {"periodos": set(), "glosas": set(), "facturas": set()}
+_candado_pendientes = threading.Lock()
+_despertar = threading.Event()
+
+
+def marcar(db: Session, periodos: Iterable[int] = (), glosas: Iterable[int] = (), facturas: Iterable[int] = ()) -> None:
+    """
+    Anota cambios hechos fuera del flush (sentencias masivas): meses
+    directamente, o glosas/facturas cuyos meses se resuelven al recalcular.
+    Se encolan al confirmar.
+    """
+    tocados = db.info.setdefault("cubos_tocados", {"periodos": set(), "glosas": set(), "facturas": set()})
+    tocados["periodos"].update(periodos)
+    tocados["glosas"].update(glosas)
+    tocados["facturas"].update(facturas)
+
+
+def _fechas(obj, atributo: str) -> List[date]:
+    """Valor actual y anterior (si cambió) de una columna de fecha."""
+    historial = inspect(obj).attrs[atributo].history
+    return [f for f in [getattr(obj, atributo), *historial.deleted] if f is not None]
+
+
+@event.listens_for(Session, "after_flush")
+def _cambios_del_flush(session, flush_context):
+    periodos, glosas, facturas = set(), set(), set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, models.Glosa):
+            periodos.update(periodo_de(f) for f in _fechas(obj, "fecha_glosa"))
+        elif isinstance(obj, models.RespuestaGlosa):
+            glosas.update(i for i in [obj.id_glosa, *inspect(obj).attrs.id_glosa.history.deleted] if i is not None)
+        elif isinstance(obj, models.Factura):
+            periodos.update(periodo_de(f) for f in _fechas(obj, "fecha_emision"))
+            if obj not in session.new:
+                facturas.add(obj.id_factura)  # sus glosas cambian de EPS o institución
+    if periodos or glosas or facturas:
+        marcar(session, periodos, glosas, facturas)
+
+
+@event.listens_for(Session, "after_commit")
+def _encolar_al_confirmar(session):
+    tocados = session.info.pop("cubos_tocados", None)
+    if tocados and any(tocados.values()):
+        with _candado_pendientes:
+            for clave, valores in tocados.items():
+                _pendientes[clave].update(valores)
+        _despertar.set()
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_al_revertir(session):
+    session.info.pop("cubos_tocados", None)
+
+
+def _periodos_de(db: Session, glosas: List[int], facturas: List[int]) -> Set[int]:
+    """Meses de las glosas indicadas y de las glosas de las facturas indicadas (calientes y archivadas)."""
+    periodos: Set[int] = set()
+    for glosa in (models.Glosa, models.GlosaArchivo):
+        for columna, ids in ((glosa.id_glosa, glosas), (glosa.id_factura, facturas)):
+            for i in range(0, len(ids), LOTE_IDS):
+                fechas = db.execute(select(glosa.fecha_glosa).where(columna.in_(ids[i:i + LOTE_IDS])).distinct()).scalars()
+                periodos.update(periodo_de(f) for f in fechas)
+    return periodos
+
+
+def procesar_pendientes(sesion_factory=None) -> int:
+    """Recalcula los meses encolados por este proceso. Devuelve cuántos meses."""
+    with _candado_pendientes:
+        tocados = {clave: list(valores) for clave, valores in _pendientes.items()}
+        for valores in _pendientes.values():
+            valores.clear()
+    if not any(tocados.values()):
+        return 0
+    if sesion_factory is None:
+        from database import SessionLocal as sesion_factory
+    db = sesion_factory()
+    try:
+        periodos = set(tocados["periodos"]) | _periodos_de(db, tocados["glosas"], tocados["facturas"])
+        meses = recalcular_periodos(db, periodos)
+        db.commit()
+    except Exception:
+        db.rollback()
+        with _candado_pendientes:
+            for clave, valores in tocados.items():
+                _pendientes[clave].update(valores)  # se reintenta en la próxima vuelta
+        raise
+    finally:
+        db.close()
+    return meses
+
+
+_hilo: Optional[threading.Thread] = None
+
+
+def _programar() -> None:
+    while True:
+        _despertar.wait(CUBOS_INTERVALO_S)
+        _despertar.clear()
+        try:
+            procesar_pendientes()
+        except Exception:
+            logger.exception("Falló el recálculo de los cubos")
+
+
+def iniciar() -> None:
+    """Arranca el hilo de recálculo (desde el lifespan, en cada worker). CUBOS_PROGRAMADOR=0 lo desactiva."""
+    global _hilo
+    if os.getenv("CUBOS_PROGRAMADOR", "1") == "0":
+        return
+    if _hilo is None or not _hilo.is_alive():
+        _hilo = threading.Thread(target=_programar, name="cubos-programador", daemon=True)
+        _hilo.start()
+
+
+# ====================================================================
+# Consulta (drill-down)
+# ====================================================================
+
+def _a_periodo(valor: Optional[str]) -> Optional[int]:
+    """"2025-03" o "202503" -> 202503."""
+    if not valor:
+        return None
+    try:
+        return int(valor.replace("-", ""))
+    except ValueError:
+        raise DimensionDesconocida(f"Periodo inválido: '{valor}' (use AAAA-MM)")
+
+
+def _tasa(numerador, denominador) -> Optional[float]:
+    return round(float(numerador) / float(denominador), 4) if denominador else None
+
+
+def consultar(
+    db: Session, dimensiones: List[str], eps: Optional[str] = None, motivo: Optional[str] = None,
+    desde: Optional[str] = None, hasta: Optional[str] = None, alcance: Alcance = TOTAL, limit: int = 100,
+) -> List[dict]:
+    """
+    Suma los cubos por las `dimensiones` pedidas (de DIMENSIONES), con
+    filtros opcionales, de mayor a menor valor glosado. Sin la dimensión
+    motivo añade lo facturado y la tasa de glosa.
+    """
+    desconocidas = [d for d in dimensiones if d not in DIMENSIONES]
+    if desconocidas:
+        raise DimensionDesconocida(f"Dimensión desconocida: {', '.join(desconocidas)}. Válidas: {', '.join(DIMENSIONES)}")
+    columnas = [DIMENSIONES[d] for d in dict.fromkeys(dimensiones)]
+    desde, hasta = _a_periodo(desde), _a_periodo(hasta)
+
+    def filtrar(stmt, cubo):
+        tabla = cubo.__table__
+        if eps is not None:
+            stmt = stmt.where(tabla.c.nombre_eps == eps)
+        if desde is not None:
+            stmt = stmt.where(tabla.c.periodo >= desde)
+        if hasta is not None:
+            stmt = stmt.where(tabla.c.periodo <= hasta)
+        return alcance.restringir(stmt, cubo)
+
+    g = models.CuboGlosas.__table__
+    valor_glosado = suma_dinero(g.c.valor_glosado)
+    stmt = select(
+        *[g.c[c] for c in columnas],
+        func.sum(g.c.glosas), valor_glosado, func.sum(g.c.glosas_respondidas),
+        suma_dinero(g.c.valor_aceptado), suma_dinero(g.c.valor_no_aceptado),
+    ).group_by(*[g.c[c] for c in columnas]).order_by(valor_glosado.desc()).limit(limit)
+    if motivo is not None:
+        stmt = stmt.where(g.c.codigo_motivo == motivo)
+    filas = db.execute(filtrar(stmt, models.CuboGlosas)).all()
+
+    facturado = {}
+    con_facturas = "codigo_motivo" not in columnas and motivo is None
+    if con_facturas and filas:
+        f = models.CuboFacturas.__table__
+        stmt = select(*[f.c[c] for c in columnas], func.sum(f.c.facturas), suma_dinero(f.c.valor_facturado))
+        stmt = stmt.group_by(*[f.c[c] for c in columnas])
+        facturado = {tuple(fila[:len(columnas)]): fila[len(columnas):] for fila in db.execute(filtrar(stmt, models.CuboFacturas))}
+
+    resultado = []
+    for fila in filas:
+        clave = tuple(fila[:len(columnas)])
+        glosas, glosado, respondidas, aceptado, no_aceptado = fila[len(columnas):]
+        registro = {d: v for d, v in zip(dict.fromkeys(dimensiones), clave)}
+        registro.update({
+            "glosas": glosas,
+            "valor_glosado": Decimal(str(glosado)).quantize(Decimal("0.01")),
+            "glosas_respondidas": respondidas,
+            "valor_aceptado": Decimal(str(aceptado)).quantize(Decimal("0.01")),
+            "valor_no_aceptado": Decimal(str(no_aceptado)).quantize(Decimal("0.01")),
+            "tasa_aceptacion": _tasa(aceptado, Decimal(str(aceptado)) + Decimal(str(no_aceptado))),
+        })
+        if con_facturas:
+            facturas, valor_facturado = facturado.get(clave, (0, 0))
+            registro.update({
+                "facturas": facturas,
+                "valor_facturado": Decimal(str(valor_facturado or 0)).quantize(Decimal("0.01")),
+                "tasa_glosa": _tasa(glosado, valor_facturado),
+            })
+        resultado.append(registro)
+    return resultado
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        filas = reconstruir(db)
+        db.commit()
+        logger.info("Cubos reconstruidos: %s", filas)
+    finally:
+        db.close()
@@ -1,11 +1,95 @@
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
-from typing import Generator
+import logging
+import sqlite3
+import threading
+import time
+from contextvars import ContextVar
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker, declarative_base, Session
+from typing import Generator, Optional
 
-DATABASE_URL = os.getenv("DATABASE_URL")
+logger = logging.getLogger(__name__)
 
-engine = create_engine(DATABASE_URL)
+# Sin DATABASE_URL se usa un archivo SQLite local (instalaciones de una sede, pruebas).
+DATABASE_URL = os.getenv("DATABASE_URL") or "sqlite:///" + os.getenv("SQLITE_RUTA", "glosas.db")
+
+# ====================================================================
+# SQLite
+# ====================================================================
+# - WAL: los lectores no bloquean al escritor ni el escritor a los lectores.
+# - synchronous=NORMAL: con WAL no se corrompe la base; una caída del sistema
+#   operativo (no del proceso) puede perder las últimas transacciones.
+# - mmap y caché de páginas más grandes que los valores por defecto.
+# - Un solo escritor: SQLite admite un escritor a la vez. La transacción
+#   empieza en la primera escritura (INSERT/UPDATE/DELETE) con BEGIN
+#   IMMEDIATE, que toma el bloqueo de escritura de una vez, y dentro del
+#   proceso los escritores hacen fila en un candado (hasta SQLITE_ESPERA_S)
+#   en lugar de reintentar contra el busy timeout y fallar con
+#   "database is locked".
+
+SQLITE_MMAP_MB = int(os.getenv("SQLITE_MMAP_MB", 256))
+SQLITE_CACHE_MB = int(os.getenv("SQLITE_CACHE_MB", 64))
+SQLITE_ESPERA_S = float(os.getenv("SQLITE_ESPERA_S", 30))
+
+_ESCRITURAS = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+_turno_escritura = threading.Lock()
+
+
+def _soltar_turno(info: dict) -> None:
+    if info.pop("turno_escritura", False):
+        _turno_escritura.release()
+
+
+def configurar_sqlite(motor) -> None:
+    """Pragmas y cola de un solo escritor para un engine SQLite."""
+
+    @event.listens_for(motor, "connect")
+    def _pragmas(conexion_dbapi, registro):
+        # pysqlite abre la transacción antes de la primera escritura: que sea IMMEDIATE.
+        conexion_dbapi.isolation_level = "IMMEDIATE"
+        cursor = conexion_dbapi.cursor()
+        for pragma in (
+            "PRAGMA journal_mode=WAL",
+            "PRAGMA synchronous=NORMAL",
+            f"PRAGMA mmap_size={SQLITE_MMAP_MB * 1024 * 1024}",
+            f"PRAGMA cache_size=-{SQLITE_CACHE_MB * 1024}",  # negativo: KiB
+            "PRAGMA temp_store=MEMORY",
+        ):
+            cursor.execute(pragma)
+        cursor.close()
+
+    @event.listens_for(motor, "before_cursor_execute")
+    def _esperar_turno(conn, cursor, sentencia, parametros, contexto, varios):
+        if conn.info.get("turno_escritura") or not sentencia.lstrip()[:7].upper().startswith(_ESCRITURAS):
+            return
+        if not _turno_escritura.acquire(timeout=SQLITE_ESPERA_S):
+            raise OperationalError(
+                sentencia, parametros,
+                sqlite3.OperationalError(f"database is locked: sin turno de escritura en {SQLITE_ESPERA_S:g} s"),
+            )
+        conn.info["turno_escritura"] = True
+
+    @event.listens_for(motor, "commit")
+    @event.listens_for(motor, "rollback")
+    def _fin_transaccion(conn):
+        _soltar_turno(conn.info)
+
+    @event.listens_for(motor.pool, "checkin")
+    def _devolucion(conexion_dbapi, registro):
+        if registro is not None:
+            _soltar_turno(registro.info)
+
+
+def crear_engine(url: str):
+    if not url.startswith("sqlite"):
+        return create_engine(url)
+    motor = create_engine(url, connect_args={"timeout": SQLITE_ESPERA_S, "check_same_thread": False})
+    configurar_sqlite(motor)
+    return motor
+
+
+engine = crear_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -14,4 +98,118 @@ def get_db_session() -> Generator:
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# ====================================================================
+# Réplica de lectura
+# ====================================================================
+# Con REPLICA_DATABASE_URL definida, los endpoints de solo lectura (listados,
+# dashboard, reportes) usan get_db_lectura / abrir_sesion_lectura y consultan
+# la réplica. Si no está definida, la réplica es el mismo engine primario.
+#
+# - Si la réplica no responde se lee de la primaria (el chequeo se memoriza
+#   REPLICA_REVISION_S segundos para no pagar un SELECT 1 por petición).
+# - Leer lo propio: un cliente que acaba de escribir lee de la primaria
+#   durante LECTURA_PROPIA_S segundos (cookie o cabecera X-Leer-Primaria),
+#   así no ve datos anteriores a su escritura por el retraso de replicación.
+
+REPLICA_DATABASE_URL = os.getenv("REPLICA_DATABASE_URL")
+REPLICA_REVISION_S = float(os.getenv("REPLICA_REVISION_S", 10))
+LECTURA_PROPIA_S = int(os.getenv("LECTURA_PROPIA_S", 5))
+COOKIE_LECTURA_PROPIA = "leer_primaria"
+
+engine_lectura = crear_engine(REPLICA_DATABASE_URL) if REPLICA_DATABASE_URL else engine
+SessionLectura = sessionmaker(autocommit=False, autoflush=False, bind=engine_lectura)
+
+_estado_replica = {"disponible": True, "revisada": 0.0}
+
+
+def replica_disponible() -> bool:
+    if engine_lectura is engine:
+        return False
+    ahora = time.monotonic()
+    if ahora - _estado_replica["revisada"] >= REPLICA_REVISION_S:
+        try:
+            with engine_lectura.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            disponible = True
+        except Exception:
+            disponible = False
+        if disponible != _estado_replica["disponible"]:
+            logger.warning("Réplica de lectura %s", "disponible" if disponible else "NO disponible; se lee de la primaria")
+        _estado_replica.update(disponible=disponible, revisada=ahora)
+    return _estado_replica["disponible"]
+
+
+class ContextoPeticion:
+    """Qué hizo la petición en curso con la base (lo llena la sesión, lo lee el middleware)."""
+    __slots__ = ("forzar_primaria", "escribio", "leyo_replica")
+
+    def __init__(self, forzar_primaria: bool = False):
+        self.forzar_primaria = forzar_primaria
+        self.escribio = False
+        self.leyo_replica = False
+
+
+contexto_peticion: ContextVar[Optional[ContextoPeticion]] = ContextVar("contexto_peticion", default=None)
+
+
+@event.listens_for(engine, "commit")
+def _marcar_escritura(conn):
+    contexto = contexto_peticion.get()
+    if contexto is not None:
+        contexto.escribio = True
+
+
+def abrir_sesion_lectura() -> Session:
+    """Sesión para consultas de solo lectura: réplica si procede, si no la primaria."""
+    contexto = contexto_peticion.get()
+    if contexto is not None and contexto.forzar_primaria:
+        return SessionLocal()
+    if not replica_disponible():
+        return SessionLocal()
+    if contexto is not None:
+        contexto.leyo_replica = True
+    return SessionLectura()
+
+
+def get_db_lectura() -> Generator:
+    db = abrir_sesion_lectura()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+class LecturaPropiaMiddleware:
+    """Crea el ContextoPeticion y, si la petición escribió, marca al cliente para leer de la primaria."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        cabeceras = dict(scope.get("headers") or [])
+        forzar = (
+            cabeceras.get(b"x-leer-primaria") == b"1"
+            or f"{COOKIE_LECTURA_PROPIA}=1".encode() in cabeceras.get(b"cookie", b"")
+        )
+        contexto = ContextoPeticion(forzar_primaria=forzar)
+        token = contexto_peticion.set(contexto)
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start" and contexto.escribio and engine_lectura is not engine:
+                mensaje.setdefault("headers", [])
+                mensaje["headers"] = list(mensaje["headers"]) + [(
+                    b"set-cookie",
+                    f"{COOKIE_LECTURA_PROPIA}=1; Max-Age={LECTURA_PROPIA_S}; Path=/; HttpOnly; SameSite=Lax".encode(),
+                )]
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            contexto_peticion.reset(token)
@@ -0,0 +1,28 @@
+# dialectos.py
+"""
+Expresiones SQL que se compilan distinto según el motor (PostgreSQL o SQLite).
+
+SQLite no tiene NUMERIC exacto: guarda los valores DECIMAL como REAL y su
+SUM() acumula el error de coma flotante. suma_dinero() suma allí centavos
+enteros y divide al final, así el total coincide con el de PostgreSQL.
+"""
+
+from sqlalchemy import Numeric
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import GenericFunction
+
+
+class suma_dinero(GenericFunction):
+    """SUM() de una columna de dinero (2 decimales), exacta en ambos motores."""
+    type = Numeric(18, 2)
+    inherit_cache = True
+
+
+@compiles(suma_dinero)
+def _suma_dinero(elemento, compilador, **kw):
+    return f"SUM({compilador.process(elemento.clauses, **kw)})"
+
+
+@compiles(suma_dinero, "sqlite")
+def _suma_dinero_sqlite(elemento, compilador, **kw):
+    return f"(SUM(CAST(ROUND(({compilador.process(elemento.clauses, **kw)}) * 100) AS INTEGER)) / 100.0)"
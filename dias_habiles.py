@@ -0,0 +1,225 @@
+# dias_habiles.py
+"""
+Vencimientos en días hábiles colombianos.
+
+Los términos de respuesta a una glosa se cuentan en días hábiles (lunes a
+viernes, sin festivos). Los festivos están precalculados en la tabla
+festivo (init_db.py la llena para varios años; se pueden añadir días
+extra a mano) y se cargan una vez en un numpy.busdaycalendar que se
+recarga solo cuando la tabla cambia.
+
+Toda la aritmética es vectorizada (numpy.busday_offset / busday_count):
+calcular o recalcular el vencimiento de miles de glosas es una sola
+operación sobre arreglos.
+
+Festivos de Colombia (Ley 51 de 1983):
+- Fijos: 1 ene, 1 may, 20 jul, 7 ago, 8 dic, 25 dic.
+- Ley Emiliani (se trasladan al lunes siguiente): 6 ene, 19 mar, 29 jun,
+  15 ago, 12 oct, 1 nov, 11 nov.
+- Según la Pascua: Jueves y Viernes Santo; Ascensión, Corpus Christi y
+  Sagrado Corazón (trasladados a lunes: Pascua + 43, + 64 y + 71 días).
+
+Uso:
+    python dias_habiles.py [--desde 2020] [--hasta 2030] [--recalcular]
+"""
+
+import logging
+import os
+import threading
+from datetime import date, timedelta
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.orm import Session
+
+import estados_glosa
+import models
+
+logger = logging.getLogger(__name__)
+
+# Término para responder una glosa, en días hábiles.
+DIAS_HABILES_RESPUESTA = int(os.getenv("DIAS_HABILES_RESPUESTA", "15"))
+SEMANA_HABIL = "1111100"
+
+# Lote por sentencia al recalcular (límite de parámetros de SQLite).
+LOTE_IDS = 5000
+
+
+# ====================================================================
+# Festivos
+# ====================================================================
+
+def pascua(anio: int) -> date:
+    """Domingo de Pascua (algoritmo anónimo gregoriano)."""
+    a, b, c = anio % 19, anio // 100, anio % 100
+    d, e = b // 4, b % 4
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 19 * l) // 433
+    mes = (h + l - 7 * m + 90) // 25
+    dia = (h + l - 7 * m + 33 * mes + 19) % 32
+    return date(anio, mes, dia)
+
+
+def _lunes_siguiente(fecha: date) -> date:
+    return fecha + timedelta(days=(7 - fecha.weekday()) % 7)
+
+
+def festivos_colombia(anio: int) -> List[Tuple[date, str]]:
+    fijos = [
+        (date(anio, 1, 1), "Año Nuevo"),
+        (date(anio, 5, 1), "Día del Trabajo"),
+        (date(anio, 7, 20), "Día de la Independencia"),
+        (date(anio, 8, 7), "Batalla de Boyacá"),
+        (date(anio, 12, 8), "Inmaculada Concepción"),
+        (date(anio, 12, 25), "Navidad"),
+    ]
+    emiliani = [
+        (_lunes_siguiente(date(anio, 1, 6)), "Reyes Magos"),
+        (_lunes_siguiente(date(anio, 3, 19)), "San José"),
+        (_lunes_siguiente(date(anio, 6, 29)), "San Pedro y San Pablo"),
+        (_lunes_siguiente(date(anio, 8, 15)), "Asunción de la Virgen"),
+        (_lunes_siguiente(date(anio, 10, 12)), "Día de la Raza"),
+        (_lunes_siguiente(date(anio, 11, 1)), "Todos los Santos"),
+        (_lunes_siguiente(date(anio, 11, 11)), "Independencia de Cartagena"),
+    ]
+    p = pascua(anio)
+    moviles = [
+        (p - timedelta(days=3), "Jueves Santo"),
+        (p - timedelta(days=2), "Viernes Santo"),
+        (p + timedelta(days=43), "Ascensión del Señor"),
+        (p + timedelta(days=64), "Corpus Christi"),
+        (p + timedelta(days=71), "Sagrado Corazón"),
+    ]
+    return sorted(fijos + emiliani + moviles)
+
+
+def poblar_festivos(db: Session, anios: Iterable[int]) -> int:
+    """Inserta los festivos de `anios` que falten en la tabla (sin commit)."""
+    nuevos = {f: n for anio in anios for f, n in festivos_colombia(anio)}
+    existentes = set(db.execute(select(models.Festivo.fecha).where(models.Festivo.fecha.in_(list(nuevos)))).scalars())
+    filas = [{"fecha": f, "nombre": n} for f, n in nuevos.items() if f not in existentes]
+    if filas:
+        db.execute(insert(models.Festivo), filas)
+    return len(filas)
+
+
+# ====================================================================
+# Calendario (caché por proceso)
+# ====================================================================
+
+_calendario = None  # (versión de la tabla festivo, busdaycalendar)
+_candado = threading.Lock()
+
+
+def calendario(db: Session):
+    """busdaycalendar con los festivos de la tabla; se recarga si la tabla cambió."""
+    import numpy as np
+    from cache_http import version_tablas
+
+    global _calendario
+    version = version_tablas(("festivo",))
+    with _candado:
+        if _calendario is not None and _calendario[0] == version:
+            return _calendario[1]
+    festivos = list(db.execute(select(models.Festivo.fecha)).scalars())
+    if not festivos:
+        # Tabla vacía (init_db.py no corrió): festivos calculados alrededor de hoy.
+        anio = date.today().year
+        festivos = [f for a in range(anio - 2, anio + 3) for f, _ in festivos_colombia(a)]
+    cal = np.busdaycalendar(weekmask=SEMANA_HABIL, holidays=np.array(festivos, dtype="datetime64[D]"))
+    with _candado:
+        _calendario = (version, cal)
+    return cal
+
+
+# ====================================================================
+# Aritmética vectorizada
+# ====================================================================
+
+def sumar(cal, fechas: Sequence[date], dias: int):
+    """
+    `dias` días hábiles después de cada fecha (arreglo datetime64[D]).
+    Una fecha no hábil cuenta desde el siguiente día hábil.
+    """
+    import numpy as np
+
+    return np.busday_offset(np.asarray(fechas, dtype="datetime64[D]"), dias, roll="forward", busdaycal=cal)
+
+
+def restantes(cal, hoy: date, fechas: Sequence[date]):
+    """Días hábiles de hoy a cada fecha (negativos si ya pasó)."""
+    import numpy as np
+
+    return np.busday_count(np.datetime64(hoy, "D"), np.asarray(fechas, dtype="datetime64[D]"), busdaycal=cal)
+
+
+def vencimiento(db: Session, fecha_glosa: date, dias: int = DIAS_HABILES_RESPUESTA) -> date:
+    return sumar(calendario(db), [fecha_glosa], dias)[0].item()
+
+
+def calcular_vencimientos(db: Session, fechas_glosa: Sequence[date], dias: int = DIAS_HABILES_RESPUESTA) -> List[date]:
+    return sumar(calendario(db), fechas_glosa, dias).tolist()
+
+
+def recalcular_vencimientos(
+    db: Session, ids: Optional[Iterable[int]] = None, dias: int = DIAS_HABILES_RESPUESTA
+) -> int:
+    """
+    Recalcula fecha_vencimiento_respuesta de las glosas de `ids` (None: todas
+    las que aún esperan respuesta) con un UPDATE executemany por lote (sin
+    commit). Devuelve cuántas se actualizaron.
+    """
+    import vencimientos as colas  # vencimientos importa este módulo
+
+    glosa = models.Glosa.__table__
+    stmt = select(glosa.c.id_glosa, glosa.c.fecha_glosa)
+    if ids is None:
+        stmt = stmt.where(glosa.c.estado_glosa.in_(estados_glosa.ESTADOS_POR_RESPONDER))
+        filas = db.execute(stmt).all()
+    else:
+        ids = list(ids)
+        filas = []
+        for i in range(0, len(ids), LOTE_IDS):
+            filas += db.execute(stmt.where(glosa.c.id_glosa.in_(ids[i:i + LOTE_IDS]))).all()
+    if not filas:
+        return 0
+
+    nuevas = calcular_vencimientos(db, [f.fecha_glosa for f in filas], dias)
+    actualizar = (
+        update(glosa)
+        .where(glosa.c.id_glosa == bindparam("b_id"))
+        .values(fecha_vencimiento_respuesta=bindparam("b_vence"))
+    )
+    for i in range(0, len(filas), LOTE_IDS):
+        db.execute(actualizar, [
+            {"b_id": f.id_glosa, "b_vence": v}
+            for f, v in zip(filas[i:i + LOTE_IDS], nuevas[i:i + LOTE_IDS])
+        ])
+    colas.marcar(db, [f.id_glosa for f in filas])
+    return len(filas)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Festivos y vencimientos en días hábiles")
+    parser.add_argument("--desde", type=int, default=date.today().year - 5, help="primer año de festivos")
+    parser.add_argument("--hasta", type=int, default=date.today().year + 5, help="último año de festivos")
+    parser.add_argument("--recalcular", action="store_true", help="recalcula el vencimiento de las glosas abiertas")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        logger.info("Festivos nuevos: %d", poblar_festivos(db, range(args.desde, args.hasta + 1)))
+        db.commit()
+        if args.recalcular:
+            logger.info("Vencimientos recalculados: %d", recalcular_vencimientos(db))
+            db.commit()
+    finally:
+        db.close()
@@ -0,0 +1,161 @@
+# duplicados.py
+"""
+Detección de glosas duplicadas.
+
+Cada glosa lleva una huella: SHA-256 de (factura, motivo, valor en
+centavos, fecha de la glosa). La calcula el ORM al insertar o actualizar
+(eventos de mapper) y las cargas masivas la usan para descartar filas
+repetidas antes de escribir. Las consultas por huella miran también
+glosa_archivo: una glosa archivada no se puede registrar de nuevo. Un índice único parcial (huella IS NOT NULL)
+impide registrar la misma glosa dos veces, incluso con dos peticiones a la
+vez; las glosas anteriores a la columna se rellenan con rellenar_huellas(),
+que deja sin huella (y reporta) las repetidas que ya existían.
+
+Los casi duplicados (misma factura y motivo, valor dentro de una
+tolerancia) se buscan con una sola pasada ordenada por el índice
+(id_factura, id_motivo_glosa, valor_glosado): LAG() compara cada glosa con
+la anterior de su grupo, sin comparar todas contra todas.
+
+Uso:
+    python duplicados.py   # rellena las huellas que falten
+"""
+
+import hashlib
+import logging
+from datetime import date
+from decimal import Decimal
+from typing import List, Optional
+
+from sqlalchemy import bindparam, event, func, select, update
+from sqlalchemy.orm import Session
+
+import models
+from alcance import Alcance, TOTAL
+
+logger = logging.getLogger(__name__)
+
+LOTE_IDS = 5000
+CAMPOS_HUELLA = ("id_factura", "id_motivo_glosa", "valor_glosado", "fecha_glosa")
+
+
+def huella(id_factura: int, id_motivo_glosa: int, valor_glosado, fecha_glosa: date) -> str:
+    """Huella determinista de una glosa (hex de 64 caracteres)."""
+    centavos = int(Decimal(str(valor_glosado)).scaleb(2).to_integral_value())
+    return hashlib.sha256(f"{int(id_factura)}|{int(id_motivo_glosa)}|{centavos}|{fecha_glosa.isoformat()}".encode()).hexdigest()
+
+
+@event.listens_for(models.Glosa, "before_insert")
+@event.listens_for(models.Glosa, "before_update")
+def _asignar_huella(mapper, connection, glosa):
+    valores = [getattr(glosa, c) for c in CAMPOS_HUELLA]
+    if all(v is not None for v in valores):
+        glosa.huella = huella(*valores)
+
+
+def get_glosa_por_huella(db: Session, valor: str, excluir: Optional[int] = None):
+    """Glosa (caliente o archivada) con esa huella, salvo la de id `excluir`."""
+    for modelo in (models.Glosa, models.GlosaArchivo):
+        consulta = db.query(modelo).filter(modelo.huella == valor)
+        if excluir is not None:
+            consulta = consulta.filter(modelo.id_glosa != excluir)
+        encontrada = consulta.first()
+        if encontrada is not None:
+            return encontrada
+    return None
+
+
+def existentes(db: Session, huellas: List[str]) -> set:
+    """Huellas de la lista ya registradas, calientes o archivadas (consulta por índice, por lotes)."""
+    encontradas = set()
+    for modelo in (models.Glosa, models.GlosaArchivo):
+        for i in range(0, len(huellas), LOTE_IDS):
+            encontradas.update(db.execute(
+                select(modelo.huella).where(modelo.huella.in_(huellas[i:i + LOTE_IDS]))
+            ).scalars())
+    return encontradas
+
+
+def casi_duplicadas(
+    db: Session, tolerancia: Decimal = Decimal("0"), id_factura: Optional[int] = None,
+    alcance: Alcance = TOTAL, skip: int = 0, limit: int = 100,
+) -> List[dict]:
+    """
+    Pares (glosa, glosa anterior) de la misma factura y motivo cuyo valor
+    difiere en `tolerancia` pesos o menos. Con tolerancia 0 son duplicados
+    exactos de valor (la fecha puede diferir).
+    """
+    g = models.Glosa
+    grupo = {"partition_by": (g.id_factura, g.id_motivo_glosa), "order_by": (g.valor_glosado, g.id_glosa)}
+    ordenadas = select(
+        g.id_glosa, g.id_factura, g.id_motivo_glosa, g.valor_glosado, g.fecha_glosa, g.estado_glosa, g.huella,
+        func.lag(g.id_glosa).over(**grupo).label("id_glosa_previa"),
+        func.lag(g.valor_glosado).over(**grupo).label("valor_previo"),
+        func.lag(g.fecha_glosa).over(**grupo).label("fecha_previa"),
+    )
+    if id_factura is not None:
+        ordenadas = ordenadas.where(g.id_factura == id_factura)
+    ordenadas = alcance.restringir(ordenadas, g).subquery()
+    diferencia = func.round(ordenadas.c.valor_glosado - ordenadas.c.valor_previo, 2)
+    stmt = (
+        select(ordenadas, diferencia.label("diferencia"))
+        .where(ordenadas.c.id_glosa_previa.is_not(None), diferencia <= tolerancia)
+        .order_by(ordenadas.c.id_factura, ordenadas.c.id_motivo_glosa, ordenadas.c.valor_glosado, ordenadas.c.id_glosa)
+        .offset(skip)
+        .limit(limit)
+    )
+    return [
+        {
+            "id_glosa": f.id_glosa,
+            "id_glosa_previa": f.id_glosa_previa,
+            "id_factura": f.id_factura,
+            "id_motivo_glosa": f.id_motivo_glosa,
+            "valor_glosado": f.valor_glosado,
+            "valor_previo": f.valor_previo,
+            "diferencia": Decimal(str(f.diferencia)).quantize(Decimal("0.01")),
+            "fecha_glosa": f.fecha_glosa,
+            "fecha_previa": f.fecha_previa,
+            "estado_glosa": f.estado_glosa,
+        }
+        for f in db.execute(stmt)
+    ]
+
+
+def rellenar_huellas(db: Session) -> dict:
+    """
+    Calcula la huella de las glosas que no la tienen (sin commit). En cada
+    grupo repetido la conserva la de menor id; las demás quedan sin huella
+    y se devuelven en "repetidas" para revisarlas.
+    """
+    g = models.Glosa.__table__
+    filas = db.execute(select(g.c.id_glosa, *[g.c[c] for c in CAMPOS_HUELLA]).where(g.c.huella.is_(None)).order_by(g.c.id_glosa)).all()
+    calculadas = {}
+    repetidas = []
+    usadas = existentes(db, list({huella(*f[1:]) for f in filas}))
+    for f in filas:
+        h = huella(*f[1:])
+        if h in usadas:
+            repetidas.append(f.id_glosa)
+            continue
+        usadas.add(h)
+        calculadas[f.id_glosa] = h
+
+    actualizar = update(g).where(g.c.id_glosa == bindparam("b_id")).values(huella=bindparam("b_huella"))
+    pares = [{"b_id": i, "b_huella": h} for i, h in calculadas.items()]
+    for i in range(0, len(pares), LOTE_IDS):
+        db.execute(actualizar, pares[i:i + LOTE_IDS])
+    return {"rellenadas": len(calculadas), "repetidas": repetidas}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        resultado = rellenar_huellas(db)
+        db.commit()
+        logger.info("Huellas rellenadas: %d; glosas repetidas sin huella: %d", resultado["rellenadas"], len(resultado["repetidas"]))
+        for id_glosa in resultado["repetidas"][:100]:
+            print(f"  glosa repetida: {id_glosa}")
+    finally:
+        db.close()
@@ -0,0 +1,70 @@
+# estados_glosa.py
+"""
+Ciclo de vida de una glosa: único lugar donde se decide qué cambios de
+estado son válidos.
+
+    Pendiente -> En revisión -> Respondida -> Aceptada | Rechazada -> Conciliada
+
+con atajos (aceptar o rechazar sin responder, conciliar lo respondido) y
+regresos a revisión; ver TRANSICIONES. Conciliada es final.
+
+Las transiciones masivas (POST /glosas/transiciones) y las individuales
+(PUT /glosas/{id}, formulario de /glosas-view) pasan por aquí.
+"""
+
+from typing import Dict, FrozenSet, Tuple
+
+PENDIENTE = "Pendiente"
+EN_REVISION = "En revisión"
+RESPONDIDA = "Respondida"
+ACEPTADA = "Aceptada"
+RECHAZADA = "Rechazada"
+CONCILIADA = "Conciliada"
+
+ESTADOS: Tuple[str, ...] = (PENDIENTE, EN_REVISION, RESPONDIDA, ACEPTADA, RECHAZADA, CONCILIADA)
+
+TRANSICIONES: Dict[str, FrozenSet[str]] = {
+    PENDIENTE: frozenset({EN_REVISION, RESPONDIDA, ACEPTADA, RECHAZADA}),
+    EN_REVISION: frozenset({PENDIENTE, RESPONDIDA, ACEPTADA, RECHAZADA}),
+    RESPONDIDA: frozenset({EN_REVISION, ACEPTADA, RECHAZADA, CONCILIADA}),
+    ACEPTADA: frozenset({CONCILIADA}),
+    RECHAZADA: frozenset({EN_REVISION, CONCILIADA}),
+    CONCILIADA: frozenset(),
+}
+
+# Sin gestión pendiente por parte de la IPS (ver archivo.py).
+ESTADOS_CERRADOS: Tuple[str, ...] = (RESPONDIDA, ACEPTADA, RECHAZADA, CONCILIADA)
+# Corre el término de respuesta (alertas, semáforo, vencimientos).
+ESTADOS_POR_RESPONDER: Tuple[str, ...] = tuple(e for e in ESTADOS if e not in ESTADOS_CERRADOS)
+
+
+class TransicionInvalida(ValueError):
+    def __init__(self, actual: str, nuevo: str):
+        self.actual = actual
+        self.nuevo = nuevo
+        super().__init__(f"No se permite pasar de '{actual}' a '{nuevo}'")
+
+
+class EstadoDesconocido(ValueError):
+    def __init__(self, estado: str):
+        self.estado = estado
+        super().__init__(f"Estado de glosa desconocido: '{estado}'. Válidos: {', '.join(ESTADOS)}")
+
+
+def validar_estado(estado: str) -> str:
+    if estado not in TRANSICIONES:
+        raise EstadoDesconocido(estado)
+    return estado
+
+
+def origenes(destino: str) -> Tuple[str, ...]:
+    """Estados desde los que se puede llegar a `destino`."""
+    validar_estado(destino)
+    return tuple(e for e in ESTADOS if destino in TRANSICIONES[e])
+
+
+def validar_transicion(actual: str, nuevo: str) -> None:
+    """Lanza TransicionInvalida si el cambio no está permitido (quedarse igual sí lo está)."""
+    validar_estado(nuevo)
+    if actual != nuevo and nuevo not in TRANSICIONES.get(actual, frozenset()):
+        raise TransicionInvalida(actual, nuevo)
@@ -0,0 +1,249 @@
+# facturas_dian.py
+"""
+Carga masiva de facturas electrónicas DIAN (UBL 2.1) en la tabla factura.
+
+Entrada: un ZIP o un directorio con los XML (Invoice o AttachedDocument).
+
+1. Los archivos se parsean en un pool de procesos (ubl.parsear_archivo,
+   iterparse sin DOM). A cada proceso se le pasa solo (ruta, miembro): lee
+   el archivo él mismo, así el proceso principal no carga los XML.
+2. Los resultados se agrupan en lotes. Por lote:
+   - instituciones por NIT: INSERT ... ON CONFLICT DO NOTHING (emisor como
+     IPS, adquirente como EPS) y un SELECT de sus ids;
+   - facturas por numero_factura: INSERT ... ON CONFLICT DO UPDATE (una
+     factura que se vuelve a cargar actualiza fecha, valor e instituciones,
+     sin tocar su estado).
+   Cada lote se confirma por separado.
+3. Antes de escribir, cada factura pasa por validaciones.REGLAS_FACTURA y
+   por el alcance de quien carga: las que incumplen una regla, las de otra
+   institución (nueva o ya registrada) y las registradas que ya avanzaron
+   de estado (ESTADO_ACTUALIZABLE) vuelven en "rechazadas" y no se
+   escriben.
+
+Uso:
+    python facturas_dian.py facturas.zip|directorio/ [--procesos 4] [--lote 500]
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import crud
+import cubos
+import models
+import ubl
+import validaciones
+from alcance import Alcance, TOTAL
+
+logger = logging.getLogger(__name__)
+
+# Facturas por lote de upsert y archivos por tarea enviada al pool.
+LOTE = int(os.getenv("DIAN_LOTE", "500"))
+ARCHIVOS_POR_TAREA = 64
+# Una factura ya registrada solo se actualiza mientras no haya avanzado
+# (radicada, glosada, pagada...).
+ESTADO_ACTUALIZABLE = "Emitida"
+
+
+def origenes(ruta: str) -> List[Tuple[str, Optional[str]]]:
+    """(ruta, miembro) de cada XML de un ZIP, o (ruta, None) de cada XML de un directorio."""
+    if os.path.isdir(ruta):
+        return [
+            (os.path.join(carpeta, nombre), None)
+            for carpeta, _, nombres in os.walk(ruta)
+            for nombre in sorted(nombres)
+            if nombre.lower().endswith(".xml")
+        ]
+    with zipfile.ZipFile(ruta) as z:
+        return [(ruta, m) for m in z.namelist() if m.lower().endswith(".xml")]
+
+
+def parsear_todos(tareas: List[Tuple[str, Optional[str]]], procesos: Optional[int] = None) -> Iterator[dict]:
+    """Parsea en un pool (spawn: seguro desde un servidor con hilos); con procesos=1, en este proceso."""
+    procesos = procesos or os.cpu_count() or 1
+    if procesos == 1 or len(tareas) <= ARCHIVOS_POR_TAREA:
+        yield from map(ubl.parsear_archivo, tareas)
+        return
+    with ProcessPoolExecutor(max_workers=procesos, mp_context=multiprocessing.get_context("spawn")) as pool:
+        yield from pool.map(ubl.parsear_archivo, tareas, chunksize=ARCHIVOS_POR_TAREA)
+
+
+def _rechazo(factura: dict, reglas) -> dict:
+    return {
+        "archivo": factura.get("archivo"),
+        "numero_factura": factura["numero_factura"],
+        "error": "; ".join(r.mensaje for r in reglas),
+        "errores": [r.como_dict() for r in reglas],
+    }
+
+
+_FUERA_DE_ALCANCE = validaciones.requerido(
+    "en_alcance", "la factura no pertenece a la institución del usuario", "fuera_de_alcance",
+)
+_NO_ACTUALIZABLE = validaciones.requerido(
+    "actualizable", "la factura ya registrada avanzó de estado y no se sobrescribe", "estado_no_actualizable",
+)
+
+
+def filtrar_lote(db: Session, facturas: List[dict], alcance: Alcance = TOTAL) -> Tuple[List[dict], List[dict]]:
+    """
+    (facturas a escribir, rechazadas) de un lote: REGLAS_FACTURA, alcance de
+    quien carga (por las instituciones de la factura nueva y, si ya existe,
+    de la registrada) y estado de la registrada.
+    """
+    import pandas as pd
+
+    facturas = list({f["numero_factura"]: f for f in facturas}.values())  # la última carga gana
+    if not facturas:
+        return [], []
+    df = pd.DataFrame([
+        {
+            "numero_factura": f["numero_factura"], "fecha_emision": f["fecha_emision"],
+            "valor_total_factura": f["valor_total_factura"],
+            "nit_emisora": f["nit_emisor"], "nit_receptora": f["nit_receptor"],
+        }
+        for f in facturas
+    ])
+    infracciones = validaciones.validar_tabla(df, validaciones.REGLAS_FACTURA)
+
+    # Instituciones ya registradas; una nueva nunca está en un alcance restringido.
+    nits = {f["nit_emisor"] for f in facturas} | {f["nit_receptor"] for f in facturas}
+    ids = dict(db.execute(
+        select(models.Institucion.nit, models.Institucion.id_institucion).where(models.Institucion.nit.in_(list(nits)))
+    ).all())
+    previas = {
+        p.numero_factura: p
+        for p in db.execute(
+            select(
+                models.Factura.numero_factura, models.Factura.id_institucion_emisora,
+                models.Factura.id_institucion_receptora, models.Factura.estado_factura,
+            ).where(models.Factura.numero_factura.in_([f["numero_factura"] for f in facturas]))
+        )
+    }
+
+    escribir, rechazadas = [], []
+    for i, f in enumerate(facturas):
+        reglas = list(infracciones.get(i, ()))
+        previa = previas.get(f["numero_factura"])
+        if not alcance.admite_factura(ids.get(f["nit_emisor"]), ids.get(f["nit_receptor"])) or (
+            previa is not None and not alcance.admite_factura(previa.id_institucion_emisora, previa.id_institucion_receptora)
+        ):
+            reglas.append(_FUERA_DE_ALCANCE)
+        elif previa is not None and previa.estado_factura != ESTADO_ACTUALIZABLE:
+            reglas.append(_NO_ACTUALIZABLE)
+        if reglas:
+            rechazadas.append(_rechazo(f, reglas))
+        else:
+            escribir.append(f)
+    return escribir, rechazadas
+
+
+def guardar_lote(db: Session, facturas: List[dict]) -> int:
+    """
+    Upsert de instituciones y facturas de un lote ya filtrado (filtrar_lote),
+    sin commit. Devuelve facturas escritas.
+    """
+    facturas = list({f["numero_factura"]: f for f in facturas}.values())  # la última carga gana
+    if not facturas:
+        return 0
+    instituciones: Dict[str, dict] = {}
+    for f in facturas:
+        instituciones.setdefault(f["nit_emisor"], {"nit": f["nit_emisor"], "razon_social": f["razon_social_emisor"], "tipo_institucion": "IPS"})
+        instituciones.setdefault(f["nit_receptor"], {"nit": f["nit_receptor"], "razon_social": f["razon_social_receptor"], "tipo_institucion": "EPS"})
+    # Meses de los cubos afectados: los nuevos, y los anteriores de las facturas que ya existían.
+    previas = db.execute(
+        select(models.Factura.id_factura, models.Factura.fecha_emision)
+        .where(models.Factura.numero_factura.in_([f["numero_factura"] for f in facturas]))
+    ).all()
+    cubos.marcar(
+        db,
+        periodos=[cubos.periodo_de(f) for f in {f["fecha_emision"] for f in facturas} | {p.fecha_emision for p in previas}],
+        facturas=[p.id_factura for p in previas],
+    )
+    crud.upsert(db, models.Institucion, list(instituciones.values()), ["nit"])
+    ids = dict(db.execute(
+        select(models.Institucion.nit, models.Institucion.id_institucion).where(models.Institucion.nit.in_(list(instituciones)))
+    ).all())
+
+    crud.upsert(
+        db, models.Factura,
+        [
+            {
+                "numero_factura": f["numero_factura"],
+                "id_institucion_emisora": ids[f["nit_emisor"]],
+                "id_institucion_receptora": ids[f["nit_receptor"]],
+                "fecha_emision": f["fecha_emision"],
+                "nombre_eps": f["razon_social_receptor"],
+                "valor_total_factura": f["valor_total_factura"],
+                "estado_factura": "Emitida",
+            }
+            for f in facturas
+        ],
+        ["numero_factura"],
+        actualizar=["id_institucion_emisora", "id_institucion_receptora", "fecha_emision", "nombre_eps", "valor_total_factura"],
+        # También en la sentencia: una factura que avanzó después de filtrar_lote no se pisa.
+        donde=models.Factura.__table__.c.estado_factura == ESTADO_ACTUALIZABLE,
+    )
+    return len(facturas)
+
+
+def importar(db: Session, ruta: str, procesos: Optional[int] = None, lote: int = LOTE, alcance: Alcance = TOTAL) -> dict:
+    """
+    Carga todos los XML de `ruta` (ZIP o directorio) dentro de `alcance`.
+    Devuelve el resumen con los rechazados (ilegibles o por filtrar_lote).
+    """
+    tareas = origenes(ruta)
+    cargadas = 0
+    rechazadas: List[dict] = []
+    pendientes: List[dict] = []
+
+    def confirmar():
+        nonlocal cargadas
+        try:
+            validas, descartadas = filtrar_lote(db, pendientes, alcance)
+            rechazadas.extend(descartadas)
+            cargadas += guardar_lote(db, validas)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        pendientes.clear()
+
+    for resultado in parsear_todos(tareas, procesos):
+        if "error" in resultado:
+            rechazadas.append(resultado)
+            continue
+        pendientes.append(resultado)
+        if len(pendientes) >= lote:
+            confirmar()
+            logger.info("Facturas DIAN cargadas: %d de %d", cargadas, len(tareas))
+    if pendientes:
+        confirmar()
+    return {"archivos": len(tareas), "cargadas": cargadas, "rechazadas": rechazadas}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("ruta", help="ZIP o directorio con los XML")
+    parser.add_argument("--procesos", type=int, default=None)
+    parser.add_argument("--lote", type=int, default=LOTE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        resumen = importar(db, args.ruta, procesos=args.procesos, lote=args.lote)
+        print(f"Archivos: {resumen['archivos']:,}  cargadas: {resumen['cargadas']:,}  rechazadas: {len(resumen['rechazadas']):,}")
+        for r in resumen["rechazadas"][:50]:
+            print(f"  {r['archivo']}: {r['error']}")
+    finally:
+        db.close()
@@ -0,0 +1,45 @@
+# gunicorn.conf.py
+"""
+Perfil de producción: gunicorn con workers uvicorn.
+
+    gunicorn -c gunicorn.conf.py main:app
+
+- Un worker por núcleo (WEB_CONCURRENCY para fijarlo): una importación de
+  Excel o un login con bcrypt ya no bloquea a todos los clientes.
+- preload_app importa la app una vez en el maestro y los workers la heredan
+  por fork (arranque más rápido y memoria compartida copy-on-write).
+- max_requests recicla cada worker de forma escalonada (jitter) para acotar
+  fugas de memoria; graceful_timeout deja terminar las peticiones en curso.
+- El estado que deben ver todos los workers (versiones de la caché HTTP,
+  métricas) va al almacén compartido; ver almacen.py.
+"""
+
+import multiprocessing
+import os
+
+# Debe fijarse antes de que preload_app importe main (y con él almacen.py).
+os.environ.setdefault("ALMACEN_COMPARTIDO_URL", "sqlite:////tmp/glosas_almacen.sqlite")
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", max(2, multiprocessing.cpu_count())))
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = True
+
+max_requests = int(os.getenv("MAX_REQUESTS", 2000))
+max_requests_jitter = 200
+graceful_timeout = 30
+timeout = 120
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
+
+
+def post_fork(server, worker):
+    # Las conexiones abiertas por el maestro (p. ej. el chequeo de arranque) no
+    # se pueden compartir entre procesos: cada worker abre las suyas, también
+    # las de la réplica de lectura si hay una.
+    from database import engine, engine_lectura
+    engine.dispose(close=False)
+    if engine_lectura is not engine:
+        engine_lectura.dispose(close=False)
@@ -1,12 +1,77 @@
 # init_db.py
-import asyncio
-from database import Base, engine
-from models import *  # Importa todos los modelos de tu proyecto
+"""
+Crea las tablas que falten. Es el paso explícito de gestión de esquema:
+se ejecuta una vez por despliegue (antes de levantar los workers), no al
+importar la aplicación.
 
-async def init():
+    python init_db.py
+"""
+import logging
+from datetime import date
+
+from sqlalchemy import inspect, text
+
+from database import Base, SessionLocal, engine
+import models  # noqa: F401  Registra todos los modelos en Base.metadata
+import auditoria
+import dias_habiles
+import duplicados
+import cubos
+
+logger = logging.getLogger(__name__)
+
+def agregar_columnas_faltantes():
+    """
+    create_all no altera tablas existentes: añade (ALTER TABLE ... ADD COLUMN)
+    las columnas de los modelos que aún no existen. Solo columnas que
+    admiten NULL; las demás requieren una migración a mano.
+    """
+    inspector = inspect(engine)
+    tablas = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for tabla in Base.metadata.sorted_tables:
+            if tabla.name not in tablas:
+                continue
+            existentes = {c["name"] for c in inspector.get_columns(tabla.name)}
+            for columna in tabla.columns:
+                if columna.name in existentes:
+                    continue
+                if not columna.nullable:
+                    logger.warning("Columna %s.%s NOT NULL sin crear: requiere migración", tabla.name, columna.name)
+                    continue
+                tipo = columna.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {tabla.name} ADD COLUMN {columna.name} {tipo}'))
+                logger.info("Columna añadida: %s.%s", tabla.name, columna.name)
+
+def init():
     # Crea todas las tablas definidas en tus modelos
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    Base.metadata.create_all(bind=engine)
+    agregar_columnas_faltantes()
+    # create_all no toca las tablas existentes: los índices añadidos después
+    # a un modelo se crean aquí.
+    for tabla in Base.metadata.sorted_tables:
+        for indice in tabla.indexes:
+            indice.create(bind=engine, checkfirst=True)
+    # Particiones mensuales de la bitácora, por adelantado (PostgreSQL).
+    with engine.begin() as conn:
+        auditoria.asegurar_particiones(conn)
+    # Calendario de festivos para el cálculo de vencimientos en días hábiles.
+    db = SessionLocal()
+    try:
+        anio = date.today().year
+        dias_habiles.poblar_festivos(db, range(anio - 5, anio + 6))
+        # Huella de las glosas registradas antes de la columna.
+        repetidas = duplicados.rellenar_huellas(db)["repetidas"]
+        if repetidas:
+            logger.warning("%d glosas repetidas quedaron sin huella (python duplicados.py las lista)", len(repetidas))
+        # Cubos de análisis: se construyen la primera vez; después se mantienen solos.
+        if db.query(models.CuboGlosas).first() is None and db.query(models.CuboFacturas).first() is None:
+            logger.info("Cubos construidos: %s", cubos.reconstruir(db))
+        db.commit()
+    finally:
+        db.close()
 
 if __name__ == "__main__":
-    asyncio.run(init())
+    logging.basicConfig(level=logging.INFO)
+    init()
+    logger.info("Esquema listo: %s", ", ".join(Base.metadata.tables))
@@ -1,18 +1,53 @@
-from fastapi import FastAPI, Request, Form, UploadFile, File
-from fastapi.responses import RedirectResponse, StreamingResponse
+from fastapi import FastAPI, Request, Form, UploadFile, File, HTTPException, Depends
+from fastapi.responses import RedirectResponse, StreamingResponse, PlainTextResponse, JSONResponse, Response
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
-import pandas as pd
+from sqlalchemy import func, select, text
+from contextlib import asynccontextmanager
 import io
 import os
-from datetime import date, timedelta
+import logging
+from datetime import date
+
+# pandas/openpyxl se importan dentro de los endpoints de importación y reporte:
+# cargarlos aquí duplica el tiempo de arranque de cada worker.
 
 # DB
-from database import engine, Base, SessionLocal
+from database import engine, engine_lectura, Base, SessionLocal, abrir_sesion_lectura, LecturaPropiaMiddleware
 
 # MODELOS (IMPORTANTE)
 import models
+import estados_glosa
+
+# CACHÉ HTTP
+import cache_http
+from serializacion import RespuestaORJSON
+
+# AUDITORÍA (bitácora glosa_evento: registra sus listeners de sesión)
+import auditoria
+
+# VENCIMIENTOS (colas de alertas precalculadas y su programador)
+import vencimientos
+import dias_habiles
+
+# DUPLICADOS (huella de cada glosa)
+import duplicados
+
+# CUBOS (agregados por EPS × motivo × mes y su recálculo incremental)
+import cubos
+
+# MÉTRICAS
+import metricas
+
+# ADMISIÓN (cupos y colas para reportes, importaciones, streaming y login)
+import admision
+
+# VUELO ÚNICO (lecturas costosas idénticas y simultáneas se calculan una vez)
+import vuelo_unico
+
+# VALIDACIONES (reglas de facturas y glosas, por fila y por DataFrame)
+import validaciones
 
 # ROUTERS
 from routers import auth
@@ -23,23 +58,51 @@ from routers import facturas
 from routers import glosas
 from routers import respuestas_glosa
 from routers import adjuntos
+from routers import conciliacion
+from routers import alertas
+from routers import analytics
+
+# ALCANCE POR INSTITUCIÓN (listados, tablero y reportes)
+from alcance import Alcance
+from auth.auth import get_alcance, get_alcance_escritura, get_alcance_vista
+import auth.auth as autenticacion
+import crud
+
+logger = logging.getLogger(__name__)
 
 # =========================
-# CREAR TABLAS
+# ARRANQUE / DISPONIBILIDAD
+# El esquema ya no se crea al importar: se gestiona con `python init_db.py`
+# (una vez por despliegue, no en cada worker).
 # =========================
-print("\n--- Tablas registradas ---")
-for table in Base.metadata.tables:
-    print("-", table)
-print("--------------------------\n")
+estado_app = {"listo": False}
 
-Base.metadata.create_all(bind=engine)
+def verificar_base_datos() -> bool:
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        return True
+    except Exception:
+        logger.exception("La base de datos no responde")
+        return False
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    estado_app["listo"] = verificar_base_datos()
+    # Hilos de fondo por worker (perfilador, publicación de métricas).
+    metricas.iniciar()
+    vencimientos.iniciar()
+    cubos.iniciar()
+    yield
+    estado_app["listo"] = False
 
 # =========================
 # APP
 # =========================
 app = FastAPI(
     title="API de Trazabilidad de Glosas",
-    version="1.0"
+    version="1.0",
+    lifespan=lifespan
 )
 
 # =========================
@@ -51,6 +114,35 @@ if os.path.exists("static"):
 
 templates = Jinja2Templates(directory="templates")
 
+# =========================
+# CACHÉ HTTP (ETag, 304, compresión)
+# Se registra antes que CORS para que las respuestas 304 también lleven sus cabeceras.
+# =========================
+app.add_middleware(cache_http.CacheHTTPMiddleware)
+
+# =========================
+# ADMISIÓN (503/429 con Retry-After cuando una clase de rutas está llena)
+# Dentro de las métricas: los rechazos también cuentan en /metrics.
+# =========================
+app.add_middleware(admision.AdmisionMiddleware)
+
+# =========================
+# MÉTRICAS (latencia por ruta, consultas SQL, Server-Timing)
+# =========================
+metricas.instrumentar_motor(engine)
+if engine_lectura is not engine:
+    metricas.instrumentar_motor(engine_lectura)
+metricas.registro.registrar_coleccion("cache_http", cache_http.cache.contadores)
+metricas.registro.registrar_coleccion("admision", admision.contadores)
+metricas.registro.registrar_coleccion("vuelo_unico", vuelo_unico.vuelo_unico.contadores)
+app.add_middleware(metricas.MetricasMiddleware)
+
+# =========================
+# RÉPLICA DE LECTURA (leer lo propio tras escribir; ver database.py)
+# Va por fuera de la caché, que consulta el contexto de la petición.
+# =========================
+app.add_middleware(LecturaPropiaMiddleware)
+
 # =========================
 # CORS
 # =========================
@@ -73,6 +165,36 @@ def root():
 def health():
     return {"status": "ok"}
 
+@app.get("/api/ready")
+def ready():
+    # Si el arranque no pudo conectarse, se reintenta en cada sondeo.
+    if not estado_app["listo"]:
+        estado_app["listo"] = verificar_base_datos()
+    if not estado_app["listo"]:
+        return JSONResponse({"status": "no listo"}, status_code=503)
+    return {"status": "listo"}
+
+@app.get("/api/cache-stats")
+def cache_stats():
+    return cache_http.cache.estadisticas()
+
+@app.get("/api/admision")
+def admision_estado():
+    return admision.estado()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(
+        metricas.registro.exportar_global(),
+        media_type="text/plain; version=0.0.4"
+    )
+
+@app.get("/api/perfiles-lentos")
+def perfiles_lentos():
+    if metricas.perfilador is None:
+        return {"activo": False, "perfiles": []}
+    return {"activo": True, "perfiles": list(metricas.perfilador.ultimos)}
+
 # =========================
 # ROUTERS
 # =========================
@@ -84,135 +206,306 @@ app.include_router(facturas.router, prefix="/facturas")
 app.include_router(glosas.router, prefix="/glosas")
 app.include_router(respuestas_glosa.router, prefix="/respuestas-glosa")
 app.include_router(adjuntos.router, prefix="/adjuntos")
+app.include_router(conciliacion.router, prefix="/conciliacion")
+app.include_router(alertas.router, prefix="/alertas")
+app.include_router(analytics.router, prefix="/analytics")
 
 # =========================
 # SEMÁFORO
 # =========================
-def calcular_semaforo(glosa):
+def calcular_semaforo(glosa, dias_restantes=None):
+    """
+    Color según el término de respuesta. `dias_restantes` son días hábiles
+    (dias_habiles.restantes, calculados para todo el listado de una vez).
+    """
     hoy = date.today()
 
     if not glosa.fecha_vencimiento_respuesta:
         return "secondary"
 
-    if glosa.estado_glosa == "Respondida":
+    if glosa.estado_glosa in estados_glosa.ESTADOS_CERRADOS:
         return "success"
 
     if glosa.fecha_vencimiento_respuesta < hoy:
         return "danger"
 
-    if (glosa.fecha_vencimiento_respuesta - hoy).days <= 5:
+    if dias_restantes is not None and dias_restantes <= vencimientos.ALERTAS_DIAS:
         return "warning"
 
     return "success"
 
 # =========================
-# DASHBOARD
+# SESIÓN DE LAS VISTAS HTML
+# El navegador no envía Authorization: /login deja el JWT en una cookie
+# HttpOnly (auth.auth.COOKIE_SESION) que las vistas y sus formularios usan.
 # =========================
-@app.get("/dashboard")
-def dashboard(request: Request):
-    db: Session = SessionLocal()
-
-    hoy = date.today()
-    limite = hoy + timedelta(days=5)
-
-    total_facturas = db.query(models.Factura).count()
-    total_glosas = db.query(models.Glosa).count()
-
-    glosas_vencidas = db.query(models.Glosa).filter(
-        models.Glosa.fecha_vencimiento_respuesta < hoy,
-        models.Glosa.estado_glosa != "Respondida"
-    ).all()
+def _destino_local(siguiente: str) -> str:
+    # Solo rutas de esta app: nada de redirigir a otro sitio.
+    return siguiente if siguiente.startswith("/") and not siguiente.startswith("//") else "/dashboard"
 
-    glosas_por_vencer = db.query(models.Glosa).filter(
-        models.Glosa.fecha_vencimiento_respuesta <= limite,
-        models.Glosa.fecha_vencimiento_respuesta >= hoy,
-        models.Glosa.estado_glosa != "Respondida"
-    ).all()
+@app.get("/login")
+def login_vista(request: Request, siguiente: str = "/dashboard"):
+    return templates.TemplateResponse("login.html", {"request": request, "siguiente": _destino_local(siguiente)})
 
-    db.close()
+@app.post("/login")
+def login(request: Request, username: str = Form(...), password: str = Form(...), siguiente: str = Form("/dashboard")):
+    db: Session = SessionLocal()
+    try:
+        usuario = crud.get_user_by_email(db, email=username)
+        valido = usuario is not None and usuario.activo and autenticacion.verify_password(password, usuario.password_hash)
+        token = autenticacion.create_access_token({"sub": str(usuario.id_usuario)}) if valido else None
+    finally:
+        db.close()
+    if token is None:
+        return templates.TemplateResponse(
+            "login.html",
+            {"request": request, "siguiente": _destino_local(siguiente), "error": "Credenciales incorrectas"},
+            status_code=401,
+        )
+    respuesta = RedirectResponse(_destino_local(siguiente), status_code=303)
+    respuesta.set_cookie(
+        autenticacion.COOKIE_SESION, token, max_age=autenticacion.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+        httponly=True, samesite="lax", secure=request.url.scheme == "https",
+    )
+    return respuesta
+
+@app.get("/logout")
+def logout():
+    respuesta = RedirectResponse("/login", status_code=303)
+    respuesta.delete_cookie(autenticacion.COOKIE_SESION)
+    return respuesta
 
-    return templates.TemplateResponse("dashboard.html", {
-        "request": request,
-        "total_facturas": total_facturas,
-        "total_glosas": total_glosas,
-        "vencidas": glosas_vencidas,
-        "por_vencer": glosas_por_vencer
-    })
+# =========================
+# DASHBOARD
+# =========================
+@app.get("/dashboard")
+def dashboard(request: Request, alcance: Alcance = Depends(get_alcance_vista)):
+    def calcular():
+        db: Session = abrir_sesion_lectura()
+        try:
+            # Colas precalculadas (alerta_vencimiento): no se recorre la tabla de glosas.
+            cola = vencimientos.cola_usuario(db, None, alcance=alcance)
+            return {
+                "total_facturas": alcance.restringir(db.query(models.Factura), models.Factura).count(),
+                "total_glosas": alcance.restringir(db.query(models.Glosa), models.Glosa).count(),
+                "vencidas": cola["vencidas"],
+                "por_vencer": cola["por_vencer"],
+            }
+        finally:
+            db.close()
+
+    # Las peticiones simultáneas (mismo alcance y datos) comparten un solo cálculo.
+    datos = vuelo_unico.compartido(
+        "dashboard", ("factura", "glosa", "alerta_vencimiento", "festivo"), (alcance, date.today()), calcular,
+    )
+    return templates.TemplateResponse("dashboard.html", {"request": request, **datos})
 
 # =========================
 # VER GLOSAS
 # =========================
-@app.get("/glosas-view")
-def ver_glosas(request: Request):
-    db: Session = SessionLocal()
+# El listado se transmite mientras se consulta: las glosas se leen por lotes
+# (yield_per), el semáforo se calcula lote a lote y la plantilla se renderiza
+# con generate(), así ni la memoria del servidor ni el primer byte dependen
+# del número de glosas. Con ?modo=virtual la página solo trae el esqueleto y
+# el navegador pide a /glosas-view/filas las filas visibles al desplazarse.
+LOTE_VISTA_GLOSAS = 500
+BLOQUE_HTML = 16 * 1024
+FILAS_VISTA_MAX = 1000
+
+
+def _consulta_vista_glosas(alcance: Alcance):
+    g, f, m = models.Glosa, models.Factura, models.MotivoGlosa
+    stmt = (
+        select(
+            g.id_glosa, g.valor_glosado, g.estado_glosa, g.fecha_vencimiento_respuesta,
+            f.numero_factura, f.nombre_eps, m.codigo_motivo,
+        )
+        .outerjoin(f, f.id_factura == g.id_factura)
+        .outerjoin(m, m.id_motivo_glosa == g.id_motivo_glosa)
+        .order_by(g.id_glosa)
+    )
+    return alcance.restringir(stmt, g)
 
-    glosas = db.query(models.Glosa).all()
 
-    data = []
-    for g in glosas:
-        factura = db.query(models.Factura).filter(
-            models.Factura.id_factura == g.id_factura
-        ).first()
+def _filas_vista_glosas(db: Session, stmt, lote: int = LOTE_VISTA_GLOSAS):
+    """Filas planas de la vista, con el semáforo calculado por lotes."""
+    calendario = dias_habiles.calendario(db)
+    hoy = date.today()
+    for filas in db.execute(stmt.execution_options(yield_per=lote)).partitions():
+        con_fecha = [r for r in filas if r.fecha_vencimiento_respuesta]
+        restantes = dict(zip(
+            (r.id_glosa for r in con_fecha),
+            dias_habiles.restantes(calendario, hoy, [r.fecha_vencimiento_respuesta for r in con_fecha]).tolist(),
+        ))
+        for r in filas:
+            yield {
+                "id_glosa": r.id_glosa,
+                "numero_factura": r.numero_factura,
+                "nombre_eps": r.nombre_eps,
+                "codigo_motivo": r.codigo_motivo,
+                "valor_glosado": r.valor_glosado,
+                "estado_glosa": r.estado_glosa,
+                "color": calcular_semaforo(r, restantes.get(r.id_glosa)),
+            }
+
+
+def _html_en_bloques(db: Session, nombre: str, contexto: dict):
+    """Renderiza con generate() y agrupa la salida en bloques; cierra la sesión al terminar."""
+    try:
+        bloque, tamano = [], 0
+        for parte in templates.get_template(nombre).generate(contexto):
+            bloque.append(parte)
+            tamano += len(parte)
+            if tamano >= BLOQUE_HTML:
+                yield "".join(bloque)
+                bloque, tamano = [], 0
+        if bloque:
+            yield "".join(bloque)
+    finally:
+        db.close()
+
 
-        motivo = db.query(models.MotivoGlosa).filter(
-            models.MotivoGlosa.id_motivo_glosa == g.id_motivo_glosa
-        ).first()
+# Estados que ofrece el formulario de cada fila: el actual y sus destinos
+# permitidos (estados_glosa.TRANSICIONES), en el orden de ESTADOS.
+OPCIONES_ESTADO = {
+    actual: [e for e in estados_glosa.ESTADOS if e == actual or e in estados_glosa.TRANSICIONES[actual]]
+    for actual in estados_glosa.ESTADOS
+}
 
-        data.append({
-            "glosa": g,
-            "factura": factura,
-            "motivo": motivo,
-            "color": calcular_semaforo(g)
-        })
 
-    db.close()
+@app.get("/glosas-view")
+def ver_glosas(request: Request, modo: str = "completo", alcance: Alcance = Depends(get_alcance_vista)):
+    if modo == "virtual":
+        return templates.TemplateResponse("glosas_virtual.html", {"request": request, "opciones_estado": OPCIONES_ESTADO})
 
-    return templates.TemplateResponse("glosas.html", {
+    db: Session = abrir_sesion_lectura()
+    contexto = {
         "request": request,
-        "data": data
-    })
+        "data": _filas_vista_glosas(db, _consulta_vista_glosas(alcance)),
+        "opciones_estado": OPCIONES_ESTADO,
+    }
+    return StreamingResponse(_html_en_bloques(db, "glosas.html", contexto), media_type="text/html; charset=utf-8")
+
+
+@app.get("/glosas-view/filas")
+def filas_glosas_view(skip: int = 0, limit: int = 200, alcance: Alcance = Depends(get_alcance)):
+    """Tramo [skip, skip + limit) del listado y el total, para el modo virtual."""
+    limit = max(0, min(limit, FILAS_VISTA_MAX))
+    db: Session = abrir_sesion_lectura()
+    try:
+        stmt = _consulta_vista_glosas(alcance)
+        total = db.execute(select(func.count()).select_from(stmt.order_by(None).subquery())).scalar_one()
+        filas = list(_filas_vista_glosas(db, stmt.offset(max(skip, 0)).limit(limit)))
+    finally:
+        db.close()
+    return RespuestaORJSON({"total": total, "skip": skip, "filas": filas})
 
 # =========================
 # ACTUALIZAR ESTADO
 # =========================
-@app.post("/actualizar-estado-glosa/{id}")
-def actualizar_estado(id: int, estado: str = Form(...)):
+@app.post("/actualizar-estado-glosa/{id}", name="actualizar_estado_glosa")
+def actualizar_estado(id: int, estado: str = Form(...), alcance: Alcance = Depends(get_alcance_escritura)):
     db: Session = SessionLocal()
 
-    glosa = db.query(models.Glosa).filter(
-        models.Glosa.id_glosa == id
-    ).first()
+    glosa = crud.get_glosa(db, id, alcance)
 
-    if glosa:
+    try:
+        if glosa is None:
+            raise HTTPException(status_code=404, detail="Glosa no encontrada")
+        estados_glosa.validar_transicion(glosa.estado_glosa, estado)
         glosa.estado_glosa = estado
         db.commit()
-
-    db.close()
+    except estados_glosa.EstadoDesconocido as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except estados_glosa.TransicionInvalida as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    finally:
+        db.close()
 
     return RedirectResponse("/glosas-view", status_code=303)
 
 # =========================
 # IMPORTAR FACTURAS
+# Columnas: numero_factura, nit_emisora, nit_receptora, fecha_emision,
+# valor_total [, fecha_radicado] [, nombre_eps]. Las instituciones se buscan
+# por NIT (con o sin dígito de verificación). Las filas que incumplen alguna
+# regla (validaciones.py) o cuyo NIT no está registrado se rechazan con sus
+# motivos; las de un número de factura ya registrado se omiten.
 # =========================
+REGLAS_IMPORTAR_FACTURAS = validaciones.REGLAS_FACTURA + (
+    validaciones.requerido("id_institucion_emisora", "nit_emisora no corresponde a una institución registrada", "institucion_no_registrada"),
+    validaciones.requerido("id_institucion_receptora", "nit_receptora no corresponde a una institución registrada", "institucion_no_registrada"),
+    # Columna auxiliar: presente solo si la factura cae en el alcance de quien importa.
+    validaciones.requerido("en_alcance", "la factura no pertenece a la institución del usuario", "fuera_de_alcance"),
+)
+
+
 @app.post("/importar-facturas")
-async def importar_facturas(file: UploadFile = File(...)):
+def importar_facturas(file: UploadFile = File(...), alcance: Alcance = Depends(get_alcance_escritura)):
+    import pandas as pd
+
     db: Session = SessionLocal()
 
     try:
-        df = pd.read_excel(file.file)
+        df = pd.read_excel(file.file, dtype=str)
         df.columns = df.columns.str.strip().str.lower()
-
-        for _, row in df.iterrows():
-            factura = models.Factura(
-                numero_factura=str(row.get("numero_factura")),
-                nombre_eps=str(row.get("nombre_eps")),
-                valor_total_factura=float(row.get("valor_total")),
-                estado_factura="Radicada"
+        df = df.rename(columns={"valor_total": "valor_total_factura"})
+        faltan = [c for c in ("numero_factura", "nit_emisora", "nit_receptora", "fecha_emision", "valor_total_factura") if c not in df.columns]
+        if faltan:
+            return {"error": f"Faltan columnas: {', '.join(faltan)}"}
+
+        instituciones = {
+            validaciones.nit_base(nit): id_institucion
+            for nit, id_institucion in db.query(models.Institucion.nit, models.Institucion.id_institucion)
+        }
+        df["numero_factura"] = df["numero_factura"].str.strip()
+        df["id_institucion_emisora"] = validaciones.nits_base(df["nit_emisora"]).map(instituciones)
+        df["id_institucion_receptora"] = validaciones.nits_base(df["nit_receptora"]).map(instituciones)
+        propia = pd.Series(
+            alcance.admite_factura(df["id_institucion_emisora"], df["id_institucion_receptora"]), index=df.index, dtype=bool,
+        )
+        df["en_alcance"] = pd.Series("si", index=df.index).where(propia)
+
+        tabla = validaciones.Tabla(df)
+        infracciones = validaciones.validar_tabla(tabla, REGLAS_IMPORTAR_FACTURAS)
+        validas = ~df.index.isin(list(infracciones))
+        df = df[validas]
+
+        registradas = {n for (n,) in db.query(models.Factura.numero_factura).filter(
+            models.Factura.numero_factura.in_(df["numero_factura"].unique().tolist())
+        )}
+        repetidas = df["numero_factura"].isin(registradas) | df["numero_factura"].duplicated()
+        filas_duplicadas = (df.index[repetidas] + 2).tolist()
+        df = df[~repetidas]
+
+        # Fechas ya convertidas al validar (validaciones.Tabla), solo de las filas que quedan.
+        emision = tabla.fecha("fecha_emision").loc[df.index]
+        radicado = tabla.fecha("fecha_radicado").loc[df.index]
+        db.add_all([
+            models.Factura(
+                numero_factura=numero,
+                id_institucion_emisora=int(emisora),
+                id_institucion_receptora=int(receptora),
+                fecha_emision=fecha_emision.date(),
+                fecha_radicado=None if pd.isna(fecha_radicado) else fecha_radicado.date(),
+                nombre_eps=None if pd.isna(eps) else eps.strip() or None,
+                valor_total_factura=validaciones.decimal(valor),
+                estado_factura="Radicada",
+            )
+            for numero, emisora, receptora, fecha_emision, fecha_radicado, eps, valor in zip(
+                df["numero_factura"], df["id_institucion_emisora"], df["id_institucion_receptora"],
+                emision, radicado,
+                df["nombre_eps"] if "nombre_eps" in df.columns else [None] * len(df),
+                df["valor_total_factura"],
             )
-            db.add(factura)
+        ])
 
         db.commit()
-        return {"mensaje": "Facturas cargadas"}
+        return {
+            "mensaje": "Facturas cargadas", "cargadas": len(df),
+            "filas_rechazadas": [fila + 2 for fila in infracciones], "filas_duplicadas": filas_duplicadas,
+            "errores": validaciones.reporte(infracciones),
+        }
 
     except Exception as e:
         db.rollback()
@@ -222,37 +515,135 @@ async def importar_facturas(file: UploadFile = File(...)):
         db.close()
 
 # =========================
-# REPORTE
+# IMPORTAR GLOSAS
+# Columnas: numero_factura, codigo_motivo, fecha_glosa, valor_glosado
+# [, observaciones] [, usuario_responsable]. El vencimiento se calcula en
+# días hábiles para todo el archivo de una vez (dias_habiles.py). Las filas
+# que incumplen alguna regla (validaciones.py: fechas, valor frente al total
+# de la factura, formato del código) o con factura/motivo desconocidos se
+# rechazan con sus motivos; las que tienen la huella de una glosa ya
+# registrada se omiten (duplicados.py).
 # =========================
-@app.get("/reporte-facturas")
-def reporte():
+REGLAS_IMPORTAR_GLOSAS = validaciones.REGLAS_GLOSA + (
+    validaciones.requerido("id_factura", "numero_factura no corresponde a una factura registrada", "factura_no_registrada"),
+    validaciones.requerido("id_motivo_glosa", "codigo_motivo no corresponde a un motivo registrado", "motivo_no_registrado"),
+)
+
+
+@app.post("/importar-glosas")
+def importar_glosas(file: UploadFile = File(...), alcance: Alcance = Depends(get_alcance_escritura)):
+    import pandas as pd
+
     db: Session = SessionLocal()
 
     try:
-        data = []
+        if (file.filename or "").lower().endswith(".csv"):
+            df = pd.read_csv(file.file, dtype=str, keep_default_na=False)
+        else:
+            df = pd.read_excel(file.file, dtype=str)
+        df.columns = df.columns.str.strip().str.lower()
 
-        facturas = db.query(models.Factura).all()
+        df["numero_factura"] = df["numero_factura"].str.strip()
+        # Una factura fuera del alcance de quien importa cuenta como no registrada.
+        facturas = pd.DataFrame(
+            [tuple(f) for f in alcance.restringir(db.query(
+                models.Factura.numero_factura, models.Factura.id_factura,
+                models.Factura.fecha_emision, models.Factura.valor_total_factura,
+            ), models.Factura).filter(models.Factura.numero_factura.in_(df["numero_factura"].dropna().unique().tolist()))],
+            columns=["numero_factura", "id_factura", "fecha_emision", "valor_total_factura"],
+        ).set_index("numero_factura")
+        motivos = dict(db.query(models.MotivoGlosa.codigo_motivo, models.MotivoGlosa.id_motivo_glosa).all())
+
+        df = df.drop(columns=facturas.columns, errors="ignore").join(facturas, on="numero_factura")
+        df["id_motivo_glosa"] = df["codigo_motivo"].str.strip().str.upper().map(motivos)
+        tabla = validaciones.Tabla(df)
+        infracciones = validaciones.validar_tabla(tabla, REGLAS_IMPORTAR_GLOSAS)
+        rechazadas = [fila + 2 for fila in infracciones]  # fila en la hoja, con encabezado
+        df = df[~df.index.isin(list(infracciones))].copy()
+        df["fecha_glosa"] = tabla.fecha("fecha_glosa").loc[df.index].dt.date
+
+        # Duplicados: misma huella que una glosa registrada o que una fila anterior del archivo.
+        df["valor_glosado"] = df["valor_glosado"].map(validaciones.decimal)
+        df["huella"] = [
+            duplicados.huella(f, m, v, d)
+            for f, m, v, d in zip(df["id_factura"], df["id_motivo_glosa"], df["valor_glosado"], df["fecha_glosa"])
+        ]
+        repetidas = df["huella"].isin(duplicados.existentes(db, df["huella"].tolist())) | df["huella"].duplicated()
+        filas_duplicadas = (df.index[repetidas] + 2).tolist()
+        df = df[~repetidas]
+
+        vencen = dias_habiles.calcular_vencimientos(db, df["fecha_glosa"].tolist())
+        observaciones = df["observaciones"].tolist() if "observaciones" in df.columns else [None] * len(df)
+        responsables = (
+            pd.to_numeric(df["usuario_responsable"], errors="coerce").tolist()
+            if "usuario_responsable" in df.columns else [None] * len(df)
+        )
+        db.add_all([
+            models.Glosa(
+                id_factura=int(id_factura),
+                id_motivo_glosa=int(id_motivo),
+                fecha_glosa=fecha,
+                valor_glosado=valor,
+                estado_glosa=estados_glosa.PENDIENTE,
+                observaciones_glosa=None if pd.isna(observacion) or not str(observacion).strip() else observacion,
+                usuario_responsable=None if pd.isna(responsable) else int(responsable),
+                fecha_vencimiento_respuesta=vence,
+            )
+            for id_factura, id_motivo, fecha, valor, observacion, responsable, vence in zip(
+                df["id_factura"], df["id_motivo_glosa"], df["fecha_glosa"], df["valor_glosado"],
+                observaciones, responsables, vencen,
+            )
+        ])
 
-        for f in facturas:
-            data.append({
-                "Factura": f.numero_factura,
-                "Valor": float(f.valor_total_factura)
-            })
+        db.commit()
+        return {
+            "mensaje": "Glosas cargadas", "cargadas": len(df),
+            "filas_rechazadas": rechazadas, "filas_duplicadas": filas_duplicadas,
+            "errores": validaciones.reporte(infracciones),
+        }
 
-        df = pd.DataFrame(data)
+    except Exception as e:
+        db.rollback()
+        return {"error": str(e)}
 
-        output = io.BytesIO()
+    finally:
+        db.close()
 
-        with pd.ExcelWriter(output, engine="openpyxl") as writer:
-            df.to_excel(writer, index=False)
+# =========================
+# REPORTE
+# =========================
+@app.get("/reporte-facturas")
+def reporte(alcance: Alcance = Depends(get_alcance_vista)):
+    def calcular() -> bytes:
+        import pandas as pd
 
-        output.seek(0)
+        db: Session = abrir_sesion_lectura()
+        try:
+            data = []
 
-        return StreamingResponse(
-            output,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": "attachment; filename=reporte.xlsx"}
-        )
+            facturas = alcance.restringir(db.query(models.Factura), models.Factura).all()
 
-    finally:
-        db.close()
\ No newline at end of file
+            for f in facturas:
+                data.append({
+                    "Factura": f.numero_factura,
+                    "Valor": float(f.valor_total_factura)
+                })
+
+            df = pd.DataFrame(data)
+
+            output = io.BytesIO()
+
+            with pd.ExcelWriter(output, engine="openpyxl") as writer:
+                df.to_excel(writer, index=False)
+
+            return output.getvalue()
+        finally:
+            db.close()
+
+    # Un solo xlsx para todos los que lo piden a la vez con el mismo alcance.
+    contenido = vuelo_unico.compartido("reporte-facturas", ("factura",), alcance, calcular)
+    return Response(
+        contenido,
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={"Content-Disposition": "attachment; filename=reporte.xlsx"}
+    )
@@ -0,0 +1,388 @@
+# metricas.py
+"""
+Instrumentación de la API: latencia por ruta, consultas SQL por petición,
+exportación en formato Prometheus y un perfilador de muestreo opcional para
+peticiones lentas.
+
+Todo el trabajo por petición es contar y sumar: se puede dejar activo en
+producción. El perfilador solo arranca si se define PERFILADOR_UMBRAL_MS.
+
+Con varios workers cada proceso publica periódicamente su registro en el
+almacén compartido y /metrics devuelve la suma de todos.
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, deque
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+from almacen import almacen
+
+logger = logging.getLogger(__name__)
+
+# Límites superiores (segundos) de los buckets del histograma de latencia.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Medicion:
+    """Lo que se acumula durante una petición (compartido con los hilos del threadpool)."""
+    __slots__ = ("inicio", "consultas", "tiempo_db", "hilos", "muestras")
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.tiempo_db = 0.0
+        self.hilos = {threading.get_ident()}
+        self.muestras: Optional[Counter] = None
+
+
+_medicion_actual: ContextVar[Optional[_Medicion]] = ContextVar("medicion_actual", default=None)
+
+
+class Histograma:
+    __slots__ = ("cuentas", "suma", "total")
+
+    def __init__(self):
+        self.cuentas = [0] * (len(BUCKETS) + 1)
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor: float) -> None:
+        self.cuentas[bisect_left(BUCKETS, valor)] += 1
+        self.suma += valor
+        self.total += 1
+
+
+class Registro:
+    """Métricas acumuladas del proceso. Solo se actualiza desde el hilo del event loop."""
+
+    def __init__(self):
+        self.latencias: Dict[Tuple[str, str], Histograma] = {}
+        self.respuestas: Counter = Counter()
+        self.consultas: Counter = Counter()
+        self.tiempo_db: Counter = Counter()
+        self.colecciones: Dict[str, Callable[[], dict]] = {}
+        self._gauges_sumados: Optional[Dict[str, float]] = None
+
+    def registrar_peticion(self, metodo: str, ruta: str, estado: int, medicion: _Medicion, duracion: float) -> None:
+        clave = (metodo, ruta)
+        histograma = self.latencias.get(clave)
+        if histograma is None:
+            histograma = self.latencias[clave] = Histograma()
+        histograma.observar(duracion)
+        self.respuestas[(metodo, ruta, estado)] += 1
+        self.consultas[clave] += medicion.consultas
+        self.tiempo_db[clave] += medicion.tiempo_db
+
+    def registrar_coleccion(self, prefijo: str, funcion: Callable[[], dict]) -> None:
+        """
+        Publica como gauges los valores numéricos que devuelva `funcion()`.
+        Entre workers se suman, así que deben ser aditivos (contadores, no tasas).
+        """
+        self.colecciones[prefijo] = funcion
+
+    # ----------------------------------------------------------------
+    # Agregación entre workers
+    # ----------------------------------------------------------------
+
+    def instantanea(self) -> dict:
+        """Estado del registro como dict serializable a JSON."""
+        return {
+            "latencias": {f"{m}|{r}": h.cuentas + [h.suma, h.total] for (m, r), h in list(self.latencias.items())},
+            "respuestas": {f"{m}|{r}|{e}": n for (m, r, e), n in list(self.respuestas.items())},
+            "consultas": {f"{m}|{r}": n for (m, r), n in list(self.consultas.items())},
+            "tiempo_db": {f"{m}|{r}": n for (m, r), n in list(self.tiempo_db.items())},
+            "gauges": self._gauges(),
+        }
+
+    @classmethod
+    def desde_instantaneas(cls, instantaneas) -> "Registro":
+        """Registro con la suma de varias instantáneas (una por worker)."""
+        total = cls()
+        gauges: Counter = Counter()
+        for inst in instantaneas:
+            for clave, valores in inst["latencias"].items():
+                h = total.latencias.setdefault(tuple(clave.split("|")), Histograma())
+                h.cuentas = [a + b for a, b in zip(h.cuentas, valores[:-2])]
+                h.suma += valores[-2]
+                h.total += valores[-1]
+            for clave, n in inst["respuestas"].items():
+                total.respuestas[tuple(clave.split("|"))] += n
+            for clave, n in inst["consultas"].items():
+                total.consultas[tuple(clave.split("|"))] += n
+            for clave, n in inst["tiempo_db"].items():
+                total.tiempo_db[tuple(clave.split("|"))] += n
+            gauges.update(inst["gauges"])
+        total._gauges_sumados = dict(gauges)
+        return total
+
+    def _gauges(self) -> Dict[str, float]:
+        if self._gauges_sumados is not None:
+            return self._gauges_sumados
+        return {
+            f"{prefijo}_{nombre}": valor
+            for prefijo, funcion in self.colecciones.items()
+            for nombre, valor in funcion().items()
+            if isinstance(valor, (int, float))
+        }
+
+    def publicar(self, ttl: float = 60) -> None:
+        """Deja la instantánea de este worker en el almacén compartido."""
+        almacen.set(f"{_PREFIJO_INSTANTANEA}{os.getpid()}", json.dumps(self.instantanea()), ttl=ttl)
+
+    def exportar_global(self) -> str:
+        """Como `exportar`, pero sumando los workers que publicaron en el almacén."""
+        if not almacen.compartido:
+            return self.exportar()
+        self.publicar()
+        instantaneas = [json.loads(v) for v in almacen.con_prefijo(_PREFIJO_INSTANTANEA).values()]
+        return Registro.desde_instantaneas(instantaneas).exportar()
+
+    def exportar(self) -> str:
+        """Texto en formato de exposición de Prometheus."""
+        lineas = [
+            "# HELP http_request_duration_seconds Latencia de las peticiones por ruta.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (metodo, ruta), h in sorted(self.latencias.items()):
+            etiquetas = f'method="{metodo}",route="{ruta}"'
+            acumulado = 0
+            for limite, cuenta in zip(BUCKETS, h.cuentas):
+                acumulado += cuenta
+                lineas.append(f'http_request_duration_seconds_bucket{{{etiquetas},le="{limite}"}} {acumulado}')
+            lineas.append(f'http_request_duration_seconds_bucket{{{etiquetas},le="+Inf"}} {h.total}')
+            lineas.append(f"http_request_duration_seconds_sum{{{etiquetas}}} {h.suma:.6f}")
+            lineas.append(f"http_request_duration_seconds_count{{{etiquetas}}} {h.total}")
+
+        lineas += ["# HELP http_responses_total Respuestas por ruta y código.", "# TYPE http_responses_total counter"]
+        for (metodo, ruta, estado), n in sorted(self.respuestas.items()):
+            lineas.append(f'http_responses_total{{method="{metodo}",route="{ruta}",status="{estado}"}} {n}')
+
+        lineas += ["# HELP db_queries_total Sentencias SQL ejecutadas por ruta.", "# TYPE db_queries_total counter"]
+        for (metodo, ruta), n in sorted(self.consultas.items()):
+            lineas.append(f'db_queries_total{{method="{metodo}",route="{ruta}"}} {n}')
+
+        lineas += ["# HELP db_time_seconds_total Tiempo en base de datos por ruta.", "# TYPE db_time_seconds_total counter"]
+        for (metodo, ruta), segundos in sorted(self.tiempo_db.items()):
+            lineas.append(f'db_time_seconds_total{{method="{metodo}",route="{ruta}"}} {segundos:.6f}')
+
+        for nombre, valor in sorted(self._gauges().items()):
+            lineas.append(f"# TYPE {nombre} gauge")
+            lineas.append(f"{nombre} {valor}")
+        return "\n".join(lineas) + "\n"
+
+
+_PREFIJO_INSTANTANEA = "metricas:"
+
+registro = Registro()
+
+
+# ====================================================================
+# Conteo de SQL mediante eventos del engine
+# ====================================================================
+
+def instrumentar_motor(engine) -> None:
+    """Cuenta sentencias y tiempo de base de datos de la petición en curso."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("inicio_consulta", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _despues(conn, cursor, statement, parameters, context, executemany):
+        inicio = conn.info["inicio_consulta"].pop()
+        medicion = _medicion_actual.get()
+        if medicion is not None:
+            medicion.consultas += 1
+            medicion.tiempo_db += time.perf_counter() - inicio
+            medicion.hilos.add(threading.get_ident())
+
+
+# ====================================================================
+# Perfilador de muestreo para peticiones lentas (opcional)
+# ====================================================================
+
+class Perfilador:
+    """
+    Hilo que, cada `intervalo` segundos, toma la pila de los hilos que atienden
+    peticiones que ya superaron `umbral`. Al terminar la petición las pilas
+    agregadas (formato "collapsed" de flamegraph) se registran en el log.
+    """
+
+    def __init__(self, umbral: float, intervalo: float = 0.01, maximo_perfiles: int = 20):
+        self.umbral = umbral
+        self.intervalo = intervalo
+        self.en_curso: Dict[int, _Medicion] = {}
+        self.ultimos = deque(maxlen=maximo_perfiles)
+        self._hilo: Optional[threading.Thread] = None
+
+    def iniciar(self) -> None:
+        """Arranca el hilo de muestreo (en cada worker, después del fork)."""
+        if self._hilo is None or not self._hilo.is_alive():
+            self._hilo = threading.Thread(target=self._muestrear, name="perfilador-lento", daemon=True)
+            self._hilo.start()
+
+    def _muestrear(self) -> None:
+        propio = threading.get_ident()
+        while True:
+            time.sleep(self.intervalo)
+            ahora = time.perf_counter()
+            lentas = [m for m in list(self.en_curso.values()) if ahora - m.inicio >= self.umbral]
+            if not lentas:
+                continue
+            marcos = sys._current_frames()
+            for medicion in lentas:
+                if medicion.muestras is None:
+                    medicion.muestras = Counter()
+                for hilo in list(medicion.hilos):
+                    marco = marcos.get(hilo)
+                    if marco is None or hilo == propio or _esta_ocioso(marco):
+                        continue
+                    medicion.muestras[_pila_colapsada(marco)] += 1
+
+    def terminar(self, metodo: str, ruta: str, medicion: _Medicion, duracion: float) -> None:
+        if not medicion.muestras:
+            return
+        perfil = {
+            "ruta": f"{metodo} {ruta}",
+            "duracion_ms": round(duracion * 1000, 1),
+            "consultas": medicion.consultas,
+            "pilas": medicion.muestras.most_common(15),
+        }
+        self.ultimos.append(perfil)
+        logger.warning(
+            "Petición lenta %s %s (%.0f ms, %d consultas):\n%s",
+            metodo, ruta, duracion * 1000, medicion.consultas,
+            "\n".join(f"{pila} {n}" for pila, n in perfil["pilas"]),
+        )
+
+
+# Hojas de pila de un hilo esperando trabajo (event loop o threadpool inactivos).
+_HOJAS_OCIOSAS = {("selectors.py", "select"), ("threading.py", "wait"), ("queue.py", "get")}
+
+
+def _esta_ocioso(marco) -> bool:
+    return (os.path.basename(marco.f_code.co_filename), marco.f_code.co_name) in _HOJAS_OCIOSAS
+
+
+def _pila_colapsada(marco) -> str:
+    partes = []
+    while marco is not None:
+        codigo = marco.f_code
+        partes.append(f"{os.path.basename(codigo.co_filename)}:{codigo.co_name}")
+        marco = marco.f_back
+    return ";".join(reversed(partes))
+
+
+_umbral_ms = os.getenv("PERFILADOR_UMBRAL_MS")
+perfilador: Optional[Perfilador] = (
+    Perfilador(
+        umbral=float(_umbral_ms) / 1000,
+        intervalo=float(os.getenv("PERFILADOR_INTERVALO_MS", 10)) / 1000,
+    )
+    if _umbral_ms
+    else None
+)
+
+
+# ====================================================================
+# Arranque de los hilos del worker
+# ====================================================================
+
+_publicacion_iniciada = False
+
+
+def iniciar(intervalo_publicacion: float = 15) -> None:
+    """
+    Arranca los hilos de fondo de este proceso. Se llama desde el lifespan de
+    la app y no al importar: con gunicorn --preload el import ocurre en el
+    proceso maestro y los hilos no sobreviven al fork.
+    """
+    global _publicacion_iniciada
+    if perfilador is not None:
+        perfilador.iniciar()
+    if almacen.compartido and not _publicacion_iniciada:
+        _publicacion_iniciada = True
+
+        def _publicar_periodicamente():
+            while True:
+                try:
+                    registro.publicar(ttl=intervalo_publicacion * 4)
+                except Exception:
+                    logger.exception("No se pudo publicar la instantánea de métricas")
+                time.sleep(intervalo_publicacion)
+
+        threading.Thread(target=_publicar_periodicamente, name="metricas-publicacion", daemon=True).start()
+
+
+# ====================================================================
+# Middleware
+# ====================================================================
+
+class MetricasMiddleware:
+    """
+    ASGI puro: mide cada petición hasta el último byte del cuerpo, así que la
+    latencia y las consultas del histograma incluyen el trabajo de una
+    StreamingResponse (p. ej. /glosas-view, NDJSON).
+
+    Las cabeceras X-Query-Count y Server-Timing, en cambio, salen con
+    http.response.start, antes de que corra el cuerpo en streaming: solo
+    cubren lo hecho hasta ese momento (en una respuesta normal, todo).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        medicion = _Medicion()
+        estado = 500  # si la aplicación falla sin responder
+        terminada = False
+
+        def terminar():
+            nonlocal terminada
+            terminada = True
+            duracion = time.perf_counter() - medicion.inicio
+            if perfilador is not None:
+                perfilador.en_curso.pop(id(medicion), None)
+            # La plantilla de la ruta ("/glosas/{glosa_id}") evita una serie por cada id.
+            ruta = getattr(scope.get("route"), "path", None) or "sin_ruta"
+            registro.registrar_peticion(scope["method"], ruta, estado, medicion, duracion)
+            if perfilador is not None:
+                perfilador.terminar(scope["method"], ruta, medicion, duracion)
+
+        async def enviar(mensaje):
+            nonlocal estado
+            if mensaje["type"] == "http.response.start":
+                estado = mensaje["status"]
+                cabeceras = MutableHeaders(scope=mensaje)
+                cabeceras["X-Query-Count"] = str(medicion.consultas)
+                cabeceras["Server-Timing"] = (
+                    f'db;dur={medicion.tiempo_db * 1000:.1f};desc="{medicion.consultas} consultas", '
+                    f"total;dur={(time.perf_counter() - medicion.inicio) * 1000:.1f}"
+                )
+            await send(mensaje)
+            if mensaje["type"] == "http.response.body" and not mensaje.get("more_body", False):
+                terminar()
+
+        token = _medicion_actual.set(medicion)
+        if perfilador is not None:
+            perfilador.en_curso[id(medicion)] = medicion
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _medicion_actual.reset(token)
+            if not terminada:
+                terminar()
@@ -3,10 +3,16 @@ from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Date, B
 from sqlalchemy.orm import relationship
 from sqlalchemy import Date
 from datetime import datetime, date, timezone
-from database import Base # Importamos Base desde nuestro nuevo módulo database
+from database import Base, engine # Importamos Base desde nuestro nuevo módulo database
 from sqlalchemy.sql import func # Para timestamps automáticos
+from sqlalchemy import DDL, JSON, Index, event, text
+from sqlalchemy.dialects.postgresql import JSONB
 #from sqlalchemy.ext.declarative import declarative_base / eliminada
 
+# BIGINT como clave primaria no es alias de ROWID en SQLite y no se
+# autonumera: allí se usa INTEGER (mismo rango, 64 bits).
+IdBigInteger = BigInteger().with_variant(Integer, "sqlite")
+
 # ====================================================================
 # Usuario Model
 # ====================================================================
@@ -23,6 +29,8 @@ class Usuario(Base):
     fecha_creacion = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
     ultima_conexion = Column(DateTime, nullable=True)
     activo = Column(Boolean, default=True)
+    # Institución (IPS o EPS) a la que pertenece: define su alcance de datos (alcance.py).
+    id_institucion = Column(Integer, ForeignKey('institucion.id_institucion'), nullable=True, index=True)
 
     glosas_creadas = relationship("Glosa", back_populates="responsable")
     respuestas_creadas = relationship("RespuestaGlosa", back_populates="respondedor")
@@ -37,7 +45,7 @@ class Usuario(Base):
 # ====================================================================
 class Institucion(Base):
     __tablename__ = "institucion"
-    id_institucion = Column(BigInteger, primary_key=True, index=True)
+    id_institucion = Column(IdBigInteger, primary_key=True, index=True)
     nit = Column(String(20), unique=True, nullable=False)
     razon_social = Column(String(255), nullable=False)
     nombre_comercial = Column(String(255), nullable=True)
@@ -58,7 +66,7 @@ class Institucion(Base):
 # ====================================================================
 class MotivoGlosa(Base):
     __tablename__ = "motivo_glosa"
-    id_motivo_glosa = Column(BigInteger, primary_key=True, index=True)
+    id_motivo_glosa = Column(IdBigInteger, primary_key=True, index=True)
     codigo_motivo = Column(String(10), unique=True, nullable=False)
     descripcion_motivo = Column(String(255), nullable=False)
     aplica_a = Column(String(50), nullable=True) # Ej. 'Facturacion', 'Autorizacion', 'Soportes', 'Tarifas'
@@ -74,13 +82,13 @@ class MotivoGlosa(Base):
 class Factura(Base):
     __tablename__ = "factura"
 
-    id_factura = Column(BigInteger, primary_key=True, index=True)
+    id_factura = Column(IdBigInteger, primary_key=True, index=True)
     numero_factura = Column(String(50), unique=True, nullable=False)
 
     id_institucion_emisora = Column(BigInteger, ForeignKey('institucion.id_institucion'), nullable=False)
     id_institucion_receptora = Column(BigInteger, ForeignKey('institucion.id_institucion'), nullable=False)
 
-    fecha_emision = Column(Date, nullable=False)
+    fecha_emision = Column(Date, nullable=False, index=True)
     fecha_radicado = Column(Date, nullable=True)   # ✅ NUEVO
 
     nombre_eps = Column(String(150), nullable=True)  # ✅ NUEVO
@@ -100,18 +108,28 @@ class Factura(Base):
 # ====================================================================
 class Glosa(Base):
     __tablename__ = "glosa" # Mantenemos 'glosa'
-    id_glosa = Column(BigInteger, primary_key=True, index=True)
-    id_factura = Column(BigInteger, ForeignKey('factura.id_factura'), nullable=False)
+    id_glosa = Column(IdBigInteger, primary_key=True, index=True)
+    id_factura = Column(BigInteger, ForeignKey('factura.id_factura'), nullable=False, index=True)
     id_motivo_glosa = Column(BigInteger, ForeignKey('motivo_glosa.id_motivo_glosa'), nullable=False)
     fecha_registro_glosa = Column(DateTime, default=datetime.now)
-    fecha_glosa = Column(Date, nullable=False)
+    fecha_glosa = Column(Date, nullable=False, index=True)
     valor_glosado = Column(DECIMAL(18,2), nullable=False)
     estado_glosa = Column(String(50), nullable=False, default='Pendiente')
     fecha_ultima_actualizacion = Column(DateTime, default=datetime.now, onupdate=datetime.now)
     observaciones_glosa = Column(Text, nullable=True)
     # CORREGIDO: Apunta a 'usuario.id_usuario' si tu tabla Usuario se llama 'usuario'
     usuario_responsable = Column(BigInteger, ForeignKey('usuario.id_usuario'), nullable=True) 
-    fecha_vencimiento_respuesta = Column(Date, nullable=True)
+    fecha_vencimiento_respuesta = Column(Date, nullable=True, index=True)
+    # SHA-256 de factura, motivo, valor y fecha (duplicados.py); la calcula el ORM.
+    huella = Column(String(64), nullable=True)
+
+    __table_args__ = (
+        # Misma glosa dos veces: no. Parcial para las glosas previas sin huella.
+        Index("ux_glosa_huella", "huella", unique=True,
+              postgresql_where=text("huella IS NOT NULL"), sqlite_where=text("huella IS NOT NULL")),
+        # Casi duplicados: recorrido ordenado por grupo (duplicados.casi_duplicadas).
+        Index("ix_glosa_factura_motivo_valor", "id_factura", "id_motivo_glosa", "valor_glosado"),
+    )
 
     # Relaciones - CONSOLIDADO y CORREGIDO
     factura = relationship("Factura", back_populates="glosas")
@@ -134,7 +152,7 @@ class RespuestaGlosa(Base):
     __tablename__ = "respuestas_glosa"
 
     id_respuesta_glosa = Column(Integer, primary_key=True, index=True)
-    id_glosa = Column(Integer, ForeignKey("glosa.id_glosa"), nullable=False)
+    id_glosa = Column(Integer, ForeignKey("glosa.id_glosa"), nullable=False, index=True)
 
     fecha_respuesta = Column(Date, default=date.today, nullable=False)
     usuario_que_responde = Column(Integer, ForeignKey("usuario.id_usuario"), nullable=False)
@@ -166,8 +184,8 @@ class Adjunto(Base):
 
     id_adjunto = Column(Integer, primary_key=True, index=True)
     # CORREGIDO: Apunta a 'glosa.id_glosa' (singular)
-    id_glosa = Column(Integer, ForeignKey("glosa.id_glosa"), nullable=True) 
-    id_respuesta_glosa = Column(Integer, ForeignKey("respuestas_glosa.id_respuesta_glosa"), nullable=True)
+    id_glosa = Column(Integer, ForeignKey("glosa.id_glosa"), nullable=True, index=True)
+    id_respuesta_glosa = Column(Integer, ForeignKey("respuestas_glosa.id_respuesta_glosa"), nullable=True, index=True)
     nombre_archivo = Column(String(255), nullable=False)
     tipo_mime = Column(String(100), nullable=True)
     ruta_almacenamiento = Column(String(500), nullable=False)
@@ -184,3 +202,177 @@ class Adjunto(Base):
     def __repr__(self):
         return f"<Adjunto(id={self.id_adjunto}, nombre='{self.nombre_archivo}', glosa_id={self.id_glosa}, respuesta_id={self.id_respuesta_glosa})>"
 
+
+# ====================================================================
+# Archivo histórico
+# ====================================================================
+# Copias de las tablas calientes para los árboles de Factura ya cerrados
+# (ver archivo.py). Los ids se conservan, así que no llevan FK hacia las
+# tablas calientes. En PostgreSQL glosa_archivo está particionada por rango
+# de fecha_glosa (una partición por año, más una DEFAULT); por eso la clave
+# primaria incluye fecha_glosa.
+
+class FacturaArchivo(Base):
+    __tablename__ = "factura_archivo"
+
+    id_factura = Column(BigInteger, primary_key=True, autoincrement=False)
+    numero_factura = Column(String(50), nullable=False, index=True)
+    id_institucion_emisora = Column(BigInteger, nullable=False)
+    id_institucion_receptora = Column(BigInteger, nullable=False)
+    fecha_emision = Column(Date, nullable=False, index=True)
+    fecha_radicado = Column(Date, nullable=True)
+    nombre_eps = Column(String(150), nullable=True)
+    valor_total_factura = Column(DECIMAL(18,2), nullable=False)
+    estado_factura = Column(String(50), nullable=False)
+    observaciones = Column(Text, nullable=True)
+    fecha_archivo = Column(DateTime, server_default=func.now(), nullable=False)
+
+
+class GlosaArchivo(Base):
+    __tablename__ = "glosa_archivo"
+    __table_args__ = {"postgresql_partition_by": "RANGE (fecha_glosa)"}
+
+    id_glosa = Column(BigInteger, primary_key=True, autoincrement=False)
+    fecha_glosa = Column(Date, primary_key=True)
+    id_factura = Column(BigInteger, nullable=False, index=True)
+    id_motivo_glosa = Column(BigInteger, nullable=False)
+    fecha_registro_glosa = Column(DateTime, nullable=True)
+    valor_glosado = Column(DECIMAL(18,2), nullable=False)
+    estado_glosa = Column(String(50), nullable=False)
+    fecha_ultima_actualizacion = Column(DateTime, nullable=True)
+    observaciones_glosa = Column(Text, nullable=True)
+    usuario_responsable = Column(BigInteger, nullable=True)
+    fecha_vencimiento_respuesta = Column(Date, nullable=True)
+    huella = Column(String(64), nullable=True, index=True)
+    fecha_archivo = Column(DateTime, server_default=func.now(), nullable=False)
+
+
+class RespuestaGlosaArchivo(Base):
+    __tablename__ = "respuestas_glosa_archivo"
+
+    id_respuesta_glosa = Column(Integer, primary_key=True, autoincrement=False)
+    id_glosa = Column(Integer, nullable=False, index=True)
+    fecha_respuesta = Column(Date, nullable=False)
+    usuario_que_responde = Column(Integer, nullable=False)
+    tipo_respuesta = Column(String(100), nullable=False)
+    valor_aceptado = Column(DECIMAL(10, 2), nullable=True)
+    valor_no_aceptado = Column(DECIMAL(10, 2), nullable=True)
+    argumento_respuesta = Column(Text, nullable=False)
+    estado_posterior_glosa = Column(String(50), nullable=False)
+    fecha_creacion = Column(DateTime, nullable=False)
+    fecha_ultima_actualizacion = Column(DateTime, nullable=False)
+    fecha_archivo = Column(DateTime, server_default=func.now(), nullable=False)
+
+
+class AdjuntoArchivo(Base):
+    __tablename__ = "adjuntos_archivo"
+
+    id_adjunto = Column(Integer, primary_key=True, autoincrement=False)
+    id_glosa = Column(Integer, nullable=True, index=True)
+    id_respuesta_glosa = Column(Integer, nullable=True)
+    nombre_archivo = Column(String(255), nullable=False)
+    tipo_mime = Column(String(100), nullable=True)
+    ruta_almacenamiento = Column(String(500), nullable=False)
+    tipo_documento = Column(String(100), nullable=True)
+    usuario_que_sube = Column(Integer, nullable=False)
+    fecha_subida = Column(DateTime, nullable=False)
+    fecha_archivo = Column(DateTime, server_default=func.now(), nullable=False)
+
+
+# Partición por defecto: recibe las fechas sin partición anual creada.
+event.listen(
+    GlosaArchivo.__table__,
+    "after_create",
+    DDL("CREATE TABLE IF NOT EXISTS glosa_archivo_default PARTITION OF glosa_archivo DEFAULT").execute_if(dialect="postgresql"),
+)
+
+
+# ====================================================================
+# GlosaEvento Model (bitácora de auditoría)
+# ====================================================================
+# Solo se inserta (ver auditoria.py). Sin FK a glosa: el historial debe
+# sobrevivir al borrado y al archivo de la glosa. En PostgreSQL la tabla
+# está particionada por mes de fecha_evento, y la clave primaria de una
+# tabla particionada debe incluir la columna de partición.
+_POSTGRES = engine.dialect.name == "postgresql"
+
+class GlosaEvento(Base):
+    __tablename__ = "glosa_evento"
+    __table_args__ = (
+        Index("ix_glosa_evento_glosa_fecha", "id_glosa", "fecha_evento"),
+        {"postgresql_partition_by": "RANGE (fecha_evento)"},
+    )
+
+    id_evento = Column(IdBigInteger, primary_key=True, autoincrement=True)
+    fecha_evento = Column(DateTime, primary_key=_POSTGRES, default=lambda: datetime.now(timezone.utc), nullable=False)
+    id_glosa = Column(BigInteger, nullable=False)
+    id_usuario = Column(Integer, nullable=True)
+    tipo = Column(String(20), nullable=False) # creacion | actualizacion | eliminacion | transicion | conciliacion
+    cambios = Column(JSON().with_variant(JSONB, "postgresql"), nullable=False) # {"campo": [antes, despues]}
+
+
+event.listen(
+    GlosaEvento.__table__,
+    "after_create",
+    DDL("CREATE TABLE IF NOT EXISTS glosa_evento_default PARTITION OF glosa_evento DEFAULT").execute_if(dialect="postgresql"),
+)
+
+
+# ====================================================================
+# AlertaVencimiento Model (colas precalculadas, ver vencimientos.py)
+# ====================================================================
+class AlertaVencimiento(Base):
+    __tablename__ = "alerta_vencimiento"
+    __table_args__ = (
+        Index("ix_alerta_vencimiento_usuario_fecha", "id_usuario", "fecha_vencimiento"),
+    )
+
+    id_glosa = Column(BigInteger, primary_key=True, autoincrement=False)
+    id_usuario = Column(Integer, nullable=True) # usuario_responsable de la glosa
+    id_factura = Column(BigInteger, nullable=False)
+    fecha_vencimiento = Column(Date, nullable=False, index=True)
+    estado_glosa = Column(String(50), nullable=False)
+    valor_glosado = Column(DECIMAL(18,2), nullable=False)
+    fecha_calculo = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+
+
+# ====================================================================
+# Festivo Model (calendario de días hábiles, ver dias_habiles.py)
+# ====================================================================
+class Festivo(Base):
+    __tablename__ = "festivo"
+
+    fecha = Column(Date, primary_key=True)
+    nombre = Column(String(100), nullable=False)
+
+
+# ====================================================================
+# Cubos de análisis (agregados por EPS × motivo × mes, ver cubos.py)
+# ====================================================================
+class CuboGlosas(Base):
+    __tablename__ = "cubo_glosas"
+    __table_args__ = (
+        Index("ix_cubo_glosas_eps_periodo", "nombre_eps", "periodo"),
+    )
+
+    periodo = Column(Integer, primary_key=True, autoincrement=False) # AAAAMM de fecha_glosa
+    nombre_eps = Column(String(150), primary_key=True)
+    codigo_motivo = Column(String(10), primary_key=True)
+    id_institucion_emisora = Column(BigInteger, primary_key=True, autoincrement=False)
+    id_institucion_receptora = Column(BigInteger, primary_key=True, autoincrement=False)
+    glosas = Column(Integer, nullable=False)
+    valor_glosado = Column(DECIMAL(18,2), nullable=False)
+    glosas_respondidas = Column(Integer, nullable=False)
+    valor_aceptado = Column(DECIMAL(18,2), nullable=False)    # de la última respuesta de cada glosa
+    valor_no_aceptado = Column(DECIMAL(18,2), nullable=False)
+
+
+class CuboFacturas(Base):
+    __tablename__ = "cubo_facturas"
+
+    periodo = Column(Integer, primary_key=True, autoincrement=False) # AAAAMM de fecha_emision
+    nombre_eps = Column(String(150), primary_key=True)
+    id_institucion_emisora = Column(BigInteger, primary_key=True, autoincrement=False)
+    id_institucion_receptora = Column(BigInteger, primary_key=True, autoincrement=False)
+    facturas = Column(Integer, nullable=False)
+    valor_facturado = Column(DECIMAL(18,2), nullable=False)
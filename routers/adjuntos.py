@@ -1,12 +1,15 @@
 # routers/adjuntos.py
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
-from database import get_db_session
+from database import get_db_session, get_db_lectura
 import schemas # Importa tus schemas
 import crud # Importa tus funciones CRUD
 import models # Asegúrate de importar los modelos si necesitas acceder a ellos directamente
+from serializacion import RespuestaNDJSON, RespuestaORJSON, pide_ndjson
+from alcance import Alcance
+from auth.auth import get_alcance, get_alcance_escritura
 
 router = APIRouter()
 
@@ -23,7 +26,10 @@ router = APIRouter()
 # ====================================================================
 
 @router.post("/", response_model=schemas.AdjuntoResponse, status_code=status.HTTP_201_CREATED)
-def create_adjunto(adjunto: schemas.AdjuntoCreate, db: Session = Depends(get_db_session)):
+def create_adjunto(
+    adjunto: schemas.AdjuntoCreate,
+    db: Session = Depends(get_db_session), alcance: Alcance = Depends(get_alcance_escritura),
+):
     # Validar que al menos uno de id_glosa o id_respuesta_glosa esté presente
     if not adjunto.id_glosa and not adjunto.id_respuesta_glosa:
         raise HTTPException(
@@ -31,15 +37,15 @@ def create_adjunto(adjunto: schemas.AdjuntoCreate, db: Session = Depends(get_db_
             detail="Se debe especificar al menos 'id_glosa' o 'id_respuesta_glosa' para el adjunto."
         )
 
-    # Opcional: Validar si la glosa existe (si se proporciona)
+    # Opcional: Validar si la glosa existe (si se proporciona) y está dentro del alcance
     if adjunto.id_glosa:
-        db_glosa = crud.get_glosa(db, adjunto.id_glosa)
+        db_glosa = crud.get_glosa(db, adjunto.id_glosa, alcance)
         if not db_glosa:
             raise HTTPException(status_code=404, detail="Glosa no encontrada para el adjunto.")
 
     # Opcional: Validar si la respuesta de glosa existe (si se proporciona)
     if adjunto.id_respuesta_glosa:
-        db_respuesta = crud.get_respuesta_glosa(db, adjunto.id_respuesta_glosa)
+        db_respuesta = crud.get_respuesta_glosa(db, adjunto.id_respuesta_glosa, alcance)
         if not db_respuesta:
             raise HTTPException(status_code=404, detail="Respuesta de Glosa no encontrada para el adjunto.")
             
@@ -52,27 +58,38 @@ def create_adjunto(adjunto: schemas.AdjuntoCreate, db: Session = Depends(get_db_
     return crud.create_adjunto(db=db, adjunto=adjunto)
 
 @router.get("/{adjunto_id}", response_model=schemas.AdjuntoResponse)
-def read_adjunto(adjunto_id: int, db: Session = Depends(get_db_session)):
-    db_adjunto = crud.get_adjunto(db, adjunto_id=adjunto_id)
+def read_adjunto(adjunto_id: int, db: Session = Depends(get_db_lectura), alcance: Alcance = Depends(get_alcance)):
+    db_adjunto = crud.get_adjunto(db, adjunto_id=adjunto_id, alcance=alcance)
     if db_adjunto is None:
         raise HTTPException(status_code=404, detail="Adjunto no encontrado")
     return db_adjunto
 
 @router.get("/", response_model=List[schemas.AdjuntoResponse])
-def read_adjuntos(skip: int = 0, limit: int = 100, db: Session = Depends(get_db_session)):
-    adjuntos = crud.get_adjuntos(db, skip=skip, limit=limit)
-    return adjuntos
+def read_adjuntos(
+    request: Request, skip: int = 0, limit: int = 100, desde_id: Optional[int] = None,
+    db: Session = Depends(get_db_lectura), alcance: Alcance = Depends(get_alcance),
+):
+    """En NDJSON (Accept o ?formato=ndjson) transmite todos, desde ?desde_id= si se indica."""
+    if pide_ndjson(request):
+        return RespuestaNDJSON(crud.iterar_filas(
+            models.Adjunto, schemas.AdjuntoResponse, alcance=alcance, desde_id=desde_id,
+        ))
+    adjuntos = crud.get_filas(db, models.Adjunto, schemas.AdjuntoResponse, skip=skip, limit=limit, alcance=alcance)
+    return RespuestaORJSON(adjuntos)
 
 @router.put("/{adjunto_id}", response_model=schemas.AdjuntoResponse)
-def update_adjunto_route(adjunto_id: int, adjunto_update: schemas.AdjuntoUpdate, db: Session = Depends(get_db_session)):
+def update_adjunto_route(
+    adjunto_id: int, adjunto_update: schemas.AdjuntoUpdate,
+    db: Session = Depends(get_db_session), alcance: Alcance = Depends(get_alcance_escritura),
+):
     # Opcional: Validar que la glosa, respuesta de glosa o usuario existan si se actualizan
     if adjunto_update.id_glosa:
-        db_glosa = crud.get_glosa(db, adjunto_update.id_glosa)
+        db_glosa = crud.get_glosa(db, adjunto_update.id_glosa, alcance)
         if not db_glosa:
             raise HTTPException(status_code=404, detail="Nueva glosa no encontrada para el adjunto.")
     
     if adjunto_update.id_respuesta_glosa:
-        db_respuesta = crud.get_respuesta_glosa(db, adjunto_update.id_respuesta_glosa)
+        db_respuesta = crud.get_respuesta_glosa(db, adjunto_update.id_respuesta_glosa, alcance)
         if not db_respuesta:
             raise HTTPException(status_code=404, detail="Nueva respuesta de glosa no encontrada para el adjunto.")
 
@@ -81,14 +98,14 @@ def update_adjunto_route(adjunto_id: int, adjunto_update: schemas.AdjuntoUpdate,
         if not db_usuario:
             raise HTTPException(status_code=404, detail="Nuevo usuario que sube no encontrado.")
 
-    db_adjunto = crud.update_adjunto(db, adjunto_id=adjunto_id, adjunto_update=adjunto_update)
+    db_adjunto = crud.update_adjunto(db, adjunto_id=adjunto_id, adjunto_update=adjunto_update, alcance=alcance)
     if db_adjunto is None:
         raise HTTPException(status_code=404, detail="Adjunto no encontrado")
     return db_adjunto
 
 @router.delete("/{adjunto_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_adjunto_route(adjunto_id: int, db: Session = Depends(get_db_session)):
-    db_adjunto = crud.delete_adjunto(db, adjunto_id=adjunto_id)
+def delete_adjunto_route(adjunto_id: int, db: Session = Depends(get_db_session), alcance: Alcance = Depends(get_alcance_escritura)):
+    db_adjunto = crud.delete_adjunto(db, adjunto_id=adjunto_id, alcance=alcance)
     if db_adjunto is None:
         raise HTTPException(status_code=404, detail="Adjunto no encontrado")
     return {} # Devuelve una respuesta vacía para 204 No Content
\ No newline at end of file
@@ -0,0 +1,22 @@
+# routers/alertas.py
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from database import get_db_lectura
+import schemas
+import vencimientos
+from auth.auth import get_current_active_user
+
+router = APIRouter(tags=["Alertas"])
+
+# ====================================================================
+# Colas de vencimiento (precalculadas, ver vencimientos.py)
+# ====================================================================
+
+@router.get("/mis-glosas", response_model=schemas.ColaAlertas)
+def mis_glosas(
+    db: Session = Depends(get_db_lectura),
+    current_user: schemas.UsuarioResponse = Depends(get_current_active_user),
+):
+    """Glosas del usuario vencidas o que vencen en los próximos ALERTAS_DIAS días."""
+    return vencimientos.cola_usuario(db, current_user.id_usuario)
@@ -0,0 +1,43 @@
+# routers/analytics.py
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from database import get_db_lectura
+import cubos
+from serializacion import RespuestaORJSON
+from alcance import Alcance
+from auth.auth import get_alcance
+
+router = APIRouter(tags=["Analytics"])
+
+# ====================================================================
+# Cubos de glosas por EPS × motivo × mes (ver cubos.py)
+# ====================================================================
+
+@router.get("/cubo")
+def consultar_cubo(
+    dimensiones: str = "eps",
+    eps: Optional[str] = None,
+    motivo: Optional[str] = None,
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None,
+    limit: int = 100,
+    db: Session = Depends(get_db_lectura),
+    alcance: Alcance = Depends(get_alcance),
+):
+    """
+    Agregados por ?dimensiones= (periodo, eps, motivo, ips; separadas por
+    coma), filtrables por eps, motivo y periodo desde/hasta (AAAA-MM).
+    Drill-down: ?dimensiones=eps, luego ?eps=X&dimensiones=motivo, luego
+    ?eps=X&motivo=Y&dimensiones=periodo.
+    """
+    try:
+        filas = cubos.consultar(
+            db, [d.strip() for d in dimensiones.split(",") if d.strip()],
+            eps=eps, motivo=motivo, desde=desde, hasta=hasta, alcance=alcance, limit=limit,
+        )
+    except cubos.DimensionDesconocida as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return RespuestaORJSON(filas)
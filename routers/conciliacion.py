@@ -0,0 +1,56 @@
+# routers/conciliacion.py
+import io
+import json
+
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from database import get_db_session
+import conciliacion
+import schemas
+from alcance import Alcance
+from auth.auth import get_alcance_escritura, get_current_active_user
+
+router = APIRouter(tags=["Conciliación"])
+
+# ====================================================================
+# Conciliación de archivos de respuesta EPS
+# ====================================================================
+
+@router.post("/eps")
+def conciliar_archivo_eps(
+    file: UploadFile = File(...),
+    aplicar: bool = True,
+    reporte: bool = False,
+    db: Session = Depends(get_db_session),
+    current_user: schemas.UsuarioResponse = Depends(get_current_active_user),
+    alcance: Alcance = Depends(get_alcance_escritura),
+):
+    """
+    Cruza el archivo (CSV o Excel) con las glosas abiertas. Con aplicar=false
+    solo informa. Con reporte=true devuelve el reporte de diferencias en CSV.
+    """
+    try:
+        eps = conciliacion.leer_archivo_eps(file.file, file.filename or "")
+    except conciliacion.ArchivoInvalido as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    resultado = conciliacion.conciliar(db, eps, current_user.id_usuario, aplicar_cambios=aplicar, alcance=alcance)
+    diferencias = conciliacion.reporte_diferencias(resultado["cruce"])
+
+    if reporte:
+        salida = io.StringIO()
+        diferencias.to_csv(salida, index=False)
+        return StreamingResponse(
+            iter([salida.getvalue()]),
+            media_type="text/csv",
+            headers={"Content-Disposition": "attachment; filename=conciliacion_diferencias.csv"},
+        )
+
+    return {
+        "resumen": resultado["resumen"],
+        "aplicadas": resultado["aplicadas"],
+        "omitidas": resultado["omitidas"],
+        "diferencias": json.loads(diferencias.head(1000).to_json(orient="records", force_ascii=False)),
+    }
@@ -1,12 +1,21 @@
 # routers/facturas.py
+import shutil
+import tempfile
+import zipfile
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, File, HTTPException, Request, UploadFile, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
-from database import get_db_session
+from database import get_db_session, get_db_lectura
 import schemas
 import crud
+import models
+import facturas_dian
+import validaciones
+from serializacion import CampoDesconocido, RespuestaNDJSON, RespuestaORJSON, pide_ndjson
+from alcance import Alcance
+from auth.auth import get_alcance, get_alcance_escritura, get_current_active_user
 
 router = APIRouter()
 
@@ -23,7 +32,17 @@ router = APIRouter()
 # ====================================================================
 
 @router.post("/", response_model=schemas.FacturaResponse, status_code=status.HTTP_201_CREATED)
-def create_factura(factura: schemas.FacturaCreate, db: Session = Depends(get_db_session)):
+def create_factura(
+    factura: schemas.FacturaCreate,
+    db: Session = Depends(get_db_session), alcance: Alcance = Depends(get_alcance_escritura),
+):
+    if not alcance.admite_factura(factura.id_institucion_emisora, factura.id_institucion_receptora):
+        raise HTTPException(status_code=403, detail="La factura no pertenece a su institución")
+    try:
+        validaciones.exigir(factura.model_dump(), validaciones.REGLAS_FACTURA)
+    except validaciones.DatosInvalidos as e:
+        raise HTTPException(status_code=422, detail=e.detalle)
+
     db_factura = crud.get_factura_by_numero(db, numero_factura=factura.numero_factura)
     if db_factura:
         raise HTTPException(status_code=400, detail="El número de factura ya está registrado")
@@ -39,20 +58,85 @@ def create_factura(factura: schemas.FacturaCreate, db: Session = Depends(get_db_
 
     return crud.create_factura(db=db, factura=factura)
 
+@router.post("/importar-dian")
+def importar_facturas_dian(
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db_session),
+    current_user: schemas.UsuarioResponse = Depends(get_current_active_user),
+    alcance: Alcance = Depends(get_alcance_escritura),
+):
+    """
+    Carga un ZIP de facturas electrónicas DIAN (XML UBL 2.1) con upsert por
+    numero_factura (ver facturas_dian.py). Los XML que no se pueden leer, los
+    que incumplen REGLAS_FACTURA, los de otra institución y los de facturas
+    que ya avanzaron de estado vuelven en "rechazadas".
+    """
+    with tempfile.NamedTemporaryFile(suffix=".zip") as temporal:
+        shutil.copyfileobj(file.file, temporal)
+        temporal.flush()
+        if not zipfile.is_zipfile(temporal.name):
+            raise HTTPException(status_code=400, detail="Se espera un archivo ZIP con los XML de las facturas")
+        return facturas_dian.importar(db, temporal.name, alcance=alcance)
+
 @router.get("/{factura_id}", response_model=schemas.FacturaResponse)
-def read_factura(factura_id: int, db: Session = Depends(get_db_session)):
-    db_factura = crud.get_factura(db, factura_id=factura_id)
+def read_factura(
+    factura_id: int, incluir_archivo: bool = False,
+    db: Session = Depends(get_db_lectura), alcance: Alcance = Depends(get_alcance),
+):
+    db_factura = crud.get_factura(db, factura_id=factura_id, alcance=alcance)
+    if db_factura is None and incluir_archivo:
+        db_factura = crud.get_factura_archivada(db, factura_id, alcance=alcance)
     if db_factura is None:
         raise HTTPException(status_code=404, detail="Factura no encontrada")
     return db_factura
 
 @router.get("/", response_model=List[schemas.FacturaResponse])
-def read_facturas(skip: int = 0, limit: int = 100, db: Session = Depends(get_db_session)):
-    facturas = crud.get_facturas(db, skip=skip, limit=limit)
-    return facturas
+def read_facturas(
+    request: Request,
+    skip: int = 0, limit: int = 100, incluir_archivo: bool = False,
+    fields: Optional[str] = None, include: Optional[str] = None, desde_id: Optional[int] = None,
+    db: Session = Depends(get_db_lectura), alcance: Alcance = Depends(get_alcance),
+):
+    """
+    ?fields= limita las columnas; ?include=emisora,receptora embebe las instituciones.
+    En NDJSON (Accept o ?formato=ndjson) transmite todas, desde ?desde_id= si se indica.
+    """
+    try:
+        campos, incluir = crud.proyeccion(models.Factura, schemas.FacturaResponse, fields, include)
+    except CampoDesconocido as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    archivo = models.FacturaArchivo if incluir_archivo else None
+    if pide_ndjson(request):
+        return RespuestaNDJSON(crud.iterar_filas(
+            models.Factura, schemas.FacturaResponse, archivo=archivo, alcance=alcance,
+            campos=campos, incluir=incluir, desde_id=desde_id,
+        ))
+    facturas = crud.get_filas(
+        db, models.Factura, schemas.FacturaResponse, skip=skip, limit=limit, archivo=archivo, alcance=alcance,
+        campos=campos, incluir=incluir,
+    )
+    return RespuestaORJSON(facturas)
 
 @router.put("/{factura_id}", response_model=schemas.FacturaResponse)
-def update_factura_route(factura_id: int, factura_update: schemas.FacturaUpdate, db: Session = Depends(get_db_session)):
+def update_factura_route(
+    factura_id: int, factura_update: schemas.FacturaUpdate,
+    db: Session = Depends(get_db_session), alcance: Alcance = Depends(get_alcance_escritura),
+):
+    db_actual = crud.get_factura(db, factura_id, alcance)
+    if db_actual is not None:
+        vigente = {c: getattr(db_actual, c) for c in ("numero_factura", "fecha_emision", "fecha_radicado", "valor_total_factura")}
+        try:
+            validaciones.exigir({**vigente, **factura_update.model_dump(exclude_unset=True)}, validaciones.REGLAS_FACTURA)
+        except validaciones.DatosInvalidos as e:
+            raise HTTPException(status_code=422, detail=e.detalle)
+        # La factura no puede salir del alcance de quien la modifica.
+        cambios = factura_update.model_dump(exclude_unset=True)
+        if not alcance.admite_factura(
+            cambios.get("id_institucion_emisora", db_actual.id_institucion_emisora),
+            cambios.get("id_institucion_receptora", db_actual.id_institucion_receptora),
+        ):
+            raise HTTPException(status_code=403, detail="La factura no pertenece a su institución")
+
     # Opcional: Validar que las instituciones emisora y receptora existan si se actualizan
     if factura_update.id_institucion_emisora:
         db_institucion_emisora = crud.get_institucion(db, factura_update.id_institucion_emisora)
@@ -64,14 +148,14 @@ def update_factura_route(factura_id: int, factura_update: schemas.FacturaUpdate,
         if not db_institucion_receptora:
             raise HTTPException(status_code=404, detail="Nueva institución receptora no encontrada")
 
-    db_factura = crud.update_factura(db, factura_id=factura_id, factura_update=factura_update)
+    db_factura = crud.update_factura(db, factura_id=factura_id, factura_update=factura_update, alcance=alcance)
     if db_factura is None:
         raise HTTPException(status_code=404, detail="Factura no encontrada")
     return db_factura
 
 @router.delete("/{factura_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_factura_route(factura_id: int, db: Session = Depends(get_db_session)):
-    db_factura = crud.delete_factura(db, factura_id=factura_id)
+def delete_factura_route(factura_id: int, db: Session = Depends(get_db_session), alcance: Alcance = Depends(get_alcance_escritura)):
+    db_factura = crud.delete_factura(db, factura_id=factura_id, alcance=alcance)
     if db_factura is None:
         raise HTTPException(status_code=404, detail="Factura no encontrada")
     return {} # Devuelve una respuesta vacía para 204 No Content
\ No newline at end of file
@@ -1,15 +1,23 @@
 # routers/glosas.py
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from decimal import Decimal
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
-from database import get_db_session
+from database import get_db_session, get_db_lectura
 
 import schemas
 import crud
 import models
-from auth.auth import get_current_active_user, get_current_auditor_ips_user, get_current_auditor_eps_user, get_current_admin_user
+import estados_glosa
+import duplicados
+import validaciones
+from serializacion import CampoDesconocido, RespuestaNDJSON, RespuestaORJSON, pide_ndjson
+from alcance import Alcance
+from auth.auth import get_current_active_user, get_current_auditor_ips_user, get_current_auditor_eps_user, get_current_admin_user, get_alcance, get_alcance_escritura
 
 router = APIRouter(
     # prefix="/glosas", # Asegúrate de que este prefix esté configurado en main.py si lo necesitas
@@ -20,9 +28,19 @@ router = APIRouter(
 # Rutas para Glosa
 # ====================================================================
 
+def _validar(datos: dict, factura: models.Factura) -> None:
+    """validaciones.REGLAS_GLOSA sobre la glosa y su factura; 422 con todas las infracciones."""
+    try:
+        validaciones.exigir(
+            {**datos, "fecha_emision": factura.fecha_emision, "valor_total_factura": factura.valor_total_factura},
+            validaciones.REGLAS_GLOSA,
+        )
+    except validaciones.DatosInvalidos as e:
+        raise HTTPException(status_code=422, detail=e.detalle)
+
 @router.post("/", response_model=schemas.Glosa, status_code=status.HTTP_201_CREATED)
-def create_glosa(glosa: schemas.GlosaCreate, db: Session = Depends(get_db_session)):
-    db_factura = crud.get_factura(db, glosa.id_factura)
+def create_glosa(glosa: schemas.GlosaCreate, db: Session = Depends(get_db_session), alcance: Alcance = Depends(get_alcance_escritura)):
+    db_factura = crud.get_factura(db, glosa.id_factura, alcance)
     if not db_factura:
         raise HTTPException(status_code=404, detail="Factura no encontrada")
 
@@ -35,19 +53,97 @@ def create_glosa(glosa: schemas.GlosaCreate, db: Session = Depends(get_db_sessio
         if not db_usuario:
             raise HTTPException(status_code=404, detail="Usuario responsable no encontrado")
 
-    return crud.create_glosa(db=db, glosa=glosa)
+    if glosa.estado_glosa:
+        try:
+            estados_glosa.validar_estado(glosa.estado_glosa)
+        except estados_glosa.EstadoDesconocido as e:
+            raise HTTPException(status_code=422, detail=str(e))
+
+    _validar(glosa.model_dump(), db_factura)
+
+    repetida = duplicados.get_glosa_por_huella(
+        db, duplicados.huella(glosa.id_factura, glosa.id_motivo_glosa, glosa.valor_glosado, glosa.fecha_glosa)
+    )
+    if repetida:
+        raise HTTPException(status_code=409, detail=f"Glosa duplicada: ya existe la glosa {repetida.id_glosa}")
+    try:
+        return crud.create_glosa(db=db, glosa=glosa)
+    except IntegrityError:
+        # Otra petición registró la misma glosa entre la consulta y el INSERT.
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Glosa duplicada")
+
+@router.post("/transiciones", response_model=schemas.TransicionResultado)
+def transicionar_glosas(
+    transicion: schemas.TransicionGlosas,
+    db: Session = Depends(get_db_session),
+    current_user: schemas.UsuarioResponse = Depends(get_current_active_user),
+    alcance: Alcance = Depends(get_alcance_escritura),
+):
+    """Aplica un cambio de estado a muchas glosas en una sola sentencia; informa las omitidas."""
+    try:
+        return crud.transicionar_glosas(db, transicion.ids, transicion.estado, alcance=alcance)
+    except estados_glosa.EstadoDesconocido as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+@router.get("/duplicados", response_model=List[schemas.GlosaCasiDuplicada])
+def read_casi_duplicadas(
+    tolerancia: Decimal = Decimal("0"), id_factura: Optional[int] = None, skip: int = 0, limit: int = 100,
+    db: Session = Depends(get_db_lectura), alcance: Alcance = Depends(get_alcance),
+):
+    """Glosas con la misma factura y motivo que otra y valor a `tolerancia` pesos o menos de ella."""
+    return RespuestaORJSON(duplicados.casi_duplicadas(
+        db, tolerancia=tolerancia, id_factura=id_factura, alcance=alcance, skip=skip, limit=limit,
+    ))
 
 @router.get("/{glosa_id}", response_model=schemas.Glosa)
-def read_glosa(glosa_id: int, db: Session = Depends(get_db_session)):
-    db_glosa = crud.get_glosa(db, glosa_id=glosa_id)
+def read_glosa(
+    glosa_id: int, incluir_archivo: bool = False,
+    db: Session = Depends(get_db_lectura), alcance: Alcance = Depends(get_alcance),
+):
+    db_glosa = crud.get_glosa(db, glosa_id=glosa_id, alcance=alcance)
+    if db_glosa is None and incluir_archivo:
+        db_glosa = crud.get_glosa_archivada(db, glosa_id, alcance=alcance)
     if db_glosa is None:
         raise HTTPException(status_code=404, detail="Glosa no encontrada")
     return db_glosa
 
+@router.get("/{glosa_id}/historial", response_model=List[schemas.GlosaEventoResponse])
+def read_historial_glosa(glosa_id: int, db: Session = Depends(get_db_lectura), alcance: Alcance = Depends(get_alcance)):
+    """Bitácora de cambios de la glosa, en orden (índice id_glosa + fecha_evento)."""
+    return RespuestaORJSON(crud.get_historial_glosa(db, glosa_id, alcance=alcance))
+
 @router.get("/", response_model=List[schemas.Glosa])
-def read_glosas(skip: int = 0, limit: int = 100, db: Session = Depends(get_db_session)):
-    glosas = crud.get_glosas(db, skip=skip, limit=limit)
-    return glosas
+def read_glosas(
+    request: Request,
+    skip: int = 0, limit: int = 100, incluir_archivo: bool = False,
+    fields: Optional[str] = None, include: Optional[str] = None, desde_id: Optional[int] = None,
+    db: Session = Depends(get_db_lectura), alcance: Alcance = Depends(get_alcance),
+):
+    """
+    ?fields=id_glosa,valor_glosado,factura.numero_factura limita las columnas;
+    ?include=factura,motivo embebe la factura y el motivo de cada glosa (un
+    solo SELECT con LEFT JOIN).
+
+    Con Accept: application/x-ndjson (o ?formato=ndjson) devuelve todas las
+    glosas en streaming, una por línea y por id_glosa; skip/limit no aplican
+    y ?desde_id= reanuda una descarga cortada.
+    """
+    try:
+        campos, incluir = crud.proyeccion(models.Glosa, schemas.Glosa, fields, include)
+    except CampoDesconocido as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    archivo = models.GlosaArchivo if incluir_archivo else None
+    if pide_ndjson(request):
+        return RespuestaNDJSON(crud.iterar_filas(
+            models.Glosa, schemas.Glosa, archivo=archivo, alcance=alcance,
+            campos=campos, incluir=incluir, desde_id=desde_id,
+        ))
+    glosas = crud.get_filas(
+        db, models.Glosa, schemas.Glosa, skip=skip, limit=limit, archivo=archivo, alcance=alcance,
+        campos=campos, incluir=incluir,
+    )
+    return RespuestaORJSON(glosas)
 
 # ====================================================================
 # RUTA DE ACTUALIZACIÓN DE GLOSA CONSOLIDADA (SOLO UNA DEFINICIÓN)
@@ -60,16 +156,17 @@ def update_glosa_route(
     db: Session = Depends(get_db_session),
     # Aquí puedes elegir la dependencia de usuario que necesites:
     # get_current_active_user, get_current_auditor_ips_user, get_current_admin_user, etc.
-    current_user: schemas.UsuarioResponse = Depends(get_current_active_user)
+    current_user: schemas.UsuarioResponse = Depends(get_current_active_user),
+    alcance: Alcance = Depends(get_alcance_escritura),
 ):
-    # 1. Verificar si la glosa existe
-    db_glosa = crud.get_glosa(db, glosa_id=glosa_id)
+    # 1. Verificar si la glosa existe (y está dentro del alcance del usuario)
+    db_glosa = crud.get_glosa(db, glosa_id=glosa_id, alcance=alcance)
     if not db_glosa:
         raise HTTPException(status_code=404, detail="Glosa no encontrada")
     
     # 2. Validaciones de IDs relacionados (factura, motivo, usuario responsable)
     if glosa_update.id_factura is not None: # Usar 'is not None' para diferenciar de 0 o False si fueran esos valores
-        db_factura = crud.get_factura(db, glosa_update.id_factura)
+        db_factura = crud.get_factura(db, glosa_update.id_factura, alcance)
         if not db_factura:
             raise HTTPException(status_code=404, detail="Nueva factura no encontrada para la glosa.")
 
@@ -83,21 +180,44 @@ def update_glosa_route(
         if not db_usuario:
             raise HTTPException(status_code=404, detail="Nuevo usuario responsable no encontrado.")
 
+    cambios = glosa_update.model_dump(exclude_unset=True)
+    if cambios.keys() & {"id_factura", "fecha_glosa", "valor_glosado", "fecha_vencimiento_respuesta"}:
+        # Si cambia la fecha de la glosa sin vencimiento explícito, crud lo recalcula.
+        vigente = {
+            "fecha_glosa": db_glosa.fecha_glosa,
+            "valor_glosado": db_glosa.valor_glosado,
+            "fecha_vencimiento_respuesta": None if "fecha_glosa" in cambios else db_glosa.fecha_vencimiento_respuesta,
+        }
+        _validar({**vigente, **cambios}, db_factura if glosa_update.id_factura is not None else db_glosa.factura)
+
+    valores = [cambios.get(c, getattr(db_glosa, c)) for c in duplicados.CAMPOS_HUELLA]
+    if cambios.keys() & set(duplicados.CAMPOS_HUELLA) and all(v is not None for v in valores):
+        repetida = duplicados.get_glosa_por_huella(db, duplicados.huella(*valores), excluir=glosa_id)
+        if repetida:
+            raise HTTPException(status_code=409, detail=f"Glosa duplicada: ya existe la glosa {repetida.id_glosa}")
+
     # 3. Opcional: Implementar lógica de permisos más granular basada en current_user
     # Por ejemplo, solo el usuario responsable o un admin pueden actualizar la glosa
     # if current_user.id_usuario != db_glosa.usuario_responsable and current_user.rol != "ADMIN":
     #     raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No tienes permiso para actualizar esta glosa")
 
     # 4. Realizar la actualización
-    updated_glosa = crud.update_glosa(db, db_glosa=db_glosa, glosa_update=glosa_update)
-    # Nota: crud.update_glosa ya debería manejar si no hay glosa, pero la comprobación inicial es buena.
-    # Si crud.update_glosa devuelve None en caso de fallo, podrías añadir una comprobación aquí también.
+    try:
+        updated_glosa = crud.update_glosa(db, glosa_id=glosa_id, glosa_update=glosa_update, alcance=alcance)
+    except estados_glosa.EstadoDesconocido as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except estados_glosa.TransicionInvalida as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except IntegrityError:
+        # Otra petición dejó una glosa con la misma huella entre la consulta y el UPDATE.
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Glosa duplicada")
     
     return updated_glosa
 
 @router.delete("/{glosa_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_glosa_route(glosa_id: int, db: Session = Depends(get_db_session)):
-    db_glosa = crud.delete_glosa(db, glosa_id=glosa_id)
+def delete_glosa_route(glosa_id: int, db: Session = Depends(get_db_session), alcance: Alcance = Depends(get_alcance_escritura)):
+    db_glosa = crud.delete_glosa(db, glosa_id=glosa_id, alcance=alcance)
     if db_glosa is None:
         raise HTTPException(status_code=404, detail="Glosa no encontrada")
     return {} # Las eliminaciones exitosas a menudo devuelven un cuerpo vacío con 204 No Content
\ No newline at end of file
@@ -4,9 +4,12 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from typing import List
 
-from database import get_db_session
+from database import get_db_session, get_db_lectura
 import schemas
 import crud
+import models
+import validaciones
+from serializacion import RespuestaORJSON
 
 router = APIRouter()
 
@@ -24,25 +27,33 @@ router = APIRouter()
 
 @router.post("/", response_model=schemas.MotivoGlosaResponse, status_code=status.HTTP_201_CREATED)
 def create_motivo_glosa(motivo_glosa: schemas.MotivoGlosaCreate, db: Session = Depends(get_db_session)):
+    try:
+        validaciones.exigir(motivo_glosa.model_dump(), validaciones.REGLAS_MOTIVO)
+    except validaciones.DatosInvalidos as e:
+        raise HTTPException(status_code=422, detail=e.detalle)
     db_motivo = crud.get_motivo_glosa_by_codigo(db, codigo=motivo_glosa.codigo_motivo)
     if db_motivo:
         raise HTTPException(status_code=400, detail="El código de motivo de glosa ya está registrado")
     return crud.create_motivo_glosa(db=db, motivo_glosa=motivo_glosa)
 
 @router.get("/{motivo_glosa_id}", response_model=schemas.MotivoGlosaResponse)
-def read_motivo_glosa(motivo_glosa_id: int, db: Session = Depends(get_db_session)):
+def read_motivo_glosa(motivo_glosa_id: int, db: Session = Depends(get_db_lectura)):
     db_motivo = crud.get_motivo_glosa(db, motivo_glosa_id=motivo_glosa_id)
     if db_motivo is None:
         raise HTTPException(status_code=404, detail="Motivo de glosa no encontrado")
     return db_motivo
 
 @router.get("/", response_model=List[schemas.MotivoGlosaResponse])
-def read_motivos_glosa(skip: int = 0, limit: int = 100, db: Session = Depends(get_db_session)):
-    motivos_glosa = crud.get_motivos_glosa(db, skip=skip, limit=limit)
-    return motivos_glosa
+def read_motivos_glosa(skip: int = 0, limit: int = 100, db: Session = Depends(get_db_lectura)):
+    motivos_glosa = crud.get_filas(db, models.MotivoGlosa, schemas.MotivoGlosaResponse, skip=skip, limit=limit)
+    return RespuestaORJSON(motivos_glosa)
 
 @router.put("/{motivo_glosa_id}", response_model=schemas.MotivoGlosaResponse)
 def update_motivo_glosa_route(motivo_glosa_id: int, motivo_glosa_update: schemas.MotivoGlosaUpdate, db: Session = Depends(get_db_session)):
+    try:
+        validaciones.exigir(motivo_glosa_update.model_dump(exclude_unset=True), validaciones.REGLAS_MOTIVO)
+    except validaciones.DatosInvalidos as e:
+        raise HTTPException(status_code=422, detail=e.detalle)
     db_motivo = crud.update_motivo_glosa(db, motivo_glosa_id=motivo_glosa_id, motivo_glosa_update=motivo_glosa_update)
     if db_motivo is None:
         raise HTTPException(status_code=404, detail="Motivo de glosa no encontrado")
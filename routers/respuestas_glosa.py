@@ -1,13 +1,19 @@
 # routers/respuestas_glosa.py
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import date
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
-from database import get_db_session
+from database import get_db_session, get_db_lectura
 import schemas # Importa tus schemas
 import crud # Importa tus funciones CRUD
 import models # Asegúrate de importar los modelos si necesitas acceder a ellos directamente (ej: para errores)
+from serializacion import RespuestaNDJSON, RespuestaORJSON, pide_ndjson
+from alcance import Alcance
+from auth.auth import get_alcance, get_alcance_escritura, get_current_active_user
+import carta_pdf
+import cartas
 
 router = APIRouter()
 
@@ -24,9 +30,12 @@ router = APIRouter()
 # ====================================================================
 
 @router.post("/", response_model=schemas.RespuestaGlosaResponse, status_code=status.HTTP_201_CREATED)
-def create_respuesta_glosa(respuesta_glosa: schemas.RespuestaGlosaCreate, db: Session = Depends(get_db_session)):
-    # Opcional: Validar si la glosa existe
-    db_glosa = crud.get_glosa(db, respuesta_glosa.id_glosa)
+def create_respuesta_glosa(
+    respuesta_glosa: schemas.RespuestaGlosaCreate,
+    db: Session = Depends(get_db_session), alcance: Alcance = Depends(get_alcance_escritura),
+):
+    # Validar si la glosa existe (y está dentro del alcance)
+    db_glosa = crud.get_glosa(db, respuesta_glosa.id_glosa, alcance)
     if not db_glosa:
         raise HTTPException(status_code=404, detail="Glosa no encontrada")
 
@@ -37,23 +46,73 @@ def create_respuesta_glosa(respuesta_glosa: schemas.RespuestaGlosaCreate, db: Se
 
     return crud.create_respuesta_glosa(db=db, respuesta_glosa=respuesta_glosa)
 
+@router.post("/cartas")
+def generar_cartas(
+    id_factura: Optional[int] = None, nombre_eps: Optional[str] = None,
+    desde: Optional[date] = None, hasta: Optional[date] = None,
+    db: Session = Depends(get_db_session), alcance: Alcance = Depends(get_alcance_escritura),
+    current_user: schemas.UsuarioResponse = Depends(get_current_active_user),
+):
+    """
+    Genera en lote las cartas PDF de las respuestas de una factura o de una
+    EPS (opcionalmente entre fechas de respuesta) y las deja como adjuntos
+    de cada respuesta (ver cartas.py).
+    """
+    if id_factura is None and nombre_eps is None:
+        raise HTTPException(status_code=400, detail="Indique id_factura o nombre_eps")
+    try:
+        resumen = cartas.generar_lote(
+            db, current_user.id_usuario, alcance=alcance,
+            id_factura=id_factura, nombre_eps=nombre_eps, desde=desde, hasta=hasta,
+        )
+    except carta_pdf.RendererNoDisponible as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    db.commit()
+    return resumen
+
+@router.get("/{respuesta_id}/carta", response_class=Response)
+def descargar_carta(respuesta_id: int, db: Session = Depends(get_db_lectura), alcance: Alcance = Depends(get_alcance)):
+    """Carta PDF de una respuesta, generada al vuelo (no se guarda como adjunto)."""
+    datos = cartas.datos_cartas(db, ids=[respuesta_id], alcance=alcance)
+    if not datos:
+        raise HTTPException(status_code=404, detail="Respuesta de Glosa no encontrada")
+    try:
+        contenido = carta_pdf.pdf(carta_pdf.texto(cartas.PLANTILLA, datos[0]), titulo=f"Respuesta glosa {datos[0]['id_glosa']}")
+    except carta_pdf.RendererNoDisponible as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return Response(
+        contenido, media_type="application/pdf",
+        headers={"Content-Disposition": f'inline; filename="respuesta_glosa_{respuesta_id}.pdf"'},
+    )
+
 @router.get("/{respuesta_id}", response_model=schemas.RespuestaGlosaResponse)
-def read_respuesta_glosa(respuesta_id: int, db: Session = Depends(get_db_session)):
-    db_respuesta = crud.get_respuesta_glosa(db, respuesta_id=respuesta_id)
+def read_respuesta_glosa(respuesta_id: int, db: Session = Depends(get_db_lectura), alcance: Alcance = Depends(get_alcance)):
+    db_respuesta = crud.get_respuesta_glosa(db, respuesta_id=respuesta_id, alcance=alcance)
     if db_respuesta is None:
         raise HTTPException(status_code=404, detail="Respuesta de Glosa no encontrada")
     return db_respuesta
 
 @router.get("/", response_model=List[schemas.RespuestaGlosaResponse])
-def read_respuestas_glosa(skip: int = 0, limit: int = 100, db: Session = Depends(get_db_session)):
-    respuestas = crud.get_respuestas_glosa(db, skip=skip, limit=limit)
-    return respuestas
+def read_respuestas_glosa(
+    request: Request, skip: int = 0, limit: int = 100, desde_id: Optional[int] = None,
+    db: Session = Depends(get_db_lectura), alcance: Alcance = Depends(get_alcance),
+):
+    """En NDJSON (Accept o ?formato=ndjson) transmite todas, desde ?desde_id= si se indica."""
+    if pide_ndjson(request):
+        return RespuestaNDJSON(crud.iterar_filas(
+            models.RespuestaGlosa, schemas.RespuestaGlosaResponse, alcance=alcance, desde_id=desde_id,
+        ))
+    respuestas = crud.get_filas(db, models.RespuestaGlosa, schemas.RespuestaGlosaResponse, skip=skip, limit=limit, alcance=alcance)
+    return RespuestaORJSON(respuestas)
 
 @router.put("/{respuesta_id}", response_model=schemas.RespuestaGlosaResponse)
-def update_respuesta_glosa_route(respuesta_id: int, respuesta_update: schemas.RespuestaGlosaUpdate, db: Session = Depends(get_db_session)):
+def update_respuesta_glosa_route(
+    respuesta_id: int, respuesta_update: schemas.RespuestaGlosaUpdate,
+    db: Session = Depends(get_db_session), alcance: Alcance = Depends(get_alcance_escritura),
+):
     # Opcional: Validar que la glosa o el usuario respondedor existan si se actualizan
     if respuesta_update.id_glosa:
-        db_glosa = crud.get_glosa(db, respuesta_update.id_glosa)
+        db_glosa = crud.get_glosa(db, respuesta_update.id_glosa, alcance)
         if not db_glosa:
             raise HTTPException(status_code=404, detail="Nueva glosa no encontrada para la respuesta.")
     
@@ -62,14 +121,16 @@ def update_respuesta_glosa_route(respuesta_id: int, respuesta_update: schemas.Re
         if not db_usuario:
             raise HTTPException(status_code=404, detail="Nuevo usuario respondedor no encontrado.")
 
-    db_respuesta = crud.update_respuesta_glosa(db, respuesta_id=respuesta_id, respuesta_update=respuesta_update)
+    db_respuesta = crud.update_respuesta_glosa(db, respuesta_id=respuesta_id, respuesta_update=respuesta_update, alcance=alcance)
     if db_respuesta is None:
         raise HTTPException(status_code=404, detail="Respuesta de Glosa no encontrada")
     return db_respuesta
 
 @router.delete("/{respuesta_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_respuesta_glosa_route(respuesta_id: int, db: Session = Depends(get_db_session)):
-    db_respuesta = crud.delete_respuesta_glosa(db, respuesta_id=respuesta_id)
+def delete_respuesta_glosa_route(
+    respuesta_id: int, db: Session = Depends(get_db_session), alcance: Alcance = Depends(get_alcance_escritura),
+):
+    db_respuesta = crud.delete_respuesta_glosa(db, respuesta_id=respuesta_id, alcance=alcance)
     if db_respuesta is None:
         raise HTTPException(status_code=404, detail="Respuesta de Glosa no encontrada")
     # Nota: Aquí podrías añadir lógica para eliminar adjuntos relacionados
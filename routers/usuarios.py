@@ -8,6 +8,8 @@ from typing import List, Optional
 from database import get_db_session # <-- Asegúrate de que get_db esté importado aquí
 import schemas
 import crud
+import models
+from serializacion import RespuestaORJSON
 
 # Importa las dependencias de seguridad desde auth.auth
 # Asegúrate de que los nombres de las funciones sean EXACTAMENTE los que tienes en auth/auth.py
@@ -49,8 +51,8 @@ def read_user(user_id: int, db: Session = Depends(get_db_session), current_user:
 @router.get("/", response_model=List[schemas.UsuarioResponse])
 # Aquí también, usando la dependencia correcta y un ejemplo de protección por rol.
 def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db_session), current_user: schemas.UsuarioResponse = Depends(get_current_admin_user)): # Solo administradores
-    users = crud.get_users(db, skip=skip, limit=limit)
-    return users
+    users = crud.get_filas(db, models.Usuario, schemas.UsuarioResponse, skip=skip, limit=limit)
+    return RespuestaORJSON(users)
 
 @router.put("/{user_id}", response_model=schemas.UsuarioResponse)
 # Y aquí, usando la dependencia correcta.
@@ -58,6 +60,9 @@ def update_user_route(user_id: int, user_update: schemas.UsuarioUpdate, db: Sess
     # Lógica de autorización: solo admin puede actualizar cualquier usuario, el propio usuario puede actualizarse a sí mismo
     if current_user.rol != "ADMIN" and current_user.id_usuario != user_id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No tienes permisos para actualizar este usuario")
+    # El rol y la institución definen qué datos ve el usuario (alcance.py): solo los cambia un admin.
+    if current_user.rol != "ADMIN" and user_update.model_fields_set & {"rol", "id_institucion"}:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Solo un administrador puede cambiar el rol o la institución")
     
     db_user = crud.update_user(db, user_id=user_id, user_update=user_update)
     if db_user is None:
@@ -26,6 +26,7 @@ class UsuarioBase(ConfigBase):
     email: EmailStr
     rol: str # Ej. 'ADMIN', 'FACTURADOR_IPS', 'AUDITOR_IPS', 'GERENTE_IPS', 'AUDITOR_EPS', 'USUARIO_EPS'
     telefono: Optional[str] = None
+    id_institucion: Optional[int] = None # IPS o EPS del usuario; limita los datos que ve
 
 class UsuarioCreate(UsuarioBase):
     password: str = Field(min_length=8) # Contraseña solo para creación
@@ -42,6 +43,7 @@ class UsuarioUpdate(ConfigBase):
     password: Optional[str] = Field(None, min_length=8) # Permite actualizar contraseña
     rol: Optional[str] = None
     telefono: Optional[str] = None
+    id_institucion: Optional[int] = None
     activo: Optional[bool] = None # Permite activar/desactivar usuario
 
 # ====================================================================
@@ -172,6 +174,56 @@ class GlosaUpdate(ConfigBase):
     usuario_responsable: Optional[int] = None
     fecha_vencimiento_respuesta: Optional[date] = None
 
+# Transiciones de estado masivas (ver estados_glosa.py)
+class TransicionGlosas(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=100_000)
+    estado: str
+
+class GlosaOmitida(BaseModel):
+    id_glosa: int
+    estado_actual: Optional[str] = None
+    motivo: str # no_existe | transicion_no_permitida
+
+class TransicionResultado(BaseModel):
+    estado: str
+    actualizadas: List[int]
+    omitidas: List[GlosaOmitida]
+
+# Bitácora de auditoría (glosa_evento)
+class GlosaEventoResponse(ConfigBase):
+    id_evento: int
+    id_glosa: int
+    fecha_evento: datetime
+    id_usuario: Optional[int] = None
+    tipo: str
+    cambios: dict # {"campo": [antes, despues]}
+
+# Colas de vencimiento (alerta_vencimiento)
+class AlertaVencimientoResponse(ConfigBase):
+    id_glosa: int
+    id_factura: int
+    estado_glosa: str
+    valor_glosado: Decimal
+    fecha_vencimiento: date
+    dias_restantes: int # negativo si ya venció
+
+class ColaAlertas(ConfigBase):
+    vencidas: List[AlertaVencimientoResponse]
+    por_vencer: List[AlertaVencimientoResponse]
+
+# Casi duplicados: glosa y la anterior de su factura y motivo (duplicados.py)
+class GlosaCasiDuplicada(ConfigBase):
+    id_glosa: int
+    id_glosa_previa: int
+    id_factura: int
+    id_motivo_glosa: int
+    valor_glosado: Decimal
+    valor_previo: Decimal
+    diferencia: Decimal
+    fecha_glosa: date
+    fecha_previa: date
+    estado_glosa: str
+
 # ====================================================================
 # Esquemas para RespuestaGlosa
 # ====================================================================
@@ -0,0 +1,189 @@
+# serializacion.py
+"""
+Ruta rápida de serialización para los endpoints de listado.
+
+En lugar de cargar objetos ORM y revalidarlos campo a campo con Pydantic,
+se seleccionan solo las columnas que declara el esquema de respuesta, se
+construyen diccionarios planos y se codifican con orjson.
+"""
+
+from datetime import date, datetime, time
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, get_args
+
+import orjson
+from fastapi import Request
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy import inspect, null
+
+
+def _por_defecto(obj: Any) -> Any:
+    """orjson no conoce Decimal: se emite como texto, igual que Pydantic en modo JSON."""
+    if isinstance(obj, Decimal):
+        return str(obj)
+    raise TypeError(f"Tipo no serializable: {type(obj).__name__}")
+
+
+def dumps(contenido: Any) -> bytes:
+    """Codifica a JSON (bytes) con el mismo formato que usan las respuestas rápidas."""
+    return orjson.dumps(contenido, default=_por_defecto, option=orjson.OPT_NON_STR_KEYS)
+
+
+class RespuestaORJSON(ORJSONResponse):
+    """ORJSONResponse con soporte para Decimal."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+# ====================================================================
+# NDJSON (listados completos en streaming)
+# ====================================================================
+
+MEDIA_NDJSON = "application/x-ndjson"
+
+
+def pide_ndjson(request: Request) -> bool:
+    """El cliente pidió NDJSON: por la cabecera Accept o con ?formato=ndjson."""
+    return request.query_params.get("formato") == "ndjson" or MEDIA_NDJSON in request.headers.get("accept", "")
+
+
+def lineas_ndjson(lotes: Iterable[List[dict]]) -> Iterator[bytes]:
+    """Un bloque de bytes por lote, con una fila JSON por línea."""
+    for lote in lotes:
+        if lote:
+            yield b"".join([dumps(fila) + b"\n" for fila in lote])
+
+
+class RespuestaNDJSON(StreamingResponse):
+    """Respuesta en streaming a partir de lotes de diccionarios (crud.iterar_filas)."""
+
+    def __init__(self, lotes: Iterable[List[dict]], **kwargs):
+        super().__init__(lineas_ndjson(lotes), media_type=MEDIA_NDJSON, **kwargs)
+
+
+# ====================================================================
+# Selección de columnas a partir del esquema de respuesta
+# ====================================================================
+
+def _a_datetime(valor: Optional[date]) -> Optional[datetime]:
+    if valor is None or isinstance(valor, datetime):
+        return valor
+    return datetime.combine(valor, time())
+
+
+def _anotacion_base(anotacion: Any) -> Any:
+    """Quita el Optional[...] de una anotación."""
+    argumentos = [a for a in get_args(anotacion) if a is not type(None)]
+    return argumentos[0] if len(argumentos) == 1 else anotacion
+
+
+@lru_cache(maxsize=None)
+def columnas_para(
+    modelo, esquema, campos: Optional[Tuple[str, ...]] = None, prefijo: str = ""
+) -> Tuple[list, Tuple[str, ...], Dict[str, Callable]]:
+    """
+    Devuelve (columnas, claves, conversores) para seleccionar exactamente
+    los campos de `esquema` (o solo `campos`, si se indican) desde la tabla
+    de `modelo` (clase mapeada o alias).
+
+    Los campos del esquema que no existen en el modelo se seleccionan como
+    NULL (Pydantic los rellenaría con su valor por defecto None), y las
+    columnas Date expuestas como datetime se convierten igual que lo haría
+    Pydantic. Con `prefijo` las columnas se etiquetan "<prefijo><campo>"
+    para no chocar con las de otra tabla del mismo SELECT.
+    """
+    tabla = inspect(modelo).selectable
+    columnas = []
+    conversores: Dict[str, Callable] = {}
+    nombres = tuple(esquema.model_fields) if campos is None else campos
+    for nombre in nombres:
+        campo = esquema.model_fields[nombre]
+        columna = tabla.columns.get(nombre)
+        if columna is None:
+            columnas.append(null().label(prefijo + nombre))
+            continue
+        columnas.append(columna.label(prefijo + nombre) if prefijo else columna)
+        tipo_python = getattr(columna.type, "python_type", None)
+        if _anotacion_base(campo.annotation) is datetime and tipo_python is date:
+            conversores[nombre] = _a_datetime
+    return columnas, nombres, conversores
+
+
+def filas_a_dicts(filas, claves: Tuple[str, ...], conversores: Dict[str, Callable]) -> List[dict]:
+    """Convierte tuplas de resultado en diccionarios listos para orjson."""
+    datos = [dict(zip(claves, fila)) for fila in filas]
+    if conversores:
+        for fila in datos:
+            for clave, conversor in conversores.items():
+                fila[clave] = conversor(fila[clave])
+    return datos
+
+
+# ====================================================================
+# Selección dispersa (?fields=) y relaciones embebidas (?include=)
+# ====================================================================
+
+class CampoDesconocido(ValueError):
+    pass
+
+
+def _lista(valor: Optional[str]) -> List[str]:
+    return [v.strip() for v in (valor or "").split(",") if v.strip()]
+
+
+def proyeccion(
+    esquema, relaciones: Dict[str, Any], fields: Optional[str], include: Optional[str], clave: str
+) -> Tuple[Optional[Tuple[str, ...]], Dict[str, Optional[Tuple[str, ...]]]]:
+    """
+    Interpreta ?fields=a,b,rel.c&include=rel. Devuelve (campos propios,
+    {relación: campos o None para todos}). La clave primaria siempre se
+    incluye. `relaciones` es {nombre: esquema de la relación}.
+    """
+    propios: List[str] = []
+    incluir: Dict[str, Optional[List[str]]] = {}
+    for nombre in _lista(include):
+        if nombre not in relaciones:
+            raise CampoDesconocido(f"include desconocido: '{nombre}'. Válidos: {', '.join(relaciones)}")
+        incluir.setdefault(nombre, None)
+    for campo in _lista(fields):
+        relacion, _, subcampo = campo.rpartition(".")
+        if not relacion:
+            if campo not in esquema.model_fields:
+                raise CampoDesconocido(f"Campo desconocido: '{campo}'")
+            propios.append(campo)
+            continue
+        if relacion not in relaciones or subcampo not in relaciones[relacion].model_fields:
+            raise CampoDesconocido(f"Campo desconocido: '{campo}'")
+        incluir[relacion] = (incluir.get(relacion) or []) + [subcampo]  # un campo con punto implica include
+
+    if propios or _lista(fields):
+        campos = tuple(dict.fromkeys([clave] + propios))  # solo con campos de relaciones: la clave
+    else:
+        campos = None
+    return campos, {r: None if c is None else tuple(dict.fromkeys(c)) for r, c in incluir.items()}
+
+
+def filas_anidadas(filas, segmentos: List[Tuple[Optional[str], Tuple[str, ...], Dict[str, Callable]]]) -> List[dict]:
+    """
+    Como filas_a_dicts, pero cada fila trae varios segmentos de columnas:
+    el primero (nombre None) son los campos propios; los siguientes se
+    anidan bajo su nombre (None si el LEFT JOIN no encontró fila).
+    """
+    datos = []
+    for fila in filas:
+        registro: Dict[str, Any] = {}
+        posicion = 0
+        for nombre, claves, conversores in segmentos:
+            valores = fila[posicion:posicion + len(claves)]
+            posicion += len(claves)
+            parte = dict(zip(claves, valores))
+            for clave, conversor in conversores.items():
+                parte[clave] = conversor(parte[clave])
+            if nombre is None:
+                registro.update(parte)
+            else:
+                registro[nombre] = parte if any(v is not None for v in valores) else None
+        datos.append(registro)
+    return datos
@@ -0,0 +1,74 @@
+# test/conftest.py
+"""
+Fixtures para pruebas en proceso (sin servidor) contra una base SQLite temporal.
+
+Las pruebas existentes que apuntan a un servidor vivo (test_glosas.py) no las usan.
+"""
+
+import os
+import sys
+import tempfile
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, RAIZ)
+os.environ.setdefault(
+    "DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="glosas_test_"), "glosas.db")
+)
+os.environ.setdefault("SECRET_KEY", "clave-solo-para-pruebas")
+# Sin hilos programadores (vencimientos, cubos): las pruebas los invocan a mano.
+os.environ.setdefault("ALERTAS_PROGRAMADOR", "0")
+os.environ.setdefault("CUBOS_PROGRAMADOR", "0")
+# Las pruebas de listados y reportes consultan sin token, como una instalación
+# de una sede; el alcance por usuario se prueba con tokens en test_alcance.py.
+os.environ.setdefault("ALCANCE_ANONIMO", "total")
+
+
+@pytest.fixture
+def db():
+    from database import Base, SessionLocal, engine
+    import models  # noqa: F401  (registra las tablas en Base.metadata)
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    sesion = SessionLocal()
+    try:
+        yield sesion
+    finally:
+        sesion.close()
+
+
+@pytest.fixture
+def client(db):
+    from fastapi.testclient import TestClient
+    from database import Base
+    import cache_http
+    import main
+
+    # Las tablas se recrean en cada prueba: que ningún ETag previo siga siendo válido.
+    cache_http.invalidar(*Base.metadata.tables)
+    with TestClient(main.app) as cliente:
+        yield cliente
+
+
+@pytest.fixture
+def factura(db):
+    """Una factura IPS -> EPS con un motivo de glosa disponible."""
+    import models
+
+    db.add_all([
+        models.Institucion(id_institucion=1, nit="900123456", razon_social="IPS Prueba", tipo_institucion="IPS"),
+        models.Institucion(id_institucion=2, nit="800654321", razon_social="EPS Prueba", tipo_institucion="EPS"),
+        models.MotivoGlosa(id_motivo_glosa=1, codigo_motivo="FA0101", descripcion_motivo="Facturación"),
+    ])
+    db.flush()
+    factura = models.Factura(
+        id_factura=1, numero_factura="FE-001", id_institucion_emisora=1, id_institucion_receptora=2,
+        fecha_emision=date(2025, 1, 10), nombre_eps="EPS Prueba", valor_total_factura=Decimal("500000.00"),
+    )
+    db.add(factura)
+    db.commit()
+    return factura
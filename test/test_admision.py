@@ -0,0 +1,38 @@
+import asyncio
+
+import admision
+
+
+def test_cola_acotada_y_turno_en_orden():
+    async def escenario():
+        clase = admision.Clase("prueba", limite=1, cola=1, espera_s=1, estado=503)
+        assert await clase.entrar()
+        segunda = asyncio.create_task(clase.entrar())
+        await asyncio.sleep(0)
+        assert clase.contadores()["en_cola"] == 1
+        assert not await clase.entrar()  # cola llena: rechazo inmediato
+
+        clase.salir()  # el cupo pasa a la que esperaba
+        assert await segunda
+        assert (clase.en_curso, clase.en_cola) == (1, 0)
+
+        clase.espera_s = 0.01
+        assert not await clase.entrar()  # espera agotada
+        clase.salir()
+        return clase.contadores()
+
+    assert asyncio.run(escenario()) == {"en_curso": 0, "en_cola": 0, "admitidas": 2, "rechazadas": 2, "vencidas": 1}
+
+
+def test_rechazo_con_retry_after(client, monkeypatch):
+    monkeypatch.setitem(admision.CLASES, "reportes", admision.Clase("reportes", limite=0, cola=0, espera_s=30, estado=503))
+
+    respuesta = client.get("/reporte-facturas")
+    assert respuesta.status_code == 503
+    assert respuesta.headers["retry-after"] == "30"
+    assert respuesta.json()["clase"] == "reportes"
+
+    # El CRUD interactivo no pasa por la admisión.
+    assert client.get("/glosas/").status_code == 200
+    assert client.get("/api/admision").json()["reportes"]["rechazadas"] == 1
+    assert "admision_reportes_rechazadas 1" in client.get("/metrics").text
@@ -0,0 +1,157 @@
+import io
+from datetime import date
+from decimal import Decimal
+
+import pandas as pd
+
+import models
+
+
+def _preparar(db):
+    db.add(models.Institucion(id_institucion=3, nit="900999999", razon_social="Otra IPS", tipo_institucion="IPS"))
+    db.flush()
+    db.add(models.Factura(
+        id_factura=2, numero_factura="FE-002", id_institucion_emisora=3, id_institucion_receptora=2,
+        fecha_emision=date(2025, 1, 11), nombre_eps="EPS Prueba", valor_total_factura=Decimal("100.00"),
+    ))
+    db.add_all([
+        models.Glosa(id_glosa=i, id_factura=i, id_motivo_glosa=1, fecha_glosa=date(2025, 2, 1),
+                     valor_glosado=Decimal("10.00"), estado_glosa="Pendiente")
+        for i in (1, 2)
+    ])
+    db.add_all([
+        models.Usuario(id_usuario=1, nombre_completo="IPS 1", email="ips1@glosas.com.co", password_hash="x", rol="AUDITOR_IPS", id_institucion=1),
+        models.Usuario(id_usuario=2, nombre_completo="EPS", email="eps@glosas.com.co", password_hash="x", rol="AUDITOR_EPS", id_institucion=2),
+        models.Usuario(id_usuario=3, nombre_completo="Sin institución", email="sin@glosas.com.co", password_hash="x", rol="AUDITOR_IPS"),
+        models.Usuario(id_usuario=4, nombre_completo="Admin", email="admin@glosas.com.co", password_hash="x", rol="ADMIN"),
+    ])
+    db.commit()
+
+
+def _cabeceras(id_usuario):
+    from auth.auth import create_access_token
+
+    return {"Authorization": f"Bearer {create_access_token({'sub': str(id_usuario)})}"}
+
+
+def test_cada_institucion_ve_solo_su_parte(client, db, factura):
+    _preparar(db)
+
+    def ids(ruta, usuario):
+        return sorted(f["id_factura"] if "facturas" in ruta else f["id_glosa"]
+                      for f in client.get(ruta, headers=_cabeceras(usuario)).json())
+
+    assert ids("/facturas/", 1) == [1]   # IPS: facturas que emitió
+    assert ids("/glosas/", 1) == [1]
+    assert ids("/facturas/", 2) == [1, 2]  # EPS: facturas que recibió
+    assert ids("/glosas/", 3) == []      # sin institución: nada
+    assert ids("/glosas/", 4) == [1, 2]  # admin: todo
+
+    assert client.get("/glosas/2", headers=_cabeceras(1)).status_code == 404
+    assert client.get("/glosas/1", headers=_cabeceras(1)).status_code == 200
+    assert client.get("/glosas/2/historial", headers=_cabeceras(1)).json() == []
+
+
+def test_solo_admin_cambia_la_institucion(client, db, factura):
+    _preparar(db)
+    r = client.put("/users/1", json={"id_institucion": 3}, headers=_cabeceras(1))
+    assert r.status_code == 403
+    r = client.put("/users/1", json={"id_institucion": 3}, headers=_cabeceras(4))
+    assert r.status_code == 200 and r.json()["id_institucion"] == 3
+
+
+def test_sin_token_no_ve_nada_por_defecto(client, db, factura, monkeypatch):
+    import auth.auth
+
+    _preparar(db)
+    monkeypatch.setattr(auth.auth, "ALCANCE_ANONIMO", "ninguno")
+    assert client.get("/glosas/").json() == []
+    assert client.get("/facturas/").json() == []
+    assert client.get("/glosas/1").status_code == 404
+
+
+def test_escrituras_respetan_el_alcance(client, db, factura):
+    _preparar(db)
+    ips = _cabeceras(1)
+
+    assert client.put("/glosas/2", json={"observaciones_glosa": "x"}, headers=ips).status_code == 404
+    assert client.delete("/glosas/2", headers=ips).status_code == 404
+    assert client.put("/facturas/2", json={"nombre_eps": "x"}, headers=ips).status_code == 404
+    assert client.delete("/facturas/2", headers=ips).status_code == 404
+    assert client.put("/glosas/1", json={"id_factura": 2}, headers=ips).status_code == 404
+
+    r = client.post("/glosas/transiciones", json={"ids": [1, 2], "estado": "En revisión"}, headers=ips).json()
+    assert r["actualizadas"] == [1]
+    assert r["omitidas"] == [{"id_glosa": 2, "estado_actual": None, "motivo": "no_existe"}]
+
+    db.expire_all()
+    assert db.get(models.Glosa, 2).estado_glosa == "Pendiente"
+    assert db.get(models.Factura, 2).nombre_eps == "EPS Prueba"
+
+
+def test_respuestas_adjuntos_e_importaciones_respetan_el_alcance(client, db, factura):
+    _preparar(db)
+    db.add(models.RespuestaGlosa(
+        id_respuesta_glosa=1, id_glosa=2, usuario_que_responde=4, tipo_respuesta="Reclamacion",
+        argumento_respuesta="x", estado_posterior_glosa="Respondida",
+    ))
+    db.add(models.Adjunto(id_adjunto=1, id_glosa=2, nombre_archivo="a.pdf", ruta_almacenamiento="/tmp/a.pdf", usuario_que_sube=4))
+    db.commit()
+    ips = _cabeceras(1)
+
+    assert client.put("/respuestas-glosa/1", json={"argumento_respuesta": "y"}, headers=ips).status_code == 404
+    assert client.delete("/respuestas-glosa/1", headers=ips).status_code == 404
+    assert client.put("/adjuntos/1", json={"nombre_archivo": "b.pdf"}, headers=ips).status_code == 404
+    assert client.delete("/adjuntos/1", headers=ips).status_code == 404
+    assert client.post("/actualizar-estado-glosa/2", data={"estado": "En revisión"}, headers=ips).status_code == 404
+
+    hoja = io.BytesIO()
+    pd.DataFrame({
+        "numero_factura": ["FE-010", "FE-011"], "nit_emisora": ["900123456", "900999999"],
+        "nit_receptora": ["800654321", "800654321"], "fecha_emision": ["2025-03-01", "2025-03-01"],
+        "valor_total": ["1000", "1000"],
+    }).to_excel(hoja, index=False)
+    resultado = client.post("/importar-facturas", files={"file": ("f.xlsx", hoja.getvalue())}, headers=ips).json()
+    assert resultado["cargadas"] == 1
+    assert [e["regla"] for e in resultado["errores"][0]["errores"]] == ["fuera_de_alcance"]
+
+    csv = "numero_factura,codigo_motivo,fecha_glosa,valor_glosado\nFE-002,FA0101,2025-02-10,5\n"
+    resultado = client.post("/importar-glosas", files={"file": ("g.csv", csv.encode())}, headers=ips).json()
+    assert resultado["cargadas"] == 0
+    assert [e["regla"] for e in resultado["errores"][0]["errores"]] == ["factura_no_registrada"]
+
+    db.expire_all()
+    assert db.get(models.RespuestaGlosa, 1).argumento_respuesta == "x" and db.get(models.Adjunto, 1) is not None
+    assert db.get(models.Glosa, 2).estado_glosa == "Pendiente"
+
+
+def test_vistas_piden_sesion_y_escrituras_token(client, db, factura, monkeypatch):
+    import auth.auth
+
+    _preparar(db)
+    db.get(models.Usuario, 1).password_hash = auth.auth.get_password_hash("clave-ips")
+    db.commit()
+    monkeypatch.setattr(auth.auth, "ALCANCE_ANONIMO", "ninguno")
+
+    r = client.get("/dashboard", follow_redirects=False)
+    assert r.status_code == 303 and r.headers["location"] == "/login?siguiente=/dashboard"
+    assert client.get("/reporte-facturas", follow_redirects=False).status_code == 303
+    assert client.post("/glosas/", json={
+        "id_factura": 1, "id_motivo_glosa": 1, "fecha_glosa": "2025-02-03", "valor_glosado": "10",
+    }).status_code == 401
+    assert client.post("/importar-glosas", files={"file": ("g.csv", b"numero_factura\n")}).status_code == 401
+
+    r = client.post("/login", data={"username": "ips1@glosas.com.co", "password": "mala"}, follow_redirects=False)
+    assert r.status_code == 401
+    r = client.post("/login", data={
+        "username": "ips1@glosas.com.co", "password": "clave-ips", "siguiente": "/glosas-view",
+    }, follow_redirects=False)
+    assert r.status_code == 303 and r.headers["location"] == "/glosas-view"
+    assert "httponly" in r.headers["set-cookie"].lower()
+
+    # El cliente conserva la cookie: la vista muestra solo la factura de la IPS.
+    html = client.get("/glosas-view").text
+    assert "FE-001" in html and "FE-002" not in html
+    assert client.get("/dashboard").status_code == 200
+    client.get("/logout")
+    assert client.get("/dashboard", follow_redirects=False).status_code == 303
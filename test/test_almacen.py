@@ -0,0 +1,37 @@
+import json
+
+from almacen import AlmacenSQLite
+from metricas import Registro, _Medicion
+
+
+def test_almacen_sqlite_compartido_entre_instancias(tmp_path):
+    ruta = str(tmp_path / "almacen.sqlite")
+    worker_a, worker_b = AlmacenSQLite(ruta), AlmacenSQLite(ruta)
+
+    assert worker_a.incr("version:glosa") == 1
+    assert worker_b.incr("version:glosa") == 2
+    assert worker_a.get("version:glosa") == "2"
+
+    assert worker_a.agregar("candado", "a") is True
+    assert worker_b.agregar("candado", "b") is False
+    assert worker_b.get("candado") == "a"
+
+    worker_a.set("efimera", "x", ttl=-1)
+    assert worker_b.get("efimera") is None
+    assert set(worker_b.con_prefijo("version:")) == {"version:glosa"}
+
+
+def test_metricas_se_suman_entre_workers():
+    instantaneas = []
+    for consultas in (2, 3):
+        registro = Registro()
+        medicion = _Medicion()
+        medicion.consultas = consultas
+        registro.registrar_peticion("GET", "/glosas/", 200, medicion, 0.02)
+        registro.registrar_coleccion("cache_http", lambda: {"aciertos": 5})
+        instantaneas.append(json.loads(json.dumps(registro.instantanea())))
+
+    texto = Registro.desde_instantaneas(instantaneas).exportar()
+    assert 'http_request_duration_seconds_count{method="GET",route="/glosas/"} 2' in texto
+    assert 'db_queries_total{method="GET",route="/glosas/"} 5' in texto
+    assert "cache_http_aciertos 10" in texto
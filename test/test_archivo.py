@@ -0,0 +1,49 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+import models
+
+
+def _glosa(id_glosa, id_factura, estado, fecha):
+    return models.Glosa(
+        id_glosa=id_glosa, id_factura=id_factura, id_motivo_glosa=1, fecha_glosa=fecha,
+        valor_glosado=Decimal("1000.00"), estado_glosa=estado,
+    )
+
+
+def test_archiva_facturas_cerradas_y_siguen_consultables(client, db, factura):
+    import archivo
+
+    abierta = models.Factura(
+        id_factura=2, numero_factura="FE-002", id_institucion_emisora=1, id_institucion_receptora=2,
+        fecha_emision=date(2023, 3, 1), valor_total_factura=Decimal("100.00"),
+    )
+    db.add_all([
+        abierta,
+        models.Usuario(id_usuario=1, nombre_completo="Auditor", email="a@glosas.test", password_hash="x", rol="AUDITOR_IPS"),
+    ])
+    db.flush()
+    db.add_all([
+        _glosa(1, 1, "Respondida", date(2023, 5, 1)),
+        _glosa(2, 1, "Aceptada", date(2023, 6, 1)),
+        _glosa(3, 2, "Pendiente", date(2023, 6, 1)),
+    ])
+    db.flush()
+    db.add_all([
+        models.RespuestaGlosa(
+            id_respuesta_glosa=1, id_glosa=1, usuario_que_responde=1, tipo_respuesta="Aceptacion Total",
+            argumento_respuesta="Soportado", estado_posterior_glosa="Respondida",
+            fecha_creacion=datetime(2023, 5, 2), fecha_ultima_actualizacion=datetime(2023, 5, 2),
+        ),
+        models.Adjunto(id_adjunto=1, id_respuesta_glosa=1, nombre_archivo="r.pdf", ruta_almacenamiento="/r.pdf", usuario_que_sube=1),
+    ])
+    db.commit()
+
+    movidas = archivo.archivar(db, antes_de=date(2024, 1, 1))
+
+    assert movidas == {"factura_archivo": 1, "glosa_archivo": 2, "respuestas_glosa_archivo": 1, "adjuntos_archivo": 1}
+    assert [g["id_glosa"] for g in client.get("/glosas/").json()] == [3]
+    assert [g["id_glosa"] for g in client.get("/glosas/?incluir_archivo=true").json()] == [1, 2, 3]
+    assert client.get("/glosas/1").status_code == 404
+    assert client.get("/glosas/1?incluir_archivo=true").json()["estado_glosa"] == "Respondida"
+    assert client.get("/facturas/1?incluir_archivo=true").json()["numero_factura"] == "FE-001"
@@ -0,0 +1,36 @@
+import os
+import re
+import subprocess
+import sys
+
+from conftest import RAIZ
+
+# Presupuesto de `import main` en milisegundos (medido: ~0.6 s, casi todo FastAPI/SQLAlchemy).
+PRESUPUESTO_MS = float(os.getenv("PRESUPUESTO_IMPORTACION_MS", 1500))
+LIBRERIAS_PESADAS = ("pandas", "numpy", "openpyxl")
+
+
+def _importtime(modulo: str) -> dict:
+    """Ejecuta `python -X importtime -c "import <modulo>"` y devuelve {módulo: acumulado_us}."""
+    salida = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        cwd=RAIZ, env={**os.environ}, capture_output=True, text=True, check=True,
+    ).stderr
+    tiempos = {}
+    for linea in salida.splitlines():
+        coincidencia = re.match(r"import time:\s+\d+ \|\s+(\d+) \|\s*(\S+)", linea)
+        if coincidencia:
+            tiempos[coincidencia.group(2)] = int(coincidencia.group(1))
+    return tiempos
+
+
+def test_importar_main_no_carga_librerias_pesadas_ni_excede_presupuesto():
+    tiempos = _importtime("main")
+
+    cargadas = [m for m in tiempos if m.split(".")[0] in LIBRERIAS_PESADAS]
+    assert cargadas == []
+    assert tiempos["main"] / 1000 < PRESUPUESTO_MS
+
+
+def test_readiness_reportada_por_lifespan(client):
+    assert client.get("/api/ready").json() == {"status": "listo"}
@@ -0,0 +1,42 @@
+from datetime import date
+from decimal import Decimal
+
+import models
+
+
+def _preparar(db):
+    db.add(models.Usuario(id_usuario=7, nombre_completo="Auditora", email="b@glosas.test", password_hash="x", rol="AUDITOR_IPS", id_institucion=1))
+    db.add_all([
+        models.Glosa(id_glosa=i, id_factura=1, id_motivo_glosa=1, fecha_glosa=date(2025, 2, 1),
+                     valor_glosado=Decimal("100.00") * i, estado_glosa="Pendiente")
+        for i in (1, 2)
+    ])
+    db.commit()
+
+
+def test_historial_registra_creacion_cambios_y_transiciones(client, db, factura):
+    from auth.auth import create_access_token
+
+    _preparar(db)
+    cabeceras = {"Authorization": f"Bearer {create_access_token({'sub': '7'})}"}
+
+    client.put("/glosas/1", json={"valor_glosado": "80.50", "observaciones_glosa": "Ajuste"}, headers=cabeceras)
+    client.post("/glosas/transiciones", json={"ids": [1, 2], "estado": "Respondida"}, headers=cabeceras)
+
+    historial = client.get("/glosas/1/historial").json()
+    assert [e["tipo"] for e in historial] == ["creacion", "actualizacion", "transicion"]
+    assert historial[0]["id_usuario"] is None
+    assert historial[1]["id_usuario"] == 7
+    assert historial[1]["cambios"] == {"valor_glosado": ["100.00", "80.50"], "observaciones_glosa": [None, "Ajuste"]}
+    assert historial[2]["cambios"] == {"estado_glosa": ["Pendiente", "Respondida"]}
+    assert len(client.get("/glosas/2/historial").json()) == 2
+
+
+def test_evento_se_revierte_con_la_transaccion(db, factura):
+    _preparar(db)
+    glosa = db.get(models.Glosa, 1)
+    glosa.estado_glosa = "En revisión"
+    db.flush()
+    db.rollback()
+
+    assert db.query(models.GlosaEvento).filter_by(id_glosa=1).count() == 1  # solo la creación
@@ -0,0 +1,45 @@
+import models
+
+
+def test_etag_304_e_invalidacion_al_confirmar(client, db, factura):
+    primera = client.get("/motivos-glosa/")
+    etag = primera.headers["etag"]
+
+    assert client.get("/motivos-glosa/", headers={"If-None-Match": etag}).status_code == 304
+
+    db.add(models.MotivoGlosa(id_motivo_glosa=2, codigo_motivo="TA0201", descripcion_motivo="Tarifas"))
+    db.commit()
+
+    nueva = client.get("/motivos-glosa/", headers={"If-None-Match": etag})
+    assert nueva.status_code == 200
+    assert nueva.headers["etag"] != etag
+    assert len(nueva.json()) == 2
+
+
+def test_cuerpos_grandes_se_comprimen(client, db, factura):
+    for i in range(2, 60):
+        db.add(models.MotivoGlosa(id_motivo_glosa=i, codigo_motivo=f"SO{i:04d}", descripcion_motivo="Soportes " * 5))
+    db.commit()
+
+    respuesta = client.get("/motivos-glosa/", headers={"Accept-Encoding": "gzip"})
+
+    assert respuesta.headers["content-encoding"] == "gzip"
+    assert len(respuesta.json()) == 59
+
+
+def test_include_depende_de_las_tablas_relacionadas(client, db, factura):
+    db.add(models.Glosa(id_glosa=1, id_factura=1, id_motivo_glosa=1, fecha_glosa=factura.fecha_emision, valor_glosado=10))
+    db.commit()
+    etag = client.get("/glosas/?include=factura,motivo").headers["etag"]
+
+    db.get(models.MotivoGlosa, 1).descripcion_motivo = "Facturación (nueva)"
+    db.commit()
+
+    nueva = client.get("/glosas/?include=factura,motivo", headers={"If-None-Match": etag})
+    assert nueva.status_code == 200 and nueva.headers["etag"] != etag
+    assert nueva.json()[0]["motivo"]["descripcion_motivo"] == "Facturación (nueva)"
+
+    etag = client.get("/facturas/?include=emisora").headers["etag"]
+    db.get(models.Institucion, 1).razon_social = "IPS Renombrada"
+    db.commit()
+    assert client.get("/facturas/?include=emisora", headers={"If-None-Match": etag}).status_code == 200
@@ -0,0 +1,62 @@
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+import carta_pdf
+import cartas
+import models
+
+pytest.importorskip("fpdf")
+
+
+@pytest.fixture
+def respuestas(db, factura):
+    db.add(models.Usuario(id_usuario=1, nombre_completo="Ana Auditora", email="a@glosas.com.co", password_hash="x", rol="AUDITOR_IPS"))
+    db.add_all([
+        models.Glosa(id_glosa=i, id_factura=1, id_motivo_glosa=1, fecha_glosa=date(2025, 2, 1), valor_glosado=Decimal("1000.00") * i)
+        for i in (1, 2)
+    ])
+    db.add_all([
+        models.RespuestaGlosa(
+            id_respuesta_glosa=i, id_glosa=i, fecha_respuesta=date(2025, 2, 15), usuario_que_responde=1,
+            tipo_respuesta="Aceptacion Parcial", valor_aceptado=Decimal("250.50"), valor_no_aceptado=Decimal("749.50"),
+            argumento_respuesta="Se adjuntan soportes de la atención — según contrato.", estado_posterior_glosa="Respondida",
+        )
+        for i in (1, 2)
+    ])
+    db.commit()
+
+
+def test_plantilla_con_filtros(db, respuestas):
+    texto = carta_pdf.texto(cartas.PLANTILLA, cartas.datos_cartas(db, ids=[1])[0])
+    assert "15 de febrero de 2025" in texto
+    assert "$ 1.000,00" in texto and "Valor aceptado: $ 250,50" in texto
+    assert "## Asunto: Respuesta a la glosa 1 de la factura FE-001" in texto
+    assert "Ana Auditora" in texto and "NIT 800654321" in texto
+
+
+def test_lote_por_factura_registra_adjuntos(db, respuestas, tmp_path):
+    resumen = cartas.generar_lote(db, 1, directorio=str(tmp_path), procesos=1, id_factura=1)
+    db.commit()
+    assert (resumen["respuestas"], resumen["generadas"], resumen["errores"]) == (2, 2, [])
+
+    adjuntos = db.query(models.Adjunto).order_by(models.Adjunto.id_respuesta_glosa).all()
+    assert [(a.id_respuesta_glosa, a.tipo_documento, a.tipo_mime) for a in adjuntos] == [
+        (1, cartas.TIPO_DOCUMENTO, "application/pdf"), (2, cartas.TIPO_DOCUMENTO, "application/pdf"),
+    ]
+    with open(adjuntos[0].ruta_almacenamiento, "rb") as f:
+        assert f.read(5) == b"%PDF-"
+
+    # Regenerar no duplica: actualiza el adjunto existente.
+    cartas.generar_lote(db, 1, directorio=str(tmp_path), procesos=1, nombre_eps="EPS Prueba")
+    db.commit()
+    assert db.query(models.Adjunto).count() == 2
+
+
+def test_endpoint_descarga_pdf(client, db, respuestas):
+    respuesta = client.get("/respuestas-glosa/1/carta")
+    assert respuesta.status_code == 200
+    assert respuesta.headers["content-type"] == "application/pdf"
+    assert respuesta.content.startswith(b"%PDF-")
+    assert client.get("/respuestas-glosa/99/carta").status_code == 404
@@ -0,0 +1,96 @@
+from datetime import date
+from decimal import Decimal
+
+import pandas as pd
+import pytest
+
+import models
+
+
+@pytest.fixture
+def glosas_abiertas(db, factura):
+    db.add(models.Usuario(id_usuario=1, nombre_completo="Auditor", email="a@glosas.test", password_hash="x", rol="AUDITOR_IPS"))
+    db.add_all([
+        models.Glosa(id_glosa=i, id_factura=1, id_motivo_glosa=1, fecha_glosa=date(2025, 2, 1),
+                     valor_glosado=Decimal(valor), estado_glosa="Respondida")
+        for i, valor in ((1, "1000.10"), (2, "500.00"), (3, "70.00"))
+    ])
+    db.commit()
+
+
+def test_cruce_empareja_por_clave_y_ordinal_en_centavos(db, glosas_abiertas):
+    import conciliacion
+
+    eps = pd.DataFrame({
+        "numero_factura": ["FE-001", "FE-001", "FE-001", "FE-999"],
+        "codigo_motivo": ["fa0101", "FA0101", "FA0101", "FA0101"],
+        "valor_aceptado": ["0.10", "500", "10", "1"],
+        "valor_no_aceptado": ["1000.00", "0", "10", "0"],
+    })
+    cruce = conciliacion.cruzar(eps, conciliacion.glosas_abiertas(db)).set_index("linea")
+
+    # 0.10 + 1000.00 cuadra exacto con 1000.10 (sin error de coma flotante).
+    assert cruce.loc[2, "resultado"] == "conciliada" and cruce.loc[2, "id_glosa"] == 1
+    assert cruce.loc[3, "resultado"] == "conciliada" and cruce.loc[3, "id_glosa"] == 2
+    assert cruce.loc[4, "resultado"] == "suma_no_cuadra" and cruce.loc[4, "diferencia"] == -50.0
+    assert cruce.loc[5, "resultado"] == "sin_glosa_abierta"
+
+
+def test_montos_invalidos_no_se_concilian(db, glosas_abiertas):
+    import conciliacion
+
+    eps = pd.DataFrame({
+        "numero_factura": ["FE-001", "FE-001", "FE-001"],
+        "codigo_motivo": ["FA0101", "FA0101", "FA0101"],
+        "valor_aceptado": ["1,000.10", "quinientos", "70.001"],
+        "valor_no_aceptado": ["0", "0", "0"],
+    })
+    cruce = conciliacion.cruzar(eps, conciliacion.glosas_abiertas(db)).set_index("linea")
+
+    assert cruce.loc[2, "resultado"] == "conciliada" and cruce.loc[2, "id_glosa"] == 1
+    assert cruce.loc[3, "resultado"] == cruce.loc[4, "resultado"] == "valor_invalido"
+    assert conciliacion.aplicar(db, cruce.reset_index(), id_usuario=1) == 1
+    assert list(conciliacion.reporte_diferencias(cruce.reset_index())["resultado"]) == ["valor_invalido", "valor_invalido"]
+
+
+def test_endpoint_aplica_respuestas_y_estados(client, db, glosas_abiertas):
+    from auth.auth import get_current_active_user
+    import main
+
+    main.app.dependency_overrides[get_current_active_user] = lambda: db.get(models.Usuario, 1)
+    try:
+        csv = "numero_factura,codigo_motivo,valor_aceptado,valor_no_aceptado\nFE-001,FA0101,500,0\n"
+        respuesta = client.post("/conciliacion/eps", files={"file": ("eps.csv", csv, "text/csv")})
+    finally:
+        main.app.dependency_overrides.clear()
+
+    cuerpo = respuesta.json()
+    assert cuerpo["aplicadas"] == 1
+    assert cuerpo["resumen"] == {"conciliada": 1, "sin_respuesta_eps": 2}
+    db.expire_all()
+    assert db.get(models.Glosa, 2).estado_glosa == "Conciliada"
+    respuesta_glosa = db.query(models.RespuestaGlosa).one()
+    assert (respuesta_glosa.id_glosa, respuesta_glosa.tipo_respuesta) == (2, "Aceptacion Total")
+
+
+def test_negativos_invalidos_y_glosas_que_cambiaron_de_estado(db, glosas_abiertas):
+    import conciliacion
+
+    eps = pd.DataFrame({
+        "numero_factura": ["FE-001", "FE-001", "FE-001"],
+        "codigo_motivo": ["FA0101", "FA0101", "FA0101"],
+        "valor_aceptado": ["600", "+1000.10", "70"],
+        "valor_no_aceptado": ["-100", "0", "0"],
+    })
+    cruce = conciliacion.cruzar(eps, conciliacion.glosas_abiertas(db))
+    assert dict(zip(cruce["linea"], cruce["resultado"])) == {
+        2: "valor_invalido", 3: "conciliada", 4: "conciliada",
+    }
+
+    # Otra petición concilia la glosa 3 entre el cruce y la aplicación.
+    db.get(models.Glosa, 3).estado_glosa = "Conciliada"
+    db.commit()
+    assert conciliacion.aplicar(db, cruce, id_usuario=1) == 1
+    db.commit()
+    assert dict(zip(cruce["linea"], cruce["resultado"]))[4] == "estado_cambiado"
+    assert [r.id_glosa for r in db.query(models.RespuestaGlosa)] == [1]
@@ -0,0 +1,59 @@
+from datetime import date
+from decimal import Decimal
+
+import cubos
+import models
+
+
+def _preparar(db):
+    db.add(models.MotivoGlosa(id_motivo_glosa=2, codigo_motivo="TA0201", descripcion_motivo="Tarifas"))
+    db.add(models.Usuario(id_usuario=1, nombre_completo="Auditor", email="a@glosas.com.co", password_hash="x", rol="ADMIN"))
+    db.add_all([
+        models.Glosa(id_glosa=1, id_factura=1, id_motivo_glosa=1, fecha_glosa=date(2025, 2, 3), valor_glosado=Decimal("100.00")),
+        models.Glosa(id_glosa=2, id_factura=1, id_motivo_glosa=1, fecha_glosa=date(2025, 2, 20), valor_glosado=Decimal("50.00")),
+        models.Glosa(id_glosa=3, id_factura=1, id_motivo_glosa=2, fecha_glosa=date(2025, 3, 1), valor_glosado=Decimal("30.00")),
+    ])
+    db.commit()
+
+
+def test_reconstruccion_y_drill_down(client, db, factura):
+    _preparar(db)
+    db.add(models.RespuestaGlosa(
+        id_glosa=1, fecha_respuesta=date(2025, 2, 10), usuario_que_responde=1, tipo_respuesta="Aceptacion Parcial",
+        valor_aceptado=Decimal("40.00"), valor_no_aceptado=Decimal("60.00"), argumento_respuesta="x",
+        estado_posterior_glosa="Respondida",
+    ))
+    db.commit()
+    cubos.reconstruir(db)
+    db.commit()
+
+    por_eps = client.get("/analytics/cubo").json()
+    assert por_eps == [{
+        "eps": "EPS Prueba", "glosas": 3, "valor_glosado": "180.00", "glosas_respondidas": 1,
+        "valor_aceptado": "40.00", "valor_no_aceptado": "60.00", "tasa_aceptacion": 0.4,
+        "facturas": 1, "valor_facturado": "500000.00", "tasa_glosa": 0.0004,
+    }]
+
+    por_mes = client.get("/analytics/cubo?eps=EPS Prueba&motivo=FA0101&dimensiones=periodo").json()
+    assert [(f["periodo"], f["glosas"], f["valor_glosado"]) for f in por_mes] == [(202502, 2, "150.00")]
+    assert "tasa_glosa" not in por_mes[0]
+
+    assert client.get("/analytics/cubo?dimensiones=cliente").status_code == 400
+
+
+def test_recalculo_incremental_por_mes(db, factura):
+    _preparar(db)
+    cubos.procesar_pendientes()
+
+    def celda(periodo, motivo):
+        return db.get(models.CuboGlosas, (periodo, "EPS Prueba", motivo, 1, 2))
+
+    assert (celda(202502, "FA0101").glosas, celda(202503, "TA0201").valor_glosado) == (2, Decimal("30.00"))
+
+    # Cambiar la fecha mueve la glosa de mes: se recalculan el mes viejo y el nuevo.
+    db.get(models.Glosa, 3).fecha_glosa = date(2025, 2, 28)
+    db.commit()
+    assert cubos.procesar_pendientes() == 2
+    db.expire_all()
+    assert celda(202503, "TA0201") is None
+    assert celda(202502, "TA0201").valor_glosado == Decimal("30.00")
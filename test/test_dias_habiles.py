@@ -0,0 +1,32 @@
+from datetime import date
+from decimal import Decimal
+
+import dias_habiles
+import models
+
+
+def test_festivos_colombia_2025():
+    festivos = dict(dias_habiles.festivos_colombia(2025))
+    assert festivos[date(2025, 3, 24)] == "San José"  # 19 de marzo, trasladado al lunes
+    assert festivos[date(2025, 4, 18)] == "Viernes Santo"
+    assert date(2025, 6, 30) in festivos  # San Pedro y Sagrado Corazón caen el mismo lunes
+    assert date(2025, 11, 17) in festivos
+
+
+def test_vencimiento_y_recalculo_en_dias_habiles(db, factura):
+    dias_habiles.poblar_festivos(db, [2025, 2026])
+    db.commit()
+    # Del viernes 19 de diciembre: salta fines de semana, 25 dic, 1 ene y Reyes (12 ene).
+    assert dias_habiles.vencimiento(db, date(2025, 12, 19)) == date(2026, 1, 14)
+
+    db.add_all([
+        models.Glosa(id_glosa=i, id_factura=1, id_motivo_glosa=1, fecha_glosa=date(2025, 3, 21),
+                     valor_glosado=Decimal("10.00") * i, estado_glosa=estado)
+        for i, estado in ((2, "Pendiente"), (3, "En revisión"), (4, "Conciliada"))
+    ])
+    db.commit()
+    assert dias_habiles.recalcular_vencimientos(db) == 2  # solo las que esperan respuesta
+    db.commit()
+    vencen = dict(db.query(models.Glosa.id_glosa, models.Glosa.fecha_vencimiento_respuesta))
+    assert vencen[2] == vencen[3] == date(2025, 4, 14)  # sin el lunes 24 (San José)
+    assert vencen[4] is None
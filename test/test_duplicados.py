@@ -0,0 +1,78 @@
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+import duplicados
+import models
+
+
+def _glosa(id_glosa, valor, motivo=1, fecha=date(2025, 2, 1)):
+    return models.Glosa(id_glosa=id_glosa, id_factura=1, id_motivo_glosa=motivo, fecha_glosa=fecha, valor_glosado=Decimal(valor))
+
+
+def test_huella_al_insertar_e_indice_unico(client, db, factura):
+    db.add(_glosa(1, "1000.00"))
+    db.commit()
+    assert db.get(models.Glosa, 1).huella == duplicados.huella(1, 1, "1000", date(2025, 2, 1))
+
+    db.add(_glosa(2, "1000.0"))
+    with pytest.raises(IntegrityError):
+        db.commit()
+    db.rollback()
+
+    cuerpo = {"id_factura": 1, "id_motivo_glosa": 1, "fecha_glosa": "2025-02-01", "valor_glosado": "1000"}
+    respuesta = client.post("/glosas/", json=cuerpo)
+    assert respuesta.status_code == 409 and "glosa 1" in respuesta.json()["detail"]
+
+
+def test_casi_duplicadas_por_grupo(client, db, factura):
+    db.add(models.MotivoGlosa(id_motivo_glosa=2, codigo_motivo="TA0201", descripcion_motivo="Tarifas"))
+    db.add_all([
+        _glosa(1, "100.00"),
+        _glosa(2, "100.00", fecha=date(2025, 3, 1)),  # mismo valor, otra fecha
+        _glosa(3, "99.99"),
+        _glosa(4, "150.00"),
+        _glosa(5, "100.00", motivo=2),               # otro motivo: otro grupo
+    ])
+    db.commit()
+
+    exactas = client.get("/glosas/duplicados").json()
+    assert [(d["id_glosa"], d["id_glosa_previa"]) for d in exactas] == [(2, 1)]
+
+    cercanas = client.get("/glosas/duplicados?tolerancia=0.01").json()
+    assert [(d["id_glosa"], d["id_glosa_previa"], d["diferencia"]) for d in cercanas] == [(1, 3, "0.01"), (2, 1, "0.00")]
+
+
+def test_rellenar_huellas_deja_sin_huella_las_repetidas(db, factura):
+    fila = {"id_factura": 1, "id_motivo_glosa": 1, "fecha_glosa": date(2025, 2, 1), "valor_glosado": Decimal("5"), "estado_glosa": "Pendiente"}
+    db.execute(insert(models.Glosa), [dict(fila, id_glosa=1), dict(fila, id_glosa=2), dict(fila, id_glosa=3, valor_glosado=Decimal("6"))])
+
+    assert duplicados.rellenar_huellas(db) == {"rellenadas": 2, "repetidas": [2]}
+    db.commit()
+    assert db.get(models.Glosa, 2).huella is None
+
+
+def test_actualizar_hacia_otra_glosa_o_una_archivada_es_409(client, db, factura):
+    from auth.auth import get_current_active_user
+    import main
+
+    db.add_all([_glosa(1, "100.00"), _glosa(2, "200.00")])
+    db.add(models.GlosaArchivo(
+        id_glosa=3, id_factura=1, id_motivo_glosa=1, fecha_glosa=date(2025, 2, 1), valor_glosado=Decimal("300.00"),
+        estado_glosa="Cerrada", huella=duplicados.huella(1, 1, "300", date(2025, 2, 1)),
+    ))
+    db.commit()
+    main.app.dependency_overrides[get_current_active_user] = lambda: None
+    try:
+        respuesta = client.put("/glosas/2", json={"valor_glosado": "100"})
+        assert respuesta.status_code == 409 and "glosa 1" in respuesta.json()["detail"]
+        assert client.put("/glosas/2", json={"valor_glosado": "300"}).status_code == 409
+        assert client.put("/glosas/2", json={"valor_glosado": "250"}).status_code == 200
+    finally:
+        main.app.dependency_overrides.clear()
+
+    cuerpo = {"id_factura": 1, "id_motivo_glosa": 1, "fecha_glosa": "2025-02-01", "valor_glosado": "300"}
+    assert client.post("/glosas/", json=cuerpo).status_code == 409
@@ -0,0 +1,110 @@
+import zipfile
+from datetime import date
+from decimal import Decimal
+
+import facturas_dian
+import models
+import ubl
+from alcance import Alcance
+
+
+def _invoice(numero, valor, nit_emisor="900123456", nit_receptor="800654321", lineas=3):
+    detalle = "".join(
+        f"<cac:InvoiceLine><cbc:ID>{i}</cbc:ID><cbc:LineExtensionAmount currencyID=\"COP\">1</cbc:LineExtensionAmount></cac:InvoiceLine>"
+        for i in range(lineas)
+    )
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<Invoice xmlns="urn:oasis:names:specification:ubl:schema:xsd:Invoice-2"
+         xmlns:cac="urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2"
+         xmlns:cbc="urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2">
+  <cbc:UBLVersionID>UBL 2.1</cbc:UBLVersionID>
+  <cbc:ID>{numero}</cbc:ID>
+  <cbc:IssueDate>2025-03-14</cbc:IssueDate>
+  <cac:AccountingSupplierParty><cac:Party><cac:PartyTaxScheme>
+    <cbc:RegistrationName>IPS Nueva</cbc:RegistrationName>
+    <cbc:CompanyID schemeID="7" schemeName="31">{nit_emisor}</cbc:CompanyID>
+  </cac:PartyTaxScheme></cac:Party></cac:AccountingSupplierParty>
+  <cac:AccountingCustomerParty><cac:Party><cac:PartyTaxScheme>
+    <cbc:RegistrationName>EPS Nueva</cbc:RegistrationName>
+    <cbc:CompanyID schemeID="1" schemeName="31">{nit_receptor}</cbc:CompanyID>
+  </cac:PartyTaxScheme></cac:Party></cac:AccountingCustomerParty>
+  <cac:LegalMonetaryTotal>
+    <cbc:LineExtensionAmount currencyID="COP">{valor}</cbc:LineExtensionAmount>
+    <cbc:PayableAmount currencyID="COP">{valor}</cbc:PayableAmount>
+  </cac:LegalMonetaryTotal>
+  {detalle}
+</Invoice>"""
+
+
+def _adjunto(invoice):
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<AttachedDocument xmlns="urn:oasis:names:specification:ubl:schema:xsd:AttachedDocument-2"
+                  xmlns:cac="urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2"
+                  xmlns:cbc="urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2">
+  <cbc:ID>AD-1</cbc:ID>
+  <cac:Attachment><cac:ExternalReference><cbc:MimeCode>text/xml</cbc:MimeCode>
+    <cbc:Description><![CDATA[{invoice}]]></cbc:Description>
+  </cac:ExternalReference></cac:Attachment>
+</AttachedDocument>"""
+
+
+def test_parsea_invoice_y_attached_document():
+    factura = ubl.parsear(_invoice("SETP1", "1500.50").encode())
+    assert factura["numero_factura"] == "SETP1"
+    assert factura["fecha_emision"] == date(2025, 3, 14)
+    assert factura["valor_total_factura"] == Decimal("1500.50")
+    assert (factura["nit_emisor"], factura["nit_receptor"]) == ("900123456", "800654321")
+    assert ubl.parsear(_adjunto(_invoice("SETP2", "10")).encode())["numero_factura"] == "SETP2"
+
+
+def test_importar_zip_con_upsert(db, factura, tmp_path):
+    ruta = str(tmp_path / "facturas.zip")
+    with zipfile.ZipFile(ruta, "w") as z:
+        z.writestr("FE-001.xml", _invoice("FE-001", "999.00"))  # ya existe: se actualiza
+        z.writestr("SETP10.xml", _adjunto(_invoice("SETP10", "200.00", nit_emisor="901000001")))
+        z.writestr("malo.xml", "<Invoice><cbc:ID>")
+        z.writestr("leeme.txt", "no es XML")
+
+    resumen = facturas_dian.importar(db, ruta, procesos=1, lote=1)
+
+    assert resumen["archivos"] == 3 and resumen["cargadas"] == 2
+    assert [r["archivo"] for r in resumen["rechazadas"]] == ["malo.xml"]
+    db.expire_all()
+    existente = db.query(models.Factura).filter_by(numero_factura="FE-001").one()
+    assert existente.valor_total_factura == Decimal("999.00") and existente.id_factura == 1
+    nueva = db.query(models.Factura).filter_by(numero_factura="SETP10").one()
+    emisora = db.get(models.Institucion, nueva.id_institucion_emisora)
+    assert (emisora.nit, emisora.tipo_institucion) == ("901000001", "IPS")
+    assert nueva.id_institucion_receptora == 2  # la EPS ya existía por NIT
+
+
+def test_importar_respeta_alcance_reglas_y_estado(db, factura, tmp_path):
+    db.add(models.Institucion(id_institucion=3, nit="900999999", razon_social="Otra IPS", tipo_institucion="IPS"))
+    db.add(models.Factura(
+        id_factura=2, numero_factura="FE-002", id_institucion_emisora=1, id_institucion_receptora=2,
+        fecha_emision=date(2025, 1, 10), valor_total_factura=Decimal("100"), estado_factura="Radicada",
+    ))
+    db.commit()
+    ruta = str(tmp_path / "facturas.zip")
+    with zipfile.ZipFile(ruta, "w") as z:
+        z.writestr("FE-001.xml", _invoice("FE-001", "1.00", nit_emisor="900999999"))  # de la IPS 1
+        z.writestr("FE-002.xml", _invoice("FE-002", "2.00"))  # propia pero ya radicada
+        z.writestr("SETP20.xml", _invoice("SETP20", "0", nit_emisor="900999999"))  # valor no positivo
+        z.writestr("SETP21.xml", _invoice("SETP21", "50.00", nit_emisor="900999999"))
+
+    ips3 = Alcance(id_institucion=3, columna="id_institucion_emisora", restringido=True)
+    resumen = facturas_dian.importar(db, ruta, procesos=1, lote=10, alcance=ips3)
+
+    assert resumen["cargadas"] == 1
+    codigos = {r["numero_factura"]: [e["regla"] for e in r["errores"]] for r in resumen["rechazadas"]}
+    assert codigos == {"FE-001": ["fuera_de_alcance"], "FE-002": ["fuera_de_alcance"], "SETP20": ["positivo"]}
+    db.expire_all()
+    existente = db.query(models.Factura).filter_by(numero_factura="FE-001").one()
+    assert existente.valor_total_factura == Decimal("500000") and existente.id_institucion_emisora == 1
+    assert db.query(models.Factura).filter_by(numero_factura="SETP21").one().id_institucion_emisora == 3
+
+    # Sin restricción, una factura radicada tampoco se sobrescribe.
+    resumen = facturas_dian.importar(db, ruta, procesos=1, lote=10)
+    assert [e["regla"] for r in resumen["rechazadas"] if r["numero_factura"] == "FE-002" for e in r["errores"]] == ["estado_no_actualizable"]
+    db.expire_all()
+    assert db.get(models.Factura, 2).valor_total_factura == Decimal("100")
@@ -0,0 +1,115 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import List
+
+from pydantic import TypeAdapter
+
+import models
+import schemas
+
+
+def test_listado_glosas_igual_al_esquema(client, db, factura):
+    for i in range(3):
+        db.add(models.Glosa(
+            id_glosa=i + 1, id_factura=factura.id_factura, id_motivo_glosa=1, fecha_glosa=date(2025, 2, 1),
+            valor_glosado=Decimal(f"{i}1000.50"), fecha_registro_glosa=datetime(2025, 2, 1, 8, 30),
+        ))
+    db.commit()
+
+    respuesta = client.get("/glosas/")
+
+    assert respuesta.status_code == 200
+    assert respuesta.headers["content-type"] == "application/json"
+    adaptador = TypeAdapter(List[schemas.Glosa])
+    esperado = adaptador.dump_python(
+        adaptador.validate_python(db.query(models.Glosa).all(), from_attributes=True), mode="json"
+    )
+    assert respuesta.json() == esperado
+    assert respuesta.json()[0]["valor_glosado"] == "1000.50"
+
+
+def test_listado_respuestas_rellena_campos_fuera_del_modelo(client, db, factura):
+    db.add(models.Usuario(id_usuario=1, nombre_completo="Auditor", email="a@b.co", password_hash="x", rol="ADMIN"))
+    db.add(models.Glosa(id_glosa=1, id_factura=1, id_motivo_glosa=1, fecha_glosa=date(2025, 2, 1), valor_glosado=1))
+    db.add(models.RespuestaGlosa(
+        id_glosa=1, fecha_respuesta=date(2025, 2, 5), usuario_que_responde=1, tipo_respuesta="Reclamacion",
+        argumento_respuesta="Soportes completos", estado_posterior_glosa="Respondida",
+    ))
+    db.commit()
+
+    fila = client.get("/respuestas-glosa/").json()[0]
+
+    assert fila["valor_propuesto_conciliacion"] is None
+    assert fila["fecha_respuesta"] == "2025-02-05T00:00:00"
+
+
+def test_campos_e_include_en_un_solo_select(client, db, factura):
+    db.add(models.Glosa(id_glosa=1, id_factura=1, id_motivo_glosa=1, fecha_glosa=date(2025, 2, 1), valor_glosado=1))
+    db.commit()
+
+    fila = client.get("/glosas/?fields=valor_glosado,factura.numero_factura&include=motivo").json()[0]
+    assert set(fila) == {"id_glosa", "valor_glosado", "factura", "motivo"}
+    assert fila["factura"] == {"numero_factura": "FE-001"}
+    assert fila["motivo"]["descripcion_motivo"] == "Facturación"
+
+    factura = client.get("/facturas/?include=emisora&fields=numero_factura").json()[0]
+    assert factura["emisora"]["razon_social"] == "IPS Prueba"
+    assert set(factura) == {"id_factura", "numero_factura", "emisora"}
+
+    assert client.get("/glosas/?fields=no_existe").status_code == 400
+    assert client.get("/glosas/?include=usuario").status_code == 400
+
+
+def test_listado_ndjson_en_streaming(client, db, factura, monkeypatch):
+    import crud
+
+    monkeypatch.setattr(crud, "LOTE_STREAM", 2)  # varias vueltas del cursor
+    db.add_all([
+        models.Glosa(id_glosa=i, id_factura=1, id_motivo_glosa=1, fecha_glosa=date(2025, 2, 1), valor_glosado=i)
+        for i in range(1, 6)
+    ])
+    db.commit()
+
+    respuesta = client.get("/glosas/?include=factura", headers={"Accept": "application/x-ndjson"})
+    assert respuesta.status_code == 200
+    assert respuesta.headers["content-type"] == "application/x-ndjson"
+    assert "etag" not in respuesta.headers
+    filas = [json.loads(linea) for linea in respuesta.text.splitlines()]
+    assert [f["id_glosa"] for f in filas] == [1, 2, 3, 4, 5]
+    assert filas[0]["factura"]["numero_factura"] == "FE-001"
+    assert filas[0] == client.get("/glosas/?include=factura").json()[0]
+
+    reanudar = client.get("/glosas/?formato=ndjson&desde_id=3&fields=valor_glosado")
+    assert [json.loads(linea) for linea in reanudar.text.splitlines()] == [
+        {"id_glosa": 4, "valor_glosado": "4.00"}, {"id_glosa": 5, "valor_glosado": "5.00"},
+    ]
+
+
+def test_vista_glosas_en_streaming_y_por_tramos(client, db, factura, monkeypatch):
+    import main
+
+    monkeypatch.setattr(main, "LOTE_VISTA_GLOSAS", 2)
+    for i in range(1, 6):
+        db.add(models.Glosa(
+            id_glosa=i, id_factura=1, id_motivo_glosa=1, fecha_glosa=date(2025, 2, 1),
+            valor_glosado=Decimal("1000") * i, fecha_vencimiento_respuesta=date(2025, 3, 1),
+        ))
+    db.commit()
+
+    with client.stream("GET", "/glosas-view", headers={"Accept-Encoding": "gzip"}) as respuesta:
+        html = "".join(respuesta.iter_text())
+        etag = respuesta.headers["etag"]
+    assert respuesta.status_code == 200
+    assert respuesta.headers["content-encoding"] == "gzip" and "content-length" not in respuesta.headers
+    assert html.count("/actualizar-estado-glosa/") == 5 and "$5,000" in html
+    sin_comprimir = client.get("/glosas-view", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in sin_comprimir.headers and sin_comprimir.text == html
+    assert client.get("/glosas-view", headers={"If-None-Match": etag}).status_code == 304
+
+    tramo = client.get("/glosas-view/filas?skip=3&limit=10").json()
+    assert tramo["total"] == 5
+    assert [(f["id_glosa"], f["numero_factura"], f["codigo_motivo"], f["color"]) for f in tramo["filas"]] == [
+        (4, "FE-001", "FA0101", "danger"), (5, "FE-001", "FA0101", "danger"),
+    ]
+    assert "glosas-view/filas" in client.get("/glosas-view?modo=virtual").text
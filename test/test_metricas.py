@@ -0,0 +1,22 @@
+def test_cabeceras_de_consultas_y_exportacion_prometheus(client, factura):
+    respuesta = client.get("/facturas/1")
+
+    assert respuesta.headers["X-Query-Count"] == "1"
+    assert respuesta.headers["Server-Timing"].startswith("db;dur=")
+
+    texto = client.get("/metrics").text
+    assert 'http_request_duration_seconds_count{method="GET",route="/facturas/{factura_id}"}' in texto
+    assert 'db_queries_total{method="GET",route="/facturas/{factura_id}"}' in texto
+
+
+def test_streaming_se_mide_hasta_el_ultimo_byte(client, factura):
+    import metricas
+
+    clave = ("GET", "/glosas-view")
+    antes = metricas.registro.consultas[clave]
+    with client.stream("GET", "/glosas-view") as respuesta:
+        en_cabecera = int(respuesta.headers["X-Query-Count"])
+        "".join(respuesta.iter_text())
+
+    # Las consultas del cuerpo en streaming cuentan en el registro, no en la cabecera.
+    assert metricas.registro.consultas[clave] - antes > en_cabecera
@@ -0,0 +1,40 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+
+@pytest.fixture
+def replica(tmp_path, monkeypatch, db):
+    """Segunda base SQLite como réplica (vacía: simula una réplica atrasada)."""
+    import database
+
+    motor = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    database.Base.metadata.create_all(bind=motor)
+    monkeypatch.setattr(database, "engine_lectura", motor)
+    monkeypatch.setattr(database, "SessionLectura", sessionmaker(autoflush=False, bind=motor))
+    monkeypatch.setattr(database, "_estado_replica", {"disponible": True, "revisada": 0.0})
+    yield motor
+    motor.dispose()
+
+
+def test_lecturas_van_a_la_replica_y_se_lee_lo_propio_tras_escribir(client, factura, replica):
+    # La factura solo existe en la primaria.
+    assert client.get("/facturas/").json() == []
+
+    respuesta = client.put("/facturas/1", json={"observaciones": "Revisada"})
+    assert respuesta.status_code == 200
+    assert "leer_primaria=1" in respuesta.headers["set-cookie"]
+
+    # Con la cookie, el mismo cliente lee de la primaria.
+    assert [f["observaciones"] for f in client.get("/facturas/").json()] == ["Revisada"]
+
+
+def test_sin_replica_disponible_se_lee_de_la_primaria(client, factura, monkeypatch):
+    import database
+
+    caida = create_engine("sqlite:////ruta/inexistente/replica.db")
+    monkeypatch.setattr(database, "engine_lectura", caida)
+    monkeypatch.setattr(database, "SessionLectura", sessionmaker(bind=caida))
+    monkeypatch.setattr(database, "_estado_replica", {"disponible": True, "revisada": 0.0})
+
+    assert [f["numero_factura"] for f in client.get("/facturas/").json()] == ["FE-001"]
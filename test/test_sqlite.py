@@ -0,0 +1,67 @@
+import threading
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import select, text
+
+import crud
+import models
+import schemas
+from dialectos import suma_dinero
+
+
+@pytest.fixture(autouse=True)
+def solo_sqlite(db):
+    if db.get_bind().dialect.name != "sqlite":
+        pytest.skip("pruebas del modo SQLite")
+
+
+def test_pragmas(db):
+    assert db.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+    assert db.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+
+
+def test_ids_autonumerados(db, factura):
+    glosa = crud.create_glosa(db, schemas.GlosaCreate(
+        id_factura=1, id_motivo_glosa=1, fecha_glosa=date(2025, 2, 3), valor_glosado=Decimal("10.00"),
+    ))
+    assert glosa.id_glosa == 1
+
+
+def test_escritores_concurrentes_sin_bloqueos(db, factura):
+    from database import SessionLocal
+
+    errores = []
+
+    # Ocho sesiones leen y escriben a la vez: hacen fila por el turno de escritura.
+    def escritor(n):
+        sesion = SessionLocal()
+        try:
+            for i in range(20):
+                sesion.execute(select(models.Glosa.id_glosa).limit(1)).all()
+                sesion.add(models.Glosa(
+                    id_factura=1, id_motivo_glosa=1, fecha_glosa=date(2025, 2, 1), valor_glosado=Decimal(n * 100 + i + 1),
+                ))
+                sesion.commit()
+        except Exception as e:
+            errores.append(e)
+        finally:
+            sesion.close()
+
+    hilos = [threading.Thread(target=escritor, args=(n,)) for n in range(8)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    assert errores == []
+    assert db.query(models.Glosa).count() == 160
+
+
+def test_suma_dinero_exacta(db, factura):
+    db.add_all([
+        models.Glosa(id_glosa=i, id_factura=1, id_motivo_glosa=1, fecha_glosa=date(2025, 2, 1), valor_glosado=Decimal("0.10") + i)
+        for i in range(1, 11)
+    ])
+    db.commit()
+    assert db.execute(select(suma_dinero(models.Glosa.valor_glosado))).scalar_one() == Decimal("56.00")
@@ -0,0 +1,72 @@
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+import models
+
+
+@pytest.fixture
+def usuario_autenticado(db):
+    from auth.auth import get_current_active_user
+    import main
+
+    db.add(models.Usuario(id_usuario=1, nombre_completo="Auditor", email="a@glosas.test", password_hash="x", rol="AUDITOR_IPS"))
+    db.commit()
+    main.app.dependency_overrides[get_current_active_user] = lambda: db.get(models.Usuario, 1)
+    yield
+    main.app.dependency_overrides.clear()
+
+
+def _glosas(db, estados):
+    db.add_all([
+        models.Glosa(id_glosa=i, id_factura=1, id_motivo_glosa=1, fecha_glosa=date(2025, 2, 1),
+                     valor_glosado=Decimal("100.00") * i, estado_glosa=estado)
+        for i, estado in enumerate(estados, start=1)
+    ])
+    db.commit()
+
+
+def test_transicion_masiva_informa_omitidas(client, db, factura, usuario_autenticado):
+    _glosas(db, ["Pendiente", "Respondida", "Conciliada", "Pendiente"])
+
+    respuesta = client.post("/glosas/transiciones", json={"ids": [1, 2, 3, 4, 99], "estado": "En revisión"})
+
+    assert respuesta.status_code == 200
+    cuerpo = respuesta.json()
+    assert cuerpo["actualizadas"] == [1, 2, 4]
+    assert cuerpo["omitidas"] == [
+        {"id_glosa": 3, "estado_actual": "Conciliada", "motivo": "transicion_no_permitida"},
+        {"id_glosa": 99, "estado_actual": None, "motivo": "no_existe"},
+    ]
+    db.expire_all()
+    assert [g.estado_glosa for g in db.query(models.Glosa).order_by(models.Glosa.id_glosa)] == [
+        "En revisión", "En revisión", "Conciliada", "En revisión",
+    ]
+    assert client.post("/glosas/transiciones", json={"ids": [1], "estado": "Cerrada"}).status_code == 422
+
+
+def test_actualizacion_individual_valida_la_transicion(client, db, factura, usuario_autenticado):
+    _glosas(db, ["Conciliada", "Pendiente"])
+
+    assert client.put("/glosas/1", json={"estado_glosa": "Pendiente"}).status_code == 409
+    respuesta = client.put("/glosas/2", json={"estado_glosa": "Respondida"})
+    assert respuesta.status_code == 200
+    assert respuesta.json()["estado_glosa"] == "Respondida"
+
+
+def test_formulario_de_la_vista_ofrece_solo_transiciones_permitidas(client, db, factura):
+    import re
+
+    _glosas(db, ["Aceptada", "Pendiente"])
+
+    html = client.get("/glosas-view").text
+    formularios = re.findall(r'<select name="estado".*?</select>', html, re.S)
+    assert [re.findall(r'<option value="([^"]+)"', f) for f in formularios] == [
+        ["Aceptada", "Conciliada"],
+        ["Pendiente", "En revisión", "Respondida", "Aceptada", "Rechazada"],
+    ]
+    assert client.post("/actualizar-estado-glosa/1", data={"estado": "Pendiente"}).status_code == 409
+    assert client.post("/actualizar-estado-glosa/1", data={"estado": "Cerrada"}).status_code == 422
+    respuesta = client.post("/actualizar-estado-glosa/1", data={"estado": "Conciliada"}, follow_redirects=False)
+    assert respuesta.status_code == 303
@@ -0,0 +1,145 @@
+import io
+import time
+from decimal import Decimal
+
+import pandas as pd
+import pytest
+
+import models
+import validaciones
+
+
+def _codigos(reglas):
+    return [(r.codigo, r.campos[0]) for r in reglas]
+
+
+def test_digito_verificacion_dian():
+    assert validaciones.digito_verificacion("800197268") == 4  # DIAN
+    assert validaciones.digito_verificacion("890903938") == 8
+    assert validaciones.nit_partes("800.197.268-4") == ("800197268", 4)
+    assert validaciones.nit_partes("80019726-") is None
+
+
+CASOS = [
+    {},  # sin infracciones
+    {"nit_emisora": "800197268-5"},
+    {"nit_emisora": "NIT 800197268"},
+    {"codigo_motivo": "fa01"},
+    {"fecha_glosa": "2025-01-05"},                   # antes de la emisión
+    {"fecha_vencimiento_respuesta": "2025-02-01"},   # igual a la glosa
+    {"valor_glosado": "600000"},
+    {"valor_glosado": "abc", "fecha_glosa": "2025-13-01"},
+    {"valor_glosado": "", "codigo_motivo": "223"},
+    {"fecha_glosa": "10/01/2025"},                   # solo ISO 8601, sin adivinar el formato
+    {"fecha_glosa": "2025-02-01 00:00:00"},
+    {"valor_glosado": "1.234,56"},                   # no es 1.23456
+    {"valor_glosado": "1,5"},
+]
+
+
+def test_fila_y_tabla_reportan_lo_mismo():
+    base = {
+        "nit_emisora": "800.197.268-4", "codigo_motivo": "FA0101", "fecha_emision": "2025-01-10",
+        "fecha_glosa": "2025-02-01", "fecha_vencimiento_respuesta": "2025-03-01",
+        "valor_glosado": "1,200.50", "valor_total_factura": "500000",
+    }
+    reglas = validaciones.REGLAS_GLOSA + (validaciones.formato_nit("nit_emisora"), validaciones.digito_nit("nit_emisora"))
+    filas = [{**base, **cambios} for cambios in CASOS]
+
+    tabla = validaciones.validar_tabla(pd.DataFrame(filas, dtype=str), reglas)
+    for i, fila in enumerate(filas):
+        assert _codigos(tabla.get(i, ())) == _codigos(validaciones.validar_fila(fila, reglas)), fila
+
+    assert 0 not in tabla
+    assert _codigos(tabla[7]) == [("fecha", "fecha_glosa"), ("positivo", "valor_glosado")]
+    assert _codigos(tabla[8]) == [("requerido", "valor_glosado")]
+    assert _codigos(tabla[9]) == [("fecha", "fecha_glosa")] and 10 not in tabla
+    assert _codigos(tabla[11]) == _codigos(tabla[12]) == [("positivo", "valor_glosado")]
+
+
+def test_fechas_y_numeros_no_se_adivinan():
+    df = pd.DataFrame({"fecha": ["10/01/2025", "25/01/2025", "2025-01-10"], "valor": ["1.234,56", "1,234.56", "1234.56"]})
+    tabla = validaciones.Tabla(df)
+    assert tabla.fecha("fecha").isna().tolist() == [True, True, False]
+    assert [validaciones._fecha(v) is validaciones._INVALIDO for v in df["fecha"]] == [True, True, False]
+    assert tabla.numero("valor").tolist()[1:] == [1234.56, 1234.56] and pd.isna(tabla.numero("valor")[0])
+    assert validaciones.decimal("1,234.56") == validaciones.decimal("1234.56")
+    with pytest.raises(ValueError):
+        validaciones.decimal("1.234,56")
+
+
+def test_cien_mil_filas_en_menos_de_un_segundo():
+    n = 100_000
+    df = pd.DataFrame({
+        "nit_emisora": ["800197268-4", "800197268-5"] * (n // 2),
+        "codigo_motivo": ["FA0101", "5000"] * (n // 2),
+        "fecha_emision": "2025-01-10",
+        "fecha_glosa": ["2025-02-01", "2025-01-01"] * (n // 2),
+        "valor_glosado": [str(v) for v in range(n)],
+        "valor_total_factura": "50000",
+    }, dtype=str)
+    reglas = validaciones.REGLAS_GLOSA + (validaciones.formato_nit("nit_emisora"), validaciones.digito_nit("nit_emisora"))
+
+    inicio = time.perf_counter()
+    infracciones = validaciones.validar_tabla(df, reglas)
+    assert time.perf_counter() - inicio < 1.0
+    assert len(infracciones) == 75_000  # las impares, más las pares con valor 0 o > 50000
+    assert {r.codigo for r in infracciones[1]} == {"digito_verificacion", "codigo_motivo", "orden_fechas"}
+
+
+def test_api_responde_422_con_todas_las_infracciones(client, factura):
+    respuesta = client.post("/glosas/", json={
+        "id_factura": 1, "id_motivo_glosa": 1, "fecha_glosa": "2025-01-02", "valor_glosado": "600000",
+    })
+    assert respuesta.status_code == 422
+    assert [e["regla"] for e in respuesta.json()["detail"]] == ["orden_fechas", "no_mayor"]
+
+    respuesta = client.post("/instituciones/", json={
+        "nit": "800197268-5", "razon_social": "DIAN", "tipo_institucion": "EPS",
+    })
+    assert respuesta.status_code == 422 and respuesta.json()["detail"][0]["regla"] == "digito_verificacion"
+
+
+def test_importaciones_rechazan_filas_con_sus_motivos(client, db, factura):
+    hoja = io.BytesIO()
+    pd.DataFrame({
+        "numero_factura": ["FE-002", "FE-003", "FE-004"],
+        "nit_emisora": ["900123456", "900123456", "900123456"],
+        "nit_receptora": ["800654321", "811111111", "800654321"],
+        "fecha_emision": ["2025-03-01", "2025-03-01", "2025-03-01"],
+        "fecha_radicado": ["2025-03-05", "2025-03-05", "2025-02-01"],
+        "valor_total": ["1000", "1000", "1000"],
+    }).to_excel(hoja, index=False)
+    hoja.seek(0)
+
+    resultado = client.post("/importar-facturas", files={"file": ("facturas.xlsx", hoja)}).json()
+    assert resultado["cargadas"] == 1 and resultado["filas_rechazadas"] == [3, 4]
+    assert [e["regla"] for fila in resultado["errores"] for e in fila["errores"]] == ["institucion_no_registrada", "orden_fechas"]
+    assert db.query(models.Factura).filter_by(numero_factura="FE-002").one().fecha_radicado.isoformat() == "2025-03-05"
+
+    csv = (
+        "numero_factura,codigo_motivo,fecha_glosa,valor_glosado\n"
+        "FE-001,FA0101,2025-02-01,1000\n"
+        "FE-001,FA0101,2025-01-02,600000\n"
+        "FE-999,X,2025-02-01,10\n"
+    )
+    resultado = client.post("/importar-glosas", files={"file": ("glosas.csv", csv.encode())}).json()
+    assert resultado["cargadas"] == 1 and resultado["filas_rechazadas"] == [3, 4]
+    assert [e["regla"] for e in resultado["errores"][1]["errores"]] == [
+        "codigo_motivo", "factura_no_registrada", "motivo_no_registrado",
+    ]
+
+    # En Excel las celdas vacías llegan como NaN: la observación queda nula, como la de solo espacios.
+    hoja = io.BytesIO()
+    pd.DataFrame({
+        "numero_factura": ["FE-001", "FE-001", "FE-001"],
+        "codigo_motivo": ["FA0101", "FA0101", "FA0101"],
+        "fecha_glosa": ["2025-02-03", "2025-02-04", "2025-02-05"],
+        "valor_glosado": ["2000", "3000", "4000"],
+        "observaciones": [None, "Soporte incompleto", "   "],
+    }).to_excel(hoja, index=False)
+    hoja.seek(0)
+    resultado = client.post("/importar-glosas", files={"file": ("glosas.xlsx", hoja)}).json()
+    assert resultado["cargadas"] == 3
+    observaciones = dict(db.query(models.Glosa.valor_glosado, models.Glosa.observaciones_glosa).filter(models.Glosa.valor_glosado >= 2000))
+    assert observaciones == {Decimal("2000.00"): None, Decimal("3000.00"): "Soporte incompleto", Decimal("4000.00"): None}
@@ -0,0 +1,79 @@
+from datetime import date
+from decimal import Decimal
+
+import dias_habiles
+import models
+import vencimientos
+
+
+def _habiles(db, hoy, dias):
+    return dias_habiles.sumar(dias_habiles.calendario(db), [hoy], dias)[0].item()
+
+
+def _preparar(db, hoy):
+    db.add(models.Usuario(id_usuario=7, nombre_completo="Auditora", email="b@glosas.test", password_hash="x", rol="AUDITOR_IPS"))
+    vence = {1: -3, 2: 2, 3: 30, 4: 1, 5: None}  # en días hábiles
+    db.add_all([
+        models.Glosa(id_glosa=i, id_factura=1, id_motivo_glosa=1, fecha_glosa=date(2025, 2, 1),
+                     valor_glosado=Decimal("100.00") * i, usuario_responsable=7,
+                     estado_glosa="Respondida" if i == 4 else "Pendiente",
+                     fecha_vencimiento_respuesta=None if d is None else _habiles(db, hoy, d))
+        for i, d in vence.items()
+    ])
+    db.commit()
+    vencimientos.procesar_pendientes()
+
+
+def test_recalculo_completo_e_incremental(db, factura):
+    hoy = date.today()
+    _preparar(db, hoy)
+    vencimientos.recalcular(db, hoy=hoy)
+    db.commit()
+
+    cola = vencimientos.cola_usuario(db, 7, hoy)
+    assert [a["id_glosa"] for a in cola["vencidas"]] == [1]
+    assert [(a["id_glosa"], a["dias_restantes"]) for a in cola["por_vencer"]] == [(2, 2)]
+
+    # Una escritura por el ORM y una transición masiva se recalculan en segundo plano.
+    db.get(models.Glosa, 3).fecha_vencimiento_respuesta = _habiles(db, hoy, 4)
+    db.commit()
+    import crud
+    crud.transicionar_glosas(db, [1], "Respondida")
+    assert vencimientos.procesar_pendientes() == 2
+
+    cola = vencimientos.cola_usuario(db, 7, hoy)
+    assert cola["vencidas"] == []
+    assert [a["id_glosa"] for a in cola["por_vencer"]] == [2, 3]
+
+
+def test_mis_glosas_y_resumen(client, db, factura, tmp_path):
+    from auth.auth import create_access_token
+
+    hoy = date.today()
+    _preparar(db, hoy)
+    vencimientos.recalcular(db, hoy=hoy)
+    db.commit()
+
+    cabeceras = {"Authorization": f"Bearer {create_access_token({'sub': '7'})}"}
+    cola = client.get("/alertas/mis-glosas", headers=cabeceras).json()
+    assert [a["id_glosa"] for a in cola["vencidas"]] == [1]
+    assert cola["por_vencer"][0]["dias_restantes"] == 2
+
+    rutas = vencimientos.escribir_resumenes(db, str(tmp_path), hoy)
+    assert len(rutas) == 1
+    contenido = open(rutas[0], encoding="utf-8").read()
+    assert "To: b@glosas.test" in contenido
+    assert "1 vencidas, 1 por vencer" in contenido
+
+
+def test_tarea_diaria_avanza_las_particiones(db, factura, monkeypatch):
+    import auditoria
+    from almacen import almacen
+
+    llamadas = []
+    monkeypatch.setattr(auditoria, "asegurar_particiones", lambda conn, desde=None, meses=13: llamadas.append(desde))
+    hoy = date(2031, 7, 15)
+    assert vencimientos.tarea_diaria(hoy)
+    assert llamadas == [hoy]
+    assert not vencimientos.tarea_diaria(hoy)  # una vez por día entre todos los workers
+    almacen.delete(vencimientos._CANDADO_DIARIO + hoy.isoformat())
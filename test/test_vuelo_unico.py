@@ -0,0 +1,55 @@
+import threading
+import time
+
+import pytest
+
+from vuelo_unico import VueloUnico
+
+
+def test_llamadas_simultaneas_comparten_un_calculo():
+    vuelo = VueloUnico(ttl=60)
+    llamadas = []
+
+    def calcular():
+        llamadas.append(1)
+        time.sleep(0.2)
+        return {"total": 42}
+
+    resultados = []
+    hilos = [threading.Thread(target=lambda: resultados.append(vuelo.obtener("clave", calcular))) for _ in range(10)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+
+    assert len(llamadas) == 1
+    assert resultados == [{"total": 42}] * 10
+    assert vuelo.obtener("clave", calcular) == {"total": 42}  # reciente: sin recalcular
+    assert vuelo.contadores() == {"calculos": 1, "compartidos": 9, "aciertos": 1, "en_vuelo": 0}
+    vuelo.obtener("otra-version", calcular)
+    assert len(llamadas) == 2
+
+
+def test_error_se_comparte_y_no_se_guarda():
+    vuelo = VueloUnico(ttl=60)
+
+    def fallar():
+        raise ValueError("sin base")
+
+    with pytest.raises(ValueError):
+        vuelo.obtener("clave", fallar)
+    assert vuelo.obtener("clave", lambda: "ok") == "ok"
+
+
+def test_reporte_se_sirve_del_resultado_reciente(client, factura):
+    import vuelo_unico
+
+    antes = vuelo_unico.vuelo_unico.contadores()
+    primero = client.get("/reporte-facturas")
+    segundo = client.get("/reporte-facturas")
+    despues = vuelo_unico.vuelo_unico.contadores()
+
+    assert primero.status_code == segundo.status_code == 200
+    assert primero.content == segundo.content and primero.content.startswith(b"PK")
+    assert despues["calculos"] - antes["calculos"] == 1
+    assert despues["aciertos"] - antes["aciertos"] == 1
@@ -0,0 +1,131 @@
+# ubl.py
+"""
+Lectura de facturas electrónicas DIAN (UBL 2.1).
+
+Solo usa la biblioteca estándar: se importa en los procesos del pool de
+facturas_dian.py sin arrastrar SQLAlchemy ni la configuración de la base.
+
+El XML se recorre con iterparse (sin construir el DOM): se toman los pocos
+campos que necesita la tabla factura a medida que aparecen, se libera cada
+elemento al cerrarse y la lectura se corta al terminar LegalMonetaryTotal,
+de modo que las líneas de detalle (InvoiceLine, lo más pesado del archivo)
+ni se recorren.
+
+Acepta tanto el Invoice suelto como el AttachedDocument que envía la DIAN
+(el Invoice viaja como texto en Attachment/ExternalReference/Description).
+"""
+
+import io
+import os
+import zipfile
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Optional, Tuple
+from xml.etree import ElementTree as ET
+
+# Ruta (nombres locales, sin el elemento raíz) -> campo.
+_CAMPOS: Dict[Tuple[str, ...], str] = {
+    ("ID",): "numero_factura",
+    ("IssueDate",): "fecha_emision",
+    ("AccountingSupplierParty", "Party", "PartyTaxScheme", "CompanyID"): "nit_emisor",
+    ("AccountingSupplierParty", "Party", "PartyTaxScheme", "RegistrationName"): "razon_social_emisor",
+    ("AccountingCustomerParty", "Party", "PartyTaxScheme", "CompanyID"): "nit_receptor",
+    ("AccountingCustomerParty", "Party", "PartyTaxScheme", "RegistrationName"): "razon_social_receptor",
+    ("LegalMonetaryTotal", "PayableAmount"): "valor_total_factura",
+}
+_ADJUNTO = ("Attachment", "ExternalReference", "Description")
+_FIN = ("LegalMonetaryTotal",)
+
+OBLIGATORIOS = ("numero_factura", "fecha_emision", "nit_emisor", "nit_receptor", "valor_total_factura")
+
+
+class FacturaInvalida(ValueError):
+    pass
+
+
+def _local(etiqueta: str) -> str:
+    return etiqueta.rpartition("}")[2]
+
+
+def _nit(valor: str) -> str:
+    """NIT sin puntos, guiones ni dígito de verificación pegado ("900.123.456-7" -> "900123456")."""
+    valor = valor.strip().replace(".", "").replace(" ", "")
+    return valor.split("-")[0]
+
+
+def parsear(contenido: bytes) -> dict:
+    """Campos de la factura en `contenido` (Invoice o AttachedDocument). FacturaInvalida si faltan."""
+    datos: Dict[str, str] = {}
+    ruta = []
+    raiz = None
+    try:
+        for evento, elem in ET.iterparse(io.BytesIO(contenido), events=("start", "end")):
+            if evento == "start":
+                if raiz is None:
+                    raiz = _local(elem.tag)
+                else:
+                    ruta.append(_local(elem.tag))
+                continue
+            clave = tuple(ruta)
+            if raiz == "AttachedDocument" and clave == _ADJUNTO:
+                return parsear((elem.text or "").strip().encode("utf-8"))
+            campo = _CAMPOS.get(clave) if raiz == "Invoice" else None
+            if campo and campo not in datos:
+                datos[campo] = (elem.text or "").strip()
+            if raiz == "Invoice" and clave == _FIN:
+                break
+            if ruta:
+                ruta.pop()
+            elem.clear()
+    except ET.ParseError as e:
+        raise FacturaInvalida(f"XML inválido: {e}")
+
+    if raiz not in ("Invoice", "AttachedDocument"):
+        raise FacturaInvalida(f"No es una factura UBL (raíz {raiz})")
+    faltantes = [c for c in OBLIGATORIOS if not datos.get(c)]
+    if faltantes:
+        raise FacturaInvalida(f"Faltan campos: {', '.join(faltantes)}")
+    try:
+        valor = Decimal(datos["valor_total_factura"])
+        fecha = date.fromisoformat(datos["fecha_emision"])
+    except (InvalidOperation, ValueError):
+        raise FacturaInvalida("Fecha o valor total con formato inválido")
+    return {
+        "numero_factura": datos["numero_factura"],
+        "fecha_emision": fecha,
+        "valor_total_factura": valor,
+        "nit_emisor": _nit(datos["nit_emisor"]),
+        "razon_social_emisor": datos.get("razon_social_emisor") or datos["nit_emisor"],
+        "nit_receptor": _nit(datos["nit_receptor"]),
+        "razon_social_receptor": datos.get("razon_social_receptor") or datos["nit_receptor"],
+    }
+
+
+# ====================================================================
+# Tarea del pool: un archivo por llamada
+# ====================================================================
+
+_zips: Dict[str, zipfile.ZipFile] = {}  # ZIP abiertos por este proceso
+
+
+def _leer(origen: Tuple[str, Optional[str]]) -> bytes:
+    ruta, miembro = origen
+    if miembro is None:
+        with open(ruta, "rb") as f:
+            return f.read()
+    if ruta not in _zips:
+        _zips[ruta] = zipfile.ZipFile(ruta)
+    return _zips[ruta].read(miembro)
+
+
+def parsear_archivo(origen: Tuple[str, Optional[str]]) -> dict:
+    """
+    Lee y parsea un archivo: `origen` es (ruta, None) para un XML suelto o
+    (ruta del ZIP, miembro). Nunca lanza: los errores vuelven en "error"
+    para que un archivo malo no detenga el lote.
+    """
+    nombre = origen[1] or os.path.basename(origen[0])
+    try:
+        return {"archivo": nombre, **parsear(_leer(origen))}
+    except (FacturaInvalida, OSError, KeyError, zipfile.BadZipFile) as e:
+        return {"archivo": nombre, "error": str(e)}
@@ -0,0 +1,481 @@
+# validaciones.py
+"""
+Reglas de validación de instituciones, motivos, facturas y glosas.
+
+Cada regla se declara una sola vez y se aplica de dos maneras:
+
+    validar_fila(datos, reglas)   sobre un dict (entrada de la API); exigir()
+                                  lanza DatosInvalidos y el router responde 422
+    validar_tabla(df, reglas)     sobre un DataFrame completo (importaciones):
+                                  cada regla se evalúa una vez sobre la columna
+                                  entera y se devuelven todas las infracciones
+                                  de cada fila; con una Tabla en lugar del
+                                  DataFrame, quien importa reutiliza después
+                                  las fechas ya convertidas
+
+Las dos maneras convierten igual: fechas solo en ISO 8601 (2025-01-10, con
+hora opcional; nunca 10/01/2025, que sería ambiguo) y números con punto
+decimal y, opcionalmente, comas de miles bien agrupadas (1,234.56). Un valor
+como 1.234,56 es inválido, no 1.23456.
+
+Una regla solo juzga los valores presentes: si falta el campo (None, NaN,
+cadena vacía o columna ausente) no aplica. Que un campo sea obligatorio lo
+dice la regla `requerido`.
+
+pandas/numpy solo se importan en la ruta vectorizada: la API no los necesita.
+"""
+
+import math
+import re
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import Any, Callable, Dict, Hashable, List, Mapping, Optional, Sequence, Tuple
+
+# Pesos de la DIAN para el dígito de verificación, del dígito de las unidades hacia la izquierda.
+PESOS_NIT = (3, 7, 13, 17, 19, 23, 29, 37, 41, 43, 47, 53, 59, 67, 71)
+# NIT (quitados puntos y espacios), con o sin dígito de verificación: 900123456 o 900123456-8.
+PATRON_NIT = r"([0-9]{5,15})(?:-([0-9]))?"
+# Códigos de motivo: 3 dígitos (Res. 3047 de 2008) o 2 letras y 4 dígitos (Res. 2284 de 2023).
+PATRON_MOTIVO = r"[0-9]{3}|[A-Z]{2}[0-9]{4}"
+
+_NIT = re.compile(PATRON_NIT)
+_MOTIVO = re.compile(PATRON_MOTIVO, re.ASCII | re.IGNORECASE)
+_SEPARADORES_NIT = re.compile(r"[. ]")
+_ANCHO_NIT = 24  # caracteres; un NIT más largo no cabe en el patrón aunque traiga puntos
+# Número con comas de miles: solo grupos de tres dígitos antes del punto decimal.
+PATRON_MILES = r"[+-]?[0-9]{1,3}(?:,[0-9]{3})+(?:\.[0-9]+)?"
+_MILES = re.compile(PATRON_MILES)
+
+_INVALIDO = object()  # valor presente que no se pudo convertir
+
+
+class DatosInvalidos(ValueError):
+    def __init__(self, infracciones: List["Regla"]):
+        self.infracciones = infracciones
+        super().__init__("; ".join(r.mensaje for r in infracciones))
+
+    @property
+    def detalle(self) -> List[dict]:
+        return [r.como_dict() for r in self.infracciones]
+
+
+# ====================================================================
+# Conversión de valores sueltos (fila a fila)
+# ====================================================================
+
+def _vacio(valor: Any) -> bool:
+    return (
+        valor is None
+        or (isinstance(valor, float) and math.isnan(valor))
+        or (isinstance(valor, str) and not valor.strip())
+    )
+
+
+def _texto(valor: Any) -> Optional[str]:
+    return None if _vacio(valor) else str(valor).strip()
+
+
+def _numero(valor: Any):
+    if _vacio(valor):
+        return None
+    if isinstance(valor, bool):
+        return _INVALIDO
+    texto = str(valor).strip()
+    if "," in texto:
+        if _MILES.fullmatch(texto) is None:
+            return _INVALIDO
+        texto = texto.replace(",", "")
+    try:
+        numero = Decimal(texto)
+    except InvalidOperation:
+        return _INVALIDO
+    return numero if numero.is_finite() else _INVALIDO
+
+
+def _fecha(valor: Any):
+    if _vacio(valor):
+        return None
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    try:
+        return datetime.fromisoformat(str(valor).strip()).date()
+    except ValueError:
+        return _INVALIDO
+
+
+def decimal(valor: Any) -> Optional[Decimal]:
+    """Valor numérico como Decimal exacto, con la misma lectura que las reglas (None si falta)."""
+    numero = _numero(valor)
+    if numero is _INVALIDO:
+        raise ValueError(f"{valor!r} no es un número válido")
+    return numero
+
+
+def digito_verificacion(base: str) -> int:
+    """Dígito de verificación DIAN del NIT `base` (solo dígitos)."""
+    resto = sum(int(d) * p for d, p in zip(reversed(base), PESOS_NIT)) % 11
+    return 11 - resto if resto > 1 else resto
+
+
+def nit_partes(valor: Any) -> Optional[Tuple[str, Optional[int]]]:
+    """(número, dígito de verificación o None); None si falta o no tiene formato de NIT."""
+    if _vacio(valor):
+        return None
+    coincidencia = _NIT.fullmatch(_SEPARADORES_NIT.sub("", str(valor).strip()))
+    if coincidencia is None:
+        return None
+    base, dv = coincidencia.groups()
+    return base, None if dv is None else int(dv)
+
+
+def nit_base(valor: Any) -> Optional[str]:
+    """NIT sin puntos ni dígito de verificación, para buscar instituciones."""
+    partes = nit_partes(valor)
+    return partes[0] if partes else None
+
+
+# ====================================================================
+# Conversión por columnas (vectorizada)
+# ====================================================================
+
+class Tabla:
+    """Columnas de un DataFrame convertidas una sola vez para todas las reglas."""
+
+    def __init__(self, df):
+        self.df = df
+        self._convertidas: Dict[Tuple[str, str], Any] = {}
+
+    def _memo(self, tipo: str, campo: str, convertir: Callable[[], Any]):
+        clave = (tipo, campo)
+        if clave not in self._convertidas:
+            self._convertidas[clave] = convertir()
+        return self._convertidas[clave]
+
+    def columna(self, campo: str):
+        import pandas as pd
+
+        if campo in self.df.columns:
+            return self.df[campo]
+        return pd.Series(None, index=self.df.index, dtype=object)
+
+    def texto(self, campo: str):
+        return self._memo("texto", campo, lambda: self.columna(campo).astype(str).str.strip())
+
+    def presente(self, campo: str):
+        def convertir():
+            serie = self.columna(campo)
+            if serie.dtype.kind in "biufcmM":
+                return serie.notna()
+            return serie.notna() & self.texto(campo).ne("")
+        return self._memo("presente", campo, convertir)
+
+    def numero(self, campo: str):
+        import numpy as np
+        import pandas as pd
+
+        def convertir():
+            serie = self.columna(campo)
+            if serie.dtype.kind in "iuf":
+                numeros = serie.astype(float)
+            else:
+                numeros = pd.to_numeric(serie.where(self.presente(campo)), errors="coerce").astype(float)
+                # Separadores de miles: solo se reintenta lo que no convirtió y
+                # tiene comas bien agrupadas (PATRON_MILES).
+                reintentar = self.presente(campo) & numeros.isna()
+                if reintentar.any():
+                    texto = self.texto(campo)[reintentar]
+                    numeros[reintentar] = pd.to_numeric(
+                        texto.str.replace(",", "", regex=False).where(texto.str.fullmatch(PATRON_MILES)), errors="coerce"
+                    )
+            return numeros.where(np.isfinite(numeros))
+        return self._memo("numero", campo, convertir)
+
+    def fecha(self, campo: str):
+        import pandas as pd
+
+        def convertir():
+            serie = self.columna(campo)
+            if serie.dtype.kind != "M":
+                # Formato explícito, como _fecha: sin adivinarlo por la primera fila.
+                serie = pd.to_datetime(serie.where(self.presente(campo)), format="ISO8601", errors="coerce")
+            return serie.dt.normalize()
+        return self._memo("fecha", campo, convertir)
+
+    def caracteres(self, campo: str, ancho: int):
+        """
+        Matriz filas × `ancho` con los códigos de carácter del texto y el largo
+        de cada uno (-1 si no cabe). Los patrones cortos (NIT, código de motivo)
+        se revisan sobre ella con numpy en lugar de un regex por fila.
+        """
+        import numpy as np
+
+        def convertir():
+            texto = self.texto(campo)
+            largo = texto.str.len().fillna(0).to_numpy(dtype=np.int64)
+            cabe = largo <= ancho
+            valores = np.where(cabe, texto.to_numpy(dtype=object, na_value=""), "")
+            columnas = max(1, int(largo[cabe].max(initial=0)))
+            matriz = valores.astype(f"U{columnas}").view(np.uint32).reshape(len(valores), columnas)
+            # Lo que no es ASCII no cabe en ningún patrón: basta un byte por carácter.
+            return np.minimum(matriz, 0xFF).astype(np.uint8), np.where(cabe, largo, -1)
+        return self._memo(f"caracteres{ancho}", campo, convertir)
+
+    def nit(self, campo: str):
+        """
+        (válido, dígito de verificación calculado, dígito de verificación
+        escrito o -1) por fila: PATRON_NIT sin regex, quitando puntos y espacios.
+        """
+        import numpy as np
+
+        def convertir():
+            matriz, largo = self.caracteres(campo, _ANCHO_NIT)
+            dentro = np.arange(matriz.shape[1]) < largo[:, None]
+            digito = dentro & (matriz >= ord("0")) & (matriz <= ord("9"))
+            guion = dentro & (matriz == ord("-"))
+            separador = dentro & ((matriz == ord(".")) | (matriz == ord(" ")))
+            antes = np.cumsum(guion, axis=1, dtype=np.int8) == 0
+            en_base = digito & antes
+            n_base = en_base.sum(axis=1)
+            n_dv = (digito & ~antes).sum(axis=1)
+            guiones = guion.sum(axis=1)
+            valido = (
+                (largo >= 0)
+                & ~(dentro & ~(digito | guion | separador)).any(axis=1)
+                & (n_base >= 5) & (n_base <= 15)
+                & (((guiones == 0) & (n_dv == 0)) | ((guiones == 1) & (n_dv == 1)))
+            )
+            # Peso DIAN de cada dígito del número según su posición desde las unidades.
+            posicion = n_base[:, None] - np.cumsum(en_base, axis=1, dtype=np.int8)
+            pesos = np.where(en_base & (posicion < 15), np.array(PESOS_NIT, dtype=np.int16)[np.clip(posicion, 0, 14)], 0)
+            valor = matriz.astype(np.int16) - ord("0")
+            resto = (valor * pesos).sum(axis=1) % 11
+            calculado = np.where(resto > 1, 11 - resto, resto)
+            escrito = np.where(valido & (guiones == 1), (valor * (digito & ~antes)).sum(axis=1), -1)
+            return valido, calculado, escrito
+        return self._memo("nit", campo, convertir)
+
+    def codigo_motivo(self, campo: str):
+        """True donde el texto cumple PATRON_MOTIVO (sin distinguir mayúsculas)."""
+        import numpy as np
+
+        def convertir():
+            matriz, largo = self.caracteres(campo, 6)
+            digito = (matriz >= ord("0")) & (matriz <= ord("9"))
+            mayuscula = matriz & 0xDF  # a-z -> A-Z
+            letra = (mayuscula >= ord("A")) & (mayuscula <= ord("Z"))
+            tres_digitos = (largo == 3) & digito[:, :3].all(axis=1)
+            letras_digitos = (largo == 6) & letra[:, :2].all(axis=1) & digito[:, 2:6].all(axis=1)
+            return tres_digitos | letras_digitos
+        return self._memo("codigo_motivo", campo, convertir)
+
+
+def nits_base(serie):
+    """nit_base() para una columna entera (None donde no hay NIT válido)."""
+    return serie.map({v: nit_base(v) for v in serie.dropna().unique().tolist()})
+
+
+# ====================================================================
+# Reglas
+# ====================================================================
+
+class Regla:
+    """Condición sobre uno o más campos: `fila` recibe los valores, `vector` una Tabla; True = incumple."""
+
+    __slots__ = ("codigo", "campos", "mensaje", "fila", "vector")
+
+    def __init__(self, codigo: str, campos: Tuple[str, ...], mensaje: str,
+                 fila: Callable[..., bool], vector: Callable[[Tabla], Any]):
+        self.codigo = codigo
+        self.campos = campos
+        self.mensaje = mensaje
+        self.fila = fila
+        self.vector = vector
+
+    def incumple(self, datos: Mapping[str, Any]) -> bool:
+        return bool(self.fila(*(datos.get(c) for c in self.campos)))
+
+    def incumplen(self, tabla: Tabla):
+        import numpy as np
+
+        mascara = self.vector(tabla)
+        if hasattr(mascara, "to_numpy"):
+            return mascara.to_numpy(dtype=bool, na_value=False)
+        return np.asarray(mascara, dtype=bool)
+
+    def como_dict(self) -> dict:
+        return {"regla": self.codigo, "campos": list(self.campos), "mensaje": self.mensaje}
+
+    def __repr__(self) -> str:
+        return f"Regla({self.codigo}: {', '.join(self.campos)})"
+
+
+def requerido(campo: str, mensaje: Optional[str] = None, codigo: str = "requerido") -> Regla:
+    return Regla(
+        codigo, (campo,), mensaje or f"{campo} es obligatorio",
+        fila=_vacio,
+        vector=lambda t: ~t.presente(campo),
+    )
+
+
+def fecha(campo: str) -> Regla:
+    return Regla(
+        "fecha", (campo,), f"{campo} no es una fecha válida",
+        fila=lambda v: _fecha(v) is _INVALIDO,
+        vector=lambda t: t.presente(campo) & t.fecha(campo).isna(),
+    )
+
+
+def positivo(campo: str) -> Regla:
+    def fila(v):
+        numero = _numero(v)
+        return numero is _INVALIDO or (numero is not None and numero <= 0)
+
+    return Regla(
+        "positivo", (campo,), f"{campo} debe ser un número mayor que cero",
+        fila=fila,
+        vector=lambda t: t.presente(campo) & ~(t.numero(campo) > 0),
+    )
+
+
+def no_mayor(campo: str, tope: str) -> Regla:
+    def fila(v, limite):
+        v, limite = _numero(v), _numero(limite)
+        return isinstance(v, Decimal) and isinstance(limite, Decimal) and v > limite
+
+    return Regla(
+        "no_mayor", (campo, tope), f"{campo} no puede superar {tope}",
+        fila=fila,
+        vector=lambda t: t.numero(campo) > t.numero(tope),
+    )
+
+
+def orden(anterior: str, posterior: str, estricto: bool = False) -> Regla:
+    """`posterior` no puede ser anterior a `anterior` (ni igual, si `estricto`)."""
+    def fila(a, b):
+        a, b = _fecha(a), _fecha(b)
+        if not isinstance(a, date) or not isinstance(b, date):
+            return False
+        return a >= b if estricto else a > b
+
+    def vector(t):
+        a, b = t.fecha(anterior), t.fecha(posterior)
+        return a >= b if estricto else a > b
+
+    return Regla(
+        "orden_fechas", (anterior, posterior),
+        f"{posterior} debe ser {'posterior' if estricto else 'igual o posterior'} a {anterior}",
+        fila=fila, vector=vector,
+    )
+
+
+def formato_nit(campo: str) -> Regla:
+    return Regla(
+        "formato_nit", (campo,), f"{campo} no es un NIT válido (solo dígitos, opcionalmente -DV)",
+        fila=lambda v: not _vacio(v) and nit_partes(v) is None,
+        vector=lambda t: t.presente(campo) & ~t.nit(campo)[0],
+    )
+
+
+def digito_nit(campo: str) -> Regla:
+    def fila(v):
+        partes = nit_partes(v)
+        return partes is not None and partes[1] is not None and digito_verificacion(partes[0]) != partes[1]
+
+    return Regla(
+        "digito_verificacion", (campo,), f"{campo}: el dígito de verificación no corresponde al NIT",
+        fila=fila,
+        vector=lambda t: (t.nit(campo)[2] >= 0) & (t.nit(campo)[1] != t.nit(campo)[2]),
+    )
+
+
+def codigo_motivo(campo: str) -> Regla:
+    def fila(v):
+        texto = _texto(v)
+        return texto is not None and _MOTIVO.fullmatch(texto) is None
+
+    return Regla(
+        "codigo_motivo", (campo,), f"{campo} debe tener 3 dígitos o 2 letras y 4 dígitos (p. ej. 223, FA0101)",
+        fila=fila,
+        vector=lambda t: t.presente(campo) & ~t.codigo_motivo(campo),
+    )
+
+
+REGLAS_INSTITUCION: Tuple[Regla, ...] = (formato_nit("nit"), digito_nit("nit"))
+
+REGLAS_MOTIVO: Tuple[Regla, ...] = (codigo_motivo("codigo_motivo"),)
+
+REGLAS_FACTURA: Tuple[Regla, ...] = (
+    requerido("numero_factura"),
+    requerido("fecha_emision"),
+    requerido("valor_total_factura"),
+    formato_nit("nit_emisora"), digito_nit("nit_emisora"),
+    formato_nit("nit_receptora"), digito_nit("nit_receptora"),
+    fecha("fecha_emision"),
+    fecha("fecha_radicado"),
+    positivo("valor_total_factura"),
+    orden("fecha_emision", "fecha_radicado"),
+)
+
+REGLAS_GLOSA: Tuple[Regla, ...] = (
+    requerido("fecha_glosa"),
+    requerido("valor_glosado"),
+    fecha("fecha_glosa"),
+    fecha("fecha_vencimiento_respuesta"),
+    positivo("valor_glosado"),
+    codigo_motivo("codigo_motivo"),
+    orden("fecha_emision", "fecha_glosa"),
+    orden("fecha_glosa", "fecha_vencimiento_respuesta", estricto=True),
+    no_mayor("valor_glosado", "valor_total_factura"),
+)
+
+
+# ====================================================================
+# Aplicación
+# ====================================================================
+
+def validar_fila(datos: Mapping[str, Any], reglas: Sequence[Regla]) -> List[Regla]:
+    """Reglas que incumple `datos` (los campos ausentes cuentan como vacíos)."""
+    return [r for r in reglas if r.incumple(datos)]
+
+
+def exigir(datos: Mapping[str, Any], reglas: Sequence[Regla]) -> None:
+    infracciones = validar_fila(datos, reglas)
+    if infracciones:
+        raise DatosInvalidos(infracciones)
+
+
+def validar_tabla(datos, reglas: Sequence[Regla]) -> Dict[Hashable, Tuple[Regla, ...]]:
+    """
+    {etiqueta de fila: reglas incumplidas}, solo para las filas con alguna
+    infracción. Cada regla se evalúa una vez sobre todas las filas. `datos` es
+    un DataFrame o una Tabla (para reutilizar luego sus columnas convertidas).
+    """
+    import numpy as np
+
+    if len(reglas) > 64:
+        raise ValueError("validar_tabla admite hasta 64 reglas por llamada")
+    tabla = datos if isinstance(datos, Tabla) else Tabla(datos)
+    df = tabla.df
+    if df.empty or not reglas:
+        return {}
+    matriz = np.column_stack([r.incumplen(tabla) for r in reglas])
+    # Cada fila se resume en un entero (un bit por regla): las combinaciones
+    # distintas son pocas y se traducen una sola vez.
+    bits = matriz.astype(np.uint64) @ (np.uint64(1) << np.arange(len(reglas), dtype=np.uint64))
+    filas = np.flatnonzero(bits)
+    combinaciones = {
+        int(c): tuple(reglas[j] for j in range(len(reglas)) if int(c) >> j & 1)
+        for c in np.unique(bits[filas])
+    }
+    etiquetas = df.index.to_numpy()[filas].tolist()
+    return {e: combinaciones[c] for e, c in zip(etiquetas, bits[filas].tolist())}
+
+
+def reporte(infracciones: Dict[Hashable, Sequence[Regla]], desfase: int = 2) -> List[dict]:
+    """Infracciones para la respuesta de una importación; `desfase` lleva el índice a la fila de la hoja."""
+    return [
+        {"fila": int(fila) + desfase, "errores": [r.como_dict() for r in reglas]}
+        for fila, reglas in infracciones.items()
+    ]
@@ -0,0 +1,299 @@
+# vencimientos.py
+"""
+Colas de vencimiento precalculadas (tabla alerta_vencimiento).
+
+Una fila por glosa que todavía espera respuesta de la IPS y cuya
+fecha_vencimiento_respuesta ya pasó o cae dentro de los próximos
+ALERTAS_DIAS días hábiles (ver dias_habiles.py). Es una tabla pequeña: el
+dashboard, /alertas/mis-glosas y el resumen diario la leen a ella y nunca
+recorren la tabla de glosas.
+
+- Recálculo completo una vez al día (lo hace un solo worker: candado en el
+  almacén compartido), para que entren las glosas que llegan a la ventana.
+- Recálculo incremental tras cada escritura: el flush del ORM anota los ids
+  de Glosa tocados y al confirmar pasan a una cola del proceso; las
+  operaciones masivas los anotan con marcar(). El hilo programador los
+  recalcula en segundo plano, fuera de la petición.
+- La misma tarea diaria crea por adelantado las particiones mensuales de
+  la bitácora (auditoria.asegurar_particiones), para que la ventana de 13
+  meses de init_db.py avance con el calendario.
+- Si ALERTAS_BUZON_DIR está definida, el recálculo diario deja en ese
+  directorio un correo .eml por usuario con su resumen (un relay de correo
+  puede recogerlos de ahí).
+"""
+
+import logging
+import os
+import threading
+from datetime import date
+from email.message import EmailMessage
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import delete, event, insert, select
+from sqlalchemy.orm import Session
+
+import auditoria
+import dias_habiles
+from alcance import Alcance, TOTAL
+import estados_glosa
+import models
+from almacen import almacen
+
+logger = logging.getLogger(__name__)
+
+ALERTAS_DIAS = int(os.getenv("ALERTAS_DIAS", "5"))
+ALERTAS_BUZON_DIR = os.getenv("ALERTAS_BUZON_DIR")
+ALERTAS_REMITENTE = os.getenv("ALERTAS_REMITENTE", "alertas@glosas.local")
+# Espera máxima del programador entre revisiones de la cola (segundos).
+ALERTAS_INTERVALO_S = float(os.getenv("ALERTAS_INTERVALO_S", "30"))
+
+# Lote de ids por sentencia en el recálculo incremental (límite de parámetros de SQLite).
+LOTE_IDS = 5000
+
+_CANDADO_DIARIO = "vencimientos:diario:"
+
+
+# ====================================================================
+# Recálculo
+# ====================================================================
+
+def _origen(limite: date):
+    """SELECT de las glosas que deben estar en la cola, con las columnas de la tabla."""
+    glosa = models.Glosa
+    return select(
+        glosa.id_glosa,
+        glosa.usuario_responsable,
+        glosa.id_factura,
+        glosa.fecha_vencimiento_respuesta,
+        glosa.estado_glosa,
+        glosa.valor_glosado,
+    ).where(
+        glosa.fecha_vencimiento_respuesta.is_not(None),
+        glosa.fecha_vencimiento_respuesta <= limite,
+        glosa.estado_glosa.in_(estados_glosa.ESTADOS_POR_RESPONDER),
+    )
+
+
+def _limite(db: Session, hoy: date) -> date:
+    """Último día que entra en la ventana: ALERTAS_DIAS días hábiles después de hoy."""
+    return dias_habiles.sumar(dias_habiles.calendario(db), [hoy], ALERTAS_DIAS)[0].item()
+
+
+_COLUMNAS = ["id_glosa", "id_usuario", "id_factura", "fecha_vencimiento", "estado_glosa", "valor_glosado"]
+
+
+def recalcular(db: Session, ids: Optional[Iterable[int]] = None, hoy: Optional[date] = None) -> int:
+    """
+    Reescribe la cola (toda, o solo las glosas de `ids`) con un DELETE y un
+    INSERT ... SELECT por lote, sin commit. Devuelve las filas insertadas.
+    """
+    limite = _limite(db, hoy or date.today())
+    alerta = models.AlertaVencimiento
+    if ids is None:
+        db.execute(delete(alerta))
+        return db.execute(insert(alerta).from_select(_COLUMNAS, _origen(limite))).rowcount
+
+    ids = list(ids)
+    insertadas = 0
+    for i in range(0, len(ids), LOTE_IDS):
+        lote = ids[i:i + LOTE_IDS]
+        db.execute(delete(alerta).where(alerta.id_glosa.in_(lote)))
+        origen = _origen(limite).where(models.Glosa.id_glosa.in_(lote))
+        insertadas += db.execute(insert(alerta).from_select(_COLUMNAS, origen)).rowcount
+    return insertadas
+
+
+def cola_usuario(
+    db: Session, id_usuario: Optional[int], hoy: Optional[date] = None, alcance: Alcance = TOTAL
+) -> Dict[str, List[dict]]:
+    """Alertas de un usuario (None: todas las del alcance), separadas en vencidas y por vencer."""
+    hoy = hoy or date.today()
+    alerta = models.AlertaVencimiento
+    stmt = alcance.restringir(select(alerta).order_by(alerta.fecha_vencimiento, alerta.id_glosa), alerta)
+    if id_usuario is not None:
+        stmt = stmt.where(alerta.id_usuario == id_usuario)
+    filas = db.execute(stmt).scalars().all()
+    cola = {"vencidas": [], "por_vencer": []}
+    if not filas:
+        return cola
+    restantes = dias_habiles.restantes(dias_habiles.calendario(db), hoy, [f.fecha_vencimiento for f in filas])
+    for fila, dias in zip(filas, restantes.tolist()):
+        if dias > ALERTAS_DIAS:
+            continue  # entra en la ventana otro día; el recálculo diario aún no corrió
+        cola["vencidas" if fila.fecha_vencimiento < hoy else "por_vencer"].append({
+            "id_glosa": fila.id_glosa,
+            "id_factura": fila.id_factura,
+            "estado_glosa": fila.estado_glosa,
+            "valor_glosado": fila.valor_glosado,
+            "fecha_vencimiento": fila.fecha_vencimiento,
+            "dias_restantes": dias,
+        })
+    return cola
+
+
+# ====================================================================
+# Cola de glosas tocadas (recálculo incremental)
+# ====================================================================
+
+_pendientes: Set[int] = set()
+_candado_pendientes = threading.Lock()
+_despertar = threading.Event()
+
+
+def marcar(db: Session, ids: Iterable[int]) -> None:
+    """Anota glosas modificadas fuera del flush (UPDATE masivos); se encolan al confirmar."""
+    db.info.setdefault("glosas_tocadas", set()).update(ids)
+
+
+@event.listens_for(Session, "after_flush")
+def _glosas_del_flush(session, flush_context):
+    ids = [
+        obj.id_glosa
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+        if isinstance(obj, models.Glosa)
+    ]
+    if ids:
+        marcar(session, ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _encolar_al_confirmar(session):
+    ids = session.info.pop("glosas_tocadas", None)
+    if ids:
+        with _candado_pendientes:
+            _pendientes.update(ids)
+        _despertar.set()
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_al_revertir(session):
+    session.info.pop("glosas_tocadas", None)
+
+
+def procesar_pendientes(sesion_factory=None) -> int:
+    """Recalcula las glosas encoladas por este proceso. Devuelve cuántas."""
+    with _candado_pendientes:
+        ids = list(_pendientes)
+        _pendientes.clear()
+    if not ids:
+        return 0
+    if sesion_factory is None:
+        from database import SessionLocal as sesion_factory
+    db = sesion_factory()
+    try:
+        recalcular(db, ids)
+        db.commit()
+    except Exception:
+        db.rollback()
+        with _candado_pendientes:
+            _pendientes.update(ids)  # se reintenta en la próxima vuelta
+        raise
+    finally:
+        db.close()
+    return len(ids)
+
+
+# ====================================================================
+# Resumen diario (buzón de salida)
+# ====================================================================
+
+def _resumen(usuario: models.Usuario, cola: Dict[str, List[dict]], hoy: date) -> EmailMessage:
+    lineas = [f"Hola {usuario.nombre_completo},", ""]
+    for titulo, clave in (("Glosas vencidas", "vencidas"), (f"Glosas que vencen en {ALERTAS_DIAS} días hábiles o menos", "por_vencer")):
+        lineas.append(f"{titulo}: {len(cola[clave])}")
+        for a in cola[clave]:
+            lineas.append(
+                f"  - Glosa {a['id_glosa']} (factura {a['id_factura']}, {a['estado_glosa']}): "
+                f"vence {a['fecha_vencimiento'].isoformat()}, {a['dias_restantes']} días hábiles"
+            )
+        lineas.append("")
+    mensaje = EmailMessage()
+    mensaje["From"] = ALERTAS_REMITENTE
+    mensaje["To"] = usuario.email
+    mensaje["Subject"] = f"Vencimientos de glosas {hoy.isoformat()}: {len(cola['vencidas'])} vencidas, {len(cola['por_vencer'])} por vencer"
+    mensaje.set_content("\n".join(lineas))
+    return mensaje
+
+
+def escribir_resumenes(db: Session, directorio: str, hoy: Optional[date] = None) -> List[str]:
+    """Un .eml por usuario con alertas; escritura atómica (tmp + rename). Devuelve las rutas."""
+    hoy = hoy or date.today()
+    os.makedirs(directorio, exist_ok=True)
+    ids_usuario = db.execute(
+        select(models.AlertaVencimiento.id_usuario).where(models.AlertaVencimiento.id_usuario.is_not(None)).distinct()
+    ).scalars().all()
+    rutas = []
+    for usuario in db.query(models.Usuario).filter(models.Usuario.id_usuario.in_(ids_usuario), models.Usuario.activo.is_not(False)):
+        cola = cola_usuario(db, usuario.id_usuario, hoy)
+        if not cola["vencidas"] and not cola["por_vencer"]:
+            continue
+        ruta = os.path.join(directorio, f"vencimientos_{hoy:%Y%m%d}_usuario_{usuario.id_usuario}.eml")
+        with open(ruta + ".tmp", "wb") as f:
+            f.write(_resumen(usuario, cola, hoy).as_bytes())
+        os.replace(ruta + ".tmp", ruta)
+        rutas.append(ruta)
+    return rutas
+
+
+# ====================================================================
+# Programador
+# ====================================================================
+
+def tarea_diaria(hoy: Optional[date] = None, sesion_factory=None) -> bool:
+    """
+    Particiones de la bitácora + recálculo completo + resumen, una vez por
+    día entre todos los workers. Devuelve si este proceso la ejecutó.
+    """
+    hoy = hoy or date.today()
+    if not almacen.agregar(_CANDADO_DIARIO + hoy.isoformat(), str(os.getpid()), ttl=2 * 86400):
+        return False
+    if sesion_factory is None:
+        from database import SessionLocal as sesion_factory
+    db = sesion_factory()
+    try:
+        # Aparte: si falla (p. ej. la partición DEFAULT ya tiene filas de ese
+        # mes) no debe impedir el recálculo.
+        auditoria.asegurar_particiones(db.connection(), hoy)
+        db.commit()
+    except Exception:
+        db.rollback()
+        logger.exception("No se pudieron crear las particiones de glosa_evento")
+    try:
+        filas = recalcular(db, hoy=hoy)
+        db.commit()
+        logger.info("Cola de vencimientos recalculada: %d glosas", filas)
+        if ALERTAS_BUZON_DIR:
+            rutas = escribir_resumenes(db, ALERTAS_BUZON_DIR, hoy)
+            logger.info("Resúmenes de vencimientos escritos: %d", len(rutas))
+    except Exception:
+        db.rollback()
+        almacen.delete(_CANDADO_DIARIO + hoy.isoformat())  # que otro worker lo reintente
+        raise
+    finally:
+        db.close()
+    return True
+
+
+_hilo: Optional[threading.Thread] = None
+
+
+def _programar() -> None:
+    while True:
+        _despertar.wait(ALERTAS_INTERVALO_S)
+        _despertar.clear()
+        try:
+            tarea_diaria()
+            procesar_pendientes()
+        except Exception:
+            logger.exception("Falló el recálculo de vencimientos")
+
+
+def iniciar() -> None:
+    """Arranca el hilo programador (desde el lifespan, en cada worker). ALERTAS_PROGRAMADOR=0 lo desactiva."""
+    global _hilo
+    if os.getenv("ALERTAS_PROGRAMADOR", "1") == "0":
+        return
+    if _hilo is None or not _hilo.is_alive():
+        _hilo = threading.Thread(target=_programar, name="vencimientos-programador", daemon=True)
+        _hilo.start()
+        _despertar.set()  # primera vuelta inmediata
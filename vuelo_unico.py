@@ -0,0 +1,118 @@
+# vuelo_unico.py
+"""
+Coalescencia de lecturas costosas idénticas ("single flight").
+
+Cuando varias peticiones piden a la vez lo mismo (misma ruta, parámetros,
+alcance y versión de los datos), solo la primera calcula; las demás esperan
+ese mismo cálculo y reciben su resultado (o su excepción). El resultado
+queda además VUELO_UNICO_TTL_S segundos en una LRU pequeña, para quien
+llegue justo después.
+
+La clave incluye las versiones de las tablas (cache_http.version_tablas):
+una escritura confirmada cambia la clave, así que nunca se sirve un
+resultado anterior a ella. Es por worker: con N workers, a lo sumo N
+cálculos simultáneos de la misma clave.
+
+Los endpoints que lo usan son síncronos (threadpool), de ahí los candados
+de threading.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import cache_http
+
+VUELO_UNICO_TTL_S = float(os.getenv("VUELO_UNICO_TTL_S", 30))
+VUELO_UNICO_MAX_ENTRADAS = int(os.getenv("VUELO_UNICO_MAX_ENTRADAS", 64))
+
+
+class _Vuelo:
+    __slots__ = ("listo", "valor", "error")
+
+    def __init__(self):
+        self.listo = threading.Event()
+        self.valor: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class VueloUnico:
+    def __init__(self, ttl: float = VUELO_UNICO_TTL_S, max_entradas: int = VUELO_UNICO_MAX_ENTRADAS):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._candado = threading.Lock()
+        self._en_vuelo: Dict[Hashable, _Vuelo] = {}
+        self._resultados: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.calculos = 0
+        self.compartidos = 0  # esperaron un cálculo en curso
+        self.aciertos = 0     # servidos desde los resultados recientes
+
+    def obtener(self, clave: Hashable, calcular: Callable[[], Any], guardar: Callable[[], bool] = lambda: True) -> Any:
+        """
+        Resultado de `calcular()` para `clave`, compartido con las llamadas
+        concurrentes. `guardar()` decide (tras calcular) si el resultado puede
+        quedar en la LRU.
+        """
+        with self._candado:
+            reciente = self._resultados.get(clave)
+            if reciente is not None and reciente[0] > time.monotonic():
+                self._resultados.move_to_end(clave)
+                self.aciertos += 1
+                return reciente[1]
+            vuelo = self._en_vuelo.get(clave)
+            lider = vuelo is None
+            if lider:
+                vuelo = self._en_vuelo[clave] = _Vuelo()
+                self.calculos += 1
+            else:
+                self.compartidos += 1
+
+        if not lider:
+            vuelo.listo.wait()
+            if vuelo.error is not None:
+                raise vuelo.error
+            return vuelo.valor
+
+        try:
+            vuelo.valor = calcular()
+        except BaseException as e:
+            vuelo.error = e
+            raise
+        finally:
+            conservar = vuelo.error is None and self.ttl > 0 and guardar()
+            with self._candado:
+                del self._en_vuelo[clave]
+                if conservar:
+                    self._resultados[clave] = (time.monotonic() + self.ttl, vuelo.valor)
+                    self._resultados.move_to_end(clave)
+                    while len(self._resultados) > self.max_entradas:
+                        self._resultados.popitem(last=False)
+            vuelo.listo.set()
+        return vuelo.valor
+
+    def limpiar(self) -> None:
+        with self._candado:
+            self._resultados.clear()
+
+    def contadores(self) -> Dict[str, int]:
+        return {
+            "calculos": self.calculos,
+            "compartidos": self.compartidos,
+            "aciertos": self.aciertos,
+            "en_vuelo": len(self._en_vuelo),
+        }
+
+
+vuelo_unico = VueloUnico()
+
+
+def compartido(nombre: str, tablas: Tuple[str, ...], parametros: Hashable, calcular: Callable[[], Any]) -> Any:
+    """
+    obtener() con la clave de siempre: (nombre, parámetros, versión de
+    `tablas`). `parametros` debe incluir el alcance y todo lo que cambie el
+    resultado. Lo leído de una réplica atrasada se comparte pero no se guarda.
+    """
+    clave = (nombre, parametros, cache_http.version_tablas(tablas))
+    return vuelo_unico.obtener(clave, calcular, guardar=lambda: not cache_http.replica_atrasada(tablas))